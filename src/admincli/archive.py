@@ -412,6 +412,7 @@ def _add_suite_to_repo(
     announce_emails=None,
     not_automatic: bool = False,
     but_automatic_upgrades: bool = False,
+    byhash_retention: T.Optional[int] = None,
 ):
     '''Add suite to a repository.'''
 
@@ -443,6 +444,8 @@ def _add_suite_to_repo(
         rs_settings.announce_emails = announce_emails
         rs_settings.not_automatic = not_automatic
         rs_settings.but_automatic_upgrades = but_automatic_upgrades
+        if byhash_retention is not None:
+            rs_settings.byhash_retention = byhash_retention
 
 
 @archive.command(aliases=['r-a-s'])
@@ -6,29 +6,108 @@
 
 import sys
 import logging as log
+from datetime import UTC, datetime, timedelta
 
 import click
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, union, select
 from sqlalchemy.orm import undefer
 
 from laniakea import LkModule
 from laniakea.db import (
+    Job,
+    JobStatus,
+    PackageType,
+    DebcheckIssue,
     SourcePackage,
+    ArchiveRepoSuiteChange,
     ArchiveRepoSuiteSettings,
     session_scope,
     config_get_value,
+    config_set_value,
 )
 from laniakea.utils import process_file_lock
 from laniakea.ariadne import (
+    BuildScheduleIndex,
     delete_orphaned_jobs,
     remove_superfluous_pending_jobs,
     schedule_package_builds_for_source,
 )
 
+# time after which an incremental scheduling run is turned into a full rescan of the suite
+FULL_RESCAN_INTERVAL = timedelta(hours=24)
+# overlap between incremental runs, so we don't miss packages from transactions that were still in flight
+CURSOR_OVERLAP = timedelta(minutes=30)
 
-def get_newest_sources_index(session, rss: ArchiveRepoSuiteSettings):
+
+def get_schedule_cursor(rss: ArchiveRepoSuiteSettings) -> dict:
+    """
+    Get the scheduling cursor of a repository/suite combination.
+
+    The cursor contains the start times of the last scheduling run and of the last full rescan.
+    """
+    value = config_get_value(LkModule.ARIADNE, 'schedule-cursor.{}.{}'.format(rss.repo.name, rss.suite.name))
+    if not value:
+        return {}
+    return {k: datetime.fromisoformat(v) for k, v in value.items()}
+
+
+def set_schedule_cursor(rss: ArchiveRepoSuiteSettings, cursor: dict):
+    """
+    Store the scheduling cursor of a repository/suite combination.
+    """
+    config_set_value(
+        LkModule.ARIADNE,
+        'schedule-cursor.{}.{}'.format(rss.repo.name, rss.suite.name),
+        {k: v.isoformat() for k, v in cursor.items()},
+    )
+
+
+def changed_source_names_query(rss: ArchiveRepoSuiteSettings, since: datetime):
+    """
+    Select the names of all source packages that may need their build jobs updated since the given time.
+
+    These are source packages that were added or published after that time, packages which
+    were added to or removed from the suite (including their binaries), packages which
+    had new dependency issues found, and all packages with jobs that are waiting for their
+    dependencies, as those may have become installable in the meantime.
+    """
+
+    changed_sq = select(SourcePackage.name).where(
+        SourcePackage.repo_id == rss.repo_id,
+        SourcePackage.suites.any(id=rss.suite_id),
+        (SourcePackage.time_added >= since) | (SourcePackage.time_published >= since),
+    )
+    # packages keep their timestamps when they are copied or migrated, so we need to check the suite's change log
+    suite_changes_sq = select(ArchiveRepoSuiteChange.source_name).where(
+        ArchiveRepoSuiteChange.repo_suite_id == rss.id,
+        ArchiveRepoSuiteChange.time >= since,
+        ArchiveRepoSuiteChange.source_name.is_not(None),
+    )
+    debcheck_sq = select(DebcheckIssue.package_name).where(
+        DebcheckIssue.package_type == PackageType.SOURCE,
+        DebcheckIssue.repo_id == rss.repo_id,
+        DebcheckIssue.suite_id == rss.suite_id,
+        DebcheckIssue.time >= since,
+    )
+    depwait_sq = (
+        select(SourcePackage.name)
+        .join(Job, Job.trigger == SourcePackage.source_uuid)
+        .where(
+            SourcePackage.repo_id == rss.repo_id,
+            Job.module == LkModule.ARIADNE,
+            Job.suite_id == rss.suite_id,
+            Job.status == JobStatus.DEPWAIT,
+        )
+    )
+
+    return union(changed_sq, suite_changes_sq, debcheck_sq, depwait_sq)
+
+
+def get_newest_sources_index(session, rss: ArchiveRepoSuiteSettings, *, since: datetime | None = None):
     """
     Create an index of the most recent source packages.
+
+    :param since: Only consider source packages that may have changed since this time.
     """
 
     spkg_filters = [
@@ -36,6 +115,8 @@ def get_newest_sources_index(session, rss: ArchiveRepoSuiteSettings):
         SourcePackage.suites.any(id=rss.suite_id),
         SourcePackage.time_deleted.is_(None),
     ]
+    if since:
+        spkg_filters.append(SourcePackage.name.in_(changed_source_names_query(rss, since)))
 
     spkg_filter_sq = session.query(SourcePackage).filter(*spkg_filters).subquery()
     smv_sq = (
@@ -64,15 +145,26 @@ def get_newest_sources_index(session, rss: ArchiveRepoSuiteSettings):
 
 
 def update_package_build_schedule(
-    session, rss: ArchiveRepoSuiteSettings, simulate=False, limit_architecture=None, limit_count=0
+    session,
+    rss: ArchiveRepoSuiteSettings,
+    simulate=False,
+    limit_architecture=None,
+    limit_count=0,
+    *,
+    since: datetime | None = None,
 ) -> int:
     '''
     Schedule builds for packages in a particular suite.
+
+    If `since` is set, only source packages that may have changed after that time are considered,
+    otherwise the whole suite is rescanned.
     '''
 
     # where to build pure arch:all packages?
     arch_indep_affinity = config_get_value(LkModule.ARIADNE, 'indep_arch_affinity')
-    src_packages = get_newest_sources_index(session, rss)
+    src_packages = get_newest_sources_index(session, rss, since=since)
+    if since:
+        log.info('Checking {} source packages that changed since {}.'.format(len(src_packages), since.isoformat()))
 
     arch_all = None
     for arch in rss.suite.architectures:
@@ -93,6 +185,9 @@ def update_package_build_schedule(
     if limit_count > 0:
         log.info('Only scheduling maximally {} builds.'.format(limit_count))
 
+    # fetch everything we need to know about existing binaries, jobs and dependency issues in one go
+    sched_index = BuildScheduleIndex(session, rss, src_packages)
+
     scheduled_count = 0
     for spkg in src_packages:
         scheduled_count += schedule_package_builds_for_source(
@@ -103,6 +198,7 @@ def update_package_build_schedule(
             arch_all=arch_all,
             simulate=simulate,
             arch_indep_affinity=arch_indep_affinity,
+            index=sched_index,
         )
         if limit_count != 0 and scheduled_count >= limit_count:
             break
@@ -154,12 +250,20 @@ def update_package_build_schedule(
     default=None,
     help='Only schedule builds for the selected architecture.',
 )
+@click.option(
+    '--full',
+    'full_rescan',
+    is_flag=True,
+    default=False,
+    help='Check all packages in the suite, instead of only the ones that changed since the last run.',
+)
 def update_jobs(
     repo_name: str | None,
     suite_name: str | None,
     limit_count: int = 0,
     limit_arch: str | None = None,
     simulate: bool = False,
+    full_rescan: bool = False,
 ):
     """Schedule & update package build jobs."""
 
@@ -188,7 +292,28 @@ def update_jobs(
             # pending sync operation to complete first
             with process_file_lock('sync_{}'.format(rss.repo.name)):
                 log.info('Processing {}:{}'.format(rss.repo.name, rss.suite.name))
-                scheduled_count += update_package_build_schedule(session, rss, simulate, limit_arch, limit_count)
+
+                # we only look at what changed since the last run, unless a full rescan was requested,
+                # the last one is too long ago, or the last run was limited and may have skipped packages
+                run_start = datetime.now(UTC)
+                cursor = get_schedule_cursor(rss)
+                since = cursor['last_run'] - CURSOR_OVERLAP if 'last_run' in cursor else None
+                last_full = cursor.get('last_full_run')
+                if full_rescan or not last_full or run_start - last_full > FULL_RESCAN_INTERVAL:
+                    since = None
+
+                rss_scheduled = update_package_build_schedule(
+                    session, rss, simulate, limit_arch, limit_count, since=since
+                )
+                scheduled_count += rss_scheduled
+
+                # only advance the cursor if every package was considered
+                if not simulate and not limit_arch and (limit_count == 0 or rss_scheduled < limit_count):
+                    cursor['last_run'] = run_start
+                    if not since:
+                        cursor['last_full_run'] = run_start
+                    set_schedule_cursor(rss, cursor)
+
                 if limit_count > 0 and scheduled_count >= limit_count:
                     break
 
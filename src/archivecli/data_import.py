@@ -40,20 +40,30 @@ from laniakea.logging import log
 from laniakea.msgstream import EventEmitter
 from laniakea.archive.utils import package_mark_published
 from laniakea.archive.manage import (
-    copy_binary_package,
-    copy_source_package,
-    package_mark_delete,
+    bulk_migrate_packages,
     retrieve_suite_package_maxver_baseinfo,
 )
-from laniakea.archive.pkgimport import PackageImporter, ArchivePackageExistsError
+from laniakea.archive.pkgimport import (
+    PackageImporter,
+    BinaryImportRequest,
+    ArchivePackageExistsError,
+)
 
 
 def import_packages(
-    session, rss: ArchiveRepoSuiteSettings, component_name: T.Optional[str], fnames: T.List[T.PathUnion]
+    session,
+    rss: ArchiveRepoSuiteSettings,
+    component_name: T.Optional[str],
+    fnames: T.List[T.PathUnion],
+    *,
+    jobs: int = 1,
 ):
     """Directly add packages to a repository, without any extra checks.
     Usually, a regulr upload will have a NEW review and a bunch of QA checks before being permitted into
     a repository, but occasionally a direct package import is useful too, which is what this command permits.
+
+    If *jobs* is larger than 1, package files are inspected and verified in that many worker processes,
+    while they are still registered with the archive one after another.
     """
 
     src_fnames = []
@@ -76,20 +86,25 @@ def import_packages(
     pi = PackageImporter(rss)
     pi.keep_source_packages = True
 
-    # import sources
-    for src_fname in src_fnames:
-        try:
-            pi.import_source(src_fname, component_name, new_policy=NewPolicy.NEVER_NEW)
-        except ArchivePackageExistsError:
-            log.info('Skipping %s: Already exists in the archive', os.path.basename(src_fname))
-    session.commit()
+    with pi.parallel_inspection(jobs):
+        # read binaries in the background while we are busy with the sources
+        pi.prepare_files(src_fnames + bin_fnames)
 
-    # import binaries
-    for bin_fname in bin_fnames:
-        try:
-            pi.import_binary(bin_fname, component_name)
-        except ArchivePackageExistsError:
-            log.info('Skipping %s: Already exists in the archive', os.path.basename(bin_fname))
+        # import sources
+        for src_fname in src_fnames:
+            try:
+                pi.import_source(src_fname, component_name, new_policy=NewPolicy.NEVER_NEW)
+            except ArchivePackageExistsError:
+                log.info('Skipping %s: Already exists in the archive', os.path.basename(src_fname))
+        session.commit()
+
+        # import binaries
+        bin_uuids = pi.import_binaries(
+            [BinaryImportRequest(fname, component_name) for fname in bin_fnames], ignore_existing=True
+        )
+    for bin_fname, bin_uuid in zip(bin_fnames, bin_uuids):
+        if not bin_uuid:
+            log.info('Skipped %s: Already exists in the archive or was not importable', os.path.basename(bin_fname))
 
 
 @click.command('import')
@@ -111,9 +126,21 @@ def import_packages(
     'component_name',
     help='Name of the component to import into, will be read from the package file if not set.',
 )
+@click.option(
+    '--jobs',
+    '-j',
+    'jobs',
+    type=int,
+    default=1,
+    help='Number of processes to inspect and verify package files with.',
+)
 @click.argument('fnames', nargs=-1, type=click.Path())
 def import_pkg(
-    repo_name: T.Optional[str], suite_name: str, component_name: T.Optional[str], fnames: T.List[T.PathUnion]
+    repo_name: T.Optional[str],
+    suite_name: str,
+    component_name: T.Optional[str],
+    fnames: T.List[T.PathUnion],
+    jobs: int = 1,
 ):
     """Directly import packages into a repository, without any extra checks."""
 
@@ -141,7 +168,7 @@ def import_pkg(
             sys.exit(1)
 
         try:
-            import_packages(session, rss, component_name, fnames)
+            import_packages(session, rss, component_name, fnames, jobs=jobs)
         except Exception as e:
             click.echo('Package import failed: {}'.format(str(e)), err=True)
             sys.exit(5)
@@ -193,10 +220,8 @@ def import_heidi_result(
             for info in bpkg_einfo:
                 bpkg_eset[info[0] + '/' + info[2]] = (info[0], info[1], info[2])
 
-            arch_ref = {}
-            for arch in rss.suite.architectures:
-                arch_ref[arch.name] = arch
-
+            add_sources = []
+            add_binaries = []
             with open(heidi_fname, 'r', encoding='utf-8') as f:
                 while line := f.readline():
                     line = line.rstrip()
@@ -211,67 +236,23 @@ def import_heidi_result(
                         if not e_version or pkgversion != e_version:
                             # package not present in target, or is present in a different version.
                             # Let's look for this version in the current repository and copy it to the target
-                            spkg = (
-                                session.query(SourcePackage)
-                                .filter(
-                                    SourcePackage.repo_id == rss.repo_id,
-                                    SourcePackage.name == pkgname,
-                                    SourcePackage.version == pkgversion,
-                                )
-                                .one()
-                            )
-                            copy_source_package(session, spkg, rss, include_binaries=False, emitter=emitter)
-                            continue
+                            add_sources.append((pkgname, pkgversion))
                     else:
                         _, e_version, e_arch_name = bpkg_eset.pop(pkgname + '/' + arch_name, (None, None, None))
                         if not e_version or e_version != pkgversion:
-                            arch = arch_ref[arch_name]
-                            bpkg = (
-                                session.query(BinaryPackage)
-                                .filter(
-                                    BinaryPackage.repo_id == rss.repo_id,
-                                    BinaryPackage.name == pkgname,
-                                    BinaryPackage.version == pkgversion,
-                                    BinaryPackage.architecture.has(id=arch.id),
-                                )
-                                .one()
-                            )
-                            copy_binary_package(session, bpkg, rss)
+                            add_binaries.append((pkgname, pkgversion, arch_name))
                             # FIXME: We also need to move the debug package here, if one that corresponds to the binary package exists
-                            continue
 
-            if allow_delete:
-                for pkgname_rm, version_rm in spkg_eset.items():
-                    spkg = (
-                        session.query(SourcePackage)
-                        .filter(
-                            SourcePackage.repo_id == rss.repo_id,
-                            SourcePackage.name == pkgname_rm,
-                            SourcePackage.version == version_rm,
-                            SourcePackage.suites.any(id=rss.suite_id),
-                        )
-                        .one_or_none()
-                    )
-                    if not spkg:
-                        continue
-                    package_mark_delete(session, rss, spkg, emitter=emitter)
-
-                for pkgname_rm, version_rm, arch_name_rm in bpkg_eset.values():
-                    arch_rm = arch_ref[arch_name_rm]
-                    bpkg = (
-                        session.query(BinaryPackage)
-                        .filter(
-                            BinaryPackage.repo_id == rss.repo_id,
-                            BinaryPackage.name == pkgname_rm,
-                            BinaryPackage.version == version_rm,
-                            BinaryPackage.suites.any(id=rss.suite_id),
-                            BinaryPackage.architecture.has(id=arch_rm.id),
-                        )
-                        .one_or_none()
-                    )
-                    if not bpkg:
-                        continue
-                    package_mark_delete(session, rss, bpkg, emitter=emitter)
+            # resolve and apply all changes at once
+            bulk_migrate_packages(
+                session,
+                rss,
+                add_sources=add_sources,
+                add_binaries=add_binaries,
+                remove_sources=list(spkg_eset.items()) if allow_delete else [],
+                remove_binaries=list(bpkg_eset.values()) if allow_delete else [],
+                emitter=emitter,
+            )
 
 
 @click.command('export-list')
@@ -332,6 +313,8 @@ def _import_repo_into_suite(
     source_suite_name: str,
     source_component_name: str,
     src_repo_path: T.PathUnion,
+    *,
+    jobs: int = 1,
 ) -> bool:
     """Import a complete, local repository into a target."""
     from laniakea.reporeader import RepositoryReader
@@ -349,196 +332,210 @@ def _import_repo_into_suite(
     pi = PackageImporter(rss_dest)
     pi.keep_source_packages = True  # we must not delete the source while importing it
     pi.prefer_hardlinks = True  # prefer hardlinks if we are on the same drive, to save space
-
-    # import all source packages
-    print(Panel.fit('Importing sources'))
-    for spkg_src in src_repo.source_packages(src_suite, src_component):
-        dscfile = None
-        for f in spkg_src.files:
+    pi.inspect_in_process = True  # read package data directly, instead of running apt-ftparchive for each package
+
+    with pi.parallel_inspection(jobs):
+        # fetch all source packages, so their files can be inspected in the background
+        print(Panel.fit('Importing sources'))
+        src_todo = []
+        for spkg_src in src_repo.source_packages(src_suite, src_component):
+            dscfile = None
             # the source repository might be on a remote location, so we need to
             # request each file to be there.
             # (dak will fetch the files referenced in the .dsc file from the same directory)
-            if f.fname.endswith('.dsc'):
-                dscfile = src_repo.get_file(f)
-            src_repo.get_file(f)
-
-        # try to guess dsc file name - very old metadata did not include file information,
-        # and we may be importing an ancient archive
-        if not dscfile:
-            dscfile = src_repo.get_file_insecure(
-                os.path.join(spkg_src.directory, '{}_{}.dsc'.format(spkg_src.name, split_epoch(spkg_src.version)[1]))
-            )
-
-        if not dscfile:
-            log.error(
-                'Critical consistency error: Source package {}/{} in repository {} has no .dsc file.'.format(
-                    spkg_src.name, spkg_src.version, src_repo.base_dir
+            for f, fname in zip(spkg_src.files, src_repo.get_files(spkg_src.files)):
+                if f.fname.endswith('.dsc'):
+                    dscfile = fname
+
+            # try to guess dsc file name - very old metadata did not include file information,
+            # and we may be importing an ancient archive
+            if not dscfile:
+                dscfile = src_repo.get_file_insecure(
+                    os.path.join(
+                        spkg_src.directory, '{}_{}.dsc'.format(spkg_src.name, split_epoch(spkg_src.version)[1])
+                    )
                 )
-            )
-            return False
 
-        # we need to register overrides based on the source package info first, as
-        # the dsc file may not contain sufficient data to auto-create them
-        register_package_overrides(session, rss_dest, spkg_src.expected_binaries, allow_invalid_section=True)
-
-        spkg_dst = (
-            session.query(SourcePackage)
-            .filter(
-                SourcePackage.repo_id == rss_dest.repo_id,
-                SourcePackage.name == spkg_src.name,
-                SourcePackage.version == spkg_src.version,
-            )
-            .one_or_none()
+            if not dscfile:
+                log.error(
+                    'Critical consistency error: Source package {}/{} in repository {} has no .dsc file.'.format(
+                        spkg_src.name, spkg_src.version, src_repo.base_dir
+                    )
+                )
+                return False
+            src_todo.append((spkg_src, dscfile))
+        existing_sources = set(
+            session.query(SourcePackage.name, SourcePackage.version).filter(SourcePackage.repo_id == rss_dest.repo_id)
+        )
+        pi.prepare_files(
+            [dscfile for spkg_src, dscfile in src_todo if (spkg_src.name, spkg_src.version) not in existing_sources]
         )
 
-        # now actually import the source package, or register it with our suite if needed
-        if spkg_dst:
-            if rss_dest.suite not in spkg_dst.suites:
-                spkg_dst.suites.append(rss_dest.suite)
-                package_mark_published(session, rss_dest, spkg_dst)
-            log.info('Processed source: %s/%s', spkg_dst.name, spkg_dst.version)
-        else:
-            pi.import_source(
-                dscfile,
-                target_component_name,
-                new_policy=NewPolicy.NEVER_NEW,
-                ignore_version_check=True,
-                ignore_bad_section=True,
-            )
-    session.commit()
-
-    # import all binary packages
-    for arch in rss_dest.suite.architectures:
-        print(Panel.fit('Importing binaries for {}'.format(arch.name)))
-        shadow_arch = None
-        if arch.name == 'all':
-            for a in rss_dest.suite.architectures:
-                if a.name != 'all':
-                    shadow_arch = a
-                    break
-            log.info('Using shadow architecture %s for arch:all', shadow_arch.name)
-
-        bin_pkgs = src_repo.binary_packages(src_suite, src_component, arch, shadow_arch=shadow_arch)
-        bin_pkgs.extend(src_repo.installer_packages(src_suite, src_component, arch))
-        for bpkg_src in bin_pkgs:
-            fname = src_repo.get_file(bpkg_src.bin_file)
-
-            rss_dest_real = rss_dest
-            if bpkg_src.override.section == 'debug' and bpkg_src.name.endswith('-dbgsym'):
-                # we have a debug package, which may live in a different repo/suite
-                rss_dest_real = rss_dest_dbg
-
-            bpkg_dst = (
-                session.query(BinaryPackage)
+        # import all source packages
+        for spkg_src, dscfile in src_todo:
+            # we need to register overrides based on the source package info first, as
+            # the dsc file may not contain sufficient data to auto-create them
+            register_package_overrides(session, rss_dest, spkg_src.expected_binaries, allow_invalid_section=True)
+
+            spkg_dst = (
+                session.query(SourcePackage)
                 .filter(
-                    BinaryPackage.repo_id == rss_dest_real.repo_id,
-                    BinaryPackage.name == bpkg_src.name,
-                    BinaryPackage.version == bpkg_src.version,
-                    BinaryPackage.architecture.has(name=arch.name),
+                    SourcePackage.repo_id == rss_dest.repo_id,
+                    SourcePackage.name == spkg_src.name,
+                    SourcePackage.version == spkg_src.version,
                 )
                 .one_or_none()
             )
 
-            # update override to match the source data exactly
-            # we check the non-debug primary repo-suite config (rss_dest) first
-            override = (
-                session.query(PackageOverride)
-                .filter(
-                    PackageOverride.repo_id == rss_dest.repo_id,
-                    PackageOverride.suite_id == rss_dest.suite_id,
-                    PackageOverride.pkg_name == bpkg_src.name,
+            # now actually import the source package, or register it with our suite if needed
+            if spkg_dst:
+                if rss_dest.suite not in spkg_dst.suites:
+                    spkg_dst.suites.append(rss_dest.suite)
+                    package_mark_published(session, rss_dest, spkg_dst)
+                log.info('Processed source: %s/%s', spkg_dst.name, spkg_dst.version)
+            else:
+                pi.import_source(
+                    dscfile,
+                    target_component_name,
+                    new_policy=NewPolicy.NEVER_NEW,
+                    ignore_version_check=True,
+                    ignore_bad_section=True,
                 )
-                .one_or_none()
-            )
-            if not override:
-                # check the corresponding debug suite
+        session.commit()
+
+        # import all binary packages
+        for arch in rss_dest.suite.architectures:
+            print(Panel.fit('Importing binaries for {}'.format(arch.name)))
+            shadow_arch = None
+            if arch.name == 'all':
+                for a in rss_dest.suite.architectures:
+                    if a.name != 'all':
+                        shadow_arch = a
+                        break
+                log.info('Using shadow architecture %s for arch:all', shadow_arch.name)
+
+            bin_pkgs = src_repo.binary_packages(src_suite, src_component, arch, shadow_arch=shadow_arch)
+            bin_pkgs.extend(src_repo.installer_packages(src_suite, src_component, arch))
+            bin_batch = []
+            for bpkg_src, fname in zip(bin_pkgs, src_repo.get_files([b.bin_file for b in bin_pkgs])):
+
+                rss_dest_real = rss_dest
+                if bpkg_src.override.section == 'debug' and bpkg_src.name.endswith('-dbgsym'):
+                    # we have a debug package, which may live in a different repo/suite
+                    rss_dest_real = rss_dest_dbg
+
+                bpkg_dst = (
+                    session.query(BinaryPackage)
+                    .filter(
+                        BinaryPackage.repo_id == rss_dest_real.repo_id,
+                        BinaryPackage.name == bpkg_src.name,
+                        BinaryPackage.version == bpkg_src.version,
+                        BinaryPackage.architecture.has(name=arch.name),
+                    )
+                    .one_or_none()
+                )
+
+                # update override to match the source data exactly
+                # we check the non-debug primary repo-suite config (rss_dest) first
                 override = (
                     session.query(PackageOverride)
                     .filter(
-                        PackageOverride.repo_id == rss_dest_dbg.repo_id,
-                        PackageOverride.suite_id == rss_dest_dbg.suite_id,
+                        PackageOverride.repo_id == rss_dest.repo_id,
+                        PackageOverride.suite_id == rss_dest.suite_id,
                         PackageOverride.pkg_name == bpkg_src.name,
                     )
                     .one_or_none()
                 )
                 if not override:
-                    # If we are importing a repository with older packages (e.g. Debian's), we may not have set
-                    # all the overrides correctly from source packages.
-                    # So we cheat and add a new override based on the binary override data (will not work for debug
-                    # packages, in which case we'll simply fail)
-                    pinfo = PackageInfo(
-                        deb_type=bpkg_src.deb_type,
-                        name=bpkg_src.name,
-                        version=bpkg_src.version,
-                        component=src_component.name,
-                        section=bpkg_src.override.section,
-                        essential=bpkg_src.override.essential,
-                        priority=bpkg_src.override.priority,
-                        architectures=[arch.name],
-                    )
-                    register_package_overrides(session, rss_dest, [pinfo])
+                    # check the corresponding debug suite
                     override = (
                         session.query(PackageOverride)
                         .filter(
-                            PackageOverride.repo_id == rss_dest.repo_id,
-                            PackageOverride.suite_id == rss_dest.suite_id,
+                            PackageOverride.repo_id == rss_dest_dbg.repo_id,
+                            PackageOverride.suite_id == rss_dest_dbg.suite_id,
                             PackageOverride.pkg_name == bpkg_src.name,
                         )
                         .one_or_none()
                     )
                     if not override:
-                        # check the corresponding debug suite
-                        if rss_dest_dbg.id != rss_dest.id:
-                            override = (
-                                session.query(PackageOverride)
-                                .filter(
-                                    PackageOverride.repo_id == rss_dest_dbg.repo_id,
-                                    PackageOverride.suite_id == rss_dest_dbg.suite_id,
-                                    PackageOverride.pkg_name == bpkg_src.name,
-                                )
-                                .one_or_none()
+                        # If we are importing a repository with older packages (e.g. Debian's), we may not have set
+                        # all the overrides correctly from source packages.
+                        # So we cheat and add a new override based on the binary override data (will not work for debug
+                        # packages, in which case we'll simply fail)
+                        pinfo = PackageInfo(
+                            deb_type=bpkg_src.deb_type,
+                            name=bpkg_src.name,
+                            version=bpkg_src.version,
+                            component=src_component.name,
+                            section=bpkg_src.override.section,
+                            essential=bpkg_src.override.essential,
+                            priority=bpkg_src.override.priority,
+                            architectures=[arch.name],
+                        )
+                        register_package_overrides(session, rss_dest, [pinfo])
+                        override = (
+                            session.query(PackageOverride)
+                            .filter(
+                                PackageOverride.repo_id == rss_dest.repo_id,
+                                PackageOverride.suite_id == rss_dest.suite_id,
+                                PackageOverride.pkg_name == bpkg_src.name,
                             )
+                            .one_or_none()
+                        )
                         if not override:
-                            log.error(
-                                (
-                                    'Override missing unexpectedly: Binary package %s has no associated override in %s:%s, '
-                                    'even though it was already imported.'
-                                ),
-                                bpkg_src.name,
-                                rss_dest_real.repo.name,
-                                rss_dest_real.suite.name,
-                            )
-                            if bpkg_src.override.section == 'debug':
-                                continue
-                            else:
-                                return False
-            override.repo_suite = rss_dest_real
-            override.section = (
-                session.query(ArchiveSection).filter(ArchiveSection.name == bpkg_src.override.section).one_or_none()
-            )
-            if not override.section:
-                log.error(
-                    'Archive section `%s` does not exist, even though `%s` thinks it does.',
-                    bpkg_src.override.section,
-                    bpkg_src.name,
-                )
-                return False
-            override.essential = bpkg_src.override.essential
-            override.priority = bpkg_src.override.priority
-
-            # import binary package if needed
-            if bpkg_dst:
-                if rss_dest_real.suite not in bpkg_dst.suites:
-                    bpkg_dst.suites.append(rss_dest_real.suite)
-                    package_mark_published(session, rss_dest_real, bpkg_dst)
-                log.info('Processed binary: %s/%s on %s', bpkg_dst.name, bpkg_dst.version, arch.name)
-            else:
-                pi.import_binary(
-                    fname, target_component_name, override_section=bpkg_src.override.section, ignore_version_check=True
+                            # check the corresponding debug suite
+                            if rss_dest_dbg.id != rss_dest.id:
+                                override = (
+                                    session.query(PackageOverride)
+                                    .filter(
+                                        PackageOverride.repo_id == rss_dest_dbg.repo_id,
+                                        PackageOverride.suite_id == rss_dest_dbg.suite_id,
+                                        PackageOverride.pkg_name == bpkg_src.name,
+                                    )
+                                    .one_or_none()
+                                )
+                            if not override:
+                                log.error(
+                                    (
+                                        'Override missing unexpectedly: Binary package %s has no associated override in %s:%s, '
+                                        'even though it was already imported.'
+                                    ),
+                                    bpkg_src.name,
+                                    rss_dest_real.repo.name,
+                                    rss_dest_real.suite.name,
+                                )
+                                if bpkg_src.override.section == 'debug':
+                                    continue
+                                else:
+                                    return False
+                override.repo_suite = rss_dest_real
+                override.section = (
+                    session.query(ArchiveSection).filter(ArchiveSection.name == bpkg_src.override.section).one_or_none()
                 )
+                if not override.section:
+                    log.error(
+                        'Archive section `%s` does not exist, even though `%s` thinks it does.',
+                        bpkg_src.override.section,
+                        bpkg_src.name,
+                    )
+                    return False
+                override.essential = bpkg_src.override.essential
+                override.priority = bpkg_src.override.priority
 
-        # commit after each architecture was processed
-        session.commit()
+                # import binary package if needed
+                if bpkg_dst:
+                    if rss_dest_real.suite not in bpkg_dst.suites:
+                        bpkg_dst.suites.append(rss_dest_real.suite)
+                        package_mark_published(session, rss_dest_real, bpkg_dst)
+                    log.info('Processed binary: %s/%s on %s', bpkg_dst.name, bpkg_dst.version, arch.name)
+                else:
+                    bin_batch.append(BinaryImportRequest(fname, target_component_name, bpkg_src.override.section))
+
+            # commit after each architecture was processed, so the importer sees all override changes
+            session.commit()
+
+            # import all new binaries of this architecture in one transaction
+            pi.import_binaries(bin_batch, ignore_version_check=True)
 
     # success!
     return True
@@ -575,6 +572,14 @@ def _import_repo_into_suite(
     required=True,
     help='Name of the component to import from.',
 )
+@click.option(
+    '--jobs',
+    '-j',
+    'jobs',
+    type=int,
+    default=1,
+    help='Number of processes to inspect and verify package files with.',
+)
 @click.argument('src_repo_path', nargs=1, type=click.Path(), required=True)
 def import_repository(
     repo_name: T.Optional[str],
@@ -583,6 +588,7 @@ def import_repository(
     source_suite: str,
     source_component: str,
     src_repo_path: T.PathUnion,
+    jobs: int = 1,
 ):
     """Import full contents of an external repository into a destination repository, copying it."""
 
@@ -605,6 +611,6 @@ def import_repository(
         if not import_confirmed:
             return
         if not _import_repo_into_suite(
-            session, rss, target_component_name, source_suite, source_component, src_repo_path
+            session, rss, target_component_name, source_suite, source_component, src_repo_path, jobs=jobs
         ):
             sys.exit(1)
@@ -31,6 +31,7 @@ from laniakea.archive import (
     find_latest_source_package,
 )
 from laniakea.msgstream import EventEmitter
+from laniakea.archive.utils import repo_suite_mark_changed
 from laniakea.archive.manage import (
     expire_superseded,
     copy_source_package,
@@ -594,3 +595,7 @@ def change_override(
 
         ov.priority = priority
         ov.section = section
+
+        # overrides are part of the Packages indices, so they need to be regenerated
+        rss = repo_suite_settings_for(session, repo_name, suite_name)
+        repo_suite_mark_changed(session, rss)
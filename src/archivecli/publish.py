@@ -7,22 +7,26 @@
 import os
 import sys
 import gzip
+import json
 import lzma
 import time
+import queue
 import shutil
 import hashlib
 import functools
+import itertools
 import multiprocessing as mproc
 from glob import iglob
 from pathlib import Path
 from datetime import UTC, datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import click
-from pebble import concurrent
-from sqlalchemy import and_, func
+from pebble import ProcessPool, concurrent
+from sqlalchemy import and_
 from rich.console import Console
 from debian.deb822 import Deb822
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
 
 import laniakea.typing as T
 import laniakea.utils.renameat2 as renameat2
@@ -35,6 +39,8 @@ from laniakea.db import (
     ArchiveComponent,
     ArchiveRepository,
     ArchiveArchitecture,
+    LatestBinaryPackage,
+    LatestSourcePackage,
     ArchiveRepoSuiteSettings,
     session_scope,
 )
@@ -46,6 +52,7 @@ from laniakea.utils import (
 from laniakea.archive import repo_suite_settings_for
 from laniakea.logging import log, archive_log
 from laniakea.utils.gpg import sign
+from laniakea.archive.utils import repo_suite_remove_changed_slices
 from laniakea.archive.appstream import import_appstream_data
 
 
@@ -116,32 +123,53 @@ class RepoFileInfo:
         return self.fname == other.fname
 
 
-def set_deb822_value(entry: Deb822, key: str, value: T.Optional[str]):
+# number of rows to fetch per round-trip when streaming index data from the database
+INDEX_QUERY_BATCH_SIZE = 1000
+
+
+def set_deb822_value(entry: T.MutableMapping[str, str], key: str, value: T.Optional[str]):
     """Optionally set a DEB822 string value."""
     if value:
         entry[key] = value
 
 
-def set_deb822_value_commalist(entry: Deb822, key: str, value: T.Optional[T.Iterable[str]]):
+def set_deb822_value_commalist(entry: T.MutableMapping[str, str], key: str, value: T.Optional[T.Iterable[str]]):
     """Optionally set a DEB822 value and format it as comma-separated list"""
     if value:
         entry[key] = ', '.join(value)
 
 
-def set_deb822_value_spacelist(entry: Deb822, key: str, value: T.Optional[T.Iterable[str]]):
+def set_deb822_value_spacelist(entry: T.MutableMapping[str, str], key: str, value: T.Optional[T.Iterable[str]]):
     """Optionally set a DEB822 value and format it as space-separated list"""
     if value:
         entry[key] = ' '.join(value)
 
 
+def format_deb822_stanza(entry: T.Mapping[str, str]) -> str:
+    """Format a single DEB822 stanza.
+
+    This produces the same output as :meth:`Deb822.dump`, but without its overhead,
+    which matters when writing the large Packages and Sources indices.
+    """
+    return ''.join(
+        [(f'{key}:{value}\n' if not value or value[0] == '\n' else f'{key}: {value}\n') for key, value in entry.items()]
+    )
+
+
 def create_by_hash_for(
-    root_path: T.PathUnion, repo_fname: T.PathUnion, component: ArchiveComponent | str
+    root_path: T.PathUnion,
+    repo_fname: T.PathUnion,
+    component: ArchiveComponent | str,
+    *,
+    checksums: T.Optional[tuple[int, str, str]] = None,
 ) -> list[RepoFileInfo]:
     """Write a by-hash file into the appropriate location, replacing the original with a symlink.
 
     :param root_path: Root subdirectory in dists/ where the components folders are located.
     :param repo_fname: The location below root_path for this file.
     :param component: The component we are working on.
+    :param checksums: Tuple of size, SHA256 and MD5 checksum of the file, if already known.
+                      The file is read back to checksum it otherwise.
 
     :return: List of generated RepoFileInfo for the selected hashes and source file.
     """
@@ -154,14 +182,18 @@ def create_by_hash_for(
     os.makedirs(by_hash_sha256_root, exist_ok=True)
 
     fname_full = os.path.join(root_path, repo_fname)
-    with open(fname_full, 'rb') as f:
-        data = f.read()
+    if checksums:
+        size, sha256_digest, md5_digest = checksums
+    else:
+        with open(fname_full, 'rb') as f:
+            data = f.read()
+        size = len(data)
+        sha256_digest = hashlib.sha256(data).hexdigest()
+        md5_digest = hashlib.md5(data).hexdigest()
 
-    sha256_digest = hashlib.sha256(data).hexdigest()
-    md5_digest = hashlib.md5(data).hexdigest()
     finfos = [
-        RepoFileInfo(repo_fname, len(data), 'SHA256', sha256_digest),
-        RepoFileInfo(repo_fname, len(data), 'MD5Sum', md5_digest),
+        RepoFileInfo(repo_fname, size, 'SHA256', sha256_digest),
+        RepoFileInfo(repo_fname, size, 'MD5Sum', md5_digest),
     ]
 
     # We could use hardlinks here, but if the source file is written to directly, the by-hash files
@@ -177,13 +209,230 @@ def create_by_hash_for(
     return finfos
 
 
+class _ChecksummingWriter:
+    """Binary file wrapper which checksums all data while it is being written."""
+
+    def __init__(self, fileobj: T.BinaryIO):
+        self._f = fileobj
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.md5.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    def flush(self):
+        self._f.flush()
+
+    def checksums(self) -> tuple[int, str, str]:
+        return self.size, self.sha256.hexdigest(), self.md5.hexdigest()
+
+
+def _compress_chunks_into(fname_z: str, z_ext: str, chunk_queue: queue.Queue) -> tuple[int, str, str]:
+    """Compress data chunks from :chunk_queue into :fname_z, until a None chunk is received.
+
+    :return: Tuple of size, SHA256 and MD5 checksum of the compressed file.
+    """
+
+    received_all = False
+    try:
+        if os.path.islink(fname_z):
+            os.unlink(fname_z)
+        with open(fname_z, 'wb') as raw_f:
+            cs_writer = _ChecksummingWriter(raw_f)
+            zf: T.BinaryIO
+            if z_ext == 'gz':
+                zf = gzip.GzipFile(filename=fname_z, mode='wb', fileobj=cs_writer)  # type: ignore[arg-type]
+            elif z_ext == 'xz':
+                zf = lzma.LZMAFile(cs_writer, 'wb')  # type: ignore[assignment]
+            else:
+                raise ArchivePublishError('Unknown compressed file extension: ' + z_ext)
+            with zf:
+                while True:
+                    chunk = chunk_queue.get()
+                    if chunk is None:
+                        received_all = True
+                        break
+                    zf.write(chunk)
+    except BaseException:
+        # keep draining the queue, so the producer is never blocked by us
+        while not received_all:
+            received_all = chunk_queue.get() is None
+        raise
+
+    return cs_writer.checksums()
+
+
+class MetadataFileWriter:
+    """Compress, checksum and by-hash-register repository metadata files concurrently.
+
+    The uncompressed data is fed from the calling thread (and can be streamed directly from the database),
+    while worker threads compress it into all requested formats at the same time. Compressed data is
+    checksummed while it is written, so no file ever has to be read back.
+    LZMA and zlib release the GIL while compressing, so consecutive files are processed in parallel
+    as well: :meth:`write` returns as soon as all data has been handed over, and :meth:`finish` waits
+    for all pending files to be completed.
+
+    An instance must only be used from a single thread, within a ``with`` block which owns the worker threads.
+    """
+
+    # size of the uncompressed data blocks passed to the compressor threads
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, max_workers: T.Optional[int] = None):
+        # we need at least one worker per compression format, as all compressors of a file run at the same time
+        self._max_workers = max(max_workers or os.cpu_count() or 1, 2)
+        self._executor: T.Optional[ThreadPoolExecutor] = None
+        self._pending: list[tuple[T.PathUnion, str, ArchiveComponent | str, Future]] = []
+        self._finfos: list[RepoFileInfo] = []
+
+    def write(
+        self,
+        root_path: T.PathUnion,
+        subdir: str,
+        basename: str,
+        *,
+        component: T.Optional[ArchiveComponent | str] = None,
+        data: bytes | str | T.Iterable[str] | T.Iterable[bytes],
+        compressions: T.Sequence[str] = ('xz',),
+    ):
+        """
+        Write archive metadata file and compress it with the selected algorithms.
+        :param root_path: Root directory of the repository.
+        :param subdir: Subdirectory within the repository.
+        :param basename: Base name of the metadata file, e.g. "Packages"
+        :param component: Archive component to write data into
+        :param data: Data the file should contain (usually UTF-8 text), or an iterable of
+                     DEB822 stanzas which are streamed into the file, separated by empty lines.
+                     Iterables of bytes are written verbatim.
+        :param compressions: File extensions of the compression formats to write.
+        """
+
+        if not component:
+            component_name = ''
+        else:
+            component_name = component if isinstance(component, str) else component.name
+
+        self.write_file(
+            root_path,
+            os.path.join(component_name, subdir, basename),
+            by_hash_component=component_name,
+            data=data,
+            compressions=compressions,
+        )
+
+    def write_file(
+        self,
+        root_path: T.PathUnion,
+        repo_fname: str,
+        *,
+        by_hash_component: ArchiveComponent | str,
+        data: bytes | str | T.Iterable[str] | T.Iterable[bytes],
+        compressions: T.Sequence[str] = ('xz',),
+    ):
+        """
+        Write archive metadata file to an arbitrary location and compress it with the selected algorithms.
+        :param root_path: Root directory of the repository.
+        :param repo_fname: Location of the uncompressed file below :root_path
+        :param by_hash_component: Archive component whose by-hash directory the file should be registered in.
+        :param data: Data the file should contain, see :meth:`write`
+        :param compressions: File extensions of the compression formats to write.
+        """
+
+        if not self._executor:
+            raise RuntimeError('MetadataFileWriter must be used as a context manager.')
+
+        if isinstance(data, (str, bytes)):
+            chunks: T.Iterable[str] | T.Iterable[bytes] = [data]  # type: ignore[list-item]
+        else:
+            chunks = data
+
+        chunk_queues = []
+        for z_ext in compressions:
+            chunk_queue: queue.Queue = queue.Queue(maxsize=8)
+            repo_fname_comp = repo_fname + '.' + z_ext
+            future = self._executor.submit(
+                _compress_chunks_into, os.path.join(root_path, repo_fname_comp), z_ext, chunk_queue
+            )
+            self._pending.append((root_path, repo_fname_comp, by_hash_component, future))
+            chunk_queues.append(chunk_queue)
+
+        def _put_block(block_: bytes):
+            for cq in chunk_queues:
+                cq.put(block_)
+
+        # feed the compressors, calculating the uncompressed checksums as we go
+        sha256_hash = hashlib.sha256()
+        md5_hash = hashlib.md5()
+        data_size = 0
+        buf = bytearray()
+        try:
+            for i, chunk in enumerate(chunks):
+                if isinstance(chunk, str):
+                    chunk_bytes = chunk.encode('utf-8') if i == 0 else b'\n' + chunk.encode('utf-8')
+                else:
+                    chunk_bytes = chunk
+                sha256_hash.update(chunk_bytes)
+                md5_hash.update(chunk_bytes)
+                data_size += len(chunk_bytes)
+                buf += chunk_bytes
+                if len(buf) >= self.CHUNK_SIZE:
+                    _put_block(bytes(buf))
+                    buf.clear()
+            if buf:
+                _put_block(bytes(buf))
+        finally:
+            # always terminate the compressors, even if generating the data failed
+            for cq in chunk_queues:
+                cq.put(None)
+
+        # uncompressed checksums
+        self._finfos.append(RepoFileInfo(repo_fname, data_size, 'SHA256', sha256_hash.hexdigest()))
+        self._finfos.append(RepoFileInfo(repo_fname, data_size, 'MD5Sum', md5_hash.hexdigest()))
+
+    def finish(self) -> list[RepoFileInfo]:
+        """Wait for all pending files to be written and register them in the by-hash directories.
+
+        :return: List of RepoFileInfo for all files written since the last call.
+        """
+
+        try:
+            for root_path, repo_fname_comp, by_hash_component, future in self._pending:
+                # the by-hash moves are cheap, and are done here to not have threads race on identical files
+                self._finfos.extend(
+                    create_by_hash_for(root_path, repo_fname_comp, by_hash_component, checksums=future.result())
+                )
+        finally:
+            self._pending = []
+
+        finfos = self._finfos
+        self._finfos = []
+        return finfos
+
+    def close(self):
+        """Wait for all workers to finish and release them."""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='metadata-compress')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 def write_compressed_files(
     root_path: T.PathUnion,
     subdir: str,
     basename: str,
     *,
     component: T.Optional[ArchiveComponent | str] = None,
-    data: str,
+    data: str | T.Iterable[str],
 ) -> T.List[RepoFileInfo]:
     """
     Write archive metadata file and compress it with all supported / applicable
@@ -192,32 +441,26 @@ def write_compressed_files(
     :param subdir: Subdirectory within the repository.
     :param basename: Base name of the metadata file, e.g. "Packages"
     :param component: Archive component to write data into
-    :param data: Data the file should contain (usually UTF-8 text)
+    :param data: Data the file should contain (usually UTF-8 text), or an iterable of
+                 DEB822 stanzas which are streamed into the file, separated by empty lines.
     """
 
-    if not component:
-        component_name = ''
-    else:
-        component_name = component if isinstance(component, str) else component.name
+    with MetadataFileWriter() as writer:
+        writer.write(root_path, subdir, basename, component=component, data=data)
+        return writer.finish()
 
-    finfos = []
-    data_bytes = data.encode('utf-8')
-    repo_fname = os.path.join(component_name, subdir, basename)
-
-    # uncompressed checksums
-    finfos.append(RepoFileInfo(repo_fname, len(data_bytes), 'SHA256', hashlib.sha256(data_bytes).hexdigest()))
-    finfos.append(RepoFileInfo(repo_fname, len(data_bytes), 'MD5Sum', hashlib.md5(data_bytes).hexdigest()))
-
-    # write compressed data
-    fname_xz = os.path.join(root_path, repo_fname + '.xz')
-    if os.path.islink(fname_xz):
-        os.unlink(fname_xz)
-    with lzma.open(fname_xz, 'w') as f:
-        f.write(data_bytes)
-
-    # write by-hash data and finish
-    finfos.extend(create_by_hash_for(root_path, repo_fname + '.xz', component=component))
-    return finfos
+
+def _read_file_chunks(fname: str, chunk_size: int) -> T.Iterator[bytes]:
+    """Read a (possibly compressed) file in chunks of uncompressed data."""
+    if fname.endswith('.xz'):
+        f = lzma.open(fname, 'rb')
+    elif fname.endswith('.gz'):
+        f = gzip.open(fname, 'rb')
+    else:
+        f = open(fname, 'rb')
+    with f:
+        while chunk := f.read(chunk_size):
+            yield chunk
 
 
 def import_metadata_file(
@@ -239,50 +482,23 @@ def import_metadata_file(
     :param component: The component to import into.
     """
 
-    source_fname = str(source_fname)
-
-    finfos = []
-    if source_fname.endswith('.xz'):
-        with lzma.open(source_fname, 'rb') as f:
-            data = f.read()
-    elif source_fname.endswith('.gz'):
-        with gzip.open(source_fname, 'rb') as f:
-            data = f.read()
-    else:
-        with open(source_fname, 'rb') as f:
-            data = f.read()
-    repo_fname = os.path.join(subdir, basename)
-
-    # add uncompressed checksums
-    data_md5 = hashlib.md5(data).hexdigest()
-    data_sha256 = hashlib.sha256(data).hexdigest()
-    finfos.append(RepoFileInfo(repo_fname, len(data), 'SHA256', data_sha256))
-    finfos.append(RepoFileInfo(repo_fname, len(data), 'MD5Sum', data_md5))
-
-    # comp_root_dir = os.path.normpath(os.path.join(root_path, '..'))
     if only_compression:
         use_exts = [only_compression]
     else:
         use_exts = ['xz', 'gz']
-
     for z_ext in use_exts:
-        repo_fname_comp = repo_fname + '.' + z_ext
-        fname_z = os.path.join(root_path, repo_fname_comp)
-        if os.path.islink(fname_z):
-            os.unlink(fname_z)
-        if z_ext == 'gz':
-            with gzip.open(fname_z, 'w') as f:
-                f.write(data)
-        elif z_ext == 'xz':
-            with lzma.open(fname_z, 'w') as f:
-                f.write(data)
-        else:
+        if z_ext not in ('xz', 'gz'):
             raise Exception('Unknown compressed file extension: ' + z_ext)
 
-        # make by-hash data
-        finfos.extend(create_by_hash_for(root_path, repo_fname_comp, component=component))
-
-    return finfos
+    with MetadataFileWriter(max_workers=len(use_exts)) as writer:
+        writer.write_file(
+            root_path,
+            os.path.join(subdir, basename),
+            by_hash_component=component,
+            data=_read_file_chunks(str(source_fname), MetadataFileWriter.CHUNK_SIZE),
+            compressions=use_exts,
+        )
+        return writer.finish()
 
 
 def write_release_file_for_arch(
@@ -309,58 +525,45 @@ def write_release_file_for_arch(
     release_path_full = os.path.join(root_path, release_name)
     if os.path.islink(release_path_full):
         os.unlink(release_path_full)
+    data = entry.dump().encode('utf-8')
     with open(release_path_full, 'wb') as f:
-        data = entry.dump().encode('utf-8')
         f.write(data)
 
-    finfos.extend(create_by_hash_for(root_path, release_name, component=component))
+    checksums = (len(data), hashlib.sha256(data).hexdigest(), hashlib.md5(data).hexdigest())
+    finfos.extend(create_by_hash_for(root_path, release_name, component=component, checksums=checksums))
     return finfos
 
 
-def generate_sources_index(session, repo: ArchiveRepository, suite: ArchiveSuite, component: ArchiveComponent) -> str:
+def generate_sources_index(
+    session, repo: ArchiveRepository, suite: ArchiveSuite, component: ArchiveComponent
+) -> T.Iterator[str]:
     """
     Generate Sources index data for the given repo/suite/component.
+    The data is streamed from the database, so the whole index is never held in memory at once.
     :param session: Active SQLAlchemy session
     :param repo: Repository to generate data for
     :param suite: Suite to generate data for
     :param component: Component to generate data for
-    :return:
+    :return: Iterator over the DEB822 stanzas of the index.
     """
 
-    spkg_filters = [
-        SourcePackage.repo_id == repo.id,
-        SourcePackage.suites.any(id=suite.id),
-        SourcePackage.component_id == component.id,
-        SourcePackage.time_deleted.is_(None),
-    ]
-
-    spkg_filter_sq = session.query(SourcePackage).filter(*spkg_filters).subquery()
-    smv_sq = (
-        session.query(spkg_filter_sq.c.name, func.max(spkg_filter_sq.c.version).label('max_version'))
-        .group_by(spkg_filter_sq.c.name)
-        .subquery('smv_sq')
-    )
-
     # get the latest source packages for this configuration
     spkgs = (
         session.query(SourcePackage)
-        .options(joinedload(SourcePackage.section), joinedload(SourcePackage.files))
-        .filter(*spkg_filters)
-        .join(
-            smv_sq,
-            and_(
-                SourcePackage.name == smv_sq.c.name,
-                SourcePackage.version == smv_sq.c.max_version,
-            ),
+        .options(joinedload(SourcePackage.section), selectinload(SourcePackage.files))
+        .join(LatestSourcePackage, LatestSourcePackage.pkg_uuid == SourcePackage.uuid)
+        .filter(
+            LatestSourcePackage.repo_id == repo.id,
+            LatestSourcePackage.suite_id == suite.id,
+            LatestSourcePackage.component_id == component.id,
         )
         .order_by(SourcePackage.name)
-        .all()
+        .yield_per(INDEX_QUERY_BATCH_SIZE)
     )
 
-    entries = []
     for spkg in spkgs:
         # write sources file
-        entry = Deb822()
+        entry: dict[str, str] = {}
         set_deb822_value(entry, 'Package', spkg.name)
         set_deb822_value(entry, 'Version', spkg.version)
         set_deb822_value(entry, 'Binary', ', '.join([b.name for b in spkg.expected_binaries]))
@@ -398,227 +601,317 @@ def generate_sources_index(session, repo: ArchiveRepository, suite: ArchiveSuite
             for key, value in extra_data.items():
                 set_deb822_value(entry, key, value)
 
-        entries.append(entry.dump())
+        yield format_deb822_stanza(entry)
 
-    return '\n'.join(entries)
 
+def _binary_package_stanza(bpkg: BinaryPackage, bpkg_override: PackageOverride, arch_name: str) -> str:
+    """Format the Packages index stanza for a binary package."""
 
-def generate_packages_index(
+    entry: dict[str, str] = {}
+
+    source_info = None
+    bpkg_is_binmu = bpkg.version != bpkg.source.version
+    if bpkg_is_binmu or bpkg.name != bpkg.source.name:
+        if bpkg_is_binmu:
+            source_info = bpkg.source.name + ' (' + bpkg.source.version + ')'
+        else:
+            source_info = bpkg.source.name
+
+    entry['Package'] = bpkg.name
+    set_deb822_value(entry, 'Source', source_info)
+    set_deb822_value(entry, 'Version', bpkg.version)
+    if bpkg_override.essential:
+        set_deb822_value(entry, 'Essential', 'yes')
+    set_deb822_value(entry, 'Maintainer', bpkg.maintainer)
+    set_deb822_value(entry, 'Original-Maintainer', bpkg.original_maintainer)
+    set_deb822_value(entry, 'Description', bpkg.summary)
+    set_deb822_value(entry, 'Description-md5', bpkg.description_md5)
+    set_deb822_value(entry, 'Homepage', bpkg.homepage)
+    set_deb822_value(entry, 'Architecture', arch_name)
+    set_deb822_value(entry, 'Multi-Arch', bpkg.multi_arch)
+    set_deb822_value(entry, 'Section', bpkg_override.section.name)
+    set_deb822_value(entry, 'Priority', str(bpkg_override.priority))
+    set_deb822_value_commalist(entry, 'Pre-Depends', bpkg.pre_depends)
+    set_deb822_value_commalist(entry, 'Depends', bpkg.depends)
+    set_deb822_value_commalist(entry, 'Replaces', bpkg.replaces)
+    set_deb822_value_commalist(entry, 'Provides', bpkg.provides)
+    set_deb822_value_commalist(entry, 'Recommends', bpkg.recommends)
+    set_deb822_value_commalist(entry, 'Suggests', bpkg.suggests)
+    set_deb822_value_commalist(entry, 'Enhances', bpkg.enhances)
+    set_deb822_value_commalist(entry, 'Conflicts', bpkg.conflicts)
+    set_deb822_value_commalist(entry, 'Breaks', bpkg.breaks)
+    set_deb822_value_commalist(entry, 'Built-Using', bpkg.built_using)
+    set_deb822_value_commalist(entry, 'Static-Built-Using', bpkg.static_built_using)
+    set_deb822_value_spacelist(entry, 'Build-Ids', bpkg.build_ids)
+
+    if bpkg.size_installed > 0:
+        set_deb822_value(entry, 'Installed-Size', str(bpkg.size_installed))
+    set_deb822_value(entry, 'Size', str(bpkg.bin_file.size))
+    set_deb822_value(entry, 'Filename', bpkg.bin_file.fname)
+    set_deb822_value(entry, 'SHA256', bpkg.bin_file.sha256sum)
+    if bpkg.phased_update_percentage < 100:
+        set_deb822_value(entry, '"Phased-Update-Percentage"', str(bpkg.phased_update_percentage))
+
+    extra_data = bpkg.extra_data
+    if extra_data:
+        for key, value in extra_data.items():
+            set_deb822_value(entry, key, value)
+
+    return format_deb822_stanza(entry)
+
+
+def generate_packages_indices(
     session,
     repo: ArchiveRepository,
     suite: ArchiveSuite,
     component: ArchiveComponent,
-    arch: ArchiveArchitecture,
+    arches: T.Sequence[ArchiveArchitecture],
     *,
     installer_udeb: bool = False,
-) -> str:
+) -> T.Iterator[tuple[ArchiveArchitecture, T.Iterator[str]]]:
     """
-    Generate Packages index data for the given repo/suite/component/arch.
+    Generate Packages index data for the given repo/suite/component for multiple architectures at once.
+    The latest package versions of all architectures are determined and fetched with a single query, and
+    the data is streamed from the database, so the whole index is never held in memory at once.
+    Each stanza iterator must be fully consumed before advancing to the next architecture.
     :param session: Active SQLAlchemy session
     :param repo: Repository to generate data for
     :param suite: Suite to generate data for
     :param component: Component to generate data for
+    :param arches: Architectures to generate data for
     :param installer_udeb: True if we should build the debian-installer index
-    :return:
+    :return: Iterator over tuples of architecture and the DEB822 stanzas of its index.
     """
 
     from laniakea.db.archive import DebType
 
-    rss = (
-        session.query(ArchiveRepoSuiteSettings)
-        .filter(
-            ArchiveRepoSuiteSettings.repo_id == repo.id,
-            ArchiveRepoSuiteSettings.suite_id == suite.id,
-        )
-        .one()
-    )
+    if not arches:
+        return
 
     deb_type = DebType.DEB
     if installer_udeb:
         deb_type = DebType.UDEB
 
-    bpkg_filter = [
-        BinaryPackage.deb_type == deb_type,
-        BinaryPackage.repo_id == repo.id,
-        BinaryPackage.suites.any(id=suite.id),
-        BinaryPackage.component_id == component.id,
-        BinaryPackage.architecture_id == arch.id,
-        BinaryPackage.time_deleted.is_(None),
-    ]
-
-    bpkg_filter_sq = session.query(BinaryPackage).filter(*bpkg_filter).subquery()
-    bmv_sq = (
-        session.query(bpkg_filter_sq.c.name, func.max(bpkg_filter_sq.c.version).label('max_version'))
-        .group_by(bpkg_filter_sq.c.name)
-        .subquery('bmv_sq')
-    )
-
     # get the latest binary packages for this configuration
     bpkgs_overrides = (
         session.query(BinaryPackage, PackageOverride)
-        .options(joinedload(BinaryPackage.bin_file), joinedload(PackageOverride.section))
-        .join(
-            bmv_sq,
-            and_(
-                BinaryPackage.name == bmv_sq.c.name,
-                BinaryPackage.version == bmv_sq.c.max_version,
-            ),
+        .options(
+            joinedload(BinaryPackage.bin_file),
+            joinedload(BinaryPackage.source),
+            joinedload(PackageOverride.section),
         )
+        .join(LatestBinaryPackage, LatestBinaryPackage.pkg_uuid == BinaryPackage.uuid)
         .join(
             PackageOverride,
             and_(
-                PackageOverride.repo_id == rss.repo_id,
-                PackageOverride.suite_id == rss.suite_id,
+                PackageOverride.repo_id == repo.id,
+                PackageOverride.suite_id == suite.id,
                 BinaryPackage.name == PackageOverride.pkg_name,
             ),
         )
-        .filter(*bpkg_filter)
-        .order_by(BinaryPackage.name)
-        .all()
+        .filter(
+            LatestBinaryPackage.repo_id == repo.id,
+            LatestBinaryPackage.suite_id == suite.id,
+            LatestBinaryPackage.component_id == component.id,
+            LatestBinaryPackage.architecture_id.in_([a.id for a in arches]),
+            LatestBinaryPackage.deb_type == deb_type,
+        )
+        .order_by(BinaryPackage.architecture_id, BinaryPackage.name)
+        .yield_per(INDEX_QUERY_BATCH_SIZE)
     )
 
-    entries = []
-    for bpkg, bpkg_override in bpkgs_overrides:
-        # write sources file
-        entry = Deb822()
+    arch_groups = itertools.groupby(bpkgs_overrides, key=lambda row: row[0].architecture_id)
+    next_group = next(arch_groups, None)
+    for arch in sorted(arches, key=lambda a: a.id):
+        if next_group and next_group[0] == arch.id:
+            yield arch, (_binary_package_stanza(bpkg, ov, arch.name) for bpkg, ov in next_group[1])
+            next_group = next(arch_groups, None)
+        else:
+            # no packages for this architecture, we still need an (empty) index
+            yield arch, iter(())
 
-        source_info = None
-        bpkg_is_binmu = bpkg.version != bpkg.source.version
-        if bpkg_is_binmu or bpkg.name != bpkg.source.name:
-            if bpkg_is_binmu:
-                source_info = bpkg.source.name + ' (' + bpkg.source.version + ')'
-            else:
-                source_info = bpkg.source.name
-
-        entry['Package'] = bpkg.name
-        set_deb822_value(entry, 'Source', source_info)
-        set_deb822_value(entry, 'Version', bpkg.version)
-        if bpkg_override.essential:
-            set_deb822_value(entry, 'Essential', 'yes')
-        set_deb822_value(entry, 'Maintainer', bpkg.maintainer)
-        set_deb822_value(entry, 'Original-Maintainer', bpkg.original_maintainer)
-        set_deb822_value(entry, 'Description', bpkg.summary)
-        set_deb822_value(entry, 'Description-md5', bpkg.description_md5)
-        set_deb822_value(entry, 'Homepage', bpkg.homepage)
-        set_deb822_value(entry, 'Architecture', arch.name)
-        set_deb822_value(entry, 'Multi-Arch', bpkg.multi_arch)
-        set_deb822_value(entry, 'Section', bpkg_override.section.name)
-        set_deb822_value(entry, 'Priority', str(bpkg_override.priority))
-        set_deb822_value_commalist(entry, 'Pre-Depends', bpkg.pre_depends)
-        set_deb822_value_commalist(entry, 'Depends', bpkg.depends)
-        set_deb822_value_commalist(entry, 'Replaces', bpkg.replaces)
-        set_deb822_value_commalist(entry, 'Provides', bpkg.provides)
-        set_deb822_value_commalist(entry, 'Recommends', bpkg.recommends)
-        set_deb822_value_commalist(entry, 'Suggests', bpkg.suggests)
-        set_deb822_value_commalist(entry, 'Enhances', bpkg.enhances)
-        set_deb822_value_commalist(entry, 'Conflicts', bpkg.conflicts)
-        set_deb822_value_commalist(entry, 'Breaks', bpkg.breaks)
-        set_deb822_value_commalist(entry, 'Built-Using', bpkg.built_using)
-        set_deb822_value_commalist(entry, 'Static-Built-Using', bpkg.static_built_using)
-        set_deb822_value_spacelist(entry, 'Build-Ids', bpkg.build_ids)
-
-        if bpkg.size_installed > 0:
-            set_deb822_value(entry, 'Installed-Size', str(bpkg.size_installed))
-        set_deb822_value(entry, 'Size', str(bpkg.bin_file.size))
-        set_deb822_value(entry, 'Filename', bpkg.bin_file.fname)
-        set_deb822_value(entry, 'SHA256', bpkg.bin_file.sha256sum)
-        if bpkg.phased_update_percentage < 100:
-            set_deb822_value(entry, '"Phased-Update-Percentage"', str(bpkg.phased_update_percentage))
-
-        extra_data = bpkg.extra_data
-        if extra_data:
-            for key, value in extra_data.items():
-                set_deb822_value(entry, key, value)
 
-        # add package metadata
-        entries.append(entry.dump())
+def generate_packages_index(
+    session,
+    repo: ArchiveRepository,
+    suite: ArchiveSuite,
+    component: ArchiveComponent,
+    arch: ArchiveArchitecture,
+    *,
+    installer_udeb: bool = False,
+) -> T.Iterator[str]:
+    """
+    Generate Packages index data for the given repo/suite/component/arch.
+    The data is streamed from the database, so the whole index is never held in memory at once.
+    :param session: Active SQLAlchemy session
+    :param repo: Repository to generate data for
+    :param suite: Suite to generate data for
+    :param component: Component to generate data for
+    :param installer_udeb: True if we should build the debian-installer index
+    :return: Iterator over the DEB822 stanzas of the index.
+    """
 
-    return '\n'.join(entries)
+    for _, stanzas in generate_packages_indices(session, repo, suite, component, [arch], installer_udeb=installer_udeb):
+        yield from stanzas
 
 
 def generate_i18n_template_data(
     session, repo: ArchiveRepository, suite: ArchiveSuite, component: ArchiveComponent
-) -> str:
+) -> T.Iterator[str]:
     """
      Generate i18n translation template data for the given repo/suite/component.
     :param session: Active SQLAlchemy session
     :param repo: Repository to generate data for
     :param suite: Suite to generate data for
     :param component: Component to generate data for
-    :return:
+    :return: Iterator over the DEB822 stanzas of the translation template.
     """
 
-    bpkg_filters = [
-        BinaryPackage.repo_id == repo.id,
-        BinaryPackage.suites.any(id=suite.id),
-        BinaryPackage.component_id == component.id,
-        BinaryPackage.time_deleted.is_(None),
-    ]
-
-    bpkg_filter_sq = session.query(BinaryPackage).filter(*bpkg_filters).subquery()
-    bmv_sq = (
-        session.query(bpkg_filter_sq.c.name, func.max(bpkg_filter_sq.c.version).label('max_version'))
-        .group_by(bpkg_filter_sq.c.name)
-        .subquery('bmv_sq')
-    )
-
-    # get the latest binary packages, ignoring the architecture (so we will select only one at random)
+    # get the latest binary packages, ignoring the architecture (so we will select only one at random
+    # of the ones with the highest version)
     i18n_data = (
         session.query(BinaryPackage.name, BinaryPackage.description_md5, BinaryPackage.description)
-        .filter(*bpkg_filters)
-        .join(
-            bmv_sq,
-            and_(
-                BinaryPackage.name == bmv_sq.c.name,
-                BinaryPackage.version == bmv_sq.c.max_version,
-            ),
+        .join(LatestBinaryPackage, LatestBinaryPackage.pkg_uuid == BinaryPackage.uuid)
+        .filter(
+            LatestBinaryPackage.repo_id == repo.id,
+            LatestBinaryPackage.suite_id == suite.id,
+            LatestBinaryPackage.component_id == component.id,
         )
-        .order_by(BinaryPackage.name)
+        .order_by(BinaryPackage.name, BinaryPackage.version.desc())
         .distinct(BinaryPackage.name)
-        .all()
+        .yield_per(INDEX_QUERY_BATCH_SIZE)
     )
 
-    i18n_entries = []
     for pkgname, description_md5, description in i18n_data:
-        i18n_entry = Deb822()
-        i18n_entry['Package'] = pkgname
-        i18n_entry['Description-md5'] = description_md5
-        i18n_entry['Description-en'] = description
-        i18n_entries.append(i18n_entry.dump())
+        i18n_entry = {
+            'Package': pkgname,
+            'Description-md5': description_md5,
+            'Description-en': description,
+        }
+        yield format_deb822_stanza(i18n_entry)
 
-    return '\n'.join(i18n_entries)
 
-
-def _expire_by_hash_files(root_path: T.PathUnion, component: ArchiveComponent, meta_files: list[RepoFileInfo]) -> None:
+class ByHashIndex:
     """
-    Expire obsolete files in by-hash directories.
-    :param root_path: Root part to the archive metadata directory.
-    :param component: Archive component to act on.
-    :return:
+    Persistent record of when the files in the by-hash directories of a suite were last referenced.
+
+    The index is kept in the archive's private state directory, so it is not published with the suite.
+    Expiring old files is a lookup in this index, and does not require walking the by-hash directories
+    on every publication.
     """
 
-    active_cs = set()
-    for fi in meta_files:
-        active_cs.add(str(fi.checksum))
+    def __init__(self, suite_dist_dir: T.PathUnion, index_fname: T.PathUnion):
+        """
+        :param suite_dist_dir: The dists/ directory of the suite containing the by-hash files.
+        :param index_fname: Location of the index file.
+        """
+        self._root = suite_dist_dir
+        self._fname = index_fname
+        self._entries: dict[str, float] = {}
+
+    def load(self, component_names: T.Iterable[str]):
+        """Load the index, creating it from the by-hash directories of the given components if it doesn't exist.
+
+        :param component_names: Components to scan if there is no index yet.
+        """
+        if os.path.isfile(self._fname):
+            try:
+                with open(self._fname, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+                return
+            except (OSError, ValueError) as e:
+                log.warning('Unable to read by-hash index %s, regenerating it: %s', self._fname, str(e))
+
+        # no usable index, so we create one from the modification times of the existing files once
+        self._entries = {}
+        for component_name in component_names:
+            by_hash_root = os.path.join(self._root, component_name, 'by-hash')
+            if not os.path.isdir(by_hash_root):
+                continue
+            for path, _, files in os.walk(by_hash_root):
+                for file in files:
+                    fname = os.path.join(path, file)
+                    self._entries[os.path.relpath(fname, self._root)] = os.path.getmtime(fname)
+
+    def mark_referenced(self, meta_files: T.Iterable[RepoFileInfo], timestamp: float):
+        """Record that the by-hash files for the given metadata files are referenced at the given time."""
+        for fi in meta_files:
+            component_name = str(fi.fname).split('/', 1)[0]
+            self._entries[os.path.join(component_name, 'by-hash', fi.checksum_name, fi.checksum)] = timestamp
+
+    def expire(self, cutoff: float):
+        """Delete all by-hash files that have not been referenced since the given time.
+
+        :param cutoff: Files last referenced before this timestamp are removed.
+        """
+        for key in [k for k, last_ref in self._entries.items() if last_ref < cutoff]:
+            fname = os.path.join(self._root, key)
+            log.debug('Deleting obsolete by-hash file: %s', fname)
+            try:
+                os.unlink(fname)
+            except FileNotFoundError:
+                pass
+            del self._entries[key]
+
+    def save(self):
+        """Write the index to disk."""
+        os.makedirs(os.path.dirname(self._fname), exist_ok=True)
+        fname_tmp = str(self._fname) + '.new'
+        with open(fname_tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, sort_keys=True, separators=(',', ':'))
+        os.replace(fname_tmp, self._fname)
 
-    comp_root_path = os.path.join(root_path, component.name)
-    by_hash_root = os.path.join(comp_root_path, 'by-hash')
-    if not os.path.isdir(by_hash_root):
-        log.error('Expected by-hash dir is missing: %s', by_hash_root)
-        return
 
-    two_weeks_ago = time.time() - (14 * 24 * 60 * 60)
-    for path, _, files in os.walk(by_hash_root):
-        for file in files:
-            # we do nothing to a hash file if it is actively referenced
-            if file in active_cs:
+def _read_release_file_infos(release_fname: T.PathUnion) -> list[RepoFileInfo]:
+    """
+    Read the file checksum entries of a previously published Release file.
+    :param release_fname: Path to the root Release file of a suite.
+    :return: List of RepoFileInfo for all files listed in the Release file.
+    """
+
+    with open(release_fname, 'r', encoding='utf-8') as f:
+        entry = Deb822(f)
+
+    finfos = []
+    for cs_name in ('SHA256', 'MD5Sum'):
+        for line in entry.get(cs_name, '').splitlines():
+            parts = line.split()
+            if len(parts) != 3:
                 continue
+            finfos.append(RepoFileInfo(parts[2], int(parts[1]), cs_name, parts[0]))
 
-            fname = os.path.join(path, file)
-            ti_m = os.path.getmtime(fname)
-            if ti_m < two_weeks_ago:
-                log.debug('Deleting obsolete by-hash file: %s', fname)
-                os.unlink(fname)
+    return finfos
+
+
+def _reuse_published_slice(prev_meta_files: list[RepoFileInfo], slice_dir: str, meta_files: list[RepoFileInfo]) -> bool:
+    """
+    Register the already published files of an unchanged dists/ slice for the new Release file.
+    :param prev_meta_files: File information read from the previously published Release file.
+    :param slice_dir: The slice subdirectory, relative to the suite's dists/ directory, e.g. "main/binary-amd64"
+    :param meta_files: List of files of the new Release file to extend.
+    :return: True if data for this slice was found and reused, False if the slice needs to be regenerated.
+    """
+
+    prefix = slice_dir + '/'
+    slice_finfos = [fi for fi in prev_meta_files if str(fi.fname).startswith(prefix)]
+    if not slice_finfos:
+        return False
+    meta_files.extend(slice_finfos)
+    return True
+
+
+def _stage_dists_file(src: str, dst: str):
+    """Copy function used to stage a published dists/ tree for editing.
+
+    Files in by-hash directories are content-addressed and never modified in place, so we can
+    hardlink them instead of copying potentially gigabytes of old indices on every publication.
+    Everything else (like the Release files, which are rewritten in place) is copied.
+    """
+    if os.path.basename(os.path.dirname(os.path.dirname(src))) == 'by-hash':
+        hardlink_or_copy(src, dst)
+    else:
+        shutil.copy2(src, dst)
+    return dst
 
 
 def _ensure_byhash_compat_link(component_arch_subdir_full: T.PathUnion):
@@ -649,7 +942,11 @@ def _publish_suite_dists(
     # update the suite data if forced, explicitly marked as changes pending or if we published the suite
     # for the last time about a week ago (6 days to give admins some time to fix issues before the old
     # data expires about 2 days later)
-    if not rss.changes_pending and not force and not rss.time_published < datetime.now(UTC) - timedelta(days=6):
+    time_published = rss.time_published
+    if time_published.tzinfo is None:
+        time_published = time_published.replace(tzinfo=UTC)
+    refresh_due = time_published < datetime.now(UTC) - timedelta(days=6)
+    if not rss.changes_pending and not force and not refresh_due:
         log.info('Not updating %s/%s: No pending changes.', rss.repo.name, rss.suite.name)
         return
 
@@ -658,6 +955,11 @@ def _publish_suite_dists(
     else:
         log.info('Publishing suite: %s/%s', rss.repo.name, rss.suite.name)
 
+    # the slices we will publish now, anything recorded as changed while we are working is kept for the next run
+    published_slices = set(rss.changed_slices or [])
+    # changes made after this point in time may not be included in the published data
+    publish_start = datetime.now(UTC)
+
     # global settings
     archive_root_dir = lconf.archive_root_dir
     temp_dists_root = os.path.join(archive_root_dir, rss.repo.name, 'zzz-meta')
@@ -665,9 +967,15 @@ def _publish_suite_dists(
     suite_temp_dist_dir = os.path.join(temp_dists_root, rss.suite.name)
     suite_repo_dist_dir = os.path.join(repo_dists_root, rss.suite.name)
 
-    # copy old directory tree to our temporary location for editing
+    # stage old directory tree in our temporary location for editing
     if os.path.isdir(suite_repo_dist_dir):
-        shutil.copytree(suite_repo_dist_dir, suite_temp_dist_dir, symlinks=True, ignore_dangling_symlinks=True)
+        shutil.copytree(
+            suite_repo_dist_dir,
+            suite_temp_dist_dir,
+            symlinks=True,
+            ignore_dangling_symlinks=True,
+            copy_function=_stage_dists_file,
+        )
     os.makedirs(suite_temp_dist_dir, exist_ok=True)
     os.makedirs(repo_dists_root, exist_ok=True)
 
@@ -680,120 +988,170 @@ def _publish_suite_dists(
             )
         )
 
-    # update metadata
-    meta_files: list[RepoFileInfo] = []
-    for component in rss.suite.components:
-        suite_component_dists_sources_dir = os.path.join(suite_temp_dist_dir, component.name, 'source')
-        os.makedirs(suite_component_dists_sources_dir, exist_ok=True)
-
-        # create link in directory pointing to the shared by-hash folder for compatibility
-        _ensure_byhash_compat_link(suite_component_dists_sources_dir)
-
-        # generate Sources
-        res = generate_sources_index(session, rss.repo, rss.suite, component)
-        meta_files.extend(
-            write_compressed_files(suite_temp_dist_dir, 'source', 'Sources', component=component, data=res)
+    # If we know which parts of the suite have changed since the last publication, we only regenerate
+    # the affected indices and reuse the already published, content-addressed files for everything else.
+    changed_slices: T.Optional[set[str]] = None
+    prev_meta_files: list[RepoFileInfo] = []
+    if (
+        not force
+        and not only_sources
+        and not refresh_due
+        and published_slices
+        and '*' not in published_slices
+        and os.path.isfile(root_rel_fname)
+    ):
+        changed_slices = set(published_slices)
+        prev_meta_files = _read_release_file_infos(root_rel_fname)
+        log.info(
+            'Updating changed indices of %s/%s: %s', rss.repo.name, rss.suite.name, ', '.join(sorted(changed_slices))
         )
-        meta_files.extend(write_release_file_for_arch(suite_temp_dist_dir, 'source', rss, component, 'source'))
-
-        # don't write anything else if we only need to update the Sources index
-        if only_sources:
-            continue
 
-        dists_dep11_subdir = os.path.join(component.name, 'dep11')
-        for arch in rss.suite.architectures:
-            # generate Packages
-            dists_arch_subdir = 'binary-' + arch.name
-            suite_component_dists_arch_dir_full = os.path.join(suite_temp_dist_dir, component.name, dists_arch_subdir)
-            os.makedirs(suite_component_dists_arch_dir_full, exist_ok=True)
+    # update metadata
+    meta_files: list[RepoFileInfo] = []
+    with MetadataFileWriter() as metadata_writer:
+        for component in rss.suite.components:
+            suite_component_dists_sources_dir = os.path.join(suite_temp_dist_dir, component.name, 'source')
+            os.makedirs(suite_component_dists_sources_dir, exist_ok=True)
 
             # create link in directory pointing to the shared by-hash folder for compatibility
-            _ensure_byhash_compat_link(suite_component_dists_arch_dir_full)
-
-            pkg_data = generate_packages_index(session, rss.repo, rss.suite, component, arch, installer_udeb=False)
-            meta_files.extend(
-                write_compressed_files(
-                    suite_temp_dist_dir, dists_arch_subdir, 'Packages', component=component, data=pkg_data
-                )
-            )
-            meta_files.extend(
-                write_release_file_for_arch(suite_temp_dist_dir, dists_arch_subdir, rss, component, arch.name)
-            )
+            _ensure_byhash_compat_link(suite_component_dists_sources_dir)
+
+            # generate Sources
+            sources_slice = os.path.join(component.name, 'source')
+            if (
+                changed_slices is None
+                or sources_slice in changed_slices
+                or not _reuse_published_slice(prev_meta_files, sources_slice, meta_files)
+            ):
+                res = generate_sources_index(session, rss.repo, rss.suite, component)
+                metadata_writer.write(suite_temp_dist_dir, 'source', 'Sources', component=component, data=res)
+                meta_files.extend(write_release_file_for_arch(suite_temp_dist_dir, 'source', rss, component, 'source'))
+
+            # don't write anything else if we only need to update the Sources index
+            if only_sources:
+                continue
 
-            # only add debian-installer data if we are not a debug suite
-            if not rss.suite.debug_suite_for:
-                dists_arch_di_subdir = os.path.join('debian-installer', 'binary-' + arch.name)
-                os.makedirs(
-                    os.path.join(suite_temp_dist_dir, os.path.join(component.name, dists_arch_di_subdir)), exist_ok=True
+            dists_dep11_subdir = os.path.join(component.name, 'dep11')
+            regen_arches = []
+            regen_di_arches = []
+            for arch in rss.suite.architectures:
+                dists_arch_subdir = 'binary-' + arch.name
+                suite_component_dists_arch_dir_full = os.path.join(
+                    suite_temp_dist_dir, component.name, dists_arch_subdir
                 )
-                pkg_data_di = generate_packages_index(
-                    session, rss.repo, rss.suite, component, arch, installer_udeb=True
+                os.makedirs(suite_component_dists_arch_dir_full, exist_ok=True)
+
+                # create link in directory pointing to the shared by-hash folder for compatibility
+                _ensure_byhash_compat_link(suite_component_dists_arch_dir_full)
+
+                arch_slice = os.path.join(component.name, dists_arch_subdir)
+                if (
+                    changed_slices is None
+                    or arch_slice in changed_slices
+                    or not _reuse_published_slice(prev_meta_files, arch_slice, meta_files)
+                ):
+                    regen_arches.append(arch)
+
+                # only add debian-installer data if we are not a debug suite
+                if not rss.suite.debug_suite_for:
+                    dists_arch_di_subdir = os.path.join('debian-installer', 'binary-' + arch.name)
+                    os.makedirs(
+                        os.path.join(suite_temp_dist_dir, os.path.join(component.name, dists_arch_di_subdir)),
+                        exist_ok=True,
+                    )
+                    arch_di_slice = os.path.join(component.name, dists_arch_di_subdir)
+                    if (
+                        changed_slices is None
+                        or arch_di_slice in changed_slices
+                        or not _reuse_published_slice(prev_meta_files, arch_di_slice, meta_files)
+                    ):
+                        regen_di_arches.append(arch)
+
+            # generate Packages, with the data for all architectures fetched at once
+            for arch, pkg_data in generate_packages_indices(
+                session, rss.repo, rss.suite, component, regen_arches, installer_udeb=False
+            ):
+                dists_arch_subdir = 'binary-' + arch.name
+                metadata_writer.write(
+                    suite_temp_dist_dir, dists_arch_subdir, 'Packages', component=component, data=pkg_data
                 )
                 meta_files.extend(
-                    write_compressed_files(
-                        suite_temp_dist_dir, dists_arch_di_subdir, 'Packages', component=component, data=pkg_data_di
-                    )
+                    write_release_file_for_arch(suite_temp_dist_dir, dists_arch_subdir, rss, component, arch.name)
+                )
+            for arch, pkg_data_di in generate_packages_indices(
+                session, rss.repo, rss.suite, component, regen_di_arches, installer_udeb=True
+            ):
+                metadata_writer.write(
+                    suite_temp_dist_dir,
+                    os.path.join('debian-installer', 'binary-' + arch.name),
+                    'Packages',
+                    component=component,
+                    data=pkg_data_di,
                 )
 
-            # import AppStream data
-            if dep11_src_dir:
-                dep11_files = ('Components-{}.yml'.format(arch.name), 'CID-Index-{}.json'.format(arch.name))
-                for dep11_basename in dep11_files:
-                    for ext in ('.gz', '.xz'):
-                        dep11_src_fname = os.path.join(
-                            dep11_src_dir, rss.suite.name, component.name, dep11_basename + ext
+            for arch in rss.suite.architectures:
+                # import AppStream data
+                if dep11_src_dir:
+                    dep11_files = ('Components-{}.yml'.format(arch.name), 'CID-Index-{}.json'.format(arch.name))
+                    for dep11_basename in dep11_files:
+                        for ext in ('.gz', '.xz'):
+                            dep11_src_fname = os.path.join(
+                                dep11_src_dir, rss.suite.name, component.name, dep11_basename + ext
+                            )
+                            if os.path.isfile(dep11_src_fname):
+                                break
+                        if not os.path.isfile(dep11_src_fname):
+                            continue
+                        os.makedirs(os.path.join(suite_temp_dist_dir, dists_dep11_subdir), exist_ok=True)
+
+                        # copy metadata, hash and register it
+                        meta_files.extend(
+                            import_metadata_file(
+                                suite_temp_dist_dir,
+                                dists_dep11_subdir,
+                                dep11_basename,
+                                dep11_src_fname,
+                                component,
+                                only_compression='xz' if dep11_basename.startswith('CID-Index') else None,
+                            )
                         )
-                        if os.path.isfile(dep11_src_fname):
-                            break
-                    if not os.path.isfile(dep11_src_fname):
-                        continue
-                    os.makedirs(os.path.join(suite_temp_dist_dir, dists_dep11_subdir), exist_ok=True)
 
-                    # copy metadata, hash and register it
+                    # import metadata into the database and connect it to binary packages
+                    import_appstream_data(session, rss, component, arch, repo_dists_dir=temp_dists_root)
+
+            # copy AppStream icon tarballs
+            if dep11_src_dir and not only_sources:
+                dep11_suite_component_src_dir = os.path.join(dep11_src_dir, rss.suite.name, component.name)
+                for icon_tar_fname in iglob(os.path.join(dep11_suite_component_src_dir, 'icons-*.tar.gz')):
+                    icon_tar_fname = os.path.join(dep11_suite_component_src_dir, icon_tar_fname)
                     meta_files.extend(
                         import_metadata_file(
                             suite_temp_dist_dir,
                             dists_dep11_subdir,
-                            dep11_basename,
-                            dep11_src_fname,
+                            Path(icon_tar_fname).stem,
+                            icon_tar_fname,
                             component,
-                            only_compression='xz' if dep11_basename.startswith('CID-Index') else None,
+                            only_compression='gz',
                         )
                     )
 
-                # import metadata into the database and connect it to binary packages
-                import_appstream_data(session, rss, component, arch, repo_dists_dir=temp_dists_root)
-
-        # copy AppStream icon tarballs
-        if dep11_src_dir and not only_sources:
-            dep11_suite_component_src_dir = os.path.join(dep11_src_dir, rss.suite.name, component.name)
-            for icon_tar_fname in iglob(os.path.join(dep11_suite_component_src_dir, 'icons-*.tar.gz')):
-                icon_tar_fname = os.path.join(dep11_suite_component_src_dir, icon_tar_fname)
-                meta_files.extend(
-                    import_metadata_file(
-                        suite_temp_dist_dir,
-                        dists_dep11_subdir,
-                        Path(icon_tar_fname).stem,
-                        icon_tar_fname,
-                        component,
-                        only_compression='gz',
+            # create i19n template data
+            if not only_sources:
+                suite_component_dists_i18n_dir = os.path.join(suite_temp_dist_dir, component.name, 'i18n')
+                os.makedirs(suite_component_dists_i18n_dir, exist_ok=True)
+                i18n_slice = os.path.join(component.name, 'i18n')
+                if (
+                    changed_slices is None
+                    or i18n_slice in changed_slices
+                    or not _reuse_published_slice(prev_meta_files, i18n_slice, meta_files)
+                ):
+                    i18n_data = generate_i18n_template_data(session, rss.repo, rss.suite, component)
+                    metadata_writer.write(
+                        suite_temp_dist_dir, 'i18n', 'Translation-en', component=component, data=i18n_data
                     )
-                )
-
-        # create i19n template data
-        if not only_sources:
-            suite_component_dists_i18n_dir = os.path.join(suite_temp_dist_dir, component.name, 'i18n')
-            os.makedirs(suite_component_dists_i18n_dir, exist_ok=True)
-            i18n_data = generate_i18n_template_data(session, rss.repo, rss.suite, component)
-            meta_files.extend(
-                write_compressed_files(
-                    suite_temp_dist_dir, 'i18n', 'Translation-en', component=component, data=i18n_data
-                )
-            )
 
-        if not only_sources:
-            # expire old by-hash files
-            _expire_by_hash_files(suite_temp_dist_dir, component, meta_files)
+        # wait for all index files to be compressed
+        meta_files.extend(metadata_writer.finish())
 
     # write root release file
     if only_sources:
@@ -866,6 +1224,15 @@ def _publish_suite_dists(
     with open(root_rel_fname, 'w', encoding='utf-8') as f:
         f.write(entry.dump())
 
+    # expire old by-hash files, everything listed in the new Release file is still referenced
+    now = time.time()
+    by_hash_index = ByHashIndex(
+        suite_temp_dist_dir, os.path.join(lconf.archive_state_dir, rss.repo.name, rss.suite.name, 'by-hash-index.json')
+    )
+    by_hash_index.load([c.name for c in rss.suite.components])
+    by_hash_index.mark_referenced(_read_release_file_infos(root_rel_fname), now)
+    by_hash_index.expire(now - rss.byhash_retention)
+
     # sign our changes
     root_relsigned_il_fname = os.path.join(suite_temp_dist_dir, 'InRelease')
     root_relsigned_dt_fname = os.path.join(suite_temp_dist_dir, 'Release.gpg')
@@ -897,12 +1264,20 @@ def _publish_suite_dists(
     else:
         os.rename(suite_temp_dist_dir, suite_repo_dist_dir)
 
-    # all changes have been applied. This is a bit of a race-condition,
-    # as some stuff may have been accepted while we are publishing data,
-    # but this is usually something we can ignore on high-volume suites,
-    # and we will also ensure that a suite gets published at least once
-    # every week
-    rss.changes_pending = False
+    # only record the by-hash changes once they are live, so we never lose track of published files
+    by_hash_index.save()
+
+    # all changes have been applied. We only clear the slices we read when we started, so slices
+    # marked as changed by imports that happened while we were publishing stay pending. A slice that
+    # was modified again after we generated its index is still a bit of a race-condition, but it
+    # will be picked up with the next change to it, and we also ensure that a suite gets published
+    # at least once every week
+    if only_sources:
+        # only the Sources indices were updated, so any other changes are still pending
+        repo_suite_remove_changed_slices(session, rss, [s for s in published_slices if s.endswith('/source')])
+    else:
+        repo_suite_remove_changed_slices(session, rss, published_slices)
+        rss.time_published = publish_start
     if only_sources:
         log.info('Published Sources index for suite: %s/%s', rss.repo.name, rss.suite.name)
         archive_log.info('PUBLISHED-SOURCES: %s/%s', rss.repo.name, rss.suite.name)
@@ -911,8 +1286,7 @@ def _publish_suite_dists(
         archive_log.info('PUBLISHED: %s/%s', rss.repo.name, rss.suite.name)
 
 
-@concurrent.process(daemon=False, name='publish-repo-suite-dists', context=mproc.get_context('forkserver'))  # type: ignore[call-overload]
-def publish_suite_dists_async(
+def publish_suite_dists_task(
     repo_name: str,
     suite_name: str,
     *,
@@ -922,7 +1296,7 @@ def publish_suite_dists_async(
     lconf_fname: T.Optional[T.PathUnion] = None,
 ):
     """
-    Parallel method for publishing data for a suite.
+    Publish data for a suite, in a worker process of the publishing pool.
     :param repo_name: Name of the repository.
     :param suite_name: Name of the suite in the repository
     :param dep11_src_dir: Source directory for DEP-11 data
@@ -977,25 +1351,34 @@ def publish_repo_dists(
             if not success:
                 raise Exception(error_msg)
 
-        async_tasks = []
+        suite_names = []
         for rss in repo.suite_settings:
             if suite_name:
                 # skip any suites that we shouldn't process
                 if rss.suite.name != suite_name:
                     continue
-            future = publish_suite_dists_async(
-                rss.repo.name,
-                rss.suite.name,
-                dep11_src_dir=dep11_dir,
-                only_sources=only_sources,
-                force=force,
-                lconf_fname=lconf.fname,
-            )
-            async_tasks.append(future)
+            suite_names.append(rss.suite.name)
+
+        # publish suites in parallel, but never run more publishing processes than we have CPU cores
+        max_workers = max(min(len(suite_names), os.cpu_count() or 1), 1)
+        with ProcessPool(max_workers=max_workers, context=mproc.get_context('forkserver')) as pool:
+            async_tasks = []
+            for s_name in suite_names:
+                future = pool.schedule(
+                    publish_suite_dists_task,
+                    args=(repo.name, s_name),
+                    kwargs=dict(
+                        dep11_src_dir=dep11_dir,
+                        only_sources=only_sources,
+                        force=force,
+                        lconf_fname=lconf.fname,
+                    ),
+                )
+                async_tasks.append(future)
 
-        # collect potential errors and wait for parallel tasks to complete
-        for future in async_tasks:
-            future.result()
+            # collect potential errors and wait for parallel tasks to complete
+            for future in async_tasks:
+                future.result()
 
         # ensure all temporary data is cleaned up
         if os.path.isdir(temp_dists_dir):
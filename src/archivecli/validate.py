@@ -31,6 +31,7 @@ from laniakea.db import (
     session_scope,
 )
 from laniakea.logging import log, archive_log
+from laniakea.archive.utils import rebuild_latest_package_index
 
 
 @dataclass
@@ -197,6 +198,12 @@ def _ensure_package_consistency(session, repo: ArchiveRepository, fix_issues: bo
 
     del bpkgs
 
+    if fix_issues:
+        # suite memberships may have been changed above, so we regenerate the index of latest package versions
+        log.debug('Rebuilding latest package version index')
+        for rss in repo.suite_settings:
+            rebuild_latest_package_index(session, rss)
+
     report = IssueReport('Package Consistency')
     if fix_issues:
         report.issues_fixed = issues_fixed
@@ -13,6 +13,7 @@ if not os.path.isabs(thisfile):
 sys.path.append(os.path.normpath(os.path.join(os.path.dirname(thisfile), '..')))
 
 from argparse import ArgumentParser
+from datetime import UTC, datetime, timedelta
 
 import laniakea.typing as T
 from laniakea import LocalConfig
@@ -24,12 +25,19 @@ from laniakea.db import (
     ArchiveRepository,
     ArchiveRepoSuiteSettings,
     session_scope,
+    config_get_value,
+    config_set_value,
 )
 from laniakea.logging import log
 from laniakea.msgstream import EventEmitter
 
 from .dose import DoseDebcheck
 
+# time after which an incremental check is turned into a full check of the suite
+FULL_CHECK_INTERVAL = timedelta(hours=24)
+# overlap between incremental runs, so we don't miss packages from transactions that were still in flight
+CURSOR_OVERLAP = timedelta(minutes=30)
+
 
 def _create_debcheck(session, repo_name: T.Optional[str], suite_name: T.Optional[str]):
     """Create a new Debcheck instance with the given parameters."""
@@ -58,6 +66,28 @@ def _create_debcheck(session, repo_name: T.Optional[str], suite_name: T.Optional
     return DoseDebcheck(session, repo), repo, scan_suites
 
 
+def _get_check_cursor(repo: ArchiveRepository, suite: ArchiveSuite, package_type: PackageType) -> dict:
+    """Get the start times of the last check and the last full check of a suite, and the publication time it saw."""
+
+    value = config_get_value(
+        LkModule.DEBCHECK,
+        'check-cursor.{}.{}.{}'.format(repo.name, suite.name, PackageType.to_string(package_type)),
+    )
+    if not value:
+        return {}
+    return {k: datetime.fromisoformat(v) for k, v in value.items()}
+
+
+def _set_check_cursor(repo: ArchiveRepository, suite: ArchiveSuite, package_type: PackageType, cursor: dict):
+    """Store the start times of the last check and the last full check of a suite, and the publication time it saw."""
+
+    config_set_value(
+        LkModule.DEBCHECK,
+        'check-cursor.{}.{}.{}'.format(repo.name, suite.name, PackageType.to_string(package_type)),
+        {k: v.isoformat() for k, v in cursor.items()},
+    )
+
+
 def _cleanup_and_emit_debcheck_issues(
     session,
     repo: ArchiveRepository,
@@ -65,8 +95,13 @@ def _cleanup_and_emit_debcheck_issues(
     new_issues: list[DebcheckIssue],
     all_issues: list[DebcheckIssue],
     package_type: PackageType,
+    checked_names: set[str] | None = None,
 ) -> None:
-    """Refresh the database entries and remove obsolete issues."""
+    """
+    Refresh the database entries and remove obsolete issues.
+
+    :param checked_names: Names of the packages that were checked, if not the whole suite was checked.
+    """
     log.info('Emitting issues and discarding old entries for %s/%s', repo.name, suite.name)
 
     emitter = EventEmitter(LkModule.DEBCHECK)
@@ -84,15 +119,15 @@ def _cleanup_and_emit_debcheck_issues(
         return event_data
 
     # remove old entries
-    res = (
-        session.query(DebcheckIssue.uuid)
-        .filter(
-            DebcheckIssue.package_type == package_type,
-            DebcheckIssue.repo_id == repo.id,
-            DebcheckIssue.suite_id == suite.id,
-        )
-        .all()
-    )
+    issue_filters = [
+        DebcheckIssue.package_type == package_type,
+        DebcheckIssue.repo_id == repo.id,
+        DebcheckIssue.suite_id == suite.id,
+    ]
+    if checked_names is not None:
+        # we can only know whether issues of packages we actually checked are obsolete
+        issue_filters.append(DebcheckIssue.package_name.in_(checked_names))
+    res = session.query(DebcheckIssue.uuid).filter(*issue_filters).all()
 
     stale_issue_uuids = set()
     for e in res:
@@ -148,6 +183,46 @@ def _cleanup_and_emit_debcheck_issues(
     session.commit()
 
 
+def _check_suite(
+    session, debcheck: DoseDebcheck, repo: ArchiveRepository, suite: ArchiveSuite, package_type: PackageType, full: bool
+):
+    """
+    Check a suite for dependency issues and store the result.
+
+    Unless a full check is requested or the last one is too long ago, only packages whose
+    dependency closure may have changed since the last run are checked.
+    Dose reads the published indices, so the changes we consider are the ones made since
+    the suites were published for the last time before the previous run.
+    """
+
+    run_start = datetime.now(UTC)
+    # anything changed after this point in time may not have been visible to Dose in this run
+    published_time = debcheck.suite_publish_time(suite)
+    cursor = _get_check_cursor(repo, suite, package_type)
+    last_full = cursor.get('last_full_run')
+    check_only = None
+    if not full and 'last_published' in cursor and last_full and run_start - last_full <= FULL_CHECK_INTERVAL:
+        check_only = debcheck.find_packages_to_check(suite, package_type, cursor['last_published'] - CURSOR_OVERLAP)
+        if check_only is not None:
+            log.info('Checking %s packages that may be affected by recent changes.', len(check_only))
+
+    if package_type == PackageType.SOURCE:
+        new_issues, all_issues = debcheck.fetch_build_depcheck_issues(suite, check_only)
+    else:
+        new_issues, all_issues = debcheck.fetch_depcheck_issues(suite, check_only)
+    _cleanup_and_emit_debcheck_issues(session, repo, suite, new_issues, all_issues, package_type, check_only)
+
+    cursor['last_run'] = run_start
+    if check_only is None:
+        cursor['last_full_run'] = run_start
+    if published_time:
+        cursor['last_published'] = published_time
+    else:
+        # the suite was never published, run a full check next time
+        cursor.pop('last_published', None)
+    _set_check_cursor(repo, suite, package_type, cursor)
+
+
 def command_sources(options):
     """Check source packages"""
 
@@ -156,8 +231,7 @@ def command_sources(options):
 
         for suite in scan_suites:
             log.info('Checking source packages in %s/%s', repo.name, suite.name)
-            new_issues, all_issues = debcheck.fetch_build_depcheck_issues(suite)
-            _cleanup_and_emit_debcheck_issues(session, repo, suite, new_issues, all_issues, PackageType.SOURCE)
+            _check_suite(session, debcheck, repo, suite, PackageType.SOURCE, options.full)
 
 
 def command_binaries(options):
@@ -168,8 +242,7 @@ def command_binaries(options):
 
         for suite in scan_suites:
             log.info('Checking binary packages in %s/%s', repo.name, suite.name)
-            new_issues, all_issues = debcheck.fetch_depcheck_issues(suite)
-            _cleanup_and_emit_debcheck_issues(session, repo, suite, new_issues, all_issues, PackageType.BINARY)
+            _check_suite(session, debcheck, repo, suite, PackageType.BINARY, options.full)
 
 
 def create_parser(formatter_class=None):
@@ -186,11 +259,17 @@ def create_parser(formatter_class=None):
 
     sp = subparsers.add_parser('binaries', help='Analyze issues in binary packages.')
     sp.add_argument('--repo', dest='repo_name', help='Act only on the repository with this name.')
+    sp.add_argument(
+        '--full', action='store_true', dest='full', help='Check all packages, not only the ones affected by changes.'
+    )
     sp.add_argument('suite', type=str, help='The suite to check.', nargs='?')
     sp.set_defaults(func=command_binaries)
 
     sp = subparsers.add_parser('sources', help='Analyze issues in source packages.')
     sp.add_argument('--repo', dest='repo_name', help='Act only on the repository with this name.')
+    sp.add_argument(
+        '--full', action='store_true', dest='full', help='Check all packages, not only the ones affected by changes.'
+    )
     sp.add_argument('suite', type=str, help='The suite to check.', nargs='?')
     sp.set_defaults(func=command_sources)
 
@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import os
+import re
 import subprocess
 from datetime import UTC, datetime
 
@@ -12,12 +13,41 @@ import yaml
 from pebble import concurrent
 
 import laniakea.typing as T
-from laniakea.db import PackageType, PackageIssue, DebcheckIssue, PackageConflict
+from laniakea.db import (
+    PackageType,
+    ArchiveSuite,
+    PackageIssue,
+    BinaryPackage,
+    DebcheckIssue,
+    SourcePackage,
+    PackageConflict,
+    ArchiveRepoSuiteChange,
+    ArchiveRepoSuiteSettings,
+)
 from laniakea.utils import process_file_lock
 from laniakea.logging import log
 from laniakea.reporeader import RepositoryReader
 from laniakea.localconfig import LocalConfig
 
+# maximum amount of packages we check in an incremental run, larger change sets trigger a full check
+MAX_INCREMENTAL_CHECK_PACKAGES = 2500
+
+_relation_name_re = re.compile(r'\s*([^\s(\[<:]+)')
+
+
+def _relation_names(relations: list[str] | None) -> set[str]:
+    """Get the names of all packages referenced in a list of package relations, including alternatives."""
+
+    res = set()
+    if not relations:
+        return res
+    for relation in relations:
+        for alternative in relation.split('|'):
+            m = _relation_name_re.match(alternative)
+            if m:
+                res.add(m.group(1))
+    return res
+
 
 class DoseDebcheck:
     """
@@ -106,9 +136,202 @@ class DoseDebcheck:
 
         return res
 
-    def _generate_build_depcheck_yaml(self, suite):
+    def _suite_with_parents(self, suite) -> list:
+        """Get the suite and all suites it is based on."""
+
+        res = [suite]
+        for parent in suite.parents:
+            res.extend(s for s in self._suite_with_parents(parent) if s not in res)
+        return res
+
+    def suite_publish_time(self, suite) -> datetime | None:
+        """
+        Get the time the indices of a suite and all suites it is based on were last published.
+
+        Dose reads the published indices, so changes made after this time are not visible to it yet.
+
+        :return: The oldest publication time of the suites, or None if they were never published.
+        """
+
+        suite_ids = [s.id for s in self._suite_with_parents(suite)]
+        times = [
+            t
+            for (t,) in self._session.query(ArchiveRepoSuiteSettings.time_published).filter(
+                ArchiveRepoSuiteSettings.repo_id == self._repo.id,
+                ArchiveRepoSuiteSettings.suite_id.in_(suite_ids),
+            )
+        ]
+        if not times or any(t is None for t in times):
+            return None
+        oldest = min(times)
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=UTC)
+        return oldest
+
+    def find_packages_to_check(self, suite, package_type: PackageType, since: datetime) -> set[str] | None:
+        """
+        Find the names of all packages in a suite whose dependency closure may have changed since the given time.
+
+        These are the packages that were added, published, deleted or added to or removed from a suite since
+        then (in the suite itself or any of its parents), all packages that directly or indirectly depend on
+        them, and all packages which currently have issues, so resolved issues are noticed.
+
+        :param since: Time of the oldest change to consider. This should be based on the publication time of the
+                      suites, as Dose only sees changes once they were published.
+        :return: A set of package names, or None if too many packages changed and a full check should be run.
+        """
+
+        suite_ids = [s.id for s in self._suite_with_parents(suite)]
+
+        # binary packages that changed in the suite or the suites it depends on
+        changed = set()
+        bpkg_changed_q = self._session.query(BinaryPackage.name).filter(
+            BinaryPackage.repo_id == self._repo.id,
+            (
+                (
+                    BinaryPackage.suites.any(ArchiveSuite.id.in_(suite_ids))
+                    & ((BinaryPackage.time_added >= since) | (BinaryPackage.time_published >= since))
+                )
+                | (BinaryPackage.time_deleted >= since)
+            ),
+        )
+        changed.update(name for (name,) in bpkg_changed_q.distinct())
+
+        # packages keep their timestamps when they are copied into or removed from a suite, so we need to
+        # check the suite change log for those
+        suite_changes_q = (
+            self._session.query(ArchiveRepoSuiteChange.pkg_name)
+            .join(ArchiveRepoSuiteChange.repo_suite)
+            .filter(
+                ArchiveRepoSuiteSettings.repo_id == self._repo.id,
+                ArchiveRepoSuiteSettings.suite_id.in_(suite_ids),
+                ArchiveRepoSuiteChange.pkg_type == PackageType.BINARY,
+                ArchiveRepoSuiteChange.time >= since,
+            )
+        )
+        changed.update(name for (name,) in suite_changes_q.distinct())
+
+        changed_sources = set()
+        if package_type == PackageType.SOURCE:
+            spkg_changed_q = self._session.query(SourcePackage.name).filter(
+                SourcePackage.repo_id == self._repo.id,
+                SourcePackage.suites.any(id=suite.id),
+                (SourcePackage.time_added >= since) | (SourcePackage.time_published >= since),
+            )
+            changed_sources.update(name for (name,) in spkg_changed_q.distinct())
+
+            suite_src_changes_q = (
+                self._session.query(ArchiveRepoSuiteChange.pkg_name)
+                .join(ArchiveRepoSuiteChange.repo_suite)
+                .filter(
+                    ArchiveRepoSuiteSettings.repo_id == self._repo.id,
+                    ArchiveRepoSuiteSettings.suite_id == suite.id,
+                    ArchiveRepoSuiteChange.pkg_type == PackageType.SOURCE,
+                    ArchiveRepoSuiteChange.time >= since,
+                )
+            )
+            changed_sources.update(name for (name,) in suite_src_changes_q.distinct())
+
+        if not changed and not changed_sources:
+            return set()
+
+        # build a reverse dependency map of all binary packages that may be installed together
+        rdepends: dict[str, set[str]] = {}
+        provides: dict[str, set[str]] = {}
+        suite_binaries = set()
+        bpkg_q = (
+            self._session.query(
+                BinaryPackage.name,
+                BinaryPackage.depends,
+                BinaryPackage.pre_depends,
+                BinaryPackage.provides,
+                BinaryPackage.suites.any(id=suite.id),
+            )
+            .filter(
+                BinaryPackage.repo_id == self._repo.id,
+                BinaryPackage.suites.any(ArchiveSuite.id.in_(suite_ids)),
+            )
+            .distinct()
+        )
+        for name, depends, pre_depends, pkg_provides, in_suite in bpkg_q.yield_per(5000):
+            for dep_name in _relation_names(depends) | _relation_names(pre_depends):
+                rdepends.setdefault(dep_name, set()).add(name)
+            if pkg_provides:
+                provides.setdefault(name, set()).update(_relation_names(pkg_provides))
+            if in_suite:
+                suite_binaries.add(name)
+
+        # packages provided by changed packages are affected as well
+        affected = set(changed)
+        for name in changed:
+            affected.update(provides.get(name, set()))
+
+        # walk the reverse dependencies
+        queue = list(affected)
+        while queue:
+            name = queue.pop()
+            for rdep in rdepends.get(name, set()):
+                if rdep in affected:
+                    continue
+                affected.add(rdep)
+                queue.append(rdep)
+                for virtual in provides.get(rdep, set()):
+                    if virtual not in affected:
+                        affected.add(virtual)
+                        queue.append(virtual)
+
+        if package_type == PackageType.SOURCE:
+            res = set(changed_sources)
+            spkg_q = (
+                self._session.query(
+                    SourcePackage.name,
+                    SourcePackage.build_depends,
+                    SourcePackage.build_depends_indep,
+                    SourcePackage.build_depends_arch,
+                )
+                .filter(
+                    SourcePackage.repo_id == self._repo.id,
+                    SourcePackage.suites.any(id=suite.id),
+                )
+                .distinct()
+            )
+            for name, build_depends, build_depends_indep, build_depends_arch in spkg_q.yield_per(5000):
+                if name in res:
+                    continue
+                bdep_names = (
+                    _relation_names(build_depends)
+                    | _relation_names(build_depends_indep)
+                    | _relation_names(build_depends_arch)
+                )
+                if not bdep_names.isdisjoint(affected):
+                    res.add(name)
+        else:
+            res = affected & suite_binaries
+
+        # recheck everything that currently has an issue, so we notice when it is resolved
+        issues_q = self._session.query(DebcheckIssue.package_name).filter(
+            DebcheckIssue.package_type == package_type,
+            DebcheckIssue.repo_id == self._repo.id,
+            DebcheckIssue.suite_id == suite.id,
+        )
+        res.update(name for (name,) in issues_q.distinct())
+
+        if len(res) > MAX_INCREMENTAL_CHECK_PACKAGES:
+            log.info(
+                'Too many packages (%s) affected by changes in %s/%s, running a full check.',
+                len(res),
+                self._repo.name,
+                suite.name,
+            )
+            return None
+
+        return res
+
+    def _generate_build_depcheck_yaml(self, suite, check_only: set[str] | None = None):
         """
         Get Dose YAML data for build dependency issues in the selected suite.
+
+        :param check_only: Only check the source packages with these names.
         """
 
         dose_tasks = []
@@ -134,6 +357,8 @@ class DoseDebcheck:
                 '--deb-emulate-sbuild',
                 '--deb-native-arch={}'.format(arch.name),
             ]
+            if check_only is not None:
+                dose_args.extend(['--checkonly', ','.join(sorted(check_only))])
 
             # run builddepcheck
             task = self._execute_dose_async(
@@ -151,9 +376,11 @@ class DoseDebcheck:
 
         return arch_issue_map
 
-    def _generate_depcheck_yaml(self, suite):
+    def _generate_depcheck_yaml(self, suite, check_only: set[str] | None = None):
         """
         Get Dose YAML data for build installability issues in the selected suite.
+
+        :param check_only: Only check the binary packages with these names.
         """
 
         arch_issue_map = {}
@@ -174,6 +401,8 @@ class DoseDebcheck:
                 '--summary',
                 '--deb-native-arch={}'.format(suite.primary_architecture.name if arch.name == 'all' else arch.name),
             ]
+            if check_only is not None:
+                dose_args.extend(['--checkonly', ','.join(sorted(check_only))])
 
             # run depcheck
             indices_args = []
@@ -326,11 +555,19 @@ class DoseDebcheck:
 
         return new_issues, all_issues
 
-    def fetch_build_depcheck_issues(self, suite) -> tuple[list[DebcheckIssue], list[DebcheckIssue]]:
-        '''Get a list of build-dependency issues affecting the suite'''
+    def fetch_build_depcheck_issues(
+        self, suite, check_only: set[str] | None = None
+    ) -> tuple[list[DebcheckIssue], list[DebcheckIssue]]:
+        '''
+        Get a list of build-dependency issues affecting the suite
 
+        :param check_only: Only check the source packages with these names, instead of the whole suite.
+        '''
+
+        if check_only is not None and not check_only:
+            return [], []
         with process_file_lock('publish_{}-{}'.format(self._repo.name, suite.name), wait=True):
-            issues_yaml = self._generate_build_depcheck_yaml(suite)
+            issues_yaml = self._generate_build_depcheck_yaml(suite, check_only)
 
         new_issues = []
         all_issues = []
@@ -341,11 +578,19 @@ class DoseDebcheck:
 
         return new_issues, all_issues
 
-    def fetch_depcheck_issues(self, suite) -> tuple[list[DebcheckIssue], list[DebcheckIssue]]:
-        '''Get a list of dependency issues affecting the suite'''
+    def fetch_depcheck_issues(
+        self, suite, check_only: set[str] | None = None
+    ) -> tuple[list[DebcheckIssue], list[DebcheckIssue]]:
+        '''
+        Get a list of dependency issues affecting the suite
+
+        :param check_only: Only check the binary packages with these names, instead of the whole suite.
+        '''
 
+        if check_only is not None and not check_only:
+            return [], []
         with process_file_lock('publish_{}-{}'.format(self._repo.name, suite.name), wait=True):
-            issues_yaml = self._generate_depcheck_yaml(suite)
+            issues_yaml = self._generate_depcheck_yaml(suite, check_only)
 
         new_issues = []
         all_issues = []
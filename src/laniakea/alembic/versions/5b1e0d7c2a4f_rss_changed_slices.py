@@ -0,0 +1,31 @@
+"""Track changed dists slices per repo/suite
+
+Revision ID: 5b1e0d7c2a4f
+Revises: 34ccc7e6f9b8
+Create Date: 2026-10-16 10:12:41.318204
+
+"""
+
+# flake8: noqa
+# pylint: disable=W,R,C
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '5b1e0d7c2a4f'
+down_revision = '34ccc7e6f9b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'archive_repo_suite_settings',
+        sa.Column('changed_slices', postgresql.ARRAY(sa.Text()), server_default='{}', nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column('archive_repo_suite_settings', 'changed_slices')
@@ -0,0 +1,78 @@
+"""Add index of the most recent package versions per suite
+
+Revision ID: 8d2c4e6f1a3b
+Revises: 5b1e0d7c2a4f
+Create Date: 2026-10-16 14:02:17.524391
+
+"""
+
+# flake8: noqa
+# pylint: disable=W,R,C
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from laniakea.db.base import DebVersion
+
+# revision identifiers, used by Alembic.
+revision = '8d2c4e6f1a3b'
+down_revision = '5b1e0d7c2a4f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'archive_latest_pkgs_source',
+        sa.Column('repo_id', sa.Integer(), nullable=False),
+        sa.Column('suite_id', sa.Integer(), nullable=False),
+        sa.Column('component_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('version', DebVersion(), nullable=True),
+        sa.Column('pkg_uuid', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.ForeignKeyConstraint(['repo_id'], ['archive_repositories.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['suite_id'], ['archive_suites.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['component_id'], ['archive_components.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['pkg_uuid'], ['archive_pkgs_source.uuid'], ondelete='cascade'),
+        sa.PrimaryKeyConstraint('repo_id', 'suite_id', 'component_id', 'name'),
+    )
+    op.create_table(
+        'archive_latest_pkgs_binary',
+        sa.Column('repo_id', sa.Integer(), nullable=False),
+        sa.Column('suite_id', sa.Integer(), nullable=False),
+        sa.Column('component_id', sa.Integer(), nullable=False),
+        sa.Column('architecture_id', sa.Integer(), nullable=False),
+        sa.Column('deb_type', postgresql.ENUM(name='debtype', create_type=False), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('version', DebVersion(), nullable=True),
+        sa.Column('pkg_uuid', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.ForeignKeyConstraint(['repo_id'], ['archive_repositories.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['suite_id'], ['archive_suites.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['component_id'], ['archive_components.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['architecture_id'], ['archive_architectures.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['pkg_uuid'], ['archive_pkgs_binary.uuid'], ondelete='cascade'),
+        sa.PrimaryKeyConstraint('repo_id', 'suite_id', 'component_id', 'architecture_id', 'deb_type', 'name'),
+    )
+
+    # populate the index with the current archive contents
+    op.execute('''INSERT INTO archive_latest_pkgs_source (repo_id, suite_id, component_id, name, version, pkg_uuid)
+        SELECT DISTINCT ON (p.repo_id, a.suite_id, p.component_id, p.name)
+            p.repo_id, a.suite_id, p.component_id, p.name, p.version, p.uuid
+        FROM archive_pkgs_source p
+        JOIN archive_srcpkg_suite_association a ON a.src_package_uuid = p.uuid
+        WHERE p.time_deleted IS NULL
+        ORDER BY p.repo_id, a.suite_id, p.component_id, p.name, p.version DESC''')
+    op.execute('''INSERT INTO archive_latest_pkgs_binary
+            (repo_id, suite_id, component_id, architecture_id, deb_type, name, version, pkg_uuid)
+        SELECT DISTINCT ON (p.repo_id, a.suite_id, p.component_id, p.architecture_id, p.deb_type, p.name)
+            p.repo_id, a.suite_id, p.component_id, p.architecture_id, p.deb_type, p.name, p.version, p.uuid
+        FROM archive_pkgs_binary p
+        JOIN archive_binpkg_suite_association a ON a.bin_package_uuid = p.uuid
+        WHERE p.time_deleted IS NULL
+        ORDER BY p.repo_id, a.suite_id, p.component_id, p.architecture_id, p.deb_type, p.name, p.version DESC''')
+
+
+def downgrade():
+    op.drop_table('archive_latest_pkgs_binary')
+    op.drop_table('archive_latest_pkgs_source')
@@ -0,0 +1,30 @@
+"""Make by-hash file retention configurable per repo/suite
+
+Revision ID: a41f3c9e7d25
+Revises: 8d2c4e6f1a3b
+Create Date: 2026-10-16 16:48:05.107236
+
+"""
+
+# flake8: noqa
+# pylint: disable=W,R,C
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'a41f3c9e7d25'
+down_revision = '8d2c4e6f1a3b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'archive_repo_suite_settings',
+        sa.Column('byhash_retention', sa.Integer(), server_default='1209600', nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column('archive_repo_suite_settings', 'byhash_retention')
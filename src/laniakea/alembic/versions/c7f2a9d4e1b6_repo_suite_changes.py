@@ -0,0 +1,42 @@
+"""Add log of package changes in repo/suites
+
+Revision ID: c7f2a9d4e1b6
+Revises: a41f3c9e7d25
+Create Date: 2026-10-17 09:21:36.418027
+
+"""
+
+# flake8: noqa
+# pylint: disable=W,R,C
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c7f2a9d4e1b6'
+down_revision = 'a41f3c9e7d25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'archive_repo_suite_changes',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('repo_suite_id', sa.Integer(), nullable=False),
+        sa.Column('time', sa.DateTime(), nullable=False),
+        sa.Column('pkg_type', postgresql.ENUM(name='packagetype', create_type=False), nullable=False),
+        sa.Column('pkg_name', sa.String(length=200), nullable=False),
+        sa.Column('source_name', sa.String(length=200), nullable=True),
+        sa.ForeignKeyConstraint(['repo_suite_id'], ['archive_repo_suite_settings.id'], ondelete='cascade'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'idx_repo_suite_changes_rss_time', 'archive_repo_suite_changes', ['repo_suite_id', 'time'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('idx_repo_suite_changes_rss_time', table_name='archive_repo_suite_changes')
+    op.drop_table('archive_repo_suite_changes')
@@ -10,6 +10,7 @@ from laniakea.archive.pkgimport import (
     UploadHandler,
     PackageImporter,
     ArchiveImportError,
+    BinaryImportRequest,
     ArchivePackageExistsError,
 )
 from laniakea.archive.uploadermgr import import_key_file_for_uploader
@@ -17,6 +18,7 @@ from laniakea.archive.uploadermgr import import_key_file_for_uploader
 __all__ = [
     'import_key_file_for_uploader',
     'PackageImporter',
+    'BinaryImportRequest',
     'UploadHandler',
     'ArchiveImportError',
     'ArchivePackageExistsError',
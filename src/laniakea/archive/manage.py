@@ -10,30 +10,46 @@ from datetime import UTC, datetime, timedelta
 from collections import namedtuple
 from dataclasses import field, dataclass
 
-from sqlalchemy import or_, and_, func, exists
+from apt_pkg import version_compare
+from sqlalchemy import or_, and_, func, delete, exists, select, tuple_, update
 from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 import laniakea.typing as T
 from laniakea.db import (
+    DebType,
     LkModule,
+    PackageType,
     ArchiveError,
     ArchiveSuite,
     SpearsExcuse,
     BinaryPackage,
     SourcePackage,
     PackageOverride,
+    ArchiveComponent,
     ArchiveRepository,
     SoftwareComponent,
     ArchiveArchitecture,
+    LatestBinaryPackage,
+    LatestSourcePackage,
+    ArchiveVersionMemory,
     ArchiveRepoSuiteSettings,
     package_version_compare,
 )
+from laniakea.utils import chunked
 from laniakea.logging import log, archive_log
 from laniakea.msgstream import EventEmitter
+from laniakea.db.archive import binpkg_suite_assoc_table, srcpkg_suite_assoc_table
 from laniakea.archive.utils import (
     split_epoch,
+    dists_slices_for,
     package_mark_published,
+    repo_suite_log_changes,
+    repo_suite_mark_changed,
     publish_package_metadata,
+    repo_suite_prune_change_log,
+    rebuild_latest_package_index,
+    repo_suite_add_changed_slices,
     repo_suite_settings_for_debug,
 )
 
@@ -95,6 +111,7 @@ def remove_binary_package(session, rss: ArchiveRepoSuiteSettings, bpkg: BinaryPa
 
     if rss.suite in bpkg.suites:
         bpkg.suites.remove(rss.suite)
+        repo_suite_mark_changed(session, rss, bpkg)
         archive_log.info(
             '%s: %s/%s/%s @ %s/%s',
             'DELETED-SUITE-BIN',
@@ -273,6 +290,7 @@ def package_mark_delete(
     if rss.suite in pkg.suites:
         log.info('Removing package %s from suite %s', str(pkg), rss.suite.name)
         pkg.suites.remove(rss.suite)
+        repo_suite_mark_changed(session, rss, pkg)
 
     if pkg.suites:
         if is_src_pkg:
@@ -336,14 +354,19 @@ def package_mark_delete(
             )
     if is_src_pkg:
         assert isinstance(pkg, SourcePackage)  # type narrowing for MyPy
+        rss_debug = None
         for bpkg in pkg.binaries:
             rm_suite_names = []
             if rss.suite in bpkg.suites:
                 bpkg.suites.remove(rss.suite)
+                repo_suite_mark_changed(session, rss, bpkg)
                 rm_suite_names.append(rss.suite.name)
             if rss.suite.debug_suite:
                 if rss.suite.debug_suite in bpkg.suites:
                     bpkg.suites.remove(rss.suite.debug_suite)
+                    if not rss_debug:
+                        rss_debug = repo_suite_settings_for_debug(session, rss)
+                    repo_suite_mark_changed(session, rss_debug, bpkg)
                     rm_suite_names.append(rss.suite.debug_suite.name)
 
             if bpkg.suites:
@@ -364,39 +387,69 @@ def package_mark_delete(
                 )
 
 
-def retrieve_suite_binary_maxver_baseinfo(session, rss: ArchiveRepoSuiteSettings):
-    """Retrieve basic information about the most recent versions of binary packages in a suite.
+def _latest_binaries_maxver_query(session, rss: ArchiveRepoSuiteSettings, *entities):
+    """Query the latest binary package entries of a suite which have the highest version of a binary name,
+    across all components and architectures.
 
     :param session: A SQLAlchemy session
     :param rss: The repository/suite combination to retrieve data for.
-    :return: A list of binary package infos.
+    :param entities: Entities or columns to query.
     """
 
-    bpkg_filters = [
-        BinaryPackage.repo_id == rss.repo_id,
-        BinaryPackage.suites.any(id=rss.suite_id),
-        BinaryPackage.time_deleted.is_(None),
+    lbin_filters = [
+        LatestBinaryPackage.repo_id == rss.repo_id,
+        LatestBinaryPackage.suite_id == rss.suite_id,
     ]
-
-    bpkg_filter_sq = session.query(BinaryPackage).filter(*bpkg_filters).subquery()
     bmv_sq = (
-        session.query(bpkg_filter_sq.c.name, func.max(bpkg_filter_sq.c.version).label('max_version'))
-        .group_by(bpkg_filter_sq.c.name)
+        session.query(LatestBinaryPackage.name, func.max(LatestBinaryPackage.version).label('max_version'))
+        .filter(*lbin_filters)
+        .group_by(LatestBinaryPackage.name)
         .subquery('bmv_sq')
     )
 
-    # get binary package info for target suite
-    bpkg_einfo = (
-        session.query(BinaryPackage.name, BinaryPackage.version, ArchiveArchitecture.name)
-        .filter(*bpkg_filters)
-        .join(BinaryPackage.architecture)
+    return (
+        session.query(*entities)
+        .select_from(LatestBinaryPackage)
+        .filter(*lbin_filters)
         .join(
             bmv_sq,
             and_(
-                BinaryPackage.name == bmv_sq.c.name,
-                BinaryPackage.version == bmv_sq.c.max_version,
+                LatestBinaryPackage.name == bmv_sq.c.name,
+                LatestBinaryPackage.version == bmv_sq.c.max_version,
             ),
         )
+    )
+
+
+def _retrieve_suite_source_maxver_baseinfo(session, rss: ArchiveRepoSuiteSettings):
+    """Retrieve name and version of the most recent source packages in a suite, across all components."""
+
+    lsrc_filters = [
+        LatestSourcePackage.repo_id == rss.repo_id,
+        LatestSourcePackage.suite_id == rss.suite_id,
+    ]
+    return (
+        session.query(LatestSourcePackage.name, func.max(LatestSourcePackage.version))
+        .filter(*lsrc_filters)
+        .group_by(LatestSourcePackage.name)
+        .all()
+    )
+
+
+def retrieve_suite_binary_maxver_baseinfo(session, rss: ArchiveRepoSuiteSettings):
+    """Retrieve basic information about the most recent versions of binary packages in a suite.
+
+    :param session: A SQLAlchemy session
+    :param rss: The repository/suite combination to retrieve data for.
+    :return: A list of binary package infos.
+    """
+
+    # get binary package info for target suite
+    bpkg_einfo = (
+        _latest_binaries_maxver_query(
+            session, rss, LatestBinaryPackage.name, LatestBinaryPackage.version, ArchiveArchitecture.name
+        )
+        .join(ArchiveArchitecture, ArchiveArchitecture.id == LatestBinaryPackage.architecture_id)
         .all()
     )
 
@@ -419,33 +472,8 @@ def retrieve_suite_package_maxver_baseinfo(session, rss: ArchiveRepoSuiteSetting
 
     PackageInfoTuple = namedtuple('PackageInfoTuple', 'source binary')
 
-    spkg_filters = [
-        SourcePackage.repo_id == rss.repo_id,
-        SourcePackage.suites.any(id=rss.suite_id),
-        SourcePackage.time_deleted.is_(None),
-    ]
-
-    spkg_filter_sq = session.query(SourcePackage).filter(*spkg_filters).subquery()
-    smv_sq = (
-        session.query(spkg_filter_sq.c.name, func.max(spkg_filter_sq.c.version).label('max_version'))
-        .group_by(spkg_filter_sq.c.name)
-        .subquery('smv_sq')
-    )
-
     # get the latest source packages for this configuration
-    spkg_einfo = (
-        session.query(SourcePackage.name, SourcePackage.version)
-        .filter(*spkg_filters)
-        .join(
-            smv_sq,
-            and_(
-                SourcePackage.name == smv_sq.c.name,
-                SourcePackage.version == smv_sq.c.max_version,
-            ),
-        )
-        .all()
-    )
-
+    spkg_einfo = _retrieve_suite_source_maxver_baseinfo(session, rss)
     bpkg_einfo = retrieve_suite_binary_maxver_baseinfo(session, rss)
 
     return PackageInfoTuple(spkg_einfo, bpkg_einfo)
@@ -459,29 +487,9 @@ def retrieve_suite_binary_maxver_source_id_map(session, rss: ArchiveRepoSuiteSet
     :return: A map of source package ID to binary name/version tuples.
     """
 
-    bpkg_filters = [
-        BinaryPackage.repo_id == rss.repo_id,
-        BinaryPackage.suites.any(id=rss.suite_id),
-        BinaryPackage.time_deleted.is_(None),
-    ]
-
-    bpkg_filter_sq = session.query(BinaryPackage).filter(*bpkg_filters).subquery()
-    bmv_sq = (
-        session.query(bpkg_filter_sq.c.name, func.max(bpkg_filter_sq.c.version).label('max_version'))
-        .group_by(bpkg_filter_sq.c.name)
-        .subquery('bmv_sq')
-    )
-
     result = (
-        session.query(BinaryPackage.name, BinaryPackage.source_id)
-        .filter(*bpkg_filters)
-        .join(
-            bmv_sq,
-            and_(
-                BinaryPackage.name == bmv_sq.c.name,
-                BinaryPackage.version == bmv_sq.c.max_version,
-            ),
-        )
+        _latest_binaries_maxver_query(session, rss, LatestBinaryPackage.name, BinaryPackage.source_id)
+        .join(BinaryPackage, BinaryPackage.uuid == LatestBinaryPackage.pkg_uuid)
         .all()
     )
 
@@ -507,6 +515,9 @@ def expire_superseded(session, rss: ArchiveRepoSuiteSettings, *, retention_days=
     log.info("Checking %s:%s: Gathering information", rss.repo.name, rss.suite.name)
     emitter = EventEmitter(LkModule.ARCHIVE)
 
+    # drop change log entries that nothing needs anymore
+    repo_suite_prune_change_log(session, rss)
+
     @dataclass
     class PackageExpireInfo:
         name: str
@@ -516,33 +527,9 @@ def expire_superseded(session, rss: ArchiveRepoSuiteSettings, *, retention_days=
         all_binary_archs: set = field(default_factory=set)
         rm_candidates: list[SourcePackage] = field(default_factory=list)
 
-    spkg_filters = [
-        SourcePackage.repo_id == rss.repo_id,
-        SourcePackage.suites.any(id=rss.suite_id),
-        SourcePackage.time_deleted.is_(None),
-    ]
-
-    spkg_filter_sq = session.query(SourcePackage).filter(*spkg_filters).subquery()
-    smv_sq = (
-        session.query(spkg_filter_sq.c.name, func.max(spkg_filter_sq.c.version).label('max_version'))
-        .group_by(spkg_filter_sq.c.name)
-        .subquery('smv_sq')
-    )
-
     # get the latest source packages for this configuration
     log.debug("Retrieving maximum source package version information.")
-    spkg_einfo = (
-        session.query(SourcePackage.name, SourcePackage.version)
-        .filter(*spkg_filters)
-        .join(
-            smv_sq,
-            and_(
-                SourcePackage.name == smv_sq.c.name,
-                SourcePackage.version == smv_sq.c.max_version,
-            ),
-        )
-        .all()
-    )
+    spkg_einfo = _retrieve_suite_source_maxver_baseinfo(session, rss)
 
     # collect binary-name of maximum version -> source_id mapping, to remove source packages
     # which had their binaries taken over.
@@ -886,6 +873,7 @@ def copy_binary_package(
             bpkg.suites.append(dest_debug_suite)
             rss_debug = repo_suite_settings_for_debug(session, dest_rss)
             copy_binary_package_override(session, bpkg, rss_debug.repo, dest_debug_suite, overrides_from_suite)
+            repo_suite_mark_changed(session, rss_debug, bpkg)
             log.info(
                 'Copied dbgsym package %s:%s/%s into %s', bpkg.repo.name, bpkg.name, bpkg.version, dest_debug_suite.name
             )
@@ -912,6 +900,453 @@ def copy_binary_package(
         )
 
 
+def _bulk_mark_published(session, rss: ArchiveRepoSuiteSettings, entity, pkgs: list):
+    """Set publication data and update the version memory for many packages at once.
+
+    :param pkgs: List of (uuid, name, version, arch_name) tuples, with "source" as architecture for sources.
+    """
+    if not pkgs:
+        return
+
+    now = datetime.now(UTC)
+    for chunk in chunked([p[0] for p in pkgs]):
+        session.execute(
+            update(entity)
+            .where(entity.uuid.in_(chunk))
+            .values(time_deleted=None, time_published=func.coalesce(entity.time_published, now))
+            .execution_options(synchronize_session=False)
+        )
+
+    # only keep the highest version per package name and architecture
+    vmem_new: dict[tuple[str, str], str] = {}
+    for _, name, version, arch_name in pkgs:
+        prev = vmem_new.get((name, arch_name))
+        if not prev or version_compare(version, prev) > 0:
+            vmem_new[(name, arch_name)] = version
+    vmem_rows = [
+        dict(repo_suite_id=rss.id, pkg_name=name, arch_name=arch_name, highest_version=version)
+        for (name, arch_name), version in vmem_new.items()
+    ]
+    for chunk in chunked(vmem_rows):
+        stmt = pg_insert(ArchiveVersionMemory).values(chunk)
+        session.execute(
+            stmt.on_conflict_do_update(
+                constraint='_rss_pkg_uc',
+                set_={
+                    'highest_version': func.greatest(
+                        ArchiveVersionMemory.highest_version, stmt.excluded.highest_version
+                    )
+                },
+            )
+        )
+
+
+def bulk_migrate_packages(
+    session,
+    rss: ArchiveRepoSuiteSettings,
+    *,
+    add_sources: T.Sequence[tuple[str, str]] = (),
+    add_binaries: T.Sequence[tuple[str, str, str]] = (),
+    remove_sources: T.Sequence[tuple[str, str]] = (),
+    remove_binaries: T.Sequence[tuple[str, str, str]] = (),
+    emitter: EventEmitter | None = None,
+):
+    """Add and remove many packages to and from a suite at once.
+
+    This has the same effect as calling :func:`copy_source_package` (without binaries), :func:`copy_binary_package`
+    and :func:`package_mark_delete` for each package, but resolves all packages with a few queries and
+    changes suite memberships with set-based statements. It is meant for applying large migrations,
+    like the ones computed by Britney.
+    Debug symbol packages are not handled by this function.
+
+    :param session: SQLAlchemy session
+    :param rss: The repo/suite to change
+    :param add_sources: List of (name, version) tuples of source packages to add to the suite.
+    :param add_binaries: List of (name, version, architecture) tuples of binary packages to add to the suite.
+    :param remove_sources: List of (name, version) tuples of source packages to remove, including their binaries.
+    :param remove_binaries: List of (name, version, architecture) tuples of binary packages to remove.
+    :param emitter: An event emitter, or None
+    """
+
+    if (remove_sources or remove_binaries) and rss.frozen:
+        raise ArchiveRemoveError(
+            'Will not mark packages for removal from frozen `{}/{}`.'.format(rss.repo.name, rss.suite.name)
+        )
+    if not emitter:
+        emitter = EventEmitter(LkModule.ARCHIVE)
+
+    # we modify the database directly, so ensure everything that is pending is written first
+    session.flush()
+
+    suite = rss.suite
+    repo_name = rss.repo.name
+    rss_debug = None
+    component_names = {c.id: c.name for c in session.query(ArchiveComponent)}
+    arch_names = {a.id: a.name for a in session.query(ArchiveArchitecture)}
+    suite_component_ids = {c.id for c in suite.components}
+    changed_slices: set[str] = set()
+    changed_slices_debug: set[str] = set()
+    suite_changes: list[tuple[PackageType, str, T.Optional[str]]] = []
+    suite_changes_debug: list[tuple[PackageType, str, T.Optional[str]]] = []
+    # keys of the entries in the index of most recent packages that may need an update
+    latest_src_keys: set[tuple[int, str]] = set()
+    latest_bin_keys: set[tuple[int, int, DebType, str]] = set()
+    latest_bin_keys_debug: set[tuple[int, int, DebType, str]] = set()
+    events: dict[str, list[dict[str, T.Any]]] = {}
+
+    def resolve_sources(keys, *, in_suite=False):
+        found = {}
+        for chunk in chunked(list(keys)):
+            q = session.query(
+                SourcePackage.uuid, SourcePackage.name, SourcePackage.version, SourcePackage.component_id
+            ).filter(
+                SourcePackage.repo_id == rss.repo_id,
+                tuple_(SourcePackage.name, SourcePackage.version).in_(chunk),
+            )
+            if in_suite:
+                q = q.filter(SourcePackage.suites.any(id=suite.id))
+            for row in q:
+                found[row.uuid] = row
+        return found
+
+    def resolve_binaries(keys, *, in_suite=False):
+        found = {}
+        for chunk in chunked(list(keys)):
+            q = (
+                session.query(
+                    BinaryPackage.uuid,
+                    BinaryPackage.name,
+                    BinaryPackage.version,
+                    BinaryPackage.component_id,
+                    BinaryPackage.architecture_id,
+                    BinaryPackage.deb_type,
+                    BinaryPackage.time_deleted,
+                    SourcePackage.name.label('source_name'),
+                )
+                .join(BinaryPackage.architecture)
+                .outerjoin(BinaryPackage.source)
+                .filter(
+                    BinaryPackage.repo_id == rss.repo_id,
+                    tuple_(BinaryPackage.name, BinaryPackage.version, ArchiveArchitecture.name).in_(chunk),
+                )
+            )
+            if in_suite:
+                q = q.filter(BinaryPackage.suites.any(id=suite.id))
+            for row in q:
+                found[row.uuid] = row
+        return found
+
+    def add_to_suite(assoc_table, uuid_col, uuids) -> set:
+        added = set()
+        for chunk in chunked(list(uuids)):
+            res = session.execute(
+                pg_insert(assoc_table)
+                .values([{uuid_col.name: uuid, 'suite_id': suite.id} for uuid in chunk])
+                .on_conflict_do_nothing()
+                .returning(uuid_col)
+            )
+            added.update(r[0] for r in res)
+        return added
+
+    # add source packages
+    spkgs_add = resolve_sources(add_sources)
+    if len(spkgs_add) != len(set(add_sources)):
+        missing = set(add_sources) - {(p.name, p.version) for p in spkgs_add.values()}
+        raise ArchiveError(
+            'Can not copy source packages, not found in {}: {}'.format(
+                repo_name, ', '.join('/'.join(m) for m in sorted(missing))
+            )
+        )
+    added_src = add_to_suite(srcpkg_suite_assoc_table, srcpkg_suite_assoc_table.c.src_package_uuid, spkgs_add.keys())
+    _bulk_mark_published(
+        session,
+        rss,
+        SourcePackage,
+        [(u, spkgs_add[u].name, spkgs_add[u].version, 'source') for u in added_src],
+    )
+    for uuid in added_src:
+        spkg_info = spkgs_add[uuid]
+        changed_slices.update(dists_slices_for(component_names[spkg_info.component_id]))
+        latest_src_keys.add((spkg_info.component_id, spkg_info.name))
+        suite_changes.append((PackageType.SOURCE, spkg_info.name, spkg_info.name))
+        archive_log.info(
+            'COPY-SRC: %s/%s in %s to suite %s (%s)',
+            spkg_info.name,
+            spkg_info.version,
+            repo_name,
+            suite.name,
+            'no-binaries',
+        )
+        events.setdefault('package-src-copied', []).append(
+            {
+                'pkg_name': spkg_info.name,
+                'pkg_version': spkg_info.version,
+                'repo': repo_name,
+                'dest_suite': suite.name,
+                'with_binaries': False,
+            }
+        )
+    log.info('Copied %s source packages into %s', len(added_src), suite.name)
+
+    # add binary packages
+    bpkgs_add = resolve_binaries(add_binaries)
+    if len(bpkgs_add) != len(set(add_binaries)):
+        missing = set(add_binaries) - {(p.name, p.version, arch_names[p.architecture_id]) for p in bpkgs_add.values()}
+        raise ArchiveError(
+            'Can not copy binary packages, not found in {}: {}'.format(
+                repo_name, ', '.join('/'.join(m) for m in sorted(missing))
+            )
+        )
+    for bpkg_info in bpkgs_add.values():
+        if bpkg_info.component_id not in suite_component_ids:
+            raise ArchiveError(
+                'Can not copy package: Source component "{}" not in target suite "{}".'.format(
+                    component_names[bpkg_info.component_id], suite.name
+                )
+            )
+    added_bin = add_to_suite(binpkg_suite_assoc_table, binpkg_suite_assoc_table.c.bin_package_uuid, bpkgs_add.keys())
+
+    # copy overrides from any other suite the binaries are in, unless they are zombies that still have an override
+    if added_bin:
+        origin_overrides: dict[str, PackageOverride] = {}
+        for chunk in chunked(list(added_bin)):
+            q = (
+                session.query(BinaryPackage.name, PackageOverride)
+                .join(binpkg_suite_assoc_table, binpkg_suite_assoc_table.c.bin_package_uuid == BinaryPackage.uuid)
+                .join(
+                    PackageOverride,
+                    and_(
+                        PackageOverride.repo_id == rss.repo_id,
+                        PackageOverride.suite_id == binpkg_suite_assoc_table.c.suite_id,
+                        PackageOverride.pkg_name == BinaryPackage.name,
+                    ),
+                )
+                .filter(BinaryPackage.uuid.in_(chunk), binpkg_suite_assoc_table.c.suite_id != suite.id)
+            )
+            for name, override in q:
+                origin_overrides.setdefault(name, override)
+        target_override_names = set()
+        for chunk in chunked(list({bpkgs_add[u].name for u in added_bin})):
+            target_override_names.update(
+                r[0]
+                for r in session.query(PackageOverride.pkg_name).filter(
+                    PackageOverride.repo_id == rss.repo_id,
+                    PackageOverride.suite_id == suite.id,
+                    PackageOverride.pkg_name.in_(chunk),
+                )
+            )
+        override_rows = {}
+        for uuid in added_bin:
+            bpkg_info = bpkgs_add[uuid]
+            origin = origin_overrides.get(bpkg_info.name)
+            if not origin:
+                if bpkg_info.time_deleted and bpkg_info.name in target_override_names:
+                    log.info('Resurrecting override for zombie package %s/%s', bpkg_info.name, bpkg_info.version)
+                    continue
+                raise ArchiveError(
+                    'Can not copy binary package: No override origin suite found for `{}/{}`.'.format(
+                        bpkg_info.name, bpkg_info.version
+                    )
+                )
+            override_rows[bpkg_info.name] = dict(
+                repo_id=rss.repo_id,
+                suite_id=suite.id,
+                pkg_name=bpkg_info.name,
+                essential=origin.essential,
+                priority=origin.priority,
+                component_id=origin.component_id,
+                section_id=origin.section_id,
+            )
+        for chunk in chunked(list(override_rows.values())):
+            stmt = pg_insert(PackageOverride).values(chunk)
+            session.execute(
+                stmt.on_conflict_do_update(
+                    constraint='_repo_suite_pkgname_uc',
+                    set_={
+                        'essential': stmt.excluded.essential,
+                        'priority': stmt.excluded.priority,
+                        'component_id': stmt.excluded.component_id,
+                        'section_id': stmt.excluded.section_id,
+                    },
+                )
+            )
+
+    _bulk_mark_published(
+        session,
+        rss,
+        BinaryPackage,
+        [(u, bpkgs_add[u].name, bpkgs_add[u].version, arch_names[bpkgs_add[u].architecture_id]) for u in added_bin],
+    )
+    for uuid in added_bin:
+        bpkg_info = bpkgs_add[uuid]
+        arch_name = arch_names[bpkg_info.architecture_id]
+        changed_slices.update(dists_slices_for(component_names[bpkg_info.component_id], arch_name, bpkg_info.deb_type))
+        latest_bin_keys.add((bpkg_info.component_id, bpkg_info.architecture_id, bpkg_info.deb_type, bpkg_info.name))
+        suite_changes.append((PackageType.BINARY, bpkg_info.name, bpkg_info.source_name))
+        archive_log.info(
+            'COPY-BIN: %s/%s/%s in %s to suite %s', bpkg_info.name, bpkg_info.version, arch_name, repo_name, suite.name
+        )
+    log.info('Copied %s binary packages into %s', len(added_bin), suite.name)
+
+    # remove source packages, and their binaries
+    spkgs_rm = resolve_sources(remove_sources, in_suite=True)
+    removed_src = set()
+    removed_bin: dict[T.Any, set[int]] = {}
+    rm_suite_ids = [suite.id]
+    if suite.debug_suite:
+        rm_suite_ids.append(suite.debug_suite.id)
+    for chunk in chunked(list(spkgs_rm.keys())):
+        res = session.execute(
+            delete(srcpkg_suite_assoc_table)
+            .where(
+                srcpkg_suite_assoc_table.c.suite_id == suite.id,
+                srcpkg_suite_assoc_table.c.src_package_uuid.in_(chunk),
+            )
+            .returning(srcpkg_suite_assoc_table.c.src_package_uuid)
+        )
+        removed_src.update(r[0] for r in res)
+        res = session.execute(
+            delete(binpkg_suite_assoc_table)
+            .where(
+                binpkg_suite_assoc_table.c.suite_id.in_(rm_suite_ids),
+                binpkg_suite_assoc_table.c.bin_package_uuid.in_(
+                    select(BinaryPackage.uuid).where(BinaryPackage.source_id.in_(chunk))
+                ),
+            )
+            .returning(binpkg_suite_assoc_table.c.bin_package_uuid, binpkg_suite_assoc_table.c.suite_id)
+        )
+        for bin_uuid, suite_id in res:
+            removed_bin.setdefault(bin_uuid, set()).add(suite_id)
+
+    # remove individual binary packages
+    bpkgs_rm = resolve_binaries(remove_binaries, in_suite=True)
+    for chunk in chunked(list(bpkgs_rm.keys())):
+        res = session.execute(
+            delete(binpkg_suite_assoc_table)
+            .where(
+                binpkg_suite_assoc_table.c.suite_id == suite.id,
+                binpkg_suite_assoc_table.c.bin_package_uuid.in_(chunk),
+            )
+            .returning(binpkg_suite_assoc_table.c.bin_package_uuid)
+        )
+        for r in res:
+            removed_bin.setdefault(r[0], set()).add(suite.id)
+
+    # mark packages which are no longer in any suite for removal
+    now = datetime.now(UTC)
+    marked_src = set()
+    for chunk in chunked(list(removed_src)):
+        res = session.execute(
+            update(SourcePackage)
+            .where(SourcePackage.uuid.in_(chunk), ~SourcePackage.suites.any())
+            .values(time_deleted=now)
+            .returning(SourcePackage.uuid)
+            .execution_options(synchronize_session=False)
+        )
+        marked_src.update(r[0] for r in res)
+    marked_bin = set()
+    for chunk in chunked(list(removed_bin.keys())):
+        res = session.execute(
+            update(BinaryPackage)
+            .where(BinaryPackage.uuid.in_(chunk), ~BinaryPackage.suites.any())
+            .values(time_deleted=now)
+            .returning(BinaryPackage.uuid)
+            .execution_options(synchronize_session=False)
+        )
+        marked_bin.update(r[0] for r in res)
+
+    for uuid in removed_src:
+        spkg_info = spkgs_rm[uuid]
+        changed_slices.update(dists_slices_for(component_names[spkg_info.component_id]))
+        latest_src_keys.add((spkg_info.component_id, spkg_info.name))
+        suite_changes.append((PackageType.SOURCE, spkg_info.name, spkg_info.name))
+        event_data = {'pkg_name': spkg_info.name, 'pkg_version': spkg_info.version, 'repo': repo_name}
+        if uuid in marked_src:
+            archive_log.info(
+                '%s: %s/%s @ %s/%s', 'MARKED-REMOVAL-SRC', spkg_info.name, spkg_info.version, repo_name, suite.name
+            )
+            events.setdefault('package-src-marked-removal', []).append(event_data)
+        else:
+            archive_log.info(
+                '%s: %s/%s @ %s/%s', 'DELETED-SUITE-SRC', spkg_info.name, spkg_info.version, repo_name, suite.name
+            )
+            event_data['suite'] = suite.name
+            events.setdefault('package-src-suite-deleted', []).append(event_data)
+
+    # binaries removed along with their source were not resolved yet
+    bpkgs_rm_info = dict(bpkgs_rm)
+    missing_info = [u for u in removed_bin.keys() if u not in bpkgs_rm_info]
+    for chunk in chunked(missing_info):
+        for row in (
+            session.query(
+                BinaryPackage.uuid,
+                BinaryPackage.name,
+                BinaryPackage.version,
+                BinaryPackage.component_id,
+                BinaryPackage.architecture_id,
+                BinaryPackage.deb_type,
+                BinaryPackage.time_deleted,
+                SourcePackage.name.label('source_name'),
+            )
+            .outerjoin(BinaryPackage.source)
+            .filter(BinaryPackage.uuid.in_(chunk))
+        ):
+            bpkgs_rm_info[row.uuid] = row
+    for uuid, suite_ids in removed_bin.items():
+        bpkg_info = bpkgs_rm_info[uuid]
+        arch_name = arch_names[bpkg_info.architecture_id]
+        slices = dists_slices_for(component_names[bpkg_info.component_id], arch_name, bpkg_info.deb_type)
+        latest_key = (bpkg_info.component_id, bpkg_info.architecture_id, bpkg_info.deb_type, bpkg_info.name)
+        rm_suite_names = []
+        if suite.id in suite_ids:
+            changed_slices.update(slices)
+            latest_bin_keys.add(latest_key)
+            suite_changes.append((PackageType.BINARY, bpkg_info.name, bpkg_info.source_name))
+            rm_suite_names.append(suite.name)
+        if suite.debug_suite and suite.debug_suite.id in suite_ids:
+            changed_slices_debug.update(slices)
+            latest_bin_keys_debug.add(latest_key)
+            suite_changes_debug.append((PackageType.BINARY, bpkg_info.name, bpkg_info.source_name))
+            rm_suite_names.append(suite.debug_suite.name)
+        if uuid in marked_bin:
+            archive_log.info(
+                'MARKED-REMOVAL-BIN: %s/%s/%s @ %s', bpkg_info.name, bpkg_info.version, arch_name, repo_name
+            )
+        else:
+            archive_log.info(
+                'DELETED-SUITE-BIN: %s/%s/%s @ %s/%s',
+                bpkg_info.name,
+                bpkg_info.version,
+                arch_name,
+                repo_name,
+                ' & '.join(rm_suite_names),
+            )
+    log.info('Removed %s source and %s binary packages from %s', len(removed_src), len(removed_bin), suite.name)
+
+    # record the changes, and update the index of most recent packages for everything we touched
+    if changed_slices:
+        repo_suite_add_changed_slices(session, rss, changed_slices)
+        repo_suite_log_changes(session, rss, suite_changes)
+        rebuild_latest_package_index(session, rss, sources=latest_src_keys, binaries=latest_bin_keys)
+    if changed_slices_debug:
+        rss_debug = repo_suite_settings_for_debug(session, rss)
+        repo_suite_add_changed_slices(session, rss_debug, changed_slices_debug)
+        repo_suite_log_changes(session, rss_debug, suite_changes_debug)
+        rebuild_latest_package_index(session, rss_debug, sources=(), binaries=latest_bin_keys_debug)
+
+    # objects loaded into the session may be stale now
+    session.flush()
+    session.expire_all()
+
+    # ensure we update the metadata alias links / extract missing data for new sources
+    for chunk in chunked(list(added_src)):
+        for spkg in session.query(SourcePackage).filter(SourcePackage.uuid.in_(chunk)):
+            publish_package_metadata(spkg)
+
+    for subject, event_list in events.items():
+        emitter.submit_events_for_mod(LkModule.ARCHIVE, subject, event_list)
+
+
 def guess_binary_package_remove_issues(
     session, rss: ArchiveRepoSuiteSettings, bpkg: BinaryPackage
 ) -> tuple[list[SourcePackage], list[BinaryPackage]]:
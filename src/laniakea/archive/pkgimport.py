@@ -9,12 +9,15 @@ import shutil
 import hashlib
 import tempfile
 import subprocess
+import multiprocessing as mproc
 from pathlib import Path
 from datetime import UTC, datetime
+from contextlib import contextmanager
 from collections import namedtuple
 from dataclasses import dataclass
 
-from apt_pkg import Hashes
+from pebble import ProcessPool
+from apt_pkg import Hashes, version_compare
 from sqlalchemy import exists
 from debian.deb822 import Sources, Packages
 
@@ -72,6 +75,7 @@ from laniakea.archive.changes import (
     InvalidChangesError,
     parse_changes,
 )
+from laniakea.archive.pkginspect import PackageInspectError, inspect_deb, inspect_dsc
 from laniakea.archive.uploadermgr import guess_archive_uploader_for_changes
 
 
@@ -134,10 +138,114 @@ def verify_hashes(file: T.Union[ChangesFileEntry, ArchiveFile], local_fname: T.U
         raise HashVerifyError('An insufficient amount of hashes was validated for "{}" - this is a bug.')
 
 
+def read_source_info(dsc_fname: T.PathUnion, inspect_in_process: bool = False) -> Sources:
+    """Read the Sources stanza for a source package.
+
+    :param dsc_fname: Path to the .dsc file of the package.
+    :param inspect_in_process: Read the file directly instead of running apt-ftparchive on it.
+    """
+    if inspect_in_process:
+        try:
+            return inspect_dsc(dsc_fname)
+        except PackageInspectError as e:
+            raise ArchiveImportError('Unable to gather valid source package information: {}'.format(str(e)))
+
+    aftp_env = {'LANG': 'C.UTF-8', 'PATH': os.environ['PATH']}
+    p = subprocess.run(
+        ['apt-ftparchive', '-q', 'sources', dsc_fname],
+        capture_output=True,
+        check=True,
+        encoding='utf-8',
+        env=aftp_env,
+    )
+    if p.returncode != 0:
+        raise ArchiveImportError('Failed to extract source package information: {}'.format(p.stderr))
+    src_tf = Sources(p.stdout)
+    if 'Package' not in src_tf:
+        raise ArchiveImportError('Unable to gather valid source package information: {}'.format(p.stderr))
+    return src_tf
+
+
+def read_binary_info(deb_fname: T.PathUnion, inspect_in_process: bool = False) -> tuple[Packages, list[str]]:
+    """Read the Packages stanza and the file list of a binary package.
+
+    :param deb_fname: Path to a deb/udeb package.
+    :param inspect_in_process: Read the file directly instead of running apt-ftparchive on it.
+    """
+    if inspect_in_process:
+        # read control data, checksums and file list in one go
+        try:
+            return inspect_deb(deb_fname)
+        except PackageInspectError as e:
+            raise ArchiveImportError('Unable to gather valid binary package information: {}'.format(str(e)))
+
+    aftp_env = {'LANG': 'C.UTF-8', 'PATH': os.environ['PATH']}
+    p = subprocess.run(
+        ['apt-ftparchive', '-q', 'packages', deb_fname],
+        capture_output=True,
+        check=True,
+        encoding='utf-8',
+        env=aftp_env,
+    )
+    bin_tf = Packages(p.stdout)
+    if 'Package' not in bin_tf:
+        raise ArchiveImportError('Unable to gather valid binary package information: {}'.format(p.stderr))
+
+    p = subprocess.run(
+        ['apt-ftparchive', '-q', 'contents', deb_fname],
+        capture_output=True,
+        check=True,
+        encoding='utf-8',
+        env=aftp_env,
+    )
+    return bin_tf, [line.split('\t', 1)[0] for line in p.stdout.splitlines()]
+
+
+def _source_info_files(src_tf: Sources) -> T.Dict[str, ArchiveFile]:
+    """Get all files of a source package, with their checksums."""
+    files = checksums_list_to_file(src_tf.get('Files'), 'md5')
+    files = checksums_list_to_file(src_tf.get('Checksums-Sha1'), 'sha1', files)
+    files = checksums_list_to_file(src_tf.get('Checksums-Sha256'), 'sha256', files)
+    return checksums_list_to_file(src_tf.get('Checksums-Sha512'), 'sha512', files)
+
+
+def _inspect_package_file(fname: str, inspect_in_process: bool) -> tuple[str, T.Optional[list[str]]]:
+    """Read and verify a package file in a worker process.
+
+    :return: Tuple of the package stanza as text, and the file list for binary packages.
+    """
+    if fname.endswith('.dsc'):
+        src_tf = read_source_info(fname, inspect_in_process)
+        dsc_dir = os.path.dirname(fname)
+        for file in _source_info_files(src_tf).values():
+            verify_hashes(file, os.path.join(dsc_dir, file.fname))
+        return src_tf.dump(), None
+
+    bin_tf, filelist = read_binary_info(fname, inspect_in_process)
+    if not inspect_in_process:
+        af = ArchiveFile(fname)
+        af.size = bin_tf['Size']
+        af.md5sum = bin_tf['MD5sum']
+        af.sha1sum = bin_tf['SHA1']
+        af.sha256sum = bin_tf['SHA256']
+        af.sha512sum = bin_tf.get('SHA512')
+        verify_hashes(af, fname)
+    return bin_tf.dump(), filelist
+
+
 # result tuple of import_source
 ImportSourceResult = namedtuple('ImportSourceResult', 'spkg_uuid is_new')
 
 
+@dataclass
+class BinaryImportRequest:
+    """A binary package to import with :func:`PackageImporter.import_binaries`"""
+
+    fname: T.PathUnion  # Path to a deb/udeb package to import
+    component_name: T.Optional[str] = None  # Name of the archive component to import into
+    override_section: T.Optional[str] = None  # Target section name, overriding the package selection
+
+
 class PackageImporter:
     """
     Imports packages into the archive directly,
@@ -153,6 +261,9 @@ class PackageImporter:
 
         self._keep_source_packages = False
         self._prefer_hardlinks = False
+        self._inspect_in_process = False
+        self._inspect_pool: T.Optional[ProcessPool] = None
+        self._inspect_futures: dict[str, T.Any] = {}
         self._ensure_not_frozen()
 
     @property
@@ -177,6 +288,64 @@ class PackageImporter:
     def prefer_hardlinks(self, v: bool):
         self._prefer_hardlinks = v
 
+    @property
+    def inspect_in_process(self) -> bool:
+        """If True, package files are read directly instead of running apt-ftparchive on them."""
+        return self._inspect_in_process
+
+    @inspect_in_process.setter
+    def inspect_in_process(self, v: bool):
+        self._inspect_in_process = v
+
+    @contextmanager
+    def parallel_inspection(self, jobs: int):
+        """Inspect and verify package files in worker processes while this context is active.
+
+        Files passed to :func:`prepare_files` are read and checksummed by up to *jobs* processes
+        in the background, while the database registration of the packages still happens
+        one after another in the calling process.
+        If *jobs* is 1 or less, all work is done in the calling process as usual.
+
+        :param jobs: Number of worker processes to use.
+        """
+        if jobs <= 1:
+            yield
+            return
+        with ProcessPool(max_workers=jobs, context=mproc.get_context('forkserver')) as pool:
+            self._inspect_pool = pool
+            try:
+                yield
+            except BaseException:
+                pool.stop()
+                raise
+            finally:
+                self._inspect_pool = None
+                self._inspect_futures.clear()
+
+    def prepare_files(self, fnames: T.Iterable[T.PathUnion]):
+        """Schedule package files for inspection in the background.
+
+        Does nothing if :func:`parallel_inspection` is not active.
+
+        :param fnames: Paths to .dsc or deb/udeb files which will be imported soon.
+        """
+        if not self._inspect_pool:
+            return
+        for fname in fnames:
+            fname = os.path.abspath(fname)
+            if fname in self._inspect_futures:
+                continue
+            self._inspect_futures[fname] = self._inspect_pool.schedule(
+                _inspect_package_file, args=(fname, self._inspect_in_process)
+            )
+
+    def _take_prepared(self, fname: T.PathUnion) -> T.Optional[tuple[str, T.Optional[list[str]]]]:
+        """Get the result of a background inspection of a file, if there was one."""
+        future = self._inspect_futures.pop(os.path.abspath(fname), None)
+        if not future:
+            return None
+        return future.result()
+
     def get_rss(self, session) -> ArchiveRepoSuiteSettings:
         """Get the repo/suite settings for this importer."""
         rss = session.query(ArchiveRepoSuiteSettings).filter(ArchiveRepoSuiteSettings.id == self._rss_id).one()
@@ -207,6 +376,15 @@ class PackageImporter:
             safe_rename(src, dst)
             log.debug('Moved package file: %s -> %s', src, dst)
 
+    def _undo_copy_or_move(self, src, dst):
+        """Revert a file operation done by :func:`_copy_or_move`"""
+        if self.keep_source_packages:
+            if os.path.isfile(dst):
+                os.unlink(dst)
+        else:
+            safe_rename(dst, src)
+        log.debug('Reverted placement of package file: %s', dst)
+
     def import_source(
         self,
         dsc_fname: T.PathUnion,
@@ -229,19 +407,12 @@ class PackageImporter:
         log.info('Attempting import of source: %s', dsc_fname)
         dsc_dir = os.path.dirname(dsc_fname)
 
-        aftp_env = {'LANG': 'C.UTF-8', 'PATH': os.environ['PATH']}
-        p = subprocess.run(
-            ['apt-ftparchive', '-q', 'sources', dsc_fname],
-            capture_output=True,
-            check=True,
-            encoding='utf-8',
-            env=aftp_env,
-        )
-        if p.returncode != 0:
-            raise ArchiveImportError('Failed to extract source package information: {}'.format(p.stderr))
-        src_tf = Sources(p.stdout)
-        if 'Package' not in src_tf:
-            raise ArchiveImportError('Unable to gather valid source package information: {}'.format(p.stderr))
+        prepared = self._take_prepared(dsc_fname)
+        if prepared:
+            # the package was already read and its files verified by a worker
+            src_tf = Sources(prepared[0])
+        else:
+            src_tf = read_source_info(dsc_fname, self._inspect_in_process)
 
         pkgname = safe_strip(src_tf.pop('Package'))
         version = safe_strip(src_tf.pop('Version'))
@@ -381,10 +552,9 @@ class PackageImporter:
                             'Section {} for {}/{} does not exist.'.format(section_name, pkgname, version)
                         )
 
-            files = checksums_list_to_file(src_tf.pop('Files'), 'md5')
-            files = checksums_list_to_file(src_tf.pop('Checksums-Sha1'), 'sha1', files)
-            files = checksums_list_to_file(src_tf.pop('Checksums-Sha256'), 'sha256', files)
-            files = checksums_list_to_file(src_tf.pop('Checksums-Sha512', None), 'sha512', files)
+            files = _source_info_files(src_tf)
+            for key in ('Files', 'Checksums-Sha1', 'Checksums-Sha256', 'Checksums-Sha512'):
+                src_tf.pop(key, None)
 
             missing_overrides = check_overrides_source(session, rss, spkg)
             if new_policy == NewPolicy.NEVER_NEW:
@@ -411,7 +581,8 @@ class PackageImporter:
             files_todo = []
             for new_file in files.values():
                 # ensure the files hashes are correct
-                verify_hashes(new_file, os.path.join(dsc_dir, new_file.fname))
+                if not prepared:
+                    verify_hashes(new_file, os.path.join(dsc_dir, new_file.fname))
 
                 pool_fname = os.path.join(spkg.directory, new_file.fname)
                 afile = (
@@ -543,7 +714,6 @@ class PackageImporter:
                 )
             else:
                 package_mark_published(session, rss, spkg)
-                rss.changes_pending = True
                 log.info(
                     'Added source `{}/{}` to {}/{}.'.format(spkg.name, spkg.version, rss.repo.name, rss.suite.name)
                 )
@@ -644,352 +814,440 @@ class PackageImporter:
         :param override_section: Set a new target section name, overriding the package selection.
         :param ignore_missing_override: Try to guess & add an override for this binary in case it is missing.
         """
-        self._ensure_not_frozen()
+        return self.import_binaries(
+            [BinaryImportRequest(deb_fname, component_name, override_section)],
+            ignore_existing=ignore_existing,
+            ignore_version_check=ignore_version_check,
+            ignore_missing_override=ignore_missing_override,
+        )[0]
+
+    def import_binaries(
+        self,
+        batch: T.Sequence[BinaryImportRequest | os.PathLike | str],
+        *,
+        ignore_existing: bool = False,
+        ignore_version_check: bool = False,
+        ignore_missing_override: bool = False,
+    ) -> list[UUID | None]:
+        """Import multiple binary packages into the given suite or its NEW queue at once.
 
-        log.debug('Attempting import of binary: %s', deb_fname)
-        pkg_type = DebType.DEB
-        if os.path.splitext(deb_fname)[1] == '.udeb':
-            pkg_type = DebType.UDEB
-
-        aftp_env = {'LANG': 'C.UTF-8', 'PATH': os.environ['PATH']}
-        p = subprocess.run(
-            ['apt-ftparchive', '-q', 'packages', deb_fname],
-            capture_output=True,
-            check=True,
-            encoding='utf-8',
-            env=aftp_env,
-        )
-        bin_tf = Packages(p.stdout)
-        if 'Package' not in bin_tf:
-            raise ArchiveImportError('Unable to gather valid binary package information: {}'.format(p.stderr))
-
-        p = subprocess.run(
-            ['apt-ftparchive', '-q', 'contents', deb_fname],
-            capture_output=True,
-            check=True,
-            encoding='utf-8',
-            env=aftp_env,
-        )
-        filelist_raw = p.stdout.splitlines()
+        All data needed for the batch is fetched from the database in a few bulk queries, and the
+        packages are registered in a single transaction. If anything fails, the whole batch is rolled
+        back, including any files that were already copied or moved.
 
-        pkgname = safe_strip(bin_tf.pop('Package'))
-        version = safe_strip(bin_tf.pop('Version'))
-        pkgarch = safe_strip(bin_tf.pop('Architecture'))
+        :param batch: Binary packages to import, either as requests or plain deb/udeb file paths.
+        :param ignore_existing: Ignore any already existing binary
+        :param ignore_version_check: Ignore version check (import older versions / ones seen before)
+        :param ignore_missing_override: Try to guess & add an override for a binary in case it is missing.
+        :return: UUIDs of the imported binaries, or None for packages that were skipped, in the order of the batch.
+        """
+        self._ensure_not_frozen()
 
+        requests = [r if isinstance(r, BinaryImportRequest) else BinaryImportRequest(r) for r in batch]
+        if not requests:
+            return []
+
+        # read all package data before touching the database
+        self.prepare_files([req.fname for req in requests])
+        pkg_infos = []
+        verified_fnames = set()
+        for req in requests:
+            log.debug('Attempting import of binary: %s', req.fname)
+            prepared = self._take_prepared(req.fname)
+            if prepared:
+                # the package was already read and verified by a worker
+                bin_tf, filelist = Packages(prepared[0]), prepared[1]
+                verified_fnames.add(str(req.fname))
+            else:
+                bin_tf, filelist = read_binary_info(req.fname, self._inspect_in_process)
+            pkgname = safe_strip(bin_tf.pop('Package'))
+            version = safe_strip(bin_tf.pop('Version'))
+            pkgarch = safe_strip(bin_tf.pop('Architecture'))
+            pkg_infos.append((req, bin_tf, filelist, pkgname, version, pkgarch))
+        all_pkgnames = {info[3] for info in pkg_infos}
+
+        results: list[UUID | None] = []
+        published_pkgs: list[tuple[ArchiveRepoSuiteSettings, BinaryPackage]] = []
+        file_ops: list[tuple[str, str, bool]] = []
         with session_scope() as session:
             rss = self.get_rss(session)
-
-            deb_rss = rss
-            deb_component = 'main'
-            section = override_section if override_section else bin_tf.get('Section')
-            if '/' in section:
-                deb_component, section = section.split('/')
-            is_debug_pkg = True if section == 'debug' and pkgname.endswith('-dbgsym') else False
-            if is_debug_pkg:
-                deb_rss = repo_suite_settings_for_debug(session, rss)
-                if not deb_rss:
-                    log.info(
-                        'Skipped import of `{}`: Not allowed or no debug-symbol location.'.format(
-                            os.path.basename(deb_fname)
-                        )
-                    )
-                    return None
-            if not component_name:
-                component_name = deb_component
-
-            # check if the package already exists
-            ret = session.query(
-                exists().where(
-                    BinaryPackage.repo_id == deb_rss.repo_id,
-                    BinaryPackage.name == pkgname,
-                    BinaryPackage.version == version,
-                    BinaryPackage.architecture.has(name=pkgarch),
+            rss_dbg = repo_suite_settings_for_debug(session, rss)
+            rss_list = [rss] if not rss_dbg or rss_dbg.id == rss.id else [rss, rss_dbg]
+            repo_ids = {r.repo_id for r in rss_list}
+
+            # prefetch everything we need to know about the packages in this batch
+            components = {c.name: c for c in session.query(ArchiveComponent).all()}
+            architectures = {a.name: a for a in session.query(ArchiveArchitecture).all()}
+            existing_pkgs = set(
+                session.query(
+                    BinaryPackage.repo_id, BinaryPackage.name, BinaryPackage.version, ArchiveArchitecture.name
                 )
-            ).scalar()
-            if ret:
-                if ignore_existing:
-                    return None
-                raise ArchivePackageExistsError(
-                    'Can not import binary package {}/{}/{}: Already exists.'.format(pkgname, version, pkgarch)
+                .join(BinaryPackage.architecture)
+                .filter(BinaryPackage.repo_id.in_(repo_ids), BinaryPackage.name.in_(all_pkgnames))
+                .all()
+            )
+            vmem_cache: dict[tuple[int, str, str], ArchiveVersionMemory | None] = {
+                (vmem.repo_suite_id, vmem.pkg_name, vmem.arch_name): vmem
+                for vmem in session.query(ArchiveVersionMemory).filter(
+                    ArchiveVersionMemory.repo_suite_id.in_([r.id for r in rss_list]),
+                    ArchiveVersionMemory.pkg_name.in_(all_pkgnames),
                 )
+            }
+            # packages without an entry have never been seen before
+            for r in rss_list:
+                for info in pkg_infos:
+                    vmem_cache.setdefault((r.id, info[3], info[5]), None)
+            overrides: dict[tuple[int, str], PackageOverride] = {}
+            for r in rss_list:
+                for override in session.query(PackageOverride).filter(
+                    PackageOverride.repo_id == r.repo_id,
+                    PackageOverride.suite_id == r.suite_id,
+                    PackageOverride.pkg_name.in_(all_pkgnames),
+                ):
+                    overrides[(r.id, override.pkg_name)] = override
+            sources: dict[tuple[int, str, str], T.Tuple[T.Optional[SourcePackage], bool]] = {}
+            # highest versions accepted in this batch, the version memory is only updated once all were accepted
+            batch_versions: dict[tuple[int, str, str], str] = {}
+            pool_fnames = set()
+            debug_section = None
 
-            # ensure we are not downgrading binary package versions
-            high_ver_res = (
-                session.query(ArchiveVersionMemory.highest_version)
-                .filter(
-                    ArchiveVersionMemory.repo_suite_id == rss.id,
-                    ArchiveVersionMemory.pkg_name == pkgname,
-                    ArchiveVersionMemory.arch_name == pkgarch,
-                    ArchiveVersionMemory.highest_version > version,
-                )
-                .one_or_none()
-            )
-            if high_ver_res:
-                if not ignore_version_check:
-                    raise ArchiveImportError(
-                        'Unable to import binary package `{}/{}`: '
-                        'We have already seen higher version "{}" in this repository/suite before.'.format(
-                            pkgname, version, high_ver_res[0]
-                        )
-                    )
+            with session.no_autoflush:
+                for req, bin_tf, filelist, pkgname, version, pkgarch in pkg_infos:
+                    deb_fname = str(req.fname)
+                    pkg_type = DebType.DEB
+                    if os.path.splitext(deb_fname)[1] == '.udeb':
+                        pkg_type = DebType.UDEB
+
+                    deb_rss = rss
+                    deb_component = 'main'
+                    section = req.override_section if req.override_section else bin_tf.get('Section')
+                    if '/' in section:
+                        deb_component, section = section.split('/')
+                    is_debug_pkg = True if section == 'debug' and pkgname.endswith('-dbgsym') else False
+                    if is_debug_pkg:
+                        deb_rss = rss_dbg
+                        if not deb_rss:
+                            log.info(
+                                'Skipped import of `{}`: Not allowed or no debug-symbol location.'.format(
+                                    os.path.basename(deb_fname)
+                                )
+                            )
+                            results.append(None)
+                            continue
+                    component_name = req.component_name if req.component_name else deb_component
 
-            # fetch component this binary package is in
-            component = session.query(ArchiveComponent).filter(ArchiveComponent.name == component_name).one_or_none()
-            if component:
-                if component not in deb_rss.suite.components:
-                    raise ArchiveImportError(
-                        'Unable to import binary package `{}/{}/{}`: Archive component `{}` does not exist in `{}:{}`.'.format(
-                            pkgname, version, pkgarch, component.name, deb_rss.repo.name, deb_rss.suite.name
-                        )
-                    )
-            else:
-                if component_name == 'main':
-                    raise ArchiveImportError(
-                        'Unable to import binary package `{}/{}/{}`: Archive component `{}` is missing.'.format(
-                            pkgname, version, pkgarch, component_name
+                    # check if the package already exists
+                    if (deb_rss.repo_id, pkgname, version, pkgarch) in existing_pkgs:
+                        if ignore_existing:
+                            results.append(None)
+                            continue
+                        raise ArchivePackageExistsError(
+                            'Can not import binary package {}/{}/{}: Already exists.'.format(pkgname, version, pkgarch)
                         )
-                    )
-                else:
-                    # We do not have the desired component *at all* - this may be the case if we do
-                    # support 'main', but not 'contrib', and if a source package in 'main' has built
-                    # binaries for 'contrib'. In that case, we simply drop the binary package semi-silently
-                    # and do emit a warning.
-                    archive_log.info(
-                        'BINPKG-IMPORT-IGNORED: %s/%s/%s @ %s:%s/%s',
-                        pkgname,
-                        version,
-                        pkgarch,
-                        deb_rss.repo.name,
-                        deb_rss.suite.name,
-                        component_name,
-                    )
-                    log.warning(
-                        'Ignored import request for binary `%s/%s/%s`: Archive component `%s` does not exist.',
-                        pkgname,
-                        version,
-                        pkgarch,
-                        component_name,
-                    )
-                    return None
 
-            with session.no_autoflush:
-                bpkg = BinaryPackage(pkgname, version, deb_rss.repo)
-                session.add(bpkg)
-
-                bpkg.component = component
-                bpkg.architecture = session.query(ArchiveArchitecture).filter(ArchiveArchitecture.name == pkgarch).one()
-                bpkg.update_uuid()
-
-                bpkg.deb_type = pkg_type
-                bpkg.maintainer = safe_strip(bin_tf.pop('Maintainer'))
-                bpkg.original_maintainer = safe_strip(bin_tf.pop('Original-Maintainer', None))
-                bpkg.homepage = safe_strip(bin_tf.pop('Homepage', None))
-                bpkg.size_installed = int(bin_tf.pop('Installed-Size', '0'))
-                bpkg.time_added = datetime.now(UTC)
-
-                source_info_raw = bin_tf.pop('Source', '')
-                if not source_info_raw:
-                    source_name = pkgname
-                    source_version = version
-                elif '(' in source_info_raw:
-                    source_name = source_info_raw[0 : source_info_raw.index('(') - 1].strip()
-                    source_version = source_info_raw[
-                        source_info_raw.index('(') + 1 : source_info_raw.index(')')
-                    ].strip()
-                else:
-                    source_name = source_info_raw
-                    source_version = version
-
-                # find the corresponding source package
-                with session.no_autoflush:
-                    bpkg.source, is_new = self._find_source_package(session, rss, deb_rss, source_name, source_version)
-                if not bpkg.source:
-                    if deb_rss.id == rss.id:
-                        search_msg = 'looked for {}/{} in {}:{}'.format(
-                            source_name, source_version, deb_rss.repo.name, deb_rss.suite.name
+                    # ensure we are not downgrading binary package versions, including ones of this batch
+                    # versions are remembered for the repo/suite the package is published in (which differs
+                    # for debug symbol packages), so we need to look them up there as well
+                    vkey = (deb_rss.id, pkgname, pkgarch)
+                    vmem = vmem_cache.get(vkey)
+                    highest_version = vmem.highest_version if vmem else None
+                    batch_version = batch_versions.get(vkey)
+                    if batch_version and (not highest_version or version_compare(batch_version, highest_version) > 0):
+                        highest_version = batch_version
+                    if highest_version and version_compare(highest_version, version) > 0:
+                        if not ignore_version_check:
+                            raise ArchiveImportError(
+                                'Unable to import binary package `{}/{}`: '
+                                'We have already seen higher version "{}" in this repository/suite before.'.format(
+                                    pkgname, version, highest_version
+                                )
+                            )
+
+                    # fetch component this binary package is in
+                    component = components.get(component_name)
+                    if component:
+                        if component not in deb_rss.suite.components:
+                            raise ArchiveImportError(
+                                'Unable to import binary package `{}/{}/{}`: Archive component `{}` does not exist in `{}:{}`.'.format(
+                                    pkgname, version, pkgarch, component.name, deb_rss.repo.name, deb_rss.suite.name
+                                )
+                            )
+                    else:
+                        if component_name == 'main':
+                            raise ArchiveImportError(
+                                'Unable to import binary package `{}/{}/{}`: Archive component `{}` is missing.'.format(
+                                    pkgname, version, pkgarch, component_name
+                                )
+                            )
+                        else:
+                            # We do not have the desired component *at all* - this may be the case if we do
+                            # support 'main', but not 'contrib', and if a source package in 'main' has built
+                            # binaries for 'contrib'. In that case, we simply drop the binary package semi-silently
+                            # and do emit a warning.
+                            archive_log.info(
+                                'BINPKG-IMPORT-IGNORED: %s/%s/%s @ %s:%s/%s',
+                                pkgname,
+                                version,
+                                pkgarch,
+                                deb_rss.repo.name,
+                                deb_rss.suite.name,
+                                component_name,
+                            )
+                            log.warning(
+                                'Ignored import request for binary `%s/%s/%s`: Archive component `%s` does not exist.',
+                                pkgname,
+                                version,
+                                pkgarch,
+                                component_name,
+                            )
+                            results.append(None)
+                            continue
+
+                    architecture = architectures.get(pkgarch)
+                    if not architecture:
+                        raise ArchiveImportError(
+                            'Unable to import binary package `{}/{}/{}`: Architecture `{}` is not known.'.format(
+                                pkgname, version, pkgarch, pkgarch
+                            )
                         )
+
+                    bpkg = BinaryPackage(pkgname, version, deb_rss.repo)
+                    session.add(bpkg)
+
+                    bpkg.component = component
+                    bpkg.architecture = architecture
+                    bpkg.update_uuid()
+
+                    bpkg.deb_type = pkg_type
+                    bpkg.maintainer = safe_strip(bin_tf.pop('Maintainer'))
+                    bpkg.original_maintainer = safe_strip(bin_tf.pop('Original-Maintainer', None))
+                    bpkg.homepage = safe_strip(bin_tf.pop('Homepage', None))
+                    bpkg.size_installed = int(bin_tf.pop('Installed-Size', '0'))
+                    bpkg.time_added = datetime.now(UTC)
+
+                    source_info_raw = bin_tf.pop('Source', '')
+                    if not source_info_raw:
+                        source_name = pkgname
+                        source_version = version
+                    elif '(' in source_info_raw:
+                        source_name = source_info_raw[0 : source_info_raw.index('(') - 1].strip()
+                        source_version = source_info_raw[
+                            source_info_raw.index('(') + 1 : source_info_raw.index(')')
+                        ].strip()
                     else:
-                        search_msg = 'looked for {}/{} in {}:{} and {}:{}'.format(
-                            source_name,
-                            source_version,
-                            deb_rss.repo.name,
-                            deb_rss.suite.name,
-                            rss.repo.name,
-                            rss.suite.name,
+                        source_name = source_info_raw
+                        source_version = version
+
+                    # find the corresponding source package, many binaries of a batch usually share one
+                    source_key = (deb_rss.id, source_name, source_version)
+                    if source_key not in sources:
+                        sources[source_key] = self._find_source_package(
+                            session, rss, deb_rss, source_name, source_version
                         )
-                    raise ArchiveImportError(
-                        'Unable to import binary package `{}/{}/{}`: Could not find corresponding source package ({}).'.format(
-                            pkgname, version, pkgarch, search_msg
+                    bpkg.source, is_new = sources[source_key]
+                    if not bpkg.source:
+                        if deb_rss.id == rss.id:
+                            search_msg = 'looked for {}/{} in {}:{}'.format(
+                                source_name, source_version, deb_rss.repo.name, deb_rss.suite.name
+                            )
+                        else:
+                            search_msg = 'looked for {}/{} in {}:{} and {}:{}'.format(
+                                source_name,
+                                source_version,
+                                deb_rss.repo.name,
+                                deb_rss.suite.name,
+                                rss.repo.name,
+                                rss.suite.name,
+                            )
+                        raise ArchiveImportError(
+                            'Unable to import binary package `{}/{}/{}`: Could not find corresponding source package ({}).'.format(
+                                pkgname, version, pkgarch, search_msg
+                            )
                         )
-                    )
 
-                # find pool location
-                if is_new:
-                    # for NEW stuff, we move the binary next to the source into its component
-                    pool_dir = pool_dir_from_name_component(bpkg.source.name, bpkg.source.component.name)
-                else:
-                    # if we are not NEW, the binary goes into its proper place
-                    pool_dir = pool_dir_from_name_component(bpkg.source.name, component.name)
-                deb_basename = '{}_{}_{}.{}'.format(
-                    bpkg.name, split_epoch(bpkg.version)[1], bpkg.architecture.name, str(pkg_type)
-                )
-                pool_fname = os.path.join(pool_dir, deb_basename)
-
-                bpkg.description = safe_strip(bin_tf.pop('Description'))
-                bpkg.summary = bpkg.description.split('\n', 1)[0].strip()
-                bpkg.description_md5 = hashlib.md5(str(bpkg.description).encode('utf-8')).hexdigest()
-
-                # we don't need the generated filename value
-                bin_tf.pop('Filename')
-                # we fetch those from already added overrides
-                bin_tf.pop('Priority', None)
-                bin_tf.pop('Section')
-                bin_tf.pop('Essential', None)
-
-                # configure package file
-                af = ArchiveFile(pool_fname, deb_rss.repo)
-                af.size = bin_tf.pop('Size')
-                af.md5sum = bin_tf.pop('MD5sum')
-                af.sha1sum = bin_tf.pop('SHA1')
-                af.sha256sum = bin_tf.pop('SHA256')
-                af.sha512sum = bin_tf.pop('SHA512', None)
-                session.add(af)
-
-                # ensure checksums match
-                verify_hashes(af, deb_fname)
+                    # find pool location
+                    if is_new:
+                        # for NEW stuff, we move the binary next to the source into its component
+                        pool_dir = pool_dir_from_name_component(bpkg.source.name, bpkg.source.component.name)
+                    else:
+                        # if we are not NEW, the binary goes into its proper place
+                        pool_dir = pool_dir_from_name_component(bpkg.source.name, component.name)
+                    deb_basename = '{}_{}_{}.{}'.format(
+                        bpkg.name, split_epoch(bpkg.version)[1], bpkg.architecture.name, str(pkg_type)
+                    )
+                    pool_fname = os.path.join(pool_dir, deb_basename)
+
+                    bpkg.description = safe_strip(bin_tf.pop('Description'))
+                    bpkg.summary = bpkg.description.split('\n', 1)[0].strip()
+                    bpkg.description_md5 = hashlib.md5(str(bpkg.description).encode('utf-8')).hexdigest()
+
+                    # we don't need the generated filename value
+                    bin_tf.pop('Filename')
+                    # we fetch those from already added overrides
+                    bin_tf.pop('Priority', None)
+                    bin_tf.pop('Section')
+                    bin_tf.pop('Essential', None)
+
+                    # configure package file
+                    af = ArchiveFile(pool_fname, deb_rss.repo)
+                    af.size = bin_tf.pop('Size')
+                    af.md5sum = bin_tf.pop('MD5sum')
+                    af.sha1sum = bin_tf.pop('SHA1')
+                    af.sha256sum = bin_tf.pop('SHA256')
+                    af.sha512sum = bin_tf.pop('SHA512', None)
+                    session.add(af)
+
+                    # ensure checksums match - if we inspected the file ourselves, the checksums were
+                    # just calculated from the very same file, so there is no need to read it again
+                    if not self._inspect_in_process and deb_fname not in verified_fnames:
+                        verify_hashes(af, deb_fname)
 
-                if is_new:
-                    # if this binary belongs to a package in the NEW queue, we don't register it and just move the binary
-                    # alongside the source package
-                    pool_fname_full = os.path.join(self._repo_newqueue_root, af.fname)
-                    self._copy_or_move(deb_fname, pool_fname_full, override=True)
+                    if is_new:
+                        # if this binary belongs to a package in the NEW queue, we don't register it and just move
+                        # the binary alongside the source package
+                        file_ops.append((deb_fname, os.path.join(self._repo_newqueue_root, af.fname), True))
 
-                    log.info(
-                        'Binary `{}/{}` for {}/{} added to NEW queue'.format(
-                            bpkg.name, bpkg.version, deb_rss.repo.name, deb_rss.suite.name
+                        log.info(
+                            'Binary `{}/{}` for {}/{} added to NEW queue'.format(
+                                bpkg.name, bpkg.version, deb_rss.repo.name, deb_rss.suite.name
+                            )
                         )
-                    )
-
-                    if af in session:
-                        session.expunge(af)
-                    if bpkg in session:
-                        session.expunge(bpkg)
 
-                    # nothing left to do, we will not register this package with the database
-                    return bpkg.uuid
+                        if af in session:
+                            session.expunge(af)
+                        if bpkg in session:
+                            session.expunge(bpkg)
 
-            bpkg.bin_file = af
-            pool_fname_full = os.path.join(deb_rss.repo.get_root_dir(), af.fname)
+                        # nothing left to do, we will not register this package with the database
+                        results.append(bpkg.uuid)
+                        continue
 
-            # check for override
-            override = (
-                session.query(PackageOverride)
-                .filter(
-                    PackageOverride.repo_id == deb_rss.repo_id,
-                    PackageOverride.suite_id == deb_rss.suite_id,
-                    PackageOverride.pkg_name == bpkg.name,
-                )
-                .one_or_none()
-            )
-            if not override:
-                if is_debug_pkg:
-                    # we have a debug package, so we can auto-generate a new override
-                    override = PackageOverride(bpkg.name, deb_rss.repo, deb_rss.suite)
-                    override.component = component
-                    override.section = session.query(ArchiveSection).filter(ArchiveSection.name == 'debug').one()
-                    override.priority = PackagePriority.OPTIONAL
-                    session.add(override)
-                elif ignore_missing_override:
-                    # The override is missing, but we are supposed to ignore that fact.
-                    # So we will try our very best to guess a sensible override for this binary.
-
-                    # Try to copy an override from another suite in the same repository.
-                    eov = (
-                        session.query(PackageOverride)
-                        .filter(
-                            PackageOverride.repo_id == bpkg.repo_id,
-                            PackageOverride.pkg_name == bpkg.name,
+                    bpkg.bin_file = af
+                    pool_fname_full = os.path.join(deb_rss.repo.get_root_dir(), af.fname)
+                    if pool_fname_full in pool_fnames or os.path.exists(pool_fname_full):
+                        raise ArchiveImportError(
+                            'Destination source file `{}` already exists. Can not continue'.format(af.fname)
                         )
-                        .first()
-                    )
+                    pool_fnames.add(pool_fname_full)
+
+                    # check for override
+                    override = overrides.get((deb_rss.id, bpkg.name))
+                    if not override:
+                        if is_debug_pkg:
+                            # we have a debug package, so we can auto-generate a new override
+                            override = PackageOverride(bpkg.name, deb_rss.repo, deb_rss.suite)
+                            override.component = component
+                            if not debug_section:
+                                debug_section = (
+                                    session.query(ArchiveSection).filter(ArchiveSection.name == 'debug').one()
+                                )
+                            override.section = debug_section
+                            override.priority = PackagePriority.OPTIONAL
+                            session.add(override)
+                        elif ignore_missing_override:
+                            # The override is missing, but we are supposed to ignore that fact.
+                            # So we will try our very best to guess a sensible override for this binary.
+
+                            # Try to copy an override from another suite in the same repository.
+                            eov = (
+                                session.query(PackageOverride)
+                                .filter(
+                                    PackageOverride.repo_id == bpkg.repo.id,
+                                    PackageOverride.pkg_name == bpkg.name,
+                                )
+                                .first()
+                            )
 
-                    if eov:
-                        log.warning(
-                            'Copying override from other suite for %s in %s:%s.',
-                            bpkg.name,
-                            bpkg.repo.name,
-                            deb_rss.suite.name,
-                        )
-                        override = PackageOverride(bpkg.name, bpkg.repo, deb_rss.suite)
-                        override.component = eov.component
-                        override.section = eov.section
-                        override.essential = eov.essential
-                        override.priority = eov.priority
-                        session.add(override)
-                    else:
-                        # we just make up an override from scratch now
-                        log.warning(
-                            'No override found at all for %s in %s:%s, inventing one from scratch.',
-                            bpkg.name,
-                            bpkg.repo.name,
-                            deb_rss.suite,
-                        )
-                        override = PackageOverride(bpkg.name, bpkg.repo, deb_rss.suite)
-                        override.component = bpkg.component
-                        override.section = bpkg.source.section
-                        override.essential = False
-                        session.add(override)
-                else:
-                    raise ArchiveImportError(
-                        'Missing override for `{}/{}`: Please process the source package through NEW first before uploading a binary.'.format(
-                            pkgname, version
-                        )
-                    )
+                            if eov:
+                                log.warning(
+                                    'Copying override from other suite for %s in %s:%s.',
+                                    bpkg.name,
+                                    bpkg.repo.name,
+                                    deb_rss.suite.name,
+                                )
+                                override = PackageOverride(bpkg.name, bpkg.repo, deb_rss.suite)
+                                override.component = eov.component
+                                override.section = eov.section
+                                override.essential = eov.essential
+                                override.priority = eov.priority
+                                session.add(override)
+                            else:
+                                # we just make up an override from scratch now
+                                log.warning(
+                                    'No override found at all for %s in %s:%s, inventing one from scratch.',
+                                    bpkg.name,
+                                    bpkg.repo.name,
+                                    deb_rss.suite,
+                                )
+                                override = PackageOverride(bpkg.name, bpkg.repo, deb_rss.suite)
+                                override.component = bpkg.component
+                                override.section = bpkg.source.section
+                                override.essential = False
+                                session.add(override)
+                        else:
+                            raise ArchiveImportError(
+                                'Missing override for `{}/{}`: Please process the source package through NEW '
+                                'first before uploading a binary.'.format(pkgname, version)
+                            )
+                        overrides[(deb_rss.id, bpkg.name)] = override
 
-            # process contents list
-            bpkg.contents = [line.split('\t', 1)[0] for line in filelist_raw]
+                    # process contents list
+                    bpkg.contents = filelist
 
-            bpkg.depends = pop_split(bin_tf, 'Depends', ',')
-            bpkg.pre_depends = pop_split(bin_tf, 'Pre-Depends', ',')
+                    bpkg.depends = pop_split(bin_tf, 'Depends', ',')
+                    bpkg.pre_depends = pop_split(bin_tf, 'Pre-Depends', ',')
 
-            bpkg.replaces = pop_split(bin_tf, 'Replaces', ',')
-            bpkg.provides = pop_split(bin_tf, 'Provides', ',')
-            bpkg.recommends = pop_split(bin_tf, 'Recommends', ',')
-            bpkg.suggests = pop_split(bin_tf, 'Suggests', ',')
-            bpkg.enhances = pop_split(bin_tf, 'Enhances', ',')
-            bpkg.conflicts = pop_split(bin_tf, 'Conflicts', ',')
-            bpkg.breaks = pop_split(bin_tf, 'Breaks', ',')
+                    bpkg.replaces = pop_split(bin_tf, 'Replaces', ',')
+                    bpkg.provides = pop_split(bin_tf, 'Provides', ',')
+                    bpkg.recommends = pop_split(bin_tf, 'Recommends', ',')
+                    bpkg.suggests = pop_split(bin_tf, 'Suggests', ',')
+                    bpkg.enhances = pop_split(bin_tf, 'Enhances', ',')
+                    bpkg.conflicts = pop_split(bin_tf, 'Conflicts', ',')
+                    bpkg.breaks = pop_split(bin_tf, 'Breaks', ',')
 
-            bpkg.built_using = pop_split(bin_tf, 'Built-Using', ',')
-            bpkg.static_built_using = pop_split(bin_tf, 'Static-Built-Using', ',')
-            bpkg.build_ids = pop_split(bin_tf, 'Build-Ids', ' ')
-            bpkg.multi_arch = safe_strip(bin_tf.pop('Multi-Arch', None))
+                    bpkg.built_using = pop_split(bin_tf, 'Built-Using', ',')
+                    bpkg.static_built_using = pop_split(bin_tf, 'Static-Built-Using', ',')
+                    bpkg.build_ids = pop_split(bin_tf, 'Build-Ids', ' ')
+                    bpkg.multi_arch = safe_strip(bin_tf.pop('Multi-Arch', None))
 
-            # add to target suite
-            bpkg.suites.append(deb_rss.suite)
+                    # add to target suite
+                    bpkg.suites.append(deb_rss.suite)
 
-            # add (custom) fields that we did no account for
-            bpkg.extra_data = dict(bin_tf)
+                    # add (custom) fields that we did no account for
+                    bpkg.extra_data = dict(bin_tf)
 
-            # commit stuff before touching the filesystem
-            session.add(bpkg)
-            session.commit()
+                    existing_pkgs.add((deb_rss.repo_id, pkgname, version, pkgarch))
+                    if vkey not in batch_versions or version_compare(version, batch_versions[vkey]) > 0:
+                        batch_versions[vkey] = version
+                    file_ops.append((deb_fname, pool_fname_full, False))
+                    published_pkgs.append((deb_rss, bpkg))
+                    results.append(bpkg.uuid)
 
-            # copy files and register binary
-            if os.path.exists(pool_fname_full):
-                raise ArchiveImportError(
-                    'Destination source file `{}` already exists. Can not continue'.format(af.fname)
-                )
-            self._copy_or_move(deb_fname, pool_fname_full)
+            # write all new packages to the database at once
+            session.flush()
 
-            package_mark_published(session, deb_rss, bpkg)
-            deb_rss.changes_pending = True
-            log.info(
-                'Added binary `{}/{}` to {}/{}'.format(bpkg.name, bpkg.version, deb_rss.repo.name, deb_rss.suite.name)
-            )
+            # copy files, undoing all file operations of this batch if anything goes wrong
+            done_ops: list[tuple[str, str, bool]] = []
+            try:
+                for src, dst, override_dst in file_ops:
+                    self._copy_or_move(src, dst, override=override_dst)
+                    done_ops.append((src, dst, override_dst))
 
-            session.commit()
-            return bpkg.uuid
+                for deb_rss, bpkg in published_pkgs:
+                    package_mark_published(session, deb_rss, bpkg, vmem_cache=vmem_cache)
+                    log.info(
+                        'Added binary `{}/{}` to {}/{}'.format(
+                            bpkg.name, bpkg.version, deb_rss.repo.name, deb_rss.suite.name
+                        )
+                    )
+
+                session.commit()
+            except Exception:
+                for src, dst, _ in reversed(done_ops):
+                    self._undo_copy_or_move(src, dst)
+                raise
+
+        return results
 
 
 def _add_uploader_event_data(event_data: T.Dict[str, T.Any], uploader: T.Optional[ArchiveUploader]):
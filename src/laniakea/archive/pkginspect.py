@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Matthias Klumpp <matthias@tenstral.net>
+#
+# SPDX-License-Identifier: LGPL-3.0+
+
+"""
+In-process inspection of Debian source and binary packages.
+
+The functions in this module produce the same stanzas as ``apt-ftparchive packages``,
+``apt-ftparchive contents`` and ``apt-ftparchive sources`` would for a single package,
+without spawning any external process.
+Checksums are computed in one read of the file; reading the control data and file list of
+a binary package is a second, separate pass over the archive done by apt_inst.
+"""
+
+import os
+import hashlib
+
+import apt_inst
+from apt_pkg import Hashes
+from debian.deb822 import Sources, Packages
+
+import laniakea.typing as T
+
+
+class PackageInspectError(Exception):
+    """Unable to read information from a package file."""
+
+
+def file_hashes(fname: T.PathUnion) -> dict[str, str]:
+    """Calculate the size and all checksums of a file in a single read.
+
+    :param fname: The file to checksum.
+    :return: Dictionary of hash type (as named by APT, e.g. "SHA256") to hash value.
+    """
+    with open(fname, 'rb') as f:
+        # pylint: disable=not-an-iterable
+        return {h.hashtype: h.hashvalue for h in Hashes(f).hashes}  # type: ignore
+
+
+def inspect_deb(deb_fname: T.PathUnion) -> tuple[Packages, list[str]]:
+    """Read the control data, checksums and file list of a binary package.
+
+    The file is read twice: once to compute all checksums, and once by apt_inst to extract
+    the control data and walk the data member for the file list.
+
+    :param deb_fname: Path to a .deb or .udeb file.
+    :return: Tuple of a Packages stanza (including Size and checksum fields) and the list of files in the package.
+    """
+    hashes = file_hashes(deb_fname)
+
+    try:
+        deb = apt_inst.DebFile(str(deb_fname))
+        control_raw = deb.control.extractdata('control')
+
+        contents = []
+
+        def add_member(member, _data):
+            if member.isdir():
+                return
+            name = member.name
+            if name.startswith('./'):
+                name = name[2:]
+            contents.append(name.lstrip('/'))
+
+        deb.data.go(add_member)
+    except SystemError as e:
+        raise PackageInspectError('Unable to read binary package {}: {}'.format(deb_fname, str(e))) from e
+
+    stanza = Packages(control_raw)
+    if 'Package' not in stanza:
+        raise PackageInspectError('Binary package {} has no valid control data.'.format(deb_fname))
+
+    stanza['Filename'] = os.path.basename(deb_fname)
+    stanza['Size'] = hashes['Checksum-FileSize']
+    stanza['MD5sum'] = hashes['MD5Sum']
+    stanza['SHA1'] = hashes['SHA1']
+    stanza['SHA256'] = hashes['SHA256']
+    stanza['SHA512'] = hashes['SHA512']
+
+    return stanza, contents
+
+
+def inspect_dsc(dsc_fname: T.PathUnion) -> Sources:
+    """Read a source package description file into a Sources stanza.
+
+    Like ``apt-ftparchive sources``, the "Source" field is renamed to "Package", and the .dsc file
+    itself is added to the file checksum lists.
+
+    :param dsc_fname: Path to a .dsc file.
+    :return: The Sources stanza of the package.
+    """
+    with open(dsc_fname, 'rb') as f:
+        data = f.read()
+
+    dsc = Sources(data)
+    if 'Source' not in dsc:
+        raise PackageInspectError('Source package {} has no valid control data.'.format(dsc_fname))
+
+    stanza = Sources()
+    stanza['Package'] = dsc.pop('Source')
+    for key, value in dsc.items():
+        stanza[key] = value
+    stanza['Directory'] = os.path.dirname(dsc_fname)
+
+    dsc_basename = os.path.basename(dsc_fname)
+    size = str(len(data))
+    stanza.setdefault('Files', []).append({'md5sum': hashlib.md5(data).hexdigest(), 'size': size, 'name': dsc_basename})
+    for field, key, hash_func in (
+        ('Checksums-Sha1', 'sha1', hashlib.sha1),
+        ('Checksums-Sha256', 'sha256', hashlib.sha256),
+        ('Checksums-Sha512', 'sha512', hashlib.sha512),
+    ):
+        if field in stanza:
+            stanza[field].append({key: hash_func(data).hexdigest(), 'size': size, 'name': dsc_basename})
+
+    return stanza
@@ -10,12 +10,14 @@ import re
 import shutil
 import tempfile
 import subprocess
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 from contextlib import contextmanager
 
 import apt_pkg
 from apt_pkg import version_compare
-from sqlalchemy import and_, select, bindparam
+from sqlalchemy import and_, text, delete, insert, select, tuple_, bindparam
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 import laniakea.typing as T
 from laniakea import LocalConfig
@@ -23,6 +25,7 @@ from laniakea.db import (
     DebType,
     ArchiveFile,
     PackageInfo,
+    PackageType,
     ArchiveSuite,
     DbgSymPolicy,
     BinaryPackage,
@@ -33,11 +36,14 @@ from laniakea.db import (
     ArchiveComponent,
     ArchiveRepository,
     ArchiveArchitecture,
+    LatestBinaryPackage,
+    LatestSourcePackage,
     ArchiveQueueNewEntry,
     ArchiveVersionMemory,
+    ArchiveRepoSuiteChange,
     ArchiveRepoSuiteSettings,
 )
-from laniakea.utils import run_command, split_strip, hardlink_or_copy
+from laniakea.utils import chunked, run_command, split_strip, hardlink_or_copy
 from laniakea.logging import log
 
 
@@ -252,27 +258,338 @@ def repo_suite_settings_for_debug(session, rss: ArchiveRepoSuiteSettings) -> T.O
     return rss_dbg
 
 
-def package_mark_published(session, rss: ArchiveRepoSuiteSettings, pkg: T.Union[SourcePackage, BinaryPackage]):
+def dists_slices_for(
+    component_name: str, arch_name: T.Optional[str] = None, deb_type: DebType = DebType.DEB
+) -> list[str]:
+    """Get the dists/ subdirectories whose index files list packages of the given kind.
+
+    :param component_name: Name of the archive component.
+    :param arch_name: Name of the architecture of a binary package, or None for source packages.
+    :param deb_type: Type of the binary package.
+    :return: List of slice names relative to the suite's dists/ directory, e.g. "main/binary-amd64"
+    """
+
+    if not arch_name:
+        return [os.path.join(component_name, 'source')]
+
+    arch_subdir = 'binary-' + arch_name
+    if deb_type == DebType.UDEB:
+        return [os.path.join(component_name, 'debian-installer', arch_subdir)]
+    return [os.path.join(component_name, arch_subdir), os.path.join(component_name, 'i18n')]
+
+
+def dists_slices_for_package(pkg: T.Union[SourcePackage, BinaryPackage]) -> list[str]:
+    """Get the dists/ subdirectories whose index files list the given package.
+
+    :param pkg: Source or binary package.
+    :return: List of slice names relative to the suite's dists/ directory, e.g. "main/binary-amd64"
+    """
+
+    if isinstance(pkg, SourcePackage):
+        return dists_slices_for(pkg.component.name)
+    return dists_slices_for(pkg.component.name, pkg.architecture.name, pkg.deb_type)
+
+
+def update_latest_package_index(session, rss: ArchiveRepoSuiteSettings, pkg: T.Union[SourcePackage, BinaryPackage]):
+    """Update the index of most recent package versions after a package was added to or removed from a suite.
+
+    :param session: SQLAlchemy session
+    :param rss: The repo/suite the package was added to or removed from
+    :param pkg: Source or binary package.
+    """
+
+    # we use the relationships here, as the ID columns may not be populated yet for new packages
+    entity: T.Type[LatestSourcePackage] | T.Type[LatestBinaryPackage]
+    if isinstance(pkg, SourcePackage):
+        entity = LatestSourcePackage
+        key = dict(repo_id=rss.repo_id, suite_id=rss.suite_id, component_id=pkg.component.id, name=pkg.name)
+    else:
+        entity = LatestBinaryPackage
+        key = dict(
+            repo_id=rss.repo_id,
+            suite_id=rss.suite_id,
+            component_id=pkg.component.id,
+            architecture_id=pkg.architecture.id,
+            deb_type=pkg.deb_type,
+            name=pkg.name,
+        )
+    if pkg.time_deleted is None and rss.suite in pkg.suites:
+        # the package was added, replace the entry only if it is the newest one - this has to happen in a single
+        # statement, so concurrent imports into the same suite neither lose a newer version nor collide on insert
+        session.flush()
+        stmt = pg_insert(entity).values(**key, version=pkg.version, pkg_uuid=pkg.uuid)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=list(key.keys()),
+                set_={'version': stmt.excluded.version, 'pkg_uuid': stmt.excluded.pkg_uuid},
+                where=stmt.excluded.version > entity.version,
+            )
+        )
+        # don't let an entry loaded earlier in this session hide the result
+        cached_entry = session.identity_map.get(identity_key(entity, tuple(key.values())))
+        if cached_entry is not None:
+            session.expire(cached_entry)
+        return
+
+    # lock the entry, so nobody can add a newer version while we look for the successor of the removed package
+    entry = session.query(entity).filter_by(**key).with_for_update().populate_existing().one_or_none()
+
+    # the package was removed, find its successor if it was the latest version
+    if not entry or entry.pkg_uuid != pkg.uuid:
+        return
+    pkg_entity = type(pkg)
+    filters = [getattr(pkg_entity, k) == v for k, v in key.items() if k != 'suite_id']
+    newest_pkg = (
+        session.query(pkg_entity)
+        .filter(
+            *filters,
+            pkg_entity.suites.any(id=rss.suite_id),
+            pkg_entity.time_deleted.is_(None),
+            pkg_entity.uuid != pkg.uuid,
+        )
+        .order_by(pkg_entity.version.desc())
+        .first()
+    )
+    if newest_pkg:
+        entry.pkg = newest_pkg
+        entry.version = newest_pkg.version
+    else:
+        session.delete(entry)
+
+
+def _rebuild_latest_entries(session, rss: ArchiveRepoSuiteSettings, entity, pkg_entity, key_names, keys):
+    """Regenerate entries of one of the indices of most recent package versions.
+
+    :param entity: The index table, :class:`LatestSourcePackage` or :class:`LatestBinaryPackage`
+    :param pkg_entity: The package table the index is built from
+    :param key_names: Names of the columns identifying a package within a repo/suite
+    :param keys: Tuples of values for the key columns to regenerate, or None for all entries
+    """
+
+    pkg_key_cols = [getattr(pkg_entity, k) for k in key_names]
+    entry_key_cols = [getattr(entity, k) for k in key_names]
+    for chunk in [None] if keys is None else chunked(list(keys)):
+        delete_q = session.query(entity).filter(entity.repo_id == rss.repo_id, entity.suite_id == rss.suite_id)
+        latest_q = session.query(*pkg_key_cols, pkg_entity.version, pkg_entity.uuid).filter(
+            pkg_entity.repo_id == rss.repo_id,
+            pkg_entity.suites.any(id=rss.suite_id),
+            pkg_entity.time_deleted.is_(None),
+        )
+        if chunk is not None:
+            delete_q = delete_q.filter(tuple_(*entry_key_cols).in_(chunk))
+            latest_q = latest_q.filter(tuple_(*pkg_key_cols).in_(chunk))
+        delete_q.delete(synchronize_session=False)
+
+        latest_q = latest_q.order_by(*pkg_key_cols, pkg_entity.version.desc()).distinct(*pkg_key_cols)
+        session.bulk_insert_mappings(
+            entity,
+            [
+                dict(
+                    repo_id=rss.repo_id,
+                    suite_id=rss.suite_id,
+                    **dict(zip(key_names, row[:-2])),
+                    version=row[-2],
+                    pkg_uuid=row[-1],
+                )
+                for row in latest_q
+            ],
+        )
+
+
+def rebuild_latest_package_index(
+    session,
+    rss: ArchiveRepoSuiteSettings,
+    *,
+    sources: T.Optional[T.Iterable[tuple[int, str]]] = None,
+    binaries: T.Optional[T.Iterable[tuple[int, int, DebType, str]]] = None,
+):
+    """Regenerate the index of most recent package versions of a repo/suite.
+
+    If neither *sources* nor *binaries* are given, the whole index is regenerated from scratch,
+    otherwise only the entries for the given packages are.
+
+    :param session: SQLAlchemy session
+    :param rss: The repo/suite to regenerate the index for
+    :param sources: (component ID, name) tuples of source packages whose entries should be regenerated.
+    :param binaries: (component ID, architecture ID, deb type, name) tuples of binary packages
+                     whose entries should be regenerated.
+    """
+
+    # imports update the repo/suite settings row when they change a suite, so locking it here keeps
+    # concurrent imports from changing the index between our removal and recreation of its entries
+    session.query(ArchiveRepoSuiteSettings).filter(ArchiveRepoSuiteSettings.id == rss.id).with_for_update().one()
+
+    full_rebuild = sources is None and binaries is None
+    if full_rebuild or sources:
+        _rebuild_latest_entries(
+            session,
+            rss,
+            LatestSourcePackage,
+            SourcePackage,
+            ('component_id', 'name'),
+            None if full_rebuild else set(sources),
+        )
+    if full_rebuild or binaries:
+        _rebuild_latest_entries(
+            session,
+            rss,
+            LatestBinaryPackage,
+            BinaryPackage,
+            ('component_id', 'architecture_id', 'deb_type', 'name'),
+            None if full_rebuild else set(binaries),
+        )
+
+
+def repo_suite_mark_changed(
+    session, rss: ArchiveRepoSuiteSettings, pkg: T.Optional[T.Union[SourcePackage, BinaryPackage]] = None
+):
+    """Mark a repo/suite as having unpublished changes.
+
+    If a package is given, only the index slices that list this package are recorded as changed,
+    otherwise the whole suite will be regenerated on the next publication run.
+    The index of most recent package versions and the log of suite changes are updated for the given
+    package as well.
+
+    :param session: SQLAlchemy session
+    :param rss: RepoSuite settings to mark
+    :param pkg: The source or binary package that was added or removed, if any.
+    """
+
+    if pkg is None:
+        repo_suite_add_changed_slices(session, rss, ['*'])
+    else:
+        repo_suite_add_changed_slices(session, rss, dists_slices_for_package(pkg))
+        update_latest_package_index(session, rss, pkg)
+        if isinstance(pkg, SourcePackage):
+            repo_suite_log_changes(session, rss, [(PackageType.SOURCE, pkg.name, pkg.name)])
+        else:
+            repo_suite_log_changes(
+                session, rss, [(PackageType.BINARY, pkg.name, pkg.source.name if pkg.source else None)]
+            )
+
+
+def repo_suite_log_changes(
+    session, rss: ArchiveRepoSuiteSettings, changes: T.Iterable[tuple[PackageType, str, T.Optional[str]]]
+):
+    """Record packages that were added to or removed from a repo/suite in the suite change log.
+
+    :param session: SQLAlchemy session
+    :param rss: The repo/suite that was changed
+    :param changes: List of (package type, package name, source package name) tuples.
+    """
+
+    now = datetime.now(UTC)
+    rows = [
+        dict(repo_suite_id=rss.id, time=now, pkg_type=pkg_type, pkg_name=name, source_name=source_name)
+        for pkg_type, name, source_name in changes
+    ]
+    if rows:
+        session.execute(insert(ArchiveRepoSuiteChange), rows)
+
+
+def repo_suite_prune_change_log(session, rss: ArchiveRepoSuiteSettings, *, retention_days: int = 7):
+    """Remove old entries from the change log of a repo/suite.
+
+    Tools reading the log process the whole suite at least once a day, so old entries are no longer needed.
+
+    :param session: SQLAlchemy session
+    :param rss: The repo/suite to prune the log for
+    :param retention_days: Age in days after which entries are removed.
+    """
+
+    session.execute(
+        delete(ArchiveRepoSuiteChange).where(
+            ArchiveRepoSuiteChange.repo_suite_id == rss.id,
+            ArchiveRepoSuiteChange.time < datetime.now(UTC) - timedelta(days=retention_days),
+        )
+    )
+
+
+def repo_suite_add_changed_slices(session, rss: ArchiveRepoSuiteSettings, slices: T.Iterable[str]):
+    """Record dists/ slices of a repo/suite as changed, and mark it as having unpublished changes.
+
+    The slices are merged into the stored set in the database, so changes recorded concurrently
+    by other processes (e.g. imports while a suite is published) are never overwritten.
+
+    :param session: SQLAlchemy session
+    :param rss: RepoSuite settings to mark
+    :param slices: Names of the changed slices, or "*" if everything may have changed.
+    """
+
+    # ensure the repo/suite settings exist in the database
+    session.flush()
+    session.execute(
+        text('''UPDATE archive_repo_suite_settings
+                SET changes_pending = TRUE,
+                    changed_slices = ARRAY(
+                        SELECT DISTINCT s FROM unnest(changed_slices || CAST(:slices AS text[])) AS s ORDER BY s
+                    )
+                WHERE id = :rss_id'''),
+        {'slices': sorted(set(slices)), 'rss_id': rss.id},
+    )
+    session.expire(rss, ['changes_pending', 'changed_slices'])
+
+
+def repo_suite_remove_changed_slices(session, rss: ArchiveRepoSuiteSettings, slices: T.Iterable[str]):
+    """Remove published dists/ slices from the set of changed slices of a repo/suite.
+
+    Only the given slices are removed, slices recorded as changed in the meantime are kept and the
+    repo/suite stays marked as having pending changes if any remain.
+
+    :param session: SQLAlchemy session
+    :param rss: RepoSuite settings to update
+    :param slices: Names of the slices that were published.
+    """
+
+    session.flush()
+    session.execute(
+        text('''UPDATE archive_repo_suite_settings
+                SET changed_slices = ARRAY(
+                        SELECT s FROM unnest(changed_slices) AS s WHERE s <> ALL(CAST(:slices AS text[])) ORDER BY s
+                    ),
+                    changes_pending = EXISTS(
+                        SELECT 1 FROM unnest(changed_slices) AS s WHERE s <> ALL(CAST(:slices AS text[]))
+                    )
+                WHERE id = :rss_id'''),
+        {'slices': sorted(set(slices)), 'rss_id': rss.id},
+    )
+    session.expire(rss, ['changes_pending', 'changed_slices'])
+
+
+def package_mark_published(
+    session,
+    rss: ArchiveRepoSuiteSettings,
+    pkg: T.Union[SourcePackage, BinaryPackage],
+    *,
+    vmem_cache: T.Optional[dict[tuple[int, str, str], T.Optional[ArchiveVersionMemory]]] = None,
+):
     """
     Mark package as published.
 
-    This updates the version memory and sets a publication date for the package..
+    This updates the version memory, sets a publication date for the package and records
+    the change for the next publication of the suite.
 
     :param session: SQLAlchemy session
     :param rss: RepoSuite settings for this package
     :param pkg: Source or binary package.
+    :param vmem_cache: Optional map of (repo-suite ID, package name, architecture name) to version memory entries,
+                       used instead of querying the database when a key is present, and updated with new entries.
     """
 
     arch_name = 'source' if isinstance(pkg, SourcePackage) else pkg.architecture.name
-    vmem = (
-        session.query(ArchiveVersionMemory)
-        .filter(
-            ArchiveVersionMemory.repo_suite_id == rss.id,
-            ArchiveVersionMemory.pkg_name == pkg.name,
-            ArchiveVersionMemory.arch_name == arch_name,
+    vmem_key = (rss.id, pkg.name, arch_name)
+    if vmem_cache is not None and vmem_key in vmem_cache:
+        vmem = vmem_cache[vmem_key]
+    else:
+        vmem = (
+            session.query(ArchiveVersionMemory)
+            .filter(
+                ArchiveVersionMemory.repo_suite_id == rss.id,
+                ArchiveVersionMemory.pkg_name == pkg.name,
+                ArchiveVersionMemory.arch_name == arch_name,
+            )
+            .one_or_none()
         )
-        .one_or_none()
-    )
 
     if vmem:
         # safety check, so we don't downgrade a version number accidentally (e.g. in case we were
@@ -286,6 +603,8 @@ def package_mark_published(session, rss: ArchiveRepoSuiteSettings, pkg: T.Union[
         vmem.arch_name = arch_name
         vmem.highest_version = pkg.version  # type: ignore[assignment]
         session.add(vmem)
+    if vmem_cache is not None:
+        vmem_cache[vmem_key] = vmem
 
     # "undelete" package, just in case it is marked as deleted
     pkg.time_deleted = None
@@ -294,6 +613,8 @@ def package_mark_published(session, rss: ArchiveRepoSuiteSettings, pkg: T.Union[
     if not pkg.time_published:
         pkg.time_published = datetime.now(UTC)
 
+    repo_suite_mark_changed(session, rss, pkg)
+
 
 def find_latest_source_package(session, rss: ArchiveRepoSuiteSettings, pkgname: str) -> T.Optional[SourcePackage]:
     """Find the most recent source package in a suite.
@@ -9,9 +9,13 @@ from laniakea.ariadne.maintenance import (
     delete_orphaned_jobs,
     remove_superfluous_pending_jobs,
 )
-from laniakea.ariadne.package_jobs import schedule_package_builds_for_source
+from laniakea.ariadne.package_jobs import (
+    BuildScheduleIndex,
+    schedule_package_builds_for_source,
+)
 
 __all__ = [
+    'BuildScheduleIndex',
     'schedule_package_builds_for_source',
     'remove_superfluous_pending_jobs',
     'delete_orphaned_jobs',
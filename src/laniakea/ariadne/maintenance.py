@@ -7,17 +7,23 @@
 import os
 from datetime import UTC, datetime, timedelta
 
+from sqlalchemy import tuple_
+
+import laniakea.typing as T
 from laniakea import LkModule, LocalConfig
 from laniakea.db import (
     Job,
     JobKind,
     JobResult,
     JobStatus,
+    BinaryPackage,
     SourcePackage,
+    ArchiveArchitecture,
     config_get_value,
 )
-from laniakea.utils import get_dir_shorthand_for_uuid
+from laniakea.utils import chunked, get_dir_shorthand_for_uuid
 from laniakea.logging import log
+from laniakea.db.archive import srcpkg_suite_assoc_table
 
 
 def remove_superfluous_pending_jobs(session, simulate: bool = False, arch_indep_affinity: str | None = None):
@@ -40,28 +46,44 @@ def remove_superfluous_pending_jobs(session, simulate: bool = False, arch_indep_
         .filter(Job.status.in_((JobStatus.UNKNOWN, JobStatus.WAITING, JobStatus.DEPWAIT)))
         .all()
     )
+
+    # resolve the source packages of all pending jobs in their target suites
+    job_keys = list({(job.trigger, job.version) for job in pending_jobs if job.suite_id is not None})
+    spkg_map = {}
+    for chunk in chunked(job_keys):
+        for spkg_uuid, source_uuid, version, suite_id in (
+            session.query(
+                SourcePackage.uuid,
+                SourcePackage.source_uuid,
+                SourcePackage.version,
+                srcpkg_suite_assoc_table.c.suite_id,
+            )
+            .join(srcpkg_suite_assoc_table, srcpkg_suite_assoc_table.c.src_package_uuid == SourcePackage.uuid)
+            .filter(tuple_(SourcePackage.source_uuid, SourcePackage.version).in_(chunk))
+        ):
+            spkg_map[(source_uuid, version, suite_id)] = spkg_uuid
+
+    # collect the architectures we have binaries for, for each of these source packages
+    binary_arches: dict[T.Any, set[str]] = {}
+    for chunk in chunked(list(set(spkg_map.values()))):
+        for spkg_uuid, arch_name in (
+            session.query(BinaryPackage.source_id, ArchiveArchitecture.name)
+            .join(BinaryPackage.architecture)
+            .filter(BinaryPackage.source_id.in_(chunk))
+            .distinct()
+        ):
+            if arch_name == 'all':
+                arch_name = arch_indep_affinity
+            binary_arches.setdefault(spkg_uuid, set()).add(arch_name)
+
     for job in pending_jobs:
         # The job only is an orphan if the source package triggering it
         # does no longer exist with the given version number in the target suite.
-        spkg = (
-            session.query(SourcePackage)
-            .filter(SourcePackage.source_uuid == job.trigger)
-            .filter(SourcePackage.version == job.version)
-            .filter(SourcePackage.suites.contains(job.suite))
-            .one_or_none()
-        )
-        if spkg:
+        spkg_uuid = spkg_map.get((job.trigger, job.version, job.suite_id))
+        if spkg_uuid:
             # check if we have binaries on the requested architecture,
             # if so, this job is also no longer needed and can be removed.
-            binaries_available = False
-            for bin in spkg.binaries:
-                bin_arch = bin.architecture.name
-                if bin_arch == 'all':
-                    bin_arch = arch_indep_affinity
-                if bin_arch == job.architecture:
-                    binaries_available = True
-                    break
-            if not binaries_available:
+            if job.architecture not in binary_arches.get(spkg_uuid, set()):
                 continue
 
         # we have no source package for this job, so this job is orphaned and can never be processed.
@@ -87,14 +109,19 @@ def delete_orphaned_jobs(
     lconf = LocalConfig()
     # find all jobs where the source package has gone missing
     pkgbuild_jobs = session.query(Job).filter(Job.module == LkModule.ARIADNE, Job.kind == JobKind.PACKAGE_BUILD).all()
-    for job in pkgbuild_jobs:
-        spkg = (
-            session.query(SourcePackage)
-            .filter(SourcePackage.source_uuid == job.trigger)
-            .filter(SourcePackage.version == job.version)
-            .one_or_none()
+
+    # resolve which of the triggering source packages still exist, in bulk
+    job_keys = list({(job.trigger, job.version) for job in pkgbuild_jobs})
+    existing_spkgs = set()
+    for chunk in chunked(job_keys):
+        existing_spkgs.update(
+            session.query(SourcePackage.source_uuid, SourcePackage.version).filter(
+                tuple_(SourcePackage.source_uuid, SourcePackage.version).in_(chunk)
+            )
         )
-        if not spkg:
+
+    for job in pkgbuild_jobs:
+        if (job.trigger, job.version) not in existing_spkgs:
             log.info(f'Deleting old job {job.uuid} (package that triggered it is no longer available)')
 
             # don't perform any action if we're just simulating
@@ -6,6 +6,7 @@
 
 from sqlalchemy.orm import undefer
 
+import laniakea.typing as T
 from laniakea import LkModule
 from laniakea.db import (
     Job,
@@ -13,35 +14,86 @@ from laniakea.db import (
     JobResult,
     JobStatus,
     PackageType,
+    BinaryPackage,
     DebcheckIssue,
     SourcePackage,
     ArchiveArchitecture,
     ArchiveRepoSuiteSettings,
     config_get_value,
 )
-from laniakea.utils import any_arch_matches
-from laniakea.archive import binaries_exist_for_package
+from laniakea.utils import chunked, any_arch_matches
 from laniakea.logging import log
 
 
-def debcheck_has_issues_for_package(
-    session, rss: ArchiveRepoSuiteSettings, spkg: SourcePackage, arch: ArchiveArchitecture
-):
+class BuildScheduleIndex:
     """
-    Get Debcheck issues related to the given source package.
+    Everything we need to know from the database to decide on build jobs for a set of source packages.
+
+    All data is loaded with a few bulk queries when the index is created, so that scheduling decisions
+    for any number of packages can be made in memory afterwards.
     """
 
-    eq = (
-        session.query(DebcheckIssue)
-        .filter(DebcheckIssue.package_type == PackageType.SOURCE)
-        .filter(DebcheckIssue.repo_id == rss.repo.id)
-        .filter(DebcheckIssue.suite_id == rss.suite.id)
-        .filter(DebcheckIssue.package_name == spkg.name)
-        .filter(DebcheckIssue.package_version == spkg.version)
-        .filter(DebcheckIssue.architectures.contains([arch.name]))
-        .exists()
-    )
-    return session.query(eq).scalar()
+    def __init__(self, session, rss: ArchiveRepoSuiteSettings, spkgs: T.Sequence[SourcePackage]):
+        self._binaries: set[tuple[T.Any, int]] = set()
+        self._debcheck_issues: set[tuple[str, str, str]] = set()
+        self._jobs: dict[tuple[T.Any, str, str], Job] = {}
+
+        spkg_uuids = [spkg.uuid for spkg in spkgs]
+        spkg_names = list({spkg.name for spkg in spkgs})
+        source_uuids = list({spkg.source_uuid for spkg in spkgs})
+
+        # source/architecture pairs that already have binaries in the suite
+        for chunk in chunked(spkg_uuids):
+            self._binaries.update(
+                session.query(BinaryPackage.source_id, BinaryPackage.architecture_id)
+                .filter(
+                    BinaryPackage.repo_id == rss.repo_id,
+                    BinaryPackage.suites.any(id=rss.suite_id),
+                    BinaryPackage.source_id.in_(chunk),
+                )
+                .distinct()
+            )
+
+        # source packages with dependency issues, per architecture
+        for chunk in chunked(spkg_names):
+            for name, version, archs in session.query(
+                DebcheckIssue.package_name, DebcheckIssue.package_version, DebcheckIssue.architectures
+            ).filter(
+                DebcheckIssue.package_type == PackageType.SOURCE,
+                DebcheckIssue.repo_id == rss.repo_id,
+                DebcheckIssue.suite_id == rss.suite_id,
+                DebcheckIssue.package_name.in_(chunk),
+            ):
+                for arch_name in archs:
+                    self._debcheck_issues.add((name, version, arch_name))
+
+        # the oldest job ever created for a source package version on an architecture
+        for chunk in chunked(source_uuids):
+            jobs = (
+                session.query(Job)
+                .options(undefer(Job.status))
+                .options(undefer(Job.result))
+                .filter(Job.trigger.in_(chunk))
+                .order_by(Job.time_created)
+            )
+            for job in jobs:
+                self._jobs.setdefault((job.trigger, job.version, job.architecture), job)
+
+    def binaries_exist(self, spkg: SourcePackage, arch: ArchiveArchitecture) -> bool:
+        """Check if the source package has binaries for the given architecture in the suite."""
+        return (spkg.uuid, arch.id) in self._binaries
+
+    def has_debcheck_issues(self, spkg: SourcePackage, arch: ArchiveArchitecture) -> bool:
+        """Check if the source package has dependency issues on the given architecture."""
+        return (spkg.name, spkg.version, arch.name) in self._debcheck_issues
+
+    def find_job(self, spkg: SourcePackage, arch: ArchiveArchitecture) -> Job | None:
+        """Find the first job that was created for the source package on the given architecture."""
+        return self._jobs.get((spkg.source_uuid, spkg.version, arch.name))
+
+    def add_job(self, job: Job):
+        """Register a newly created job."""
+        self._jobs.setdefault((job.trigger, job.version, job.architecture), job)
 
 
 def schedule_build_for_arch(
@@ -53,15 +105,19 @@ def schedule_build_for_arch(
     enforce_indep=False,
     arch_all=None,
     simulate=False,
+    index: BuildScheduleIndex | None = None,
 ):
     """
     Schedule a job for the given architecture, if the
     package can be built on it and no prior job was scheduled.
     """
 
+    if not index:
+        index = BuildScheduleIndex(session, rss, [spkg])
+
     # check if this package has binaries installed already, in that case we don't
     # need a rebuild.
-    if binaries_exist_for_package(session, rss, spkg, arch):
+    if index.binaries_exist(spkg, arch):
         return False
 
     if enforce_indep:
@@ -69,27 +125,18 @@ def schedule_build_for_arch(
         # we were requested to inforce arch-independent package built on a non-affinity architecture.
         # we have to verify that and check if something hasn't already built arch:all packages in a
         # previous run (or via a package sync) and revise that enforcement hint in such a case.
-        if binaries_exist_for_package(session, rss, spkg, arch_all):
+        if index.binaries_exist(spkg, arch_all):
             enforce_indep = False
 
     # we have no binaries, looks like we might need to schedule a build job
     #
     # check if all dependencies are there, if not we might create a job anyway and
     # set it to wait for dependencies to become available
-    has_dependency_issues = debcheck_has_issues_for_package(session, rss, spkg, arch)
+    has_dependency_issues = index.has_debcheck_issues(spkg, arch)
 
     # check if we have already scheduled a job for this in the past and don't create
     # another one in that case
-    job = (
-        session.query(Job)
-        .options(undefer(Job.status))
-        .options(undefer(Job.result))
-        .filter(Job.trigger == spkg.source_uuid)
-        .filter(Job.version == spkg.version)
-        .filter(Job.architecture == arch.name)
-        .order_by(Job.time_created)
-        .first()
-    )
+    job = index.find_job(spkg, arch)
     if job:
         if has_dependency_issues:
             # dependency issues and an already existing job means there is nothing to
@@ -134,6 +181,7 @@ def schedule_build_for_arch(
         if has_dependency_issues:
             job.status = JobStatus.DEPWAIT
         session.add(job)
+        index.add_job(job)
 
     return True
 
@@ -147,6 +195,7 @@ def schedule_package_builds_for_source(
     arch_all: ArchiveArchitecture | None = None,
     simulate: bool = False,
     arch_indep_affinity: str | None = None,
+    index: BuildScheduleIndex | None = None,
 ) -> int:
     """
     Schedule a build job for the given source package on the given repo/suite if required.
@@ -158,9 +207,13 @@ def schedule_package_builds_for_source(
     :param arch_all: Entity of the arch:all architecture
     :param simulate: Whether to only simulate instead of actually scheduling anything.
     :param arch_indep_affinity: Architecture affinity for arch:all-only packages
+    :param index: Precomputed scheduling data containing this source package, if available
     :return: The number of scheduled jobs
     """
 
+    if not index:
+        index = BuildScheduleIndex(session, rss, [spkg])
+
     if not arch_all:
         for arch in rss.suite.architectures:
             if arch.name == 'all':
@@ -184,7 +237,7 @@ def schedule_package_builds_for_source(
         if not any_arch_matches(arch_all.name, spkg.architectures):
             return 0
 
-        return 1 if schedule_build_for_arch(session, rss, spkg, arch_all, simulate=simulate) else 0
+        return 1 if schedule_build_for_arch(session, rss, spkg, arch_all, simulate=simulate, index=index) else 0
 
     if not arch_indep_affinity:
         arch_indep_affinity = config_get_value(LkModule.ARIADNE, 'indep_arch_affinity')
@@ -225,6 +278,7 @@ def schedule_package_builds_for_source(
             enforce_indep=force_indep,
             arch_all=arch_all,
             simulate=simulate,
+            index=index,
         ):
             scheduled_count += 1
 
@@ -411,9 +411,13 @@ class ArchiveRepoSuiteSettings(Base):
     but_automatic_upgrades: Mapped[bool] = mapped_column(Boolean(), default=False)
     valid_time: Mapped[int] = mapped_column(Integer, default=604800)
     phased_update_delay: Mapped[int] = mapped_column(Integer, default=0)
+    # time in seconds to keep by-hash files around after they were last referenced
+    byhash_retention: Mapped[int] = mapped_column(Integer, default=1209600)
     signingkeys: Mapped[list[str]] = mapped_column(ARRAY(String(64)), default=[])
     announce_emails: Mapped[list[str]] = mapped_column(ARRAY(Text()), default=[])
     changes_pending: Mapped[bool] = mapped_column(Boolean(), default=True)
+    # dists/ subdirectories (e.g. "main/binary-amd64") with unpublished changes, "*" if all may have changed
+    changed_slices: Mapped[list[str]] = mapped_column(ARRAY(Text()), default=[])
     time_published: Mapped[datetime] = mapped_column(DateTime(), default=datetime.fromtimestamp(0, UTC))
 
     def __init__(self, repo: ArchiveRepository, suite: ArchiveSuite):
@@ -1184,6 +1188,95 @@ idx_pkgs_binary_repo_source_arch = Index(
 )
 
 
+class LatestSourcePackage(Base):
+    """
+    The most recent version of a source package in a repository/suite/component.
+    This is maintained when packages are added to or removed from suites, so we do not
+    need to determine the newest versions from all packages in a suite every time.
+    """
+
+    __tablename__ = 'archive_latest_pkgs_source'
+
+    repo_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_repositories.id', ondelete='cascade'), primary_key=True
+    )
+    suite_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_suites.id', ondelete='cascade'), primary_key=True
+    )
+    component_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_components.id', ondelete='cascade'), primary_key=True
+    )
+    name: Mapped[str] = mapped_column(String(200), primary_key=True)  # Source package name
+
+    version: Mapped[str] = mapped_column(DebVersion())  # Version of the most recent package
+    pkg_uuid: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey('archive_pkgs_source.uuid', ondelete='cascade'), nullable=False
+    )
+    pkg: Mapped['SourcePackage'] = relationship('SourcePackage')  # The most recent package
+
+
+class LatestBinaryPackage(Base):
+    """
+    The most recent version of a binary package in a repository/suite/component/architecture.
+    This is maintained when packages are added to or removed from suites, so we do not
+    need to determine the newest versions from all packages in a suite every time.
+    """
+
+    __tablename__ = 'archive_latest_pkgs_binary'
+
+    repo_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_repositories.id', ondelete='cascade'), primary_key=True
+    )
+    suite_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_suites.id', ondelete='cascade'), primary_key=True
+    )
+    component_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_components.id', ondelete='cascade'), primary_key=True
+    )
+    architecture_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_architectures.id', ondelete='cascade'), primary_key=True
+    )
+    deb_type: Mapped[DebType] = mapped_column(Enum(DebType), primary_key=True)
+    name: Mapped[str] = mapped_column(String(200), primary_key=True)  # Binary package name
+
+    version: Mapped[str] = mapped_column(DebVersion())  # Version of the most recent package
+    pkg_uuid: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey('archive_pkgs_binary.uuid', ondelete='cascade'), nullable=False
+    )
+    pkg: Mapped['BinaryPackage'] = relationship('BinaryPackage')  # The most recent package
+
+
+class ArchiveRepoSuiteChange(Base):
+    """
+    Record of a package that was added to or removed from a repository/suite.
+    Packages keep their timestamps when they are copied or migrated between suites, so tools which
+    process suites incrementally use this log to find all packages affected by changes since their last run.
+    """
+
+    __tablename__ = 'archive_repo_suite_changes'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+
+    repo_suite_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('archive_repo_suite_settings.id', ondelete='cascade'), nullable=False
+    )
+    repo_suite: Mapped['ArchiveRepoSuiteSettings'] = relationship('ArchiveRepoSuiteSettings')
+
+    time: Mapped[datetime] = mapped_column(
+        DateTime(), default=lambda: datetime.now(UTC), nullable=False
+    )  # Time when the change was made
+    pkg_type: Mapped[PackageType] = mapped_column(Enum(PackageType))
+    pkg_name: Mapped[str] = mapped_column(String(200))  # Name of the package that was added or removed
+    source_name: Mapped[str] = mapped_column(String(200), nullable=True)  # Name of the source package it belongs to
+
+
+idx_repo_suite_changes_rss_time = Index(
+    'idx_repo_suite_changes_rss_time',
+    ArchiveRepoSuiteChange.repo_suite_id,
+    ArchiveRepoSuiteChange.time,
+)
+
+
 def package_version_compare(pkg1: SourcePackage | BinaryPackage, pkg2: SourcePackage | BinaryPackage):
     """Comparison function helper to compare package versions."""
     return apt_pkg.version_compare(pkg1.version, pkg2.version)
@@ -69,6 +69,9 @@ class LocalConfig:
         servers_submit: T.List[str] = field(default_factory=list)
         servers_publish: T.List[str] = field(default_factory=list)
 
+        event_signers: int = 2
+        event_batch_size: int = 1
+
     instance = None
 
     class __LocalConfig:
@@ -129,6 +132,8 @@ class LocalConfig:
             self._master_repo_name = carchive.get('master_repo_name', 'master')
             self._archive_root_dir = carchive.get('path', '/nonexistent')
             self._archive_queue_dir = carchive.get('queue_path', os.path.join(self._workspace, 'archive-queues'))
+            # private state of archive management tools, which must not be published with the archive
+            self._archive_state_dir = carchive.get('state_path', os.path.join(self._workspace, 'archive-state'))
             self._archive_url = carchive.get('url', '#')
             self._archive_appstream_media_url = carchive.get(
                 'appstream_media_url', 'https://appstream.debian.org/media/pool'
@@ -151,6 +156,9 @@ class LocalConfig:
             self._lighthouse.servers_submit = listify(lhconf_servers.get('submit'))
             self._lighthouse.servers_publish = listify(lhconf_servers.get('publish'))
 
+            self._lighthouse.event_signers = max(int(lhconf.get('event_signers', 2)), 1)
+            self._lighthouse.event_batch_size = max(int(lhconf.get('event_batch_size', 1)), 1)
+
             # Synchrotron-specific configuration
             self._synchrotron_sourcekeyrings = []
             syncconf = cdata.get('Synchrotron')
@@ -223,6 +231,10 @@ class LocalConfig:
         def archive_queue_dir(self) -> str:
             return self._archive_queue_dir
 
+        @property
+        def archive_state_dir(self) -> str:
+            return self._archive_state_dir
+
         @property
         def archive_queue_url(self) -> str:
             """URL where a human user can view the archive queue(s), like the NEW queue"""
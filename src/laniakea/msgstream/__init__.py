@@ -1,9 +1,11 @@
 from laniakea.msgstream.signing import keyfile_read_verify_key, keyfile_read_signing_key
 from laniakea.msgstream.event_msg import (
     EventEmitter,
+    EventMessageVerifier,
     create_message_tag,
     create_event_message,
     create_submit_socket,
+    event_message_unpack,
     submit_event_message,
     verify_event_message,
     create_event_listen_socket,
@@ -16,6 +18,7 @@ __all__ = [
     'create_event_message',
     'verify_event_message',
     'event_message_is_valid_and_signed',
+    'event_message_unpack',
     'SignatureVerifyException',
     'keyfile_read_verify_key',
     'keyfile_read_signing_key',
@@ -23,4 +26,5 @@ __all__ = [
     'submit_event_message',
     'create_event_listen_socket',
     'EventEmitter',
+    'EventMessageVerifier',
 ]
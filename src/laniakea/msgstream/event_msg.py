@@ -5,9 +5,12 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import os
+import json
 import uuid
 import random
+import hashlib
 from datetime import datetime
+from collections import OrderedDict
 
 import zmq
 
@@ -20,7 +23,15 @@ from laniakea.msgstream.signing import (
     keyfile_read_signing_key,
     decode_signing_key_base64,
 )
-from laniakea.msgstream.signedjson import sign_json, verify_signed_json
+from laniakea.msgstream.signedjson import (
+    SignatureVerifyException,
+    sign_json,
+    verify_signed_json,
+    verify_signed_json_bytes,
+)
+
+# format identifier of messages bundling multiple events
+EVENT_BATCH_FORMAT = '1.0-batch'
 
 
 def create_message_tag(module, subject):
@@ -44,6 +55,32 @@ def create_event_message(sender, tag, data, key):
     return sign_json(msg, sender, key)
 
 
+def create_event_batch_message(events: list[dict]) -> dict:
+    '''
+    Bundle multiple event messages with the same tag into one (unsigned) batch message.
+    '''
+
+    return {
+        'tag': events[0]['tag'],
+        'uuid': str(uuid.uuid1()),
+        'format': EVENT_BATCH_FORMAT,
+        'time': datetime.now().isoformat(),
+        'data': {'events': events},
+    }
+
+
+def event_message_unpack(event) -> list[dict]:
+    '''
+    Get the individual events contained in an event message.
+
+    Batch messages are split into their events, any other message is returned as-is.
+    '''
+
+    if event.get('format') != EVENT_BATCH_FORMAT:
+        return [event]
+    return event['data'].get('events', [])
+
+
 def event_message_is_valid_and_signed(event):
     '''
     Check if an event message is valid and has signatures attached.
@@ -80,6 +117,66 @@ def verify_event_message(sender, event, key, assume_valid=False):
     verify_signed_json(event, sender, key)  # this will raise an error if validation fails
 
 
+class EventMessageVerifier:
+    '''
+    Decode and verify event messages from a set of trusted signers.
+
+    Signatures are checked against the received data where possible, and messages that were
+    verified recently are remembered, so relayed duplicates do not need to be verified again.
+    '''
+
+    def __init__(self, trusted_keys: dict, cache_size: int = 4096):
+        self._trusted_keys = trusted_keys
+        self._cache_size = cache_size
+        self._verified: OrderedDict[tuple[str, bytes], None] = OrderedDict()
+
+    def decode(self, data: bytes) -> dict | None:
+        '''
+        Decode an event message, returning None if it is not a valid, signed event.
+        '''
+        try:
+            event = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            # we ignore invalid messages
+            log.debug('Received invalid JSON message: %s (%s)', data, str(e))
+            return None
+        if type(event) is not dict or not event_message_is_valid_and_signed(event):
+            return None
+        return event
+
+    def verify(self, data: bytes, event: dict) -> bool:
+        '''
+        Check if the event is signed by a trusted signer.
+
+        :param data: The raw data the event was decoded from.
+        :param event: The decoded event.
+        :return: True if the first trusted signature on the event is valid.
+        '''
+
+        for signer in event['signatures'].keys():
+            key = self._trusted_keys.get(signer)
+            if not key:
+                continue
+
+            cache_key = (signer, hashlib.blake2b(data, digest_size=20).digest())
+            if cache_key in self._verified:
+                self._verified.move_to_end(cache_key)
+                return True
+
+            try:
+                verify_signed_json_bytes(data, event, signer, key)
+            except SignatureVerifyException as e:
+                log.info('Invalid signature on event ({}): {}'.format(str(e), str(event)))
+                return False
+
+            self._verified[cache_key] = None
+            if len(self._verified) > self._cache_size:
+                self._verified.popitem(last=False)
+            return True
+
+        return False
+
+
 def create_submit_socket(zmq_context):
     '''
     Create a ZeroMQ socket that is connected to a Lighthouse instance in order
@@ -174,6 +271,17 @@ class EventEmitter:
         tag = create_message_tag(mod, subject)
         submit_event_message(self._socket, self._signer_id, tag, data, self._signing_key)
 
+    def submit_events_for_mod(self, mod, subject, data_list):
+        '''
+        Submit a batch of events of the same kind for a different
+        module than what the :EventEmitter was created for.
+        '''
+        if not self._socket:
+            return
+        tag = create_message_tag(mod, subject)
+        for data in data_list:
+            submit_event_message(self._socket, self._signer_id, tag, data, self._signing_key)
+
     def submit_event_for_tag(self, tag, data):
         '''
         Submit and event and set a custom tag.
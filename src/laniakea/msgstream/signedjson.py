@@ -105,3 +105,40 @@ def verify_signed_json(json_object, signature_name, verify_key):
     except Exception:
         log.exception('Error verifying signature')
         raise SignatureVerifyException('Unable to verify signature for {}'.format(signature_name))
+
+
+def verify_signed_json_bytes(json_bytes: bytes, json_object, signature_name, verify_key):
+    '''
+    Check a signature on a signed JSON object, using the serialized data it was decoded from.
+
+    If the JSON object was received in its compact canonical form, the signed message is recreated
+    by cutting the signatures out of the received data, which avoids serializing the object again.
+    Otherwise, this falls back to :func:`verify_signed_json`.
+
+    Args:
+        json_bytes (bytes): The data the JSON object was decoded from.
+        json_object (dict): The signed JSON object to check.
+        signature_name (str): The name of the signature to check.
+        verify_key (syutil.crypto.VerifyKey): The key to verify the signature.
+
+    Raises:
+        InvalidSignature: If the signature isn't valid
+    '''
+
+    signatures = json_object.get('signatures')
+    if signatures and 'unsigned' not in json_object:
+        key_id = '%s:%s' % (verify_key.alg, verify_key.version)
+        signature_b64 = signatures.get(signature_name, {}).get(key_id)
+        sig_member = b',"signatures":' + json_compact_dump(signatures, as_bytes=True)
+        pos = json_bytes.find(sig_member)
+        if signature_b64 and pos > 0:
+            # Any data that verifies here was signed without a signatures member, so the member we cut out
+            # must have been the top-level one, and the decoded object matches the signed message.
+            message = json_bytes[:pos] + json_bytes[pos + len(sig_member) :]
+            try:
+                verify_key.verify(message, decode_base64(signature_b64))
+                return
+            except Exception:
+                pass  # the data may just not be canonical, check the slow way
+
+    verify_signed_json(json_object, signature_name, verify_key)
@@ -5,13 +5,22 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import os
-
+import time
+import pickle
+import hashlib
+import threading
+from sys import intern
+from email.utils import formatdate, parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 from apt_pkg import (
     Hashes,
     TagFile,
     TagSection,
     version_compare,
 )
+from requests.adapters import HTTPAdapter
 
 import laniakea.typing as T
 from laniakea.db import (
@@ -26,34 +35,142 @@ from laniakea.db import (
     ArchiveRepository,
     ArchiveArchitecture,
 )
-from laniakea.utils import split_strip, download_file, is_remote_url
+from laniakea.utils import split_strip, is_remote_url
 from laniakea.logging import log
 from laniakea.utils.gpg import SignedFile
 from laniakea.localconfig import LocalConfig
 from laniakea.archive.utils import parse_package_list
 
+# fields of Sources and Packages index stanzas that we read, and keep in the parsed-index cache
+SOURCES_INDEX_FIELDS = (
+    'Package',
+    'Version',
+    'Extra-Source-Only',
+    'Architecture',
+    'Standards-Version',
+    'Format',
+    'Vcs-Browser',
+    'Homepage',
+    'Maintainer',
+    'Uploaders',
+    'Build-Depends',
+    'Directory',
+    'Checksums-Sha256',
+    'Package-List',
+    'Binary',
+    'Section',
+    'Essential',
+    'Priority',
+)
+PACKAGES_INDEX_FIELDS = (
+    'Package',
+    'Version',
+    'Architecture',
+    'Maintainer',
+    'Source',
+    'Installed-Size',
+    'Depends',
+    'Pre-Depends',
+    'Homepage',
+    'Section',
+    'Priority',
+    'Essential',
+    'Description',
+    'Description-md5',
+    'Filename',
+    'Size',
+    'SHA256',
+)
+
+# time in seconds after which unused entries are removed from the parsed-index cache
+INDEX_CACHE_MAX_AGE = 14 * 24 * 60 * 60
+
+
+class _LazySplitField:
+    """
+    Descriptor for a list field that is split from its raw string value on first access.
+
+    The raw value is stored in a slot named like the field, prefixed with an underscore.
+    Most consumers never look at these fields, so we don't pay for the list allocations.
+    """
+
+    __slots__ = ('_slot', '_sep')
+
+    def __init__(self, sep: str):
+        self._sep = sep
+        self._slot = ''
+
+    def __set_name__(self, owner, name):
+        self._slot = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self._slot)
+        if isinstance(value, str):
+            value = split_strip(value, self._sep)
+            setattr(obj, self._slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self._slot, value)
+
 
 class ExternalSourcePackage:
     """Describes a source package coming from an external source."""
 
+    __slots__ = (
+        'name',
+        'version',
+        'repo',
+        'suites',
+        'component',
+        'section',
+        'architectures',
+        'standards_version',
+        'format_version',
+        'maintainer',
+        'original_maintainer',
+        '_uploaders',
+        'homepage',
+        'vcs_browser',
+        'vcs_git',
+        'summary',
+        'description',
+        'extra_source_only',
+        'testsuite',
+        'testsuite_triggers',
+        'changes_urgency',
+        '_build_depends',
+        'build_depends_indep',
+        'build_depends_arch',
+        'build_conflicts',
+        'build_conflicts_indep',
+        'build_conflicts_arch',
+        'directory',
+        '_files',
+        'expected_binaries',
+        'extra_data',
+    )
+
     name: str  # Source package name
     version: str  # Version of this package
 
     repo: ArchiveRepository
-    suites: list[ArchiveSuite] = []  # Suites this package is in
+    suites: list[ArchiveSuite]  # Suites this package is in
 
     component: ArchiveComponent  # Component this package is in
 
     section: ArchiveSection  # Section of the source package
 
-    architectures: list[str] = []  # List of architectures this source package can be built for
+    architectures: list[str]  # List of architectures this source package can be built for
 
     standards_version: T.Optional[str]
     format_version: T.Optional[str]
 
     maintainer: str
     original_maintainer: T.Optional[str]
-    uploaders: list[str] = []
+    uploaders = _LazySplitField(',')
 
     homepage: T.Optional[str]  # homepage URL of this package
     vcs_browser: T.Optional[str]  # VCS browser URL
@@ -62,52 +179,138 @@ class ExternalSourcePackage:
     summary: T.Optional[str]
     description: T.Optional[str]
 
-    extra_source_only: bool = False  # True if package is only kept around for compliance reasons and has no binaries
+    extra_source_only: bool  # True if package is only kept around for compliance reasons and has no binaries
 
-    testsuite: list[str] = []  # list of testsuite types this package contains
-    testsuite_triggers: list[str] = []  # list of package names that trigger the testsuite
+    testsuite: list[str]  # list of testsuite types this package contains
+    testsuite_triggers: list[str]  # list of package names that trigger the testsuite
 
     # value for how important it is to upgrade to this package version from previous ones
-    changes_urgency: ChangesUrgency = ChangesUrgency.MEDIUM
+    changes_urgency: ChangesUrgency
 
     # see https://www.debian.org/doc/debian-policy/ch-relationships.html
-    build_depends: list[str] = []
-    build_depends_indep: list[str] = []
-    build_depends_arch: list[str] = []
+    build_depends = _LazySplitField(',')
+    build_depends_indep: list[str]
+    build_depends_arch: list[str]
 
-    build_conflicts: list[str] = []
-    build_conflicts_indep: list[str] = []
-    build_conflicts_arch: list[str] = []
+    build_conflicts: list[str]
+    build_conflicts_indep: list[str]
+    build_conflicts_arch: list[str]
 
     directory: T.Optional[str]  # pool directory name for the sources
-    files: list[ArchiveFile]  # Files that make this source package
 
-    expected_binaries: list[PackageInfo] = []
+    expected_binaries: list[PackageInfo]
 
-    extra_data: dict[str, T.Any] = {}
+    extra_data: dict[str, T.Any]
 
     def __init__(self, name, version):
         self.name = name
         self.version = version
 
+        self.repo = None
+        self.suites = []
+        self.component = None
+        self.section = None
+        self.architectures = []
+        self.standards_version = None
+        self.format_version = None
+        self.maintainer = None
+        self.original_maintainer = None
+        self._uploaders = []
+        self.homepage = None
+        self.vcs_browser = None
+        self.vcs_git = None
+        self.summary = None
+        self.description = None
+        self.extra_source_only = False
+        self.testsuite = []
+        self.testsuite_triggers = []
+        self.changes_urgency = ChangesUrgency.MEDIUM
+        self._build_depends = []
+        self.build_depends_indep = []
+        self.build_depends_arch = []
+        self.build_conflicts = []
+        self.build_conflicts_indep = []
+        self.build_conflicts_arch = []
+        self.directory = None
+        self._files = []
+        self.expected_binaries = []
+        self.extra_data = {}
+
+    @property
+    def files(self) -> list[ArchiveFile]:
+        """Files that make this source package"""
+        if isinstance(self._files, str):
+            self._files = parse_checksums_list(self._files, self.directory)
+        return self._files
+
+    @files.setter
+    def files(self, value: list[ArchiveFile]):
+        self._files = value
+
 
 class ExternalPackageOverride:
     """
     Organization data of an external binary package.
     """
 
+    __slots__ = ('essential', 'priority', 'component', 'section')
+
     essential: bool
-    priority: PackagePriority = PackagePriority.OPTIONAL
+    priority: PackagePriority
 
     component: ArchiveComponent
 
     section: str
 
+    def __init__(self):
+        self.essential = False
+        self.priority = PackagePriority.OPTIONAL
+        self.component = None
+        self.section = None
+
 
 class ExternalBinaryPackage:
     """Describes a binary package coming from an external source."""
 
-    deb_type: DebType = DebType.DEB  # Deb package type
+    __slots__ = (
+        'deb_type',
+        'name',
+        'version',
+        'source_name',
+        'source_version',
+        'repo',
+        'suites',
+        'component',
+        'architecture',
+        'source',
+        'size_installed',
+        'override',
+        'summary',
+        'description',
+        'description_md5',
+        '_depends',
+        '_pre_depends',
+        'replaces',
+        'provides',
+        'recommends',
+        'suggests',
+        'enhances',
+        'conflicts',
+        'breaks',
+        'built_using',
+        'static_built_using',
+        'build_ids',
+        'maintainer',
+        'original_maintainer',
+        'homepage',
+        'multi_arch',
+        'phased_update_percentage',
+        '_bin_file',
+        'contents',
+        'extra_data',
+    )
+
+    deb_type: DebType  # Deb package type
 
     name: str  # Package name
     version: str  # Version of this package
@@ -117,14 +320,14 @@ class ExternalBinaryPackage:
 
     repo: ArchiveRepository  # Repository this package belongs to
 
-    suites: list[ArchiveSuite] = []  # Suites this package is in
+    suites: list[ArchiveSuite]  # Suites this package is in
     component: ArchiveComponent  # Component this package is in
 
     architecture: ArchiveArchitecture  # Architecture this binary was built for
 
     source: ExternalSourcePackage
 
-    size_installed: int = 0  # Size of the installed package
+    size_installed: int  # Size of the installed package
 
     override: ExternalPackageOverride
 
@@ -132,21 +335,21 @@ class ExternalBinaryPackage:
     description: T.Optional[str]
     description_md5: T.Optional[str]
 
-    depends: list[str] = []
-    pre_depends: list[str] = []
+    depends = _LazySplitField(',')
+    pre_depends = _LazySplitField(',')
 
-    replaces: list[str] = []
-    provides: list[str] = []
-    recommends: list[str] = []
-    suggests: list[str] = []
-    enhances: list[str] = []
-    conflicts: list[str] = []
-    breaks: list[str] = []
+    replaces: list[str]
+    provides: list[str]
+    recommends: list[str]
+    suggests: list[str]
+    enhances: list[str]
+    conflicts: list[str]
+    breaks: list[str]
 
-    built_using: list[str] = []
-    static_built_using: list[str] = []
+    built_using: list[str]
+    static_built_using: list[str]
 
-    build_ids: list[str] = []
+    build_ids: list[str]
 
     maintainer: T.Optional[str]
     original_maintainer: T.Optional[str]
@@ -154,11 +357,9 @@ class ExternalBinaryPackage:
 
     multi_arch: T.Optional[str]
 
-    phased_update_percentage: int = 100
+    phased_update_percentage: int
 
-    bin_file: ArchiveFile = None
-
-    contents: list[str] = []  # List of filenames that this package contains
+    contents: list[str]  # List of filenames that this package contains
 
     # Additional key-value metadata that may be specific to this package
     extra_data: dict[str, T.Any]
@@ -167,6 +368,55 @@ class ExternalBinaryPackage:
         self.name = name
         self.version = version
 
+        self.deb_type = DebType.DEB
+        self.source_name = None
+        self.source_version = None
+        self.repo = None
+        self.suites = []
+        self.component = None
+        self.architecture = None
+        self.source = None
+        self.size_installed = 0
+        self.override = None
+        self.summary = None
+        self.description = None
+        self.description_md5 = None
+        self._depends = []
+        self._pre_depends = []
+        self.replaces = []
+        self.provides = []
+        self.recommends = []
+        self.suggests = []
+        self.enhances = []
+        self.conflicts = []
+        self.breaks = []
+        self.built_using = []
+        self.static_built_using = []
+        self.build_ids = []
+        self.maintainer = None
+        self.original_maintainer = None
+        self.homepage = None
+        self.multi_arch = None
+        self.phased_update_percentage = 100
+        self._bin_file = None
+        self.contents = []
+        self.extra_data = {}
+
+    @property
+    def bin_file(self) -> T.Optional[ArchiveFile]:
+        """The .deb file of this package"""
+        if isinstance(self._bin_file, tuple):
+            # only create the (comparatively heavy) database object when somebody needs it
+            fname, size, sha256sum = self._bin_file
+            self._bin_file = ArchiveFile(fname)
+            self._bin_file.size = size
+            self._bin_file.sha256sum = sha256sum
+        return self._bin_file
+
+    @bin_file.setter
+    def bin_file(self, value: T.Optional[ArchiveFile]):
+        self._bin_file = value
+
 
 def parse_checksums_list(data, base_dir=None):
     files = []
@@ -202,6 +452,166 @@ def version_revision(version: str, full_for_native: bool = True) -> str:
     return version[idx + 1 :]
 
 
+def _sha256sum_file(fname: T.PathUnion) -> str:
+    """Calculate the SHA256 checksum of a file."""
+    h = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        while chunk := f.read(RepoFileDownloader.CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RepoFileDownloader:
+    """
+    Download files from a remote repository into a local cache directory.
+
+    All requests share one pooled HTTP session. Files whose cached copy already matches the
+    expected checksum are not downloaded again, files without a known checksum are only
+    fetched if they changed on the server, and interrupted downloads are resumed.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, base_url: str, cache_dir: T.PathUnion, *, max_parallel: int = 4):
+        """
+        :param base_url: Root URL of the remote repository.
+        :param cache_dir: Local directory to mirror the repository files to.
+        :param max_parallel: Maximum number of files to fetch at the same time.
+        """
+        self._base_url = base_url
+        self._cache_dir = cache_dir
+        self._max_parallel = max(1, max_parallel)
+        self._session_lock = threading.Lock()
+        self._session: T.Optional[requests.Session] = None
+        self._file_locks: dict[str, threading.Lock] = {}
+
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            if not self._session:
+                adapter = HTTPAdapter(
+                    pool_connections=self._max_parallel, pool_maxsize=self._max_parallel, max_retries=3
+                )
+                self._session = requests.Session()
+                self._session.headers.update({'user-agent': 'laniakea/0.0.1'})
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
+
+    def close(self):
+        """Close all pooled connections."""
+        with self._session_lock:
+            if self._session:
+                self._session.close()
+                self._session = None
+
+    def _stream_to(self, r: requests.Response, fname: str, mode: str, sha256h: T.Optional[T.Any] = None):
+        with open(fname, mode) as f:
+            for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
+                f.write(chunk)
+                if sha256h:
+                    sha256h.update(chunk)
+
+    def fetch(
+        self, location: str, *, sha256sum: T.Optional[str] = None, size: T.Optional[int] = None, check: bool = False
+    ) -> T.Optional[str]:
+        """Download a single file, if necessary.
+
+        :param location: Location of the file relative to the repository root.
+        :param sha256sum: Expected SHA256 checksum of the file. A cached copy that matches it is used as-is,
+                          and the downloaded data is validated against it.
+        :param size: Expected size of the file, if known.
+        :param check: Raise an error if the file could not be retrieved.
+        :return: Path to the local copy of the file, or None if it could not be retrieved.
+        """
+        # ensure we never write to the same file from multiple threads
+        with self._session_lock:
+            file_lock = self._file_locks.setdefault(location, threading.Lock())
+        with file_lock:
+            return self._fetch_locked(location, sha256sum=sha256sum, size=size, check=check)
+
+    def _fetch_locked(
+        self, location: str, *, sha256sum: T.Optional[str], size: T.Optional[int], check: bool
+    ) -> T.Optional[str]:
+        url = os.path.join(self._base_url, location)
+        target_fname = os.path.join(self._cache_dir, location)
+        partial_fname = target_fname + '.partial'
+        os.makedirs(os.path.dirname(target_fname), exist_ok=True)
+
+        headers = {}
+        if os.path.isfile(target_fname):
+            if sha256sum:
+                # skip the download if our cached copy is still valid
+                size_matches = size is None or os.path.getsize(target_fname) == size
+                if size_matches and _sha256sum_file(target_fname) == sha256sum:
+                    return target_fname
+            else:
+                # no checksum to compare against, so we let the server tell us if the file has changed
+                headers['If-Modified-Since'] = formatdate(os.path.getmtime(target_fname), usegmt=True)
+
+        sha256h = None
+        offset = os.path.getsize(partial_fname) if os.path.isfile(partial_fname) else 0
+        if offset > 0 and sha256sum:
+            # resume an interrupted download, we can only verify the result if we know its checksum
+            sha256h = hashlib.sha256()
+            with open(partial_fname, 'rb') as f:
+                while chunk := f.read(self.CHUNK_SIZE):
+                    sha256h.update(chunk)
+            headers['Range'] = 'bytes={}-'.format(offset)
+            headers.pop('If-Modified-Since', None)
+        elif sha256sum:
+            sha256h = hashlib.sha256()
+
+        with self.session.get(url, stream=True, headers=headers, timeout=60) as r:
+            if r.status_code == 304:
+                return target_fname
+            if r.status_code == 206 and 'Range' in headers:
+                self._stream_to(r, partial_fname, 'ab', sha256h)
+            elif r.status_code == 200:
+                if sha256sum:
+                    sha256h = hashlib.sha256()
+                self._stream_to(r, partial_fname, 'wb', sha256h)
+            elif r.status_code == 416 and 'Range' in headers:
+                # our partial file is bogus, start from scratch
+                os.remove(partial_fname)
+                return self._fetch_locked(location, sha256sum=sha256sum, size=size, check=check)
+            else:
+                if check:
+                    raise Exception('Unable to download file "{}". Status: {}'.format(url, r.status_code))
+                log.debug('Unable to download file "%s". Status: %s', url, r.status_code)
+                return None
+            last_modified = r.headers.get('Last-Modified')
+
+        if sha256h and sha256h.hexdigest() != sha256sum:
+            os.remove(partial_fname)
+            raise Exception(
+                'Checksum validation of "{}" failed ({} != {}).'.format(location, sha256h.hexdigest(), sha256sum)
+            )
+        os.replace(partial_fname, target_fname)
+        if last_modified:
+            try:
+                mtime = parsedate_to_datetime(last_modified).timestamp()
+                os.utime(target_fname, (mtime, mtime))
+            except (TypeError, ValueError):
+                pass
+
+        return target_fname
+
+    def fetch_many(self, afiles: T.Sequence[ArchiveFile]) -> list[str]:
+        """Download multiple files in parallel, validating them against their known checksums.
+
+        :param afiles: The files to fetch.
+        :return: Paths to the local copies of the files, in the same order as the input.
+        """
+        if len(afiles) <= 1:
+            return [self.fetch(af.fname, sha256sum=af.sha256sum, size=af.size, check=True) for af in afiles]
+        with ThreadPoolExecutor(max_workers=min(self._max_parallel, len(afiles))) as executor:
+            futures = [
+                executor.submit(self.fetch, af.fname, sha256sum=af.sha256sum, size=af.size, check=True) for af in afiles
+            ]
+            return [f.result() for f in futures]
+
+
 class RepositoryReader:
     '''
     Allows reading data from a Debian repository.
@@ -210,7 +620,15 @@ class RepositoryReader:
     class InReleaseData:
         files: list[ArchiveFile] = []
 
-    def __init__(self, location, repo_name=None, trusted_keyrings: list[str] = None, entity=None):
+    def __init__(
+        self,
+        location,
+        repo_name=None,
+        trusted_keyrings: list[str] = None,
+        entity=None,
+        *,
+        max_parallel_downloads: int = 4,
+    ):
         if not trusted_keyrings:
             trusted_keyrings = []
 
@@ -221,9 +639,11 @@ class RepositoryReader:
             self._root_dir = os.path.join(self._lconf.cache_dir, 'repo_cache', repo_name)
             os.makedirs(self._root_dir, exist_ok=True)
             self._repo_url = location
+            self._downloader = RepoFileDownloader(location, self._root_dir, max_parallel=max_parallel_downloads)
         else:
             self._root_dir = location
             self._repo_url = None
+            self._downloader = None
 
         self._keyrings = trusted_keyrings
         self._trusted = False
@@ -235,6 +655,7 @@ class RepositoryReader:
             self._repo_entity = ArchiveRepository(self._name)
 
         self._inrelease: dict[str, RepositoryReader.InReleaseData] = {}  # pylint: disable=used-before-assignment
+        self._index_cache_dir = os.path.join(self._lconf.cache_dir, 'repo_index_cache')
 
     @property
     def base_dir(self) -> str:
@@ -258,26 +679,40 @@ class RepositoryReader:
             log.debug('Explicitly marked repository "{}" as trusted.'.format(self.location))
 
     def cleanup(self):
-        """Remove any cruft from temporary locations."""
+        """Remove downloaded package files and interrupted downloads from the local cache.
+
+        The repository index files in dists/ are kept, so unchanged ones don't need to be downloaded
+        again the next time this repository is read.
+        """
         import shutil
 
-        if self._repo_url and self._root_dir.startswith(self._lconf.cache_dir):
-            shutil.rmtree(self._root_dir)
+        if self._downloader:
+            self._downloader.close()
+        if not self._repo_url or not self._root_dir.startswith(self._lconf.cache_dir):
+            return
+
+        for entry in os.scandir(self._root_dir):
+            if entry.name == 'dists' and entry.is_dir(follow_symlinks=False):
+                for root, _, files in os.walk(entry.path):
+                    for fname in files:
+                        if fname.endswith('.partial'):
+                            os.remove(os.path.join(root, fname))
+            elif entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
 
-    def _fetch_repo_file_internal(self, location, check=False):
+    def _fetch_repo_file_internal(self, location, check=False, *, sha256sum: T.Optional[str] = None):
         '''
         Download a file and retrieve a filename.
 
-        This function does not validate the result, this step
-        has to be done by the caller.
+        This function does not validate the result, unless a checksum is passed,
+        this step has to be done by the caller.
         '''
-        if self._repo_url:
-            source_url = os.path.join(self._repo_url, location)
-            target_fname = os.path.join(self._root_dir, location)
-            os.makedirs(os.path.dirname(target_fname), exist_ok=True)
-
-            download_file(source_url, target_fname, check=check)
-            return target_fname
+        if self._downloader:
+            fname = self._downloader.fetch(location, sha256sum=sha256sum, check=check)
+            if fname:
+                return fname
         else:
             fname = os.path.join(self._root_dir, location)
             if os.path.isfile(fname):
@@ -287,6 +722,14 @@ class RepositoryReader:
         log.error('Could not find repository file "{}"'.format(location))
         return None
 
+    def _check_local_file(self, fname: str, afile: ArchiveFile):
+        with open(fname, 'rb') as f:
+            sha256h = Hashes(f).hashes.find('SHA256').hashvalue  # pylint: disable=no-member
+            if sha256h != afile.sha256sum:
+                raise Exception(
+                    'Checksum validation of "{}" failed ({} != {}).'.format(fname, sha256h, afile.sha256sum)
+                )
+
     def get_file(self, afile, check=True) -> str:
         '''
         Get a file from the repository.
@@ -294,17 +737,27 @@ class RepositoryReader:
         '''
         assert type(afile) is ArchiveFile
 
+        if self._downloader:
+            # downloaded files are always validated, cached copies are only used if they match
+            return self._downloader.fetch(afile.fname, sha256sum=afile.sha256sum, size=afile.size, check=True)
+
         fname = self._fetch_repo_file_internal(afile.fname, check=True)
         if check:
-            with open(fname, 'rb') as f:
-                sha256h = Hashes(f).hashes.find('SHA256').hashvalue  # pylint: disable=no-member
-                if sha256h != afile.sha256sum:
-                    raise Exception(
-                        'Checksum validation of "{}" failed ({} != {}).'.format(fname, sha256h, afile.sha256sum)
-                    )
+            self._check_local_file(fname, afile)
 
         return fname
 
+    def get_files(self, afiles: T.Iterable[ArchiveFile], check=True) -> list[str]:
+        '''
+        Get multiple files from the repository at once.
+        Remote files are downloaded in parallel.
+        Returns: A list of absolute paths to the repository files, in the order they were requested.
+        '''
+        afiles = list(afiles)
+        if self._downloader:
+            return self._downloader.fetch_many(afiles)
+        return [self.get_file(af, check=check) for af in afiles]
+
     def get_file_insecure(self, fname) -> str:
         """
         Get a file from the repository by its filename alone,
@@ -351,12 +804,11 @@ class RepositoryReader:
         self._inrelease[suite_name] = ird
         return ird
 
-    def index_file(self, suite, fname, check=True):
+    def _index_file_with_checksum(self, suite, fname, check=True) -> tuple[T.Optional[str], T.Optional[str]]:
         '''
-        Retrieve a package list (index) file from the repository.
-        The file will be downloaded if necessary:
+        Retrieve a package list (index) file from the repository, like :func:`index_file`.
 
-        Returns: A file path to the index file.
+        Returns: A tuple of the file path to the index file and its SHA256 checksum.
         '''
         if type(suite) is ArchiveSuite:
             suite_name = suite.name
@@ -369,9 +821,16 @@ class RepositoryReader:
             self._inrelease.pop(suite_name, None)
 
         ird = self._read_repo_information(suite_name)
-        index_fname = self._fetch_repo_file_internal(os.path.join('dists', suite_name, fname))
+        expected_sha256sum = None
+        for af in ird.files:
+            if af.fname == fname:
+                expected_sha256sum = af.sha256sum
+                break
+        index_fname = self._fetch_repo_file_internal(
+            os.path.join('dists', suite_name, fname), sha256sum=expected_sha256sum
+        )
         if not index_fname:
-            return None
+            return None, None
 
         # validate the file
         with open(index_fname, 'rb') as f:
@@ -389,8 +848,61 @@ class RepositoryReader:
         if not valid and check:
             raise Exception('Unable to validate "{}": File not mentioned in InRelease.'.format(fname))
 
+        return index_fname, index_sha256sum
+
+    def index_file(self, suite, fname, check=True):
+        '''
+        Retrieve a package list (index) file from the repository.
+        The file will be downloaded if necessary:
+
+        Returns: A file path to the index file.
+        '''
+        index_fname, _ = self._index_file_with_checksum(suite, fname, check=check)
         return index_fname
 
+    def _index_records(self, index_fname: str, index_sha256sum: str, fields: tuple[str, ...]) -> list[tuple]:
+        '''
+        Read the values of the selected fields from all stanzas of an index file.
+
+        Results are cached by the checksum of the index, so unchanged indices are never parsed twice.
+        Returns: A list of tuples with the field values (or None) in the order of :fields
+        '''
+        fields_key = hashlib.md5('\n'.join(fields).encode('utf-8')).hexdigest()[:12]
+        cache_fname = os.path.join(self._index_cache_dir, '{}-{}.pickle'.format(index_sha256sum, fields_key))
+        try:
+            with open(cache_fname, 'rb') as f:
+                records = pickle.load(f)
+            # mark cache entry as recently used
+            os.utime(cache_fname)
+            return records
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            log.warning('Unable to load cached index data %s, parsing index again: %s', cache_fname, str(e))
+
+        with TagFile(index_fname) as tf:
+            records = [tuple(e.get(field) for field in fields) for e in tf]
+
+        os.makedirs(self._index_cache_dir, exist_ok=True)
+        self._prune_index_cache()
+        cache_fname_tmp = '{}.{}.tmp'.format(cache_fname, os.getpid())
+        with open(cache_fname_tmp, 'wb') as f:
+            pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_fname_tmp, cache_fname)
+
+        return records
+
+    def _prune_index_cache(self):
+        '''Remove index cache entries that have not been used in a while.'''
+        cutoff = time.time() - INDEX_CACHE_MAX_AGE
+        with os.scandir(self._index_cache_dir) as it:
+            for entry in it:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
     def source_packages(
         self, suite: ArchiveSuite, component: ArchiveComponent, *, include_extra_sources: bool = True
     ) -> T.List[ExternalSourcePackage]:
@@ -398,94 +910,104 @@ class RepositoryReader:
         assert type(suite) is ArchiveSuite
         assert type(component) is ArchiveComponent
 
-        index_fname = self.index_file(suite.name, os.path.join(component.name, 'source', 'Sources.xz'))
+        index_fname, index_sha256sum = self._index_file_with_checksum(
+            suite.name, os.path.join(component.name, 'source', 'Sources.xz')
+        )
         if not index_fname:
             return []
 
         pkgs = []
-        with TagFile(index_fname) as tf:
-            for e in tf:
-                pkgname = e['Package']
-                pkgversion = e['Version']
-                if not pkgname or not pkgversion:
-                    raise Exception(
-                        'Found invalid block (no Package and Version fields) in Sources file "{}".'.format(index_fname)
-                    )
+        suites = [suite]  # shared by all packages read from this index
+        for rec in self._index_records(index_fname, index_sha256sum, SOURCES_INDEX_FIELDS):
+            e = {k: v for k, v in zip(SOURCES_INDEX_FIELDS, rec) if v is not None}
+            pkgname = e['Package']
+            pkgversion = e['Version']
+            if not pkgname or not pkgversion:
+                raise Exception(
+                    'Found invalid block (no Package and Version fields) in Sources file "{}".'.format(index_fname)
+                )
 
-                extra_source_only = e.get('Extra-Source-Only', 'no') == 'yes'
-                if not include_extra_sources and extra_source_only:
-                    continue
+            extra_source_only = e.get('Extra-Source-Only', 'no') == 'yes'
+            if not include_extra_sources and extra_source_only:
+                continue
 
-                pkg = ExternalSourcePackage(pkgname, pkgversion)
-                pkg.repo = self._repo_entity
-                pkg.component = component
-                if suite not in pkg.suites:
-                    pkg.suites.append(suite)
-
-                pkg.architectures = split_strip(e['Architecture'], ' ')
-                pkg.standards_version = e.get('Standards-Version', '0~notset')
-                pkg.format_version = e['Format']
-
-                pkg.vcs_browser = e.get('Vcs-Browser')
-                pkg.homepage = e.get('Homepage')
-                pkg.maintainer = e['Maintainer']
-                # FIXME: Careful! Splitting just by comma isn't enough! We need to parse this properly.
-                pkg.uploaders = split_strip(e.get('Uploaders', ''), ',')
-
-                pkg.build_depends = split_strip(e.get('Build-Depends', ''), ',')
-                pkg.directory = e['Directory']
-                pkg.extra_source_only = extra_source_only
-
-                pkg.files = parse_checksums_list(e.get('Checksums-Sha256'), pkg.directory)
-
-                ex_binaries = []
-                raw_pkg_list = e.get('Package-List', None)
-                if not raw_pkg_list:
-                    for bpname in e.get('Binary', '').split(','):
-                        if not bpname:
-                            continue
-                        bpname = bpname.strip()
-                        pi = PackageInfo()
-                        pi.deb_type = DebType.DEB
-                        pi.name = bpname
-                        pi.version = pkg.version
-                        pi.architectures = pkg.architectures
-                        pi.component = component.name
-                        pi.section = e.get('Section')
-                        pi.essential = e.get('Essential', 'no') == 'yes'
-                        pi.priority = PackagePriority.from_string(e.get('Priority', 'optional'))
-                        ex_binaries.append(pi)
-                else:
-                    ex_binaries = parse_package_list(
-                        raw_pkg_list, default_version=pkg.version, default_archs=pkg.architectures
-                    )
-                pkg.expected_binaries = ex_binaries
-
-                # do some issue-reporting
-                if not pkg.files and pkg.format_version != '1.0':
-                    log.warning(
-                        'Source package {}/{} seems to have no files (in {}).'.format(
-                            pkg.name, pkg.version, self.location
-                        )
-                    )
+            pkg = ExternalSourcePackage(intern(pkgname), intern(pkgversion))
+            pkg.repo = self._repo_entity
+            pkg.component = component
+            pkg.suites = suites
 
-                # add package to results set
-                pkgs.append(pkg)
+            pkg.architectures = split_strip(e['Architecture'], ' ')
+            pkg.standards_version = e.get('Standards-Version', '0~notset')
+            pkg.format_version = e['Format']
+
+            pkg.vcs_browser = e.get('Vcs-Browser')
+            pkg.homepage = e.get('Homepage')
+            pkg.maintainer = intern(e['Maintainer'])
+            # FIXME: Careful! Splitting just by comma isn't enough! We need to parse this properly.
+            # the raw values of these fields are only split into lists when they are accessed
+            pkg._uploaders = e.get('Uploaders', '')
+            pkg._build_depends = e.get('Build-Depends', '')
+
+            pkg.directory = e['Directory']
+            pkg.extra_source_only = extra_source_only
+
+            checksums_raw = e.get('Checksums-Sha256', '')
+            pkg._files = checksums_raw
+
+            ex_binaries = []
+            raw_pkg_list = e.get('Package-List', None)
+            if not raw_pkg_list:
+                for bpname in e.get('Binary', '').split(','):
+                    if not bpname:
+                        continue
+                    bpname = bpname.strip()
+                    pi = PackageInfo()
+                    pi.deb_type = DebType.DEB
+                    pi.name = bpname
+                    pi.version = pkg.version
+                    pi.architectures = pkg.architectures
+                    pi.component = component.name
+                    pi.section = e.get('Section')
+                    pi.essential = e.get('Essential', 'no') == 'yes'
+                    pi.priority = PackagePriority.from_string(e.get('Priority', 'optional'))
+                    ex_binaries.append(pi)
+            else:
+                ex_binaries = parse_package_list(
+                    raw_pkg_list, default_version=pkg.version, default_archs=pkg.architectures
+                )
+            pkg.expected_binaries = ex_binaries
+
+            # do some issue-reporting
+            if not checksums_raw.strip() and pkg.format_version != '1.0':
+                log.warning(
+                    'Source package {}/{} seems to have no files (in {}).'.format(pkg.name, pkg.version, self.location)
+                )
+
+            # add package to results set
+            pkgs.append(pkg)
 
         return pkgs
 
-    def _read_binary_packages_from_tf(
-        self, tf, tf_fname, suite, component: ArchiveComponent, arch: ArchiveArchitecture, deb_type: DebType
+    def _read_binary_packages_from_index(
+        self,
+        index_fname,
+        index_sha256sum,
+        suite,
+        component: ArchiveComponent,
+        arch: ArchiveArchitecture,
+        deb_type: DebType,
     ) -> T.List[ExternalBinaryPackage]:
         requested_arch_is_all = arch.name == 'all'
 
         pkgs = []
-        for e in tf:
+        suites = [suite]  # shared by all packages read from this index
+        for rec in self._index_records(index_fname, index_sha256sum, PACKAGES_INDEX_FIELDS):
+            e = {k: v for k, v in zip(PACKAGES_INDEX_FIELDS, rec) if v is not None}
             pkgname = e['Package']
             pkgversion = e['Version']
             if not pkgname or not pkgversion:
                 raise Exception(
-                    'Found invalid block (no Package and Version fields) in Packages file "{}".'.format(tf_fname)
+                    'Found invalid block (no Package and Version fields) in Packages file "{}".'.format(index_fname)
                 )
 
             arch_name = e['Architecture']
@@ -504,36 +1026,36 @@ class RepositoryReader:
                     )
                 )
 
-            pkg = ExternalBinaryPackage(pkgname, pkgversion)
+            pkg = ExternalBinaryPackage(intern(pkgname), intern(pkgversion))
             pkg.deb_type = deb_type
             pkg.repo = self._repo_entity
             pkg.component = component
-            if suite not in pkg.suites:
-                pkg.suites.append(suite)
+            pkg.suites = suites
 
             pkg.architecture = arch
-            pkg.maintainer = e['Maintainer']
+            pkg.maintainer = intern(e['Maintainer'])
 
             source_id = e.get('Source')
             if not source_id:
                 pkg.source_name = pkg.name
                 pkg.source_version = pkg.version
             elif '(' in source_id:
-                pkg.source_name = source_id[0 : source_id.index('(') - 1].strip()
-                pkg.source_version = source_id[source_id.index('(') + 1 : source_id.index(')')].strip()
+                pkg.source_name = intern(source_id[0 : source_id.index('(') - 1].strip())
+                pkg.source_version = intern(source_id[source_id.index('(') + 1 : source_id.index(')')].strip())
             else:
-                pkg.source_name = source_id
+                pkg.source_name = intern(source_id)
                 pkg.source_version = pkg.version
 
             pkg.size_installed = int(e.get('Installed-Size', '0'))
 
-            pkg.depends = split_strip(e.get('Depends', ''), ',')
-            pkg.pre_depends = split_strip(e.get('Pre-Depends', ''), ',')
+            # the raw values of these fields are only split into lists when they are accessed
+            pkg._depends = e.get('Depends', '')
+            pkg._pre_depends = e.get('Pre-Depends', '')
 
             pkg.homepage = e.get('Homepage')
 
             pkg.override = ExternalPackageOverride()
-            pkg.override.section = e['Section']
+            pkg.override.section = intern(e['Section'])
             pkg.override.priority = PackagePriority.from_string(e['Priority'])
             pkg.override.component = component
             pkg.override.essential = e.get('Essential', 'no') == 'yes'
@@ -541,16 +1063,16 @@ class RepositoryReader:
             pkg.description = e['Description']
             pkg.description_md5 = e.get('Description-md5')
 
-            pkg.bin_file = ArchiveFile(e['Filename'])
-            pkg.bin_file.size = int(e.get('Size', '0'))
-            pkg.bin_file.sha256sum = e['SHA256']
+            # the ArchiveFile is only created when the file is requested
+            bin_fname = e['Filename']
+            pkg._bin_file = (bin_fname, int(e.get('Size', '0')), e['SHA256'])
 
             pkg.deb_type = DebType.DEB
-            if pkg.bin_file.fname.endswith('.udeb'):
+            if bin_fname.endswith('.udeb'):
                 pkg.deb_type = DebType.UDEB
 
             # do some issue-reporting
-            if not pkg.bin_file.fname:
+            if not bin_fname:
                 log.warning(
                     'Binary package "{}/{}/{}" seems to have no files.'.format(pkg.name, pkg.version, arch.name)
                 )
@@ -575,12 +1097,12 @@ class RepositoryReader:
         if not shadow_arch:
             shadow_arch = arch
 
-        index_fname = self.index_file(
+        index_fname, index_sha256sum = self._index_file_with_checksum(
             suite.name, os.path.join(component.name, 'binary-{}'.format(arch.name), 'Packages.xz')
         )
         if not index_fname:
             if shadow_arch != arch:
-                index_fname = self.index_file(
+                index_fname, index_sha256sum = self._index_file_with_checksum(
                     suite.name, os.path.join(component.name, 'binary-{}'.format(shadow_arch.name), 'Packages.xz')
                 )
                 if not index_fname:
@@ -588,8 +1110,7 @@ class RepositoryReader:
             else:
                 return []
 
-        with TagFile(index_fname) as tf:
-            return self._read_binary_packages_from_tf(tf, index_fname, suite, component, arch, DebType.DEB)
+        return self._read_binary_packages_from_index(index_fname, index_sha256sum, suite, component, arch, DebType.DEB)
 
     def installer_packages(self, suite, component, arch):
         '''
@@ -603,14 +1124,13 @@ class RepositoryReader:
         assert type(component) is ArchiveComponent
         assert type(arch) is ArchiveArchitecture
 
-        index_fname = self.index_file(
+        index_fname, index_sha256sum = self._index_file_with_checksum(
             suite.name, os.path.join(component.name, 'debian-installer', 'binary-{}'.format(arch.name), 'Packages.xz')
         )
         if not index_fname:
             return []
 
-        with TagFile(index_fname) as tf:
-            return self._read_binary_packages_from_tf(tf, index_fname, suite, component, arch, DebType.UDEB)
+        return self._read_binary_packages_from_index(index_fname, index_sha256sum, suite, component, arch, DebType.UDEB)
 
 
 def make_newest_packages_dict(pkgs):
@@ -8,6 +8,7 @@ from laniakea.utils.json import json_compact_dump
 from laniakea.utils.misc import (
     LockError,
     cd,
+    chunked,
     listify,
     stringify,
     safe_strip,
@@ -54,6 +55,7 @@ __all__ = [
     'LockError',
     'cd',
     'listify',
+    'chunked',
     'stringify',
     'is_remote_url',
     'download_file',
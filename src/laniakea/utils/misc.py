@@ -74,6 +74,14 @@ def listify(item):
     return [item]
 
 
+def chunked(items: T.Sequence[_T], size: int = 2000) -> T.Iterator[T.Sequence[_T]]:
+    '''
+    Split a sequence into chunks of at most :size items, e.g. to keep the size of SQL IN clauses reasonable.
+    '''
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
 def stringify(item: T.Any):
     '''
     Convert anything into a string, if it isn't one already.
@@ -4,11 +4,15 @@
 #
 # SPDX-License-Identifier: LGPL-3.0+
 
+import os
 import sys
+import atexit
+import shutil
 import signal
 import logging as log
+import tempfile
 from argparse import ArgumentParser
-from multiprocessing import Queue, Process
+from multiprocessing import Process
 
 __mainfile = None
 server_processes: list[Process] = []
@@ -36,14 +40,24 @@ def run_events_receiver_server(endpoint, pub_queue):
     receiver.run()
 
 
-def run_events_publisher_server(endpoints, pub_queue):
+def run_events_signer(endpoint, publisher_endpoint, batch_size):
+    '''
+    Run a worker process which signs events that are about to be published.
+    '''
+    from lighthouse.events_publisher import EventsSigner
+
+    signer = EventsSigner(endpoint, publisher_endpoint, batch_size)
+    signer.run()
+
+
+def run_events_publisher_server(endpoints, pipeline_endpoint):
     '''
     Run a server process which publishes processed events on
     one or multiple ZeroMQ publisher sockets.
     '''
     from lighthouse.events_publisher import EventsPublisher
 
-    publisher = EventsPublisher(endpoints, pub_queue)
+    publisher = EventsPublisher(endpoints, pipeline_endpoint)
     publisher.run()
 
 
@@ -75,18 +89,43 @@ def run_server(options):
     # TODO: Disable server features requiring the database if Lighthouse is
     # configured as relay, making it only forward requests to other instances.
 
-    # event stream plumbing
+    # event stream plumbing: events are pushed to a pool of signing workers via internal sockets,
+    # which forward them to a single publisher process
     pub_queue = None
     publish_endpoints = lconf.lighthouse.endpoints_publish
     if publish_endpoints:
+        from lighthouse.events_publisher import EventsQueue
+
+        pipeline_dir = tempfile.mkdtemp(prefix='lighthouse-events-')
+        # the worker processes are daemonic and die with us, so their sockets can go when we exit
+        atexit.register(shutil.rmtree, pipeline_dir, ignore_errors=True)
+        pipeline_endpoint = 'ipc://' + os.path.join(pipeline_dir, 'publish')
+        signer_endpoints = [
+            'ipc://' + os.path.join(pipeline_dir, 'sign-{}'.format(i)) for i in range(lconf.lighthouse.event_signers)
+        ]
+        pub_queue = EventsQueue(signer_endpoints)
+
         log.info('Creating event stream publisher.')
-        pub_queue = Queue()
         spub = Process(
-            target=run_events_publisher_server, args=(publish_endpoints, pub_queue), name='EventsPublisher', daemon=True
+            target=run_events_publisher_server,
+            args=(publish_endpoints, pipeline_endpoint),
+            name='EventsPublisher',
+            daemon=True,
         )
         spub.start()
         server_processes.append(spub)
 
+        log.info('Creating event signers ({}).'.format(len(signer_endpoints)))
+        for i, signer_endpoint in enumerate(signer_endpoints):
+            p = Process(
+                target=run_events_signer,
+                args=(signer_endpoint, pipeline_endpoint, lconf.lighthouse.event_batch_size),
+                name='EventsSigner-{}'.format(i),
+                daemon=True,
+            )
+            p.start()
+            server_processes.append(p)
+
         # spawn processes that handle event stream submissions
         log.info('Creating event stream receivers ({}).'.format(len(lconf.lighthouse.endpoints_submit)))
         for i, submit_endpoint in enumerate(lconf.lighthouse.endpoints_submit):
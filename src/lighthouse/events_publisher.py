@@ -5,21 +5,107 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import os
+import json
+import time
 import logging as log
+import threading
 
 import zmq
 
 from laniakea.utils import json_compact_dump
+from laniakea.msgstream.event_msg import create_event_batch_message
 from laniakea.msgstream.signedjson import sign_json
 
+# interval in seconds in which pipeline statistics are logged
+STATS_INTERVAL = 60
 
-class EventsPublisher:
+# longest time in milliseconds an event may wait for a batch to fill up
+EVENT_BATCH_DELAY_MSEC = 200
+
+# maximum number of queued events a signer processes in one go
+MAX_EVENTS_PER_CYCLE = 1000
+
+
+class EventsQueue:
     '''
-    Lighthouse helper which handles the actual event publishing from multiple
-    receiver processes.
+    Handle to submit events into the internal publishing pipeline.
+
+    Only the socket endpoints are stored, so instances can be passed to other processes.
+    Events are sent as JSON via ZeroMQ, round-robin to all signing workers. Each thread of a
+    process uses its own socket.
+    '''
+
+    def __init__(self, signer_endpoints: list[str]):
+        self._signer_endpoints = signer_endpoints
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {'_signer_endpoints': self._signer_endpoints}
+
+    def __setstate__(self, state):
+        self._signer_endpoints = state['_signer_endpoints']
+        self._local = threading.local()
+
+    def put(self, event):
+        '''Submit a trusted event for publication.'''
+
+        socket = getattr(self._local, 'socket', None)
+        if not socket:
+            socket = zmq.Context.instance().socket(zmq.PUSH)
+            for endpoint in self._signer_endpoints:
+                socket.connect(endpoint)
+            self._local.socket = socket
+
+        socket.send(json_compact_dump(event, as_bytes=True))
+
+
+class _PipelineStats:
     '''
+    Counters to make the event throughput visible in the log.
 
-    def __init__(self, endpoints, pub_queue):
+    ZeroMQ does not tell us how many messages are waiting in a queue, so instead we record how many events
+    were drained at once and how often a drain stopped at its limit while more events were still pending.
+    '''
+
+    def __init__(self, name):
+        self._name = name
+        self._count = 0
+        self._max_drained = 0
+        self._saturated = 0
+        self._last_report = time.monotonic()
+
+    def add(self, count: int, saturated: bool = False):
+        self._count += count
+        self._max_drained = max(self._max_drained, count)
+        if saturated:
+            self._saturated += 1
+
+        now = time.monotonic()
+        elapsed = now - self._last_report
+        if elapsed < STATS_INTERVAL:
+            return
+        if self._count:
+            log.info(
+                '%s: %s events (%.1f/s), most drained at once: %s, drains left events pending: %s',
+                self._name,
+                self._count,
+                self._count / elapsed,
+                self._max_drained,
+                self._saturated,
+            )
+        self._count = 0
+        self._max_drained = 0
+        self._saturated = 0
+        self._last_report = now
+
+
+class EventsSigner:
+    '''
+    Lighthouse helper which signs trusted events, optionally in batches, and hands
+    them to the publisher.
+    '''
+
+    def __init__(self, endpoint, publisher_endpoint, batch_size=1):
         from laniakea import LkModule, LocalConfig
         from laniakea.msgstream.signing import (
             NACL_ED25519,
@@ -28,10 +114,11 @@ class EventsPublisher:
         )
 
         lconf = LocalConfig()
-        self._sockets = []
-        self._endpoints = endpoints
+        self._endpoint = endpoint
+        self._publisher_endpoint = publisher_endpoint
+        self._batch_size = max(batch_size, 1)
         self._ctx = zmq.Context.instance()
-        self._pub_queue = pub_queue
+        self._stats = _PipelineStats('Event signer {}'.format(endpoint))
 
         # load our own signing key, so we can sign outgoing messages
         keyfile = lconf.secret_curve_keyfile_for_module(LkModule.LIGHTHOUSE)
@@ -55,16 +142,71 @@ class EventsPublisher:
 
         return sign_json(event, self._signer_id, self._signing_key)
 
-    def _publish_event(self, event):
-        # sign outgoing trusted message with our key
-        # anything that is in this queue has already been
-        # checked and is trusted
-        event = self._sign_message(event)
-        new_data = json_compact_dump(event)
+    def _publish_events(self, out_socket, events: list[dict]):
+        '''Sign events and send them to the publisher, as batches if enabled.'''
+
+        if self._batch_size == 1:
+            batches = [[event] for event in events]
+        else:
+            # subscribers filter by tag, so we can only batch events with the same tag
+            by_tag: dict[str, list[dict]] = {}
+            for event in events:
+                by_tag.setdefault(event['tag'], []).append(event)
+            batches = []
+            for tag_events in by_tag.values():
+                for i in range(0, len(tag_events), self._batch_size):
+                    batches.append(tag_events[i : i + self._batch_size])
+
+        for batch in batches:
+            # anything that is in this queue has already been checked and is trusted
+            event = batch[0] if len(batch) == 1 else create_event_batch_message(batch)
+            event = self._sign_message(event)
+            out_socket.send_multipart([bytes(event['tag'], 'utf-8'), json_compact_dump(event, as_bytes=True)])
+
+    def run(self):
+        in_socket = self._ctx.socket(zmq.PULL)
+        in_socket.bind(self._endpoint)
+        out_socket = self._ctx.socket(zmq.PUSH)
+        out_socket.connect(self._publisher_endpoint)
 
-        # create message
-        msg = [bytes(event['tag'], 'utf-8'), bytes(new_data, 'utf-8')]
+        poller = zmq.Poller()
+        poller.register(in_socket, zmq.POLLIN)
+        while True:
+            poller.poll(STATS_INTERVAL * 1000)
+
+            # fetch everything that is already queued, waiting a little for a batch to fill up if we can
+            events = []
+            deadline = time.monotonic() + EVENT_BATCH_DELAY_MSEC / 1000
+            while len(events) < MAX_EVENTS_PER_CYCLE:
+                try:
+                    events.append(json.loads(in_socket.recv(zmq.NOBLOCK)))
+                except zmq.Again:
+                    if self._batch_size == 1 or not events or len(events) >= self._batch_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not poller.poll(remaining * 1000):
+                        break
+
+            # if we stopped at the limit and more events are waiting, the signer is falling behind
+            saturated = len(events) >= MAX_EVENTS_PER_CYCLE and bool(in_socket.poll(0))
+            self._publish_events(out_socket, events)
+            self._stats.add(len(events), saturated)
 
+
+class EventsPublisher:
+    '''
+    Lighthouse helper which handles the actual event publishing from multiple
+    signing worker processes.
+    '''
+
+    def __init__(self, endpoints, pipeline_endpoint):
+        self._sockets = []
+        self._endpoints = endpoints
+        self._pipeline_endpoint = pipeline_endpoint
+        self._ctx = zmq.Context.instance()
+        self._stats = _PipelineStats('Event publisher')
+
+    def _publish_message(self, msg):
         # send message
         for socket in self._sockets:
             try:
@@ -82,6 +224,18 @@ class EventsPublisher:
             socket.bind(endpoint)
             self._sockets.append(socket)
 
+        in_socket = self._ctx.socket(zmq.PULL)
+        in_socket.bind(self._pipeline_endpoint)
+
         while True:
-            event = self._pub_queue.get()
-            self._publish_event(event)
+            # publish everything that has queued up, then wait for more
+            msg = in_socket.recv_multipart()
+            count = 0
+            while msg:
+                self._publish_message(msg)
+                count += 1
+                try:
+                    msg = in_socket.recv_multipart(zmq.NOBLOCK)
+                except zmq.Again:
+                    msg = None
+            self._stats.add(count)
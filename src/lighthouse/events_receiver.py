@@ -5,13 +5,12 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import os
-import json
 import logging as log
 
 import zmq
 from zmq.eventloop import ioloop, zmqstream
 
-from laniakea.msgstream import verify_event_message, event_message_is_valid_and_signed
+from laniakea.msgstream import EventMessageVerifier
 
 
 class EventsReceiver:
@@ -40,39 +39,19 @@ class EventsReceiver:
             signer_id, verify_key = keyfile_read_verify_key(keyfname)
             if signer_id and verify_key:
                 self._trusted_keys[signer_id] = verify_key
+        self._verifier = EventMessageVerifier(self._trusted_keys)
 
     def _event_message_received(self, socket, msg):
-        data = str(msg[1], 'utf-8', 'replace')
-        try:
-            event = json.loads(data)
-        except json.JSONDecodeError as e:
-            # we ignore invalid requests
-            log.info('Received invalid JSON message from sender: %s (%s)', data if len(data) > 1 else msg, str(e))
-            return
+        data = msg[1]
 
         # check if the message is actually valid and can be processed
-        if not event_message_is_valid_and_signed(event):
+        event = self._verifier.decode(data)
+        if not event:
             # we currently just silently ignore invalid submissions
             return
 
-        signatures = event.get('signatures')
-        signature_trusted = False
-        for signer in signatures.keys():
-            key = self._trusted_keys.get(signer)
-            if not key:
-                continue
-            try:
-                verify_event_message(signer, event, key, assume_valid=True)
-            except Exception as e:
-                log.info('Invalid signature on event ({}): {}'.format(str(e), str(event)))
-                return
-
-            # if we are here, we verified a signature without issues, which means
-            # the message is legit and we can sign it ourselves and publish it
-            signature_trusted = True
-            break
-
-        if not signature_trusted:
+        # if the signature is valid, the message is legit and we can sign it ourselves and publish it
+        if not self._verifier.verify(data, event):
             log.info('Unable to verify signature on event: {}'.format(str(event)))
             return
 
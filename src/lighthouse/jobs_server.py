@@ -7,7 +7,9 @@
 import os
 import sys
 import json
+import time
 import logging as log
+from concurrent.futures import ThreadPoolExecutor
 
 import zmq
 import zmq.auth
@@ -18,14 +20,35 @@ from laniakea import LkModule, LocalConfig
 from laniakea.utils import json_compact_dump
 from lighthouse.jobs_worker import JobWorker
 
+# number of threads processing client requests, each may hold one database connection
+JOB_DISPATCH_THREADS = 4
+
+# interval in seconds in which we check for new jobs for workers waiting on a job request
+JOB_QUEUE_REFRESH_INTERVAL = 5
+
+# longest time in seconds we keep a worker waiting on a job request
+MAX_JOB_POLL_TIMEOUT = 120
+
+# interval in seconds in which buffered job status updates are written to the database
+STATUS_FLUSH_INTERVAL = 10
+
+# interval in seconds in which statistics about the status update buffer are logged
+STATUS_STATS_INTERVAL = 300
+
 
 class JobsServer:
     '''
     Lighthouse module serving job requests.
+
+    Requests are processed on a thread pool, so the socket stays responsive while we are waiting
+    on the database. Workers may set ``poll_timeout`` (in seconds) on a ``job`` request to wait
+    for a job to become available instead of immediately receiving an empty reply.
     '''
 
     def __init__(self, endpoint, pub_queue):
         self._server = None
+        self._stream = None
+        self._loop = None
         self._ctx = zmq.Context.instance()
 
         lconf = LocalConfig()
@@ -34,8 +57,15 @@ class JobsServer:
 
         self._jobs_endpoint = endpoint
         self._worker = JobWorker(pub_queue)
+        self._executor = ThreadPoolExecutor(max_workers=JOB_DISPATCH_THREADS, thread_name_prefix='JobDispatch')
 
-    def _client_request_received(self, server, msg):
+        # job requests waiting for a job to become available, as (address, request, deadline) tuples
+        self._pending_polls: list[tuple[bytes, dict, float]] = []
+        self._queue_refresh_running = False
+        self._status_flush_running = False
+        self._status_flush_count_reported = 0
+
+    def _client_request_received(self, stream, msg):
         '''Called when we receive a request from a client.'''
 
         if len(msg) != 3:
@@ -50,11 +80,40 @@ class JobsServer:
             log.info('Received invalid JSON request from client: %s (%s)', msg, str(e))
             return
 
+        deadline = None
+        if type(request) is dict and request.get('request') == 'job':
+            try:
+                poll_timeout = min(float(request.get('poll_timeout', 0)), MAX_JOB_POLL_TIMEOUT)
+            except (TypeError, ValueError):
+                poll_timeout = 0
+            if poll_timeout > 0:
+                deadline = time.monotonic() + poll_timeout
+
+        self._dispatch_request(address, request, deadline)
+
+    def _dispatch_request(self, address, request, deadline):
+        '''Process a request on the thread pool, and reply once a result is available.'''
+        future = self._loop.run_in_executor(self._executor, self._worker.process_client_message, request)
+        self._loop.add_future(future, lambda f: self._request_processed(address, request, deadline, f))
+
+    def _request_processed(self, address, request, deadline, future):
+        '''Called on the event loop once a request was processed.'''
+
         try:
-            reply = self._worker.process_client_message(request)
+            reply = future.result()
         except Exception as e:
             reply = json_compact_dump({'error': 'Internal Error: {}'.format(e)}, as_bytes=True)
 
+        # no job was available, so let the worker wait for one if it wants to
+        if deadline and reply == 'null' and time.monotonic() < deadline:
+            self._pending_polls.append((address, request, deadline))
+            return
+
+        self._send_reply(address, reply)
+
+    def _send_reply(self, address, reply):
+        '''Send a reply to a client.'''
+
         # an empty result means we will send an empty message back, as ACK for the REQ connection
         if not reply:
             reply = b''
@@ -69,7 +128,78 @@ class JobsServer:
         reply_msg = [address, b'', reply]
 
         log.debug('Sending %s', reply_msg)
-        server.send_multipart(reply_msg)
+        self._stream.send_multipart(reply_msg)
+
+    def _refresh_job_queue(self):
+        '''Check for new jobs for waiting workers, and expire polls that ran out of time.'''
+
+        if not self._pending_polls or self._queue_refresh_running:
+            return
+        self._queue_refresh_running = True
+        future = self._loop.run_in_executor(self._executor, self._worker.fetch_waiting_job_counts)
+        self._loop.add_future(future, self._job_queue_refreshed)
+
+    def _job_queue_refreshed(self, future):
+        '''Called on the event loop with the new number of waiting jobs.'''
+
+        self._queue_refresh_running = False
+        try:
+            waiting_counts = future.result()
+        except Exception as e:
+            log.error('Failed to refresh the job queue: %s', str(e))
+            waiting_counts = {}
+
+        now = time.monotonic()
+        still_pending = []
+        for address, request, deadline in self._pending_polls:
+            if self._worker.job_request_satisfiable(request, waiting_counts):
+                self._dispatch_request(address, request, deadline)
+            elif now >= deadline:
+                self._send_reply(address, 'null')
+            else:
+                still_pending.append((address, request, deadline))
+        self._pending_polls = still_pending
+
+    def _flush_status_updates(self):
+        '''Write buffered job status updates to the database.'''
+
+        if self._status_flush_running:
+            return
+        self._status_flush_running = True
+        future = self._loop.run_in_executor(self._executor, self._worker.flush_status_updates)
+        self._loop.add_future(future, self._status_updates_flushed)
+
+    def _status_updates_flushed(self, future):
+        '''Called on the event loop once buffered status updates were written.'''
+
+        self._status_flush_running = False
+        try:
+            future.result()
+        except Exception as e:
+            metrics = self._worker.status_buffer_metrics()
+            log.error(
+                'Failed to write job status updates (%s job updates and %s pings pending): %s',
+                metrics['pending_job_updates'],
+                metrics['pending_worker_pings'],
+                str(e),
+            )
+
+    def _log_status_buffer_metrics(self):
+        '''Log the depth of the status update buffer and how long writing it took.'''
+
+        metrics = self._worker.status_buffer_metrics()
+        flushes = metrics['flush_count'] - self._status_flush_count_reported
+        if not flushes and not metrics['pending_job_updates'] and not metrics['pending_worker_pings']:
+            return
+        self._status_flush_count_reported = metrics['flush_count']
+        log.info(
+            'Status buffer: %s job updates and %s pings pending, %s flushes (last took %.3fs, slowest %.3fs)',
+            metrics['pending_job_updates'],
+            metrics['pending_worker_pings'],
+            flushes,
+            metrics['flush_last_duration'],
+            metrics['flush_max_duration'],
+        )
 
     def _setup_server(self):
         '''
@@ -83,8 +213,13 @@ class JobsServer:
         self._server.curve_server = True  # must come before bind
         self._server.bind(self._jobs_endpoint)
 
-        server_stream = zmqstream.ZMQStream(self._server)
-        server_stream.on_recv_stream(self._client_request_received)
+        self._loop = ioloop.IOLoop.current()
+        self._stream = zmqstream.ZMQStream(self._server)
+        self._stream.on_recv_stream(self._client_request_received)
+
+        ioloop.PeriodicCallback(self._refresh_job_queue, JOB_QUEUE_REFRESH_INTERVAL * 1000).start()
+        ioloop.PeriodicCallback(self._flush_status_updates, STATUS_FLUSH_INTERVAL * 1000).start()
+        ioloop.PeriodicCallback(self._log_status_buffer_metrics, STATUS_STATS_INTERVAL * 1000).start()
 
     def run(self):
         if self._server:
@@ -4,11 +4,14 @@
 #
 # SPDX-License-Identifier: LGPL-3.0+
 
+import time
 import uuid
 import logging as log
+import threading
 from datetime import UTC, datetime
 
-from sqlalchemy import text
+from sqlalchemy import Text, func, text, column, update, values
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
 
 import laniakea.typing as T
 from laniakea import LkModule, LocalConfig
@@ -65,6 +68,16 @@ class JobWorker:
             ).suite
             self._default_incoming_suite_name = incoming_suite.name
 
+        # buffered status updates from workers, merged per job and per worker until they are flushed
+        self._status_lock = threading.Lock()
+        # held while a flush writes to the database, so a flush never returns while another one is still writing
+        self._status_flush_lock = threading.Lock()
+        self._pending_log_excerpts: dict[uuid.UUID, str] = {}
+        self._pending_pings: dict[uuid.UUID, datetime] = {}
+        self._status_flush_count = 0
+        self._status_flush_last_duration = 0.0
+        self._status_flush_max_duration = 0.0
+
     def _emit_event(self, subject, data):
         if not self._event_pub_queue:
             return  # do nothing if event publishing is disabled
@@ -76,7 +89,41 @@ class JobWorker:
     def _error_reply(self, message):
         return json_compact_dump({'error': message})
 
+    def fetch_waiting_job_counts(self) -> dict[tuple[str, str], int]:
+        '''
+        Get the number of jobs waiting to be assigned, per job kind and architecture.
+        '''
+        with session_scope() as session:
+            rows = (
+                session.query(Job.kind, Job.architecture, func.count(Job.uuid))
+                .filter(Job.status == JobStatus.WAITING)
+                .group_by(Job.kind, Job.architecture)
+                .all()
+            )
+        return {(str(kind), arch): count for kind, arch, count in rows}
+
+    def job_request_satisfiable(self, request, waiting_counts: dict[tuple[str, str], int]) -> bool:
+        '''
+        Check if a job request could be served given the numbers of waiting jobs.
+
+        This mirrors the selection done by :meth:`_process_job_request` without touching the database.
+        '''
+        accepted_kinds = request.get('accepts', [])
+        if type(accepted_kinds) is not list:
+            accepted_kinds = [str(accepted_kinds)]
+        for accepted_kind in accepted_kinds:
+            if waiting_counts.get((accepted_kind, 'any'), 0) > 0:
+                return True
+            for arch_name in request.get('architectures', []):
+                if waiting_counts.get((accepted_kind, arch_name), 0) > 0:
+                    return True
+                if arch_name == self._arch_indep_affinity and waiting_counts.get((accepted_kind, 'all'), 0) > 0:
+                    return True
+        return False
+
     def _assign_suitable_job(self, session, job_kind, arch, client_id):
+        # requests are processed concurrently, so we skip jobs that are just being assigned by another
+        # request instead of waiting for them and then finding that they no longer match
         qres = session.execute(
             text('''WITH cte AS (
                                         SELECT uuid
@@ -86,7 +133,7 @@ class JobWorker:
                                         AND kind=:jkind
                                         ORDER BY priority, time_created
                                         LIMIT 1
-                                        FOR UPDATE
+                                        FOR UPDATE SKIP LOCKED
                                         )
                                     UPDATE jobs j SET
                                         status=:jstatus_new,
@@ -376,10 +423,12 @@ class JobWorker:
 
         return True
 
-    def _process_job_status_request(self, session, request):
+    def _process_job_status_request(self, request):
         '''
         When a job is running, the worker will periodically send
         status information, which we collect here.
+
+        The data is only buffered, and written to the database by :meth:`flush_status_updates`.
         '''
 
         job_id = request.get('uuid')
@@ -390,16 +439,93 @@ class JobWorker:
             return self._error_reply('Job ID was missing.')
         if not client_id:
             return self._error_reply('ID of the machine making this request was missing.')
+        try:
+            job_uuid = uuid.UUID(job_id)
+            client_uuid = uuid.UUID(client_id)
+        except (TypeError, ValueError) as e:
+            return self._error_reply('Failed to parse UUID: {}'.format(str(e)))
 
-        # update log & status data
-        if log_excerpt:
-            # sometimes nasty builders send NULL characters in the string, protect against that
-            log_excerpt = log_excerpt.replace('\x00', '')
-            session.query(Job).filter(Job.uuid == job_id).update({'latest_log_excerpt': log_excerpt})
+        with self._status_lock:
+            # update log & status data
+            if log_excerpt:
+                # sometimes nasty builders send NULL characters in the string, protect against that
+                self._pending_log_excerpts[job_uuid] = log_excerpt.replace('\x00', '')
 
-        # update last seen information
-        session.query(SparkWorker).filter(SparkWorker.uuid == client_id).update({'last_ping': datetime.now(UTC)})
-        session.commit()
+            # update last seen information
+            self._pending_pings[client_uuid] = datetime.now(UTC)
+
+    def flush_status_updates(self):
+        '''
+        Write all buffered job status updates and worker pings to the database.
+
+        Only one flush writes at a time: if another thread is flushing already, we wait for it to finish,
+        so all updates received before this call are in the database once it returns.
+        '''
+
+        with self._status_flush_lock:
+            with self._status_lock:
+                log_excerpts, self._pending_log_excerpts = self._pending_log_excerpts, {}
+                pings, self._pending_pings = self._pending_pings, {}
+            if not log_excerpts and not pings:
+                return
+
+            start_time = time.monotonic()
+            try:
+                with session_scope() as session:
+                    if log_excerpts:
+                        excerpts_v = values(column('uuid', UUID), column('excerpt', Text), name='excerpts').data(
+                            list(log_excerpts.items())
+                        )
+                        session.execute(
+                            update(Job)
+                            .where(Job.uuid == excerpts_v.c.uuid)
+                            .values(latest_log_excerpt=excerpts_v.c.excerpt)
+                            .execution_options(synchronize_session=False)
+                        )
+                    if pings:
+                        pings_v = values(column('uuid', UUID), column('ping', TIMESTAMP), name='pings').data(
+                            list(pings.items())
+                        )
+                        session.execute(
+                            update(SparkWorker)
+                            .where(SparkWorker.uuid == pings_v.c.uuid)
+                            .values(
+                                last_ping=func.greatest(
+                                    func.coalesce(SparkWorker.last_ping, pings_v.c.ping), pings_v.c.ping
+                                )
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+            except Exception:
+                # put the data back, unless we received newer updates in the meantime
+                with self._status_lock:
+                    for job_uuid, excerpt in log_excerpts.items():
+                        self._pending_log_excerpts.setdefault(job_uuid, excerpt)
+                    for client_uuid, ping in pings.items():
+                        self._pending_pings.setdefault(client_uuid, ping)
+                raise
+
+            duration = time.monotonic() - start_time
+            with self._status_lock:
+                self._status_flush_count += 1
+                self._status_flush_last_duration = duration
+                self._status_flush_max_duration = max(self._status_flush_max_duration, duration)
+            log.debug(
+                'Flushed %s job status updates and %s worker pings in %.3fs', len(log_excerpts), len(pings), duration
+            )
+
+    def status_buffer_metrics(self) -> dict[str, T.Any]:
+        '''
+        Get the current depth of the status update buffer and flush timing information.
+        '''
+        with self._status_lock:
+            return {
+                'pending_job_updates': len(self._pending_log_excerpts),
+                'pending_worker_pings': len(self._pending_pings),
+                'flush_count': self._status_flush_count,
+                'flush_last_duration': self._status_flush_last_duration,
+                'flush_max_duration': self._status_flush_max_duration,
+            }
 
     def _process_job_finished_request(self, session, request, success: bool):
         """
@@ -464,6 +590,13 @@ class JobWorker:
             return self._error_reply('Request was malformed.')
 
         try:
+            if req_kind == 'job-status':
+                self._process_job_status_request(request)
+                return None  # we don't reply to this
+            if req_kind in ('job-accepted', 'job-rejected', 'job-success', 'job-failed'):
+                # write pending status updates before the state of any job changes
+                self.flush_status_updates()
+
             with session_scope() as session:
                 if req_kind == 'archive-info':
                     return self._process_archive_info_request(session, request)
@@ -473,9 +606,6 @@ class JobWorker:
                     return self._process_job_accepted_request(session, request)
                 if req_kind == 'job-rejected':
                     return self._process_job_rejected_request(session, request)
-                if req_kind == 'job-status':
-                    self._process_job_status_request(session, request)
-                    return None  # we don't reply to this
                 if req_kind == 'job-success':
                     return self._process_job_finished_request(session, request, True)
                 if req_kind == 'job-failed':
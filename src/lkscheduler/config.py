@@ -50,8 +50,9 @@ class SchedulerConfig:
             # sync packages from an origin OS every 12h
             self._intervals_min['synchrotron-autosync'] = cintervals.get('synchrotron-autosync', 12 * 60)
 
-            # refresh ariadne data all 5h
-            self._intervals_min['ariadne-update'] = cintervals.get('ariadne-update', 5 * 60)
+            # refresh ariadne data every 15min, only changed packages are checked and
+            # a full rescan of all packages happens at most once a day
+            self._intervals_min['ariadne-update'] = cintervals.get('ariadne-update', 15)
 
             # collect statistics every 4h
             self._intervals_min['statistics'] = cintervals.get('statistics', 4 * 60)
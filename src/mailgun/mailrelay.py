@@ -5,7 +5,6 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import os
-import json
 
 import zmq
 import zmq.asyncio
@@ -13,9 +12,9 @@ import zmq.asyncio
 import laniakea.typing as T
 from laniakea.logging import log
 from laniakea.msgstream import (
-    verify_event_message,
+    EventMessageVerifier,
+    event_message_unpack,
     create_event_listen_socket,
-    event_message_is_valid_and_signed,
 )
 
 from .config import MailgunConfig
@@ -36,10 +35,15 @@ class MailRelay:
 
         self._conf = MailgunConfig()
         self._lconf = LocalConfig()
-        self._zctx = zmq.asyncio.Context()
-        self._lhsub_socket = create_event_listen_socket(self._zctx)
         self._running = True
 
+        # set of tags that we will actually send emails for
+        self._handled_tags = {'_lk.archive.package-upload-accepted', '_lk.archive.package-upload-rejected'}
+
+        # only subscribe to the tags we handle, so everything else is already filtered by the publisher
+        self._zctx = zmq.asyncio.Context()
+        self._lhsub_socket = create_event_listen_socket(self._zctx, list(self._handled_tags))
+
         # Read all the keys that we trust, to verify messages
         # TODO: Implement auto-reloading of valid keys list if directory changes
         self._trusted_keys = {}
@@ -47,13 +51,11 @@ class MailRelay:
             signer_id, verify_key = keyfile_read_verify_key(keyfname)
             if signer_id and verify_key:
                 self._trusted_keys[signer_id] = verify_key
+        self._verifier = EventMessageVerifier(self._trusted_keys)
 
         self._mail_sender = MailSender()
         self._mtmpl = MailTemplateLoader()
 
-        # set of tags that we will actually send emails for
-        self._handled_tags = {'_lk.archive.package-upload-accepted', '_lk.archive.package-upload-rejected'}
-
         # basic template variables
         self._common_vars = {'project_name': config_get_project_name(), 'from_address': self._conf.mail_origin_address}
 
@@ -88,34 +90,14 @@ class MailRelay:
             mail_text = self._mtmpl.render('package-rejected', **data, **self._common_vars)
             self._mail_sender.send(mail_text)
 
-    async def _on_event_received(self, event):
-        tag = event['tag']
-        data = event['data']
-
-        if tag not in self._handled_tags:
-            return
-
-        signatures = event.get('signatures')
-        signature_trusted = False
-        for signer in signatures.keys():
-            key = self._trusted_keys.get(signer)
-            if not key:
-                continue
-            try:
-                verify_event_message(signer, event, key, assume_valid=True)
-            except Exception as e:
-                log.info('Invalid signature on event ({}): {}'.format(str(e), str(event)))
-                break
-
-            # if we are here, we verified one signature without issues and can go forward
-            signature_trusted = True
-            break
-
-        if not signature_trusted:
+    async def _on_event_received(self, data: bytes, event):
+        if not self._verifier.verify(data, event):
             log.warning('Unable to verify signature on event: {}'.format(str(event)))
             return
 
-        await self._send_mail_for(tag, data)
+        # a verified batch message vouches for all events it contains
+        for single_event in event_message_unpack(event):
+            await self._send_mail_for(single_event['tag'], single_event['data'])
 
     def stop(self):
         self._running = False
@@ -127,21 +109,18 @@ class MailRelay:
             mparts = await self._lhsub_socket.recv_multipart()
             if len(mparts) != 2:
                 log.info('Received message with odd length: %s', len(mparts))
-            msg_b = mparts[1]
-            msg_s = str(msg_b, 'utf-8', 'replace')
-
-            try:
-                event = json.loads(msg_s)
-            except json.JSONDecodeError as e:
-                # we ignore invalid requests
-                log.info('Received invalid JSON message: %s (%s)', msg_s if len(msg_s) > 1 else msg_b, str(e))
+                continue
+
+            # ignore tags we don't handle before even looking at the message
+            if str(mparts[0], 'utf-8', 'replace') not in self._handled_tags:
                 continue
 
             # check if the message is actually valid and can be processed
-            if not event_message_is_valid_and_signed(event):
+            event = self._verifier.decode(mparts[1])
+            if not event or event['tag'] not in self._handled_tags:
                 # we currently just silently ignore invalid submissions, no need to spam
                 # the logs in case some bad actor flood server with spam
                 log.debug('Invalid message ignored.')
                 continue
 
-            await self._on_event_received(event)
+            await self._on_event_received(mparts[1], event)
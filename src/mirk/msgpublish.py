@@ -5,7 +5,6 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import os
-import json
 import logging as log
 from typing import Any
 from fnmatch import fnmatch
@@ -15,9 +14,9 @@ import zmq.asyncio
 
 import laniakea.typing as T
 from laniakea.msgstream import (
-    verify_event_message,
+    EventMessageVerifier,
+    event_message_unpack,
     create_event_listen_socket,
-    event_message_is_valid_and_signed,
 )
 
 from .config import MirkConfig
@@ -110,6 +109,7 @@ class MatrixPublisher:
             signer_id, verify_key = keyfile_read_verify_key(keyfname)
             if signer_id and verify_key:
                 self._trusted_keys[signer_id] = verify_key
+        self._verifier = EventMessageVerifier(self._trusted_keys)
 
         self._mclient = MirkMatrixClient(self._mconf)
 
@@ -148,42 +148,18 @@ class MatrixPublisher:
 
         return text
 
-    async def _on_event_received(self, event):
-        tag = event['tag']
-        data = event['data']
-
-        # don't react to blacklisted tags
-        if tag in EVENT_TAG_BLACKLIST:
+    async def _on_event_received(self, data: bytes, event):
+        signature_trusted = self._verifier.verify(data, event)
+        if not signature_trusted and not self._mconf.allow_unsigned:
+            log.info('Unable to verify signature on event: {}'.format(str(event)))
             return
 
-        signatures = event.get('signatures')
-        signature_trusted = False
-        for signer in signatures.keys():
-            key = self._trusted_keys.get(signer)
-            if not key:
-                continue
-            try:
-                verify_event_message(signer, event, key, assume_valid=True)
-            except Exception as e:
-                log.info('Invalid signature on event ({}): {}'.format(str(e), str(event)))
-                break
-
-            # if we are here, we verified a signature without issues, which means
-            # the message is legit and we can sign it ourselves and publish it
-            signature_trusted = True
-            break
-
-        if signature_trusted:
-            text = self._tag_data_to_html_message(tag, data)
-        else:
-            if self._mconf.allow_unsigned:
-                text = self._tag_data_to_html_message(tag, data)
+        # a verified batch message vouches for all events it contains
+        for single_event in event_message_unpack(event):
+            text = self._tag_data_to_html_message(single_event['tag'], single_event['data'])
+            if not signature_trusted:
                 text = '[<font color="#ed1515">VERIFY_FAILED</font>] ' + text
-            else:
-                log.info('Unable to verify signature on event: {}'.format(str(event)))
-                return
-
-        await self._rooms_publish_text(event, text)
+            await self._rooms_publish_text(single_event, text)
 
     async def _rooms_publish_text(self, event: dict[str, T.Any], text: str):
         """Publish raw message text in all rooms."""
@@ -227,21 +203,18 @@ class MatrixPublisher:
             mparts = await self._lhsub_socket.recv_multipart()
             if len(mparts) != 2:
                 log.info('Received message with odd length: %s', len(mparts))
-            msg_b = mparts[1]
-            msg_s = str(msg_b, 'utf-8', 'replace')
+                continue
 
-            try:
-                event = json.loads(msg_s)
-            except json.JSONDecodeError as e:
-                # we ignore invalid requests
-                log.info('Received invalid JSON message: %s (%s)', msg_s if len(msg_s) > 1 else msg_b, str(e))
+            # don't react to blacklisted tags, no need to look at the message at all in that case
+            if str(mparts[0], 'utf-8', 'replace') in EVENT_TAG_BLACKLIST:
                 continue
 
             # check if the message is actually valid and can be processed
-            if not event_message_is_valid_and_signed(event):
+            event = self._verifier.decode(mparts[1])
+            if not event or event['tag'] in EVENT_TAG_BLACKLIST:
                 # we currently just silently ignore invalid submissions, no need to spam
                 # the logs in case some bad actor flood server with spam
                 log.debug('Invalid message ignored.')
                 continue
 
-            await self._on_event_received(event)
+            await self._on_event_received(mparts[1], event)
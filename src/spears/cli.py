@@ -42,7 +42,7 @@ def command_migrate(options):
 
     engine = SpearsEngine()
 
-    ret = engine.run_migration(options.repo_name, options.suite1, options.suite2)
+    ret = engine.run_migration(options.repo_name, options.suite1, options.suite2, max_jobs=options.jobs)
     if not ret:
         sys.exit(2)
 
@@ -69,6 +69,14 @@ def create_parser():
         'migrate', help='Run migration. If suites are omitted, migration is run for all targets.'
     )
     sp.add_argument('--repo', dest='repo_name', help='Act only on the repository with this name.')
+    sp.add_argument(
+        '-j',
+        '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='Maximum number of independent migrations to run in parallel (default: 1).',
+    )
     sp.add_argument('suite1', type=str, help='The source suite.', nargs='?')
     sp.add_argument('suite2', type=str, help='The target suite.', nargs='?')
     sp.set_defaults(func=command_migrate)
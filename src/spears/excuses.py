@@ -5,23 +5,26 @@
 # SPDX-License-Identifier: LGPL-3.0+
 
 import re
-from typing import Dict
+import time
 from datetime import UTC, datetime
 
 import yaml
+from sqlalchemy import tuple_
 
-from laniakea.db import (
-    SpearsExcuse,
-    SourcePackage,
-    SpearsOldBinaries,
-    SpearsMigrationTask,
-)
+import laniakea.typing as T
+from laniakea.db import SourcePackage, SpearsMigrationTask
+
+# use the much faster libyaml-based loader if PyYAML was built with it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# number of source packages to resolve in a single database query
+RESOLVE_BATCH_SIZE = 2000
 
 
 class ExcusesFile:
     '''
     Read the excuses.yml Britney output file as well as the Britney logfile
-    and create SpearsExcuse objects to be added to the database from their data.
+    and create SpearsExcuse database rows from their data.
     '''
 
     def __init__(self, session, fname_excuses: str, fname_log: str, mtask: SpearsMigrationTask):
@@ -29,12 +32,15 @@ class ExcusesFile:
         self._mtask = mtask
         self._suites_source = mtask.source_suites
         self._suite_target = mtask.target_suite
+        self.timings: dict[str, float] = {}
 
-        with open(fname_excuses, 'r') as f:
-            self._excuses_data = yaml.safe_load(f)
+        start_time = time.monotonic()
+        with open(fname_excuses, 'rb') as f:
+            self._excuses_data = yaml.load(f, Loader=YamlLoader)
 
         with open(fname_log) as f:
             self._log_data = [line.rstrip() for line in f]
+        self.timings['parse'] = time.monotonic() - start_time
 
     def _process_log_data(self):
         '''
@@ -81,7 +87,42 @@ class ExcusesFile:
 
         return res
 
-    def get_excuses(self) -> Dict[str, SpearsExcuse]:
+    def _resolve_source_packages(self, entries) -> dict[tuple[str, str], T.Any]:
+        '''
+        Find the UUIDs of all source packages referenced by the excuses entries,
+        using as few database queries as possible.
+        '''
+
+        wanted = {self._entry_source_key(entry) for entry in entries}
+        res = {}
+        wanted_list = list(wanted)
+        for i in range(0, len(wanted_list), RESOLVE_BATCH_SIZE):
+            chunk = wanted_list[i : i + RESOLVE_BATCH_SIZE]
+            spkg_q = self._session.query(SourcePackage.name, SourcePackage.version, SourcePackage.uuid).filter(
+                SourcePackage.repo_id == self._mtask.repo_id,
+                tuple_(SourcePackage.name, SourcePackage.version).in_(chunk),
+            )
+            for name, version, spkg_uuid in spkg_q:
+                res[(name, version)] = spkg_uuid
+
+        return res
+
+    @staticmethod
+    def _entry_source_key(entry) -> tuple[str, str]:
+        '''Get the name/version pair of the source package an excuse entry is about.'''
+
+        version = str(entry['new-version'])
+        if not version or version == '-':
+            # the package might be deleted, so we need to search for the *old* version instead
+            version = str(entry['old-version'])
+        return str(entry['source']), version
+
+    def get_excuse_rows(self) -> dict[tuple[str, str, str], dict[str, T.Any]]:
+        '''
+        Get the column values of all excuses, keyed by source package name, new and old version.
+
+        The returned dictionaries can be used directly for bulk inserts and updates of SpearsExcuse.
+        '''
         res = {}
 
         other_reason_ignore_strings = (
@@ -97,68 +138,67 @@ class ExcusesFile:
         loginfo = self._process_log_data()
 
         ysrc = self._excuses_data['sources']
+
+        start_time = time.monotonic()
+        spkg_uuids = self._resolve_source_packages(ysrc)
+        self.timings['resolve'] = time.monotonic() - start_time
+
+        start_time = time.monotonic()
+        time_created = datetime.now(UTC)
         for entry in ysrc:
-            excuse = SpearsExcuse()
-
-            excuse.time_created = datetime.now(UTC)
-            excuse.migration_task = self._mtask
-
-            spkg_name = str(entry['source'])
-            excuse.version_new = str(entry['new-version'])
-            excuse.version_old = str(entry['old-version'])
-
-            spkg_version = excuse.version_new
-            if not spkg_version or spkg_version == '-':
-                # the package might be deleted, so we need to search for the *old* version instead
-                spkg_version = excuse.version_old
-
-            excuse.source_package = (
-                self._session.query(SourcePackage)
-                .filter(
-                    SourcePackage.repo_id == self._mtask.repo.id,
-                    SourcePackage.name == spkg_name,
-                    SourcePackage.version == spkg_version,
-                )
-                .one_or_none()
-            )
-            if not excuse.source_package:
+            spkg_name, spkg_version = self._entry_source_key(entry)
+            spkg_uuid = spkg_uuids.get((spkg_name, spkg_version))
+            if not spkg_uuid:
                 raise ValueError("Unable to find source package %s/%s!" % (spkg_name, spkg_version))
 
-            excuse.is_candidate = bool(entry['is-candidate'])
-            if 'maintainer' in entry:
-                excuse.maintainer = str(entry['maintainer'])
+            excuse = {
+                'time_created': time_created,
+                'migration_id': self._mtask.id,
+                'source_package_id': spkg_uuid,
+                'version_new': str(entry['new-version']),
+                'version_old': str(entry['old-version']),
+                'is_candidate': bool(entry['is-candidate']),
+                'maintainer': str(entry['maintainer']) if 'maintainer' in entry else None,
+                'age_current': None,
+                'age_required': None,
+                'missing_archs_primary': [],
+                'missing_archs_secondary': [],
+                'old_binaries': [],
+                'blocked_by': [],
+                'migrate_after': [],
+                'manual_block': None,
+                'other': [],
+                # add log information
+                'log_excerpt': loginfo.get(spkg_name),
+            }
 
             if 'policy_info' in entry:
                 policy = entry['policy_info']
                 if 'age' in policy:
-                    excuse.age_current = int(policy['age']['current-age'])
-                    excuse.age_required = int(policy['age']['age-requirement'])
+                    excuse['age_current'] = int(policy['age']['current-age'])
+                    excuse['age_required'] = int(policy['age']['age-requirement'])
 
             if 'missing-builds' in entry:
                 ybuilds = entry['missing-builds']
-                excuse.missing_archs_primary = list(ybuilds['on-architectures'])
-                excuse.missing_archs_secondary = list(ybuilds['on-unimportant-architectures'])
+                excuse['missing_archs_primary'] = list(ybuilds['on-architectures'])
+                excuse['missing_archs_secondary'] = list(ybuilds['on-unimportant-architectures'])
 
             if 'old-binaries' in entry:
-                obins = []
-                for yver, ybins in entry['old-binaries'].items():
-                    obin = SpearsOldBinaries()
-                    obin.pkg_version = str(yver)
-                    obin.binaries = list(ybins)
-                    obins.append(obin)
-                excuse.set_old_binaries(obins)
+                # same format as SpearsExcuse.set_old_binaries() produces
+                excuse['old_binaries'] = [
+                    {'pkg_version': str(yver), 'binaries': list(ybins)} for yver, ybins in entry['old-binaries'].items()
+                ]
 
             if 'dependencies' in entry:
                 ydeps = entry['dependencies']
                 if 'migrate-after' in ydeps:
-                    excuse.migrate_after = list(ydeps['migrate-after'])
+                    excuse['migrate_after'] = list(ydeps['migrate-after'])
 
                 if 'blocked-by' in ydeps:
-                    excuse.blocked_by = list(ydeps['blocked-by'])
+                    excuse['blocked_by'] = list(ydeps['blocked-by'])
 
             # other plaintext excuses
             if 'excuses' in entry:
-                excuse.other = []
                 for n in entry['excuses']:
                     s = str(n)
                     if not any(test in s for test in other_reason_ignore_strings):
@@ -166,11 +206,12 @@ class ExcusesFile:
                             s = s[4:]
                         if 'buildd.debian.org' in s:
                             s = re.sub(debian_buildd_link_re, r'\1', s)
-                        excuse.other.append(s)
+                        excuse['other'].append(s)
 
-            # add log information
-            excuse.log_excerpt = loginfo.get(excuse.source_package.name)
+            res[(spkg_name, excuse['version_new'], excuse['version_old'])] = excuse
+        self.timings['process'] = time.monotonic() - start_time
 
-            res[excuse.make_idname()] = excuse
+        # we don't need the raw data anymore
+        self._excuses_data = None
 
         return res
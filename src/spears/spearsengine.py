@@ -8,12 +8,16 @@ from __future__ import annotations
 
 import os
 import gzip
+import time
 import shutil
+import hashlib
+import resource
 import subprocess
 from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from pebble import concurrent
-from apt_pkg import TagFile
+from sqlalchemy import delete, insert, update
 
 import laniakea.typing as T
 from laniakea.db import (
@@ -21,23 +25,129 @@ from laniakea.db import (
     SpearsHint,
     ArchiveSuite,
     SpearsExcuse,
+    BinaryPackage,
     SourcePackage,
     ArchiveComponent,
     ArchiveRepository,
     ArchiveArchitecture,
     SpearsMigrationTask,
+    ArchiveRepoSuiteSettings,
     session_scope,
 )
 from laniakea.utils import listify, open_compressed
 from laniakea.logging import log
 from laniakea.msgstream import EventEmitter
-from laniakea.reporeader import RepositoryReader
 from laniakea.localconfig import LocalConfig
 
 from .britney import Britney
 from .excuses import ExcusesFile
 from .britneyconfig import BritneyConfig
 
+# size of the chunks we copy when merging index files
+MERGE_CHUNK_SIZE = 1024 * 1024
+
+# number of excuses written to the database in a single statement
+EXCUSE_BATCH_SIZE = 1000
+
+# excuse columns that are refreshed if Britney emits an excuse again
+EXCUSE_UPDATE_FIELDS = (
+    'is_candidate',
+    'maintainer',
+    'age_current',
+    'age_required',
+    'missing_archs_primary',
+    'missing_archs_secondary',
+    'old_binaries',
+    'blocked_by',
+    'migrate_after',
+    'manual_block',
+    'other',
+    'log_excerpt',
+)
+
+
+def group_dependent_migration_tasks(migration_tasks: list[SpearsMigrationTask]) -> list[list[SpearsMigrationTask]]:
+    """
+    Split migration tasks into groups which can be run independently of each other.
+
+    Tasks end up in the same group if they share any suite, either as source or as target.
+    The original order of the tasks is kept within each group.
+    """
+
+    group_for_suite: dict[int, int] = {}
+    groups: dict[int, list[SpearsMigrationTask]] = {}
+    for idx, mtask in enumerate(migration_tasks):
+        suite_ids = {s.id for s in mtask.source_suites}
+        suite_ids.add(mtask.target_suite_id)
+
+        # merge all groups this task connects with
+        group_id = idx
+        tasks = [mtask]
+        for gid in sorted({group_for_suite[sid] for sid in suite_ids if sid in group_for_suite}):
+            tasks.extend(groups.pop(gid))
+            group_id = min(group_id, gid)
+        groups[group_id] = tasks
+        for gtask in tasks:
+            for sid in {s.id for s in gtask.source_suites} | {gtask.target_suite_id}:
+                group_for_suite[sid] = group_id
+
+    return [sorted(tasks, key=migration_tasks.index) for _, tasks in sorted(groups.items())]
+
+
+def _index_inputs_checksum(groups: list[list[str]]) -> str:
+    """Calculate a checksum over the names and contents of all files that are merged into an index file."""
+
+    csum = hashlib.sha256()
+    for files in groups:
+        for fname in files:
+            csum.update(fname.encode('utf-8') + b'\0')
+            with open(fname, 'rb') as f:
+                while chunk := f.read(MERGE_CHUNK_SIZE):
+                    csum.update(chunk)
+        csum.update(b'\0')
+    return csum.hexdigest()
+
+
+def _stream_merge_index_files(target_fname: str, groups: list[list[str]]) -> bool:
+    """
+    Merge compressed Packages/Sources files into one gzip-compressed file, without loading them into memory.
+
+    Files of a group are written one after the other, separated and followed by an empty line
+    if we have written any data. If the input files have not changed since the target file
+    was last created, nothing is done.
+
+    :param target_fname: The merged file to create.
+    :param groups: Lists of files to merge.
+    :return: True if the target file was written, False if it was up to date.
+    """
+
+    inputs_csum = _index_inputs_checksum(groups)
+    csum_fname = target_fname + '.inputs-sha256'
+    if os.path.isfile(target_fname) and os.path.isfile(csum_fname):
+        with open(csum_fname, 'r') as f:
+            if f.read().strip() == inputs_csum:
+                return False
+
+    tmp_fname = target_fname + '.new'
+    with gzip.open(tmp_fname, 'wb') as out:
+        have_data = False
+        for files in groups:
+            for i, fname in enumerate(files):
+                if i > 0 and have_data:
+                    out.write(b'\n')
+                with open_compressed(fname) as f:
+                    while chunk := f.read(MERGE_CHUNK_SIZE):
+                        out.write(chunk)
+                        if not have_data and chunk.strip():
+                            have_data = True
+            if have_data:
+                out.write(b'\n')
+    os.replace(tmp_fname, target_fname)
+
+    with open(csum_fname, 'w') as f:
+        f.write(inputs_csum + '\n')
+    return True
+
 
 class SpearsEngine:
     '''
@@ -196,19 +306,11 @@ class SpearsEngine:
                     log.debug('Generating combined packages input file: {}'.format(target_packages_file))
                     os.makedirs(os.path.dirname(target_packages_file), exist_ok=True)
 
-                    data = b''
-                    for fname, fname_all in packages_files:
-                        with open_compressed(fname) as f:
-                            data += f.read()
-                        if fname_all:
-                            if data.rstrip():
-                                data += b'\n'
-                            with open_compressed(fname_all) as f:
-                                data += f.read()
-                        if data.rstrip():
-                            data += b'\n'
-                    with gzip.open(target_packages_file, 'w') as f:
-                        f.write(data)
+                    if not _stream_merge_index_files(
+                        target_packages_file,
+                        [[fname, fname_all] if fname_all else [fname] for fname, fname_all in packages_files],
+                    ):
+                        log.debug('Combined packages file is up to date: {}'.format(target_packages_file))
 
             sources_files = []
             for suite in suites:
@@ -229,14 +331,8 @@ class SpearsEngine:
             log.debug('Generating combined sources input file: {}'.format(target_sources_file))
             os.makedirs(os.path.dirname(target_sources_file), exist_ok=True)
 
-            data = b''
-            for fname in sources_files:
-                with open_compressed(fname) as f:
-                    data += f.read()
-                if data.rstrip():
-                    data += b'\n'
-            with gzip.open(target_sources_file, 'w') as f:
-                f.write(data)
+            if not _stream_merge_index_files(target_sources_file, [[fname] for fname in sources_files]):
+                log.debug('Combined sources file is up to date: {}'.format(target_sources_file))
 
         # Britney needs a Release file to determine the source suites components and architectures.
         # To keep things simple, we just copy one of the source Release files.
@@ -258,12 +354,23 @@ class SpearsEngine:
         This function prepares the combined data in the respective workspace location.
         """
 
+        # ru_maxrss is the peak of the whole process (in KiB on Linux), so we report by how much the merge
+        # raised it - with migrations running in parallel, this may include the other migrations' usage
+        maxrss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
         srcmerge_future = self._write_merged_dists_data_for(session, mi_wspace, mtask, mtask.source_suites)  # type: ignore[call-arg]
         dstmerge_future = self._write_merged_dists_data_for(session, mi_wspace, mtask, mtask.target_suite)  # type: ignore[call-arg]
 
         srcmerge_future.result()
         dstmerge_future.result()
 
+        maxrss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        log.info(
+            'Merging dists data raised the process peak memory usage by {:.1f} MiB (process peak: {:.1f} MiB)'.format(
+                (maxrss_after - maxrss_before) / 1024, maxrss_after / 1024
+            )
+        )
+
     def _create_faux_packages(self, session, mi_wspace: str, mtask: SpearsMigrationTask) -> None:
         """
         If we have a partial source and target suite, we need to let Britney know about the
@@ -284,105 +391,148 @@ class SpearsEngine:
             log.info('No auto-generating faux packages: No source and target suite parents, generation is unnecessary.')
             return
 
+        # the faux packages only depend on the contents of the involved suites, so we can reuse
+        # the previous result if none of them has changed since
+        fauxpkg_fname = os.path.join(mi_wspace, 'input', 'faux-packages')
+        cache_key = self._faux_packages_cache_key(session, mtask)
+        cache_key_fname = fauxpkg_fname + '.cachekey'
+        if cache_key and os.path.isfile(fauxpkg_fname) and os.path.isfile(cache_key_fname):
+            with open(cache_key_fname, 'r') as f:
+                if f.read().strip() == cache_key:
+                    log.debug('Faux packages list is up to date.')
+                    return
+
         existing_pkg_arch_set = set()
         log.debug('Creating index of valid packages that do not need a faux package.')
 
-        # we need repository information to only generate faux packages if a package doesn't exist
-        # in our source suite(s) already
-        archive_root_dir = os.path.join(self._lconf.archive_root_dir, mtask.repo.name)
-        repo_reader = RepositoryReader(archive_root_dir, mtask.repo.name, trusted_keyrings=[])
-        repo_reader.set_trusted(True)  # we assume the local repository data is trusted
+        # we only generate faux packages if a package doesn't exist in our source suite(s) already
         for suite in mtask.source_suites:
-            suite_nodb = ArchiveSuite(suite.name, suite.alias)
-            for component in suite.components:
-                component_nodb = ArchiveComponent(component.name)
-                for arch in suite.architectures:
-                    aname = arch.name
-                    # create detached entities so the local packages aren't accidentally added to the database
-                    arch_nodb = ArchiveArchitecture(arch.name)
-
-                    # fetch package information
-                    for bpkg in repo_reader.binary_packages(suite_nodb, component_nodb, arch_nodb):
-                        existing_pkg_arch_set.add(aname + ':' + bpkg.name)
-                    for spkg in repo_reader.source_packages(suite_nodb, component_nodb):
-                        existing_pkg_arch_set.add(aname + ':' + spkg.name)
-        del repo_reader
+            component_ids = [c.id for c in suite.components]
+            arch_names = [a.name for a in suite.architectures]
+
+            bpkg_q = (
+                session.query(ArchiveArchitecture.name, BinaryPackage.name)
+                .join(BinaryPackage.architecture)
+                .filter(
+                    BinaryPackage.repo_id == mtask.repo_id,
+                    BinaryPackage.suites.any(id=suite.id),
+                    BinaryPackage.component_id.in_(component_ids),
+                    BinaryPackage.architecture_id.in_([a.id for a in suite.architectures]),
+                )
+                .distinct()
+            )
+            for aname, pkgname in bpkg_q.yield_per(5000):
+                existing_pkg_arch_set.add(aname + ':' + pkgname)
+
+            spkg_q = (
+                session.query(SourcePackage.name)
+                .filter(
+                    SourcePackage.repo_id == mtask.repo_id,
+                    SourcePackage.suites.any(id=suite.id),
+                    SourcePackage.component_id.in_(component_ids),
+                )
+                .distinct()
+            )
+            for (pkgname,) in spkg_q.yield_per(5000):
+                for aname in arch_names:
+                    existing_pkg_arch_set.add(aname + ':' + pkgname)
 
         log.debug('Generating faux packages list')
-        fauxpkg_fname = os.path.join(mi_wspace, 'input', 'faux-packages')
         fauxpkg_data = {}
 
         for parent in mtask.target_suite.parents:
-            for component in parent.components:
-                for installer_dir in ['', 'debian-installer']:
-                    for arch in parent.architectures:
-                        pfile = os.path.join(
-                            archive_root_dir,
-                            'dists',
-                            parent.name,
-                            component.name,
-                            installer_dir,
-                            'binary-{}'.format(arch.name),
-                            'Packages.xz',
-                        )
-                        if not os.path.isfile(pfile):
-                            continue
-
-                        log.debug('Reading data for faux packages list: {}'.format(pfile))
-
-                        with TagFile(pfile) as tf:
-                            for e in tf:
-                                pkgname = e['Package']
-                                pkgversion = e['Version']
-                                pkgarch = e['Architecture']
-
-                                pkid = '{}-{}-{}'.format(pkgname, pkgversion, pkgarch)
-                                if pkid in fauxpkg_data:
-                                    continue
-                                pkgname_arch = pkgarch + ':' + pkgname
-                                if pkgname_arch in existing_pkg_arch_set:
-                                    continue
-                                provides = e.get('Provides', '')
-
-                                data = 'Package: {}\nVersion: {}'.format(pkgname, pkgversion)
-                                if pkgarch and pkgarch != 'all':
-                                    data = data + '\nArchitecture: {}'.format(pkgarch)
-                                if provides:
-                                    data = data + '\nProvides: {}'.format(provides)
-                                if component.name != 'main':
-                                    data = data + '\nComponent: {}'.format(component.name)
-
-                                fauxpkg_data[pkid] = data
-
-                                # FIXME: We shouldn't have to special-case this :any case,
-                                # rather Britney should do the right thing and recognize this
-                                # notation for faux-packages. But until that is fixed
-                                # properly and since a dependency on python3:any is so common, we
-                                # will work around this issue
-                                if pkgname == 'python3':
-                                    pkid = '{}-{}-{}'.format('python3:any', pkgversion, pkgarch)
-                                    if pkid in fauxpkg_data:
-                                        continue
-                                    fauxpkg_data[pkid] = data.replace('Package: python3\n', 'Package: python3:any\n')
+            parent_q = (
+                session.query(
+                    BinaryPackage.name,
+                    BinaryPackage.version,
+                    ArchiveArchitecture.name,
+                    ArchiveComponent.name,
+                    BinaryPackage.provides,
+                )
+                .join(BinaryPackage.architecture)
+                .join(BinaryPackage.component)
+                .filter(
+                    BinaryPackage.repo_id == mtask.repo_id,
+                    BinaryPackage.suites.any(id=parent.id),
+                    BinaryPackage.component_id.in_([c.id for c in parent.components]),
+                    BinaryPackage.architecture_id.in_([a.id for a in parent.architectures]),
+                )
+                .order_by(BinaryPackage.component_id, BinaryPackage.deb_type, BinaryPackage.architecture_id)
+            )
+            log.debug('Reading data for faux packages list from suite: {}'.format(parent.name))
+
+            for pkgname, pkgversion, pkgarch, component_name, provides in parent_q.yield_per(5000):
+                pkid = '{}-{}-{}'.format(pkgname, pkgversion, pkgarch)
+                if pkid in fauxpkg_data:
+                    continue
+                pkgname_arch = pkgarch + ':' + pkgname
+                if pkgname_arch in existing_pkg_arch_set:
+                    continue
+
+                data = 'Package: {}\nVersion: {}'.format(pkgname, pkgversion)
+                if pkgarch and pkgarch != 'all':
+                    data = data + '\nArchitecture: {}'.format(pkgarch)
+                if provides:
+                    data = data + '\nProvides: {}'.format(', '.join(provides))
+                if component_name != 'main':
+                    data = data + '\nComponent: {}'.format(component_name)
+
+                fauxpkg_data[pkid] = data
+
+                # FIXME: We shouldn't have to special-case this :any case,
+                # rather Britney should do the right thing and recognize this
+                # notation for faux-packages. But until that is fixed
+                # properly and since a dependency on python3:any is so common, we
+                # will work around this issue
+                if pkgname == 'python3':
+                    pkid = '{}-{}-{}'.format('python3:any', pkgversion, pkgarch)
+                    if pkid in fauxpkg_data:
+                        continue
+                    fauxpkg_data[pkid] = data.replace('Package: python3\n', 'Package: python3:any\n')
 
         with open(fauxpkg_fname, 'w') as f:
             for segment in fauxpkg_data.values():
                 f.write(segment + '\n\n')
 
+        if cache_key:
+            with open(cache_key_fname, 'w') as f:
+                f.write(cache_key + '\n')
+        elif os.path.isfile(cache_key_fname):
+            os.remove(cache_key_fname)
+
+    def _faux_packages_cache_key(self, session, mtask: SpearsMigrationTask) -> str | None:
+        """
+        Get a key identifying the state of all suites faux packages are generated from.
+
+        Returns None if any of the suites has unpublished changes, in which case we can not cache anything.
+        """
+
+        suite_ids = [s.id for s in mtask.source_suites] + [p.id for p in mtask.target_suite.parents]
+        rss_list = (
+            session.query(ArchiveRepoSuiteSettings)
+            .filter(
+                ArchiveRepoSuiteSettings.repo_id == mtask.repo_id,
+                ArchiveRepoSuiteSettings.suite_id.in_(suite_ids),
+            )
+            .order_by(ArchiveRepoSuiteSettings.suite_id)
+            .all()
+        )
+        if len(rss_list) != len(set(suite_ids)) or any(rss.changes_pending for rss in rss_list):
+            return None
+        return ';'.join('{}:{}'.format(rss.suite_id, rss.time_published.isoformat()) for rss in rss_list)
+
     def _collect_urgencies(self, session, mi_wspace: T.PathUnion, mtask: SpearsMigrationTask):
         log.debug('Collecting urgencies for %s:%s', mtask.repo.name, mtask.target_suite.name)
-        udata = (
-            session.query(SourcePackage.name, SourcePackage.version, SourcePackage.changes_urgency).filter(
-                SourcePackage.repo_id == mtask.repo.id,
-                SourcePackage.suites.any(id=mtask.target_suite_id),
-                SourcePackage.time_deleted.is_(None),
-            )
-        ).all()
+        udata = session.query(SourcePackage.name, SourcePackage.version, SourcePackage.changes_urgency).filter(
+            SourcePackage.repo_id == mtask.repo.id,
+            SourcePackage.suites.any(id=mtask.target_suite_id),
+            SourcePackage.time_deleted.is_(None),
+        )
 
         log.info('Writing urgency policy file for: %s:%s', mtask.repo.name, mtask.target_suite.name)
         urgency_policy_file = os.path.join(mi_wspace, 'state', 'age-policy-urgencies')
         with open(urgency_policy_file, 'w') as f:
-            for pkgname, version, changes_urgency in udata:
+            for pkgname, version, changes_urgency in udata.yield_per(5000):
                 f.write('{} {} {}\n'.format(pkgname, version, changes_urgency.to_string()))
 
     def _setup_dates(self, mi_wspace: T.PathUnion):
@@ -449,7 +599,7 @@ class SpearsEngine:
 
         return processed_result
 
-    def _retrieve_excuses(self, session, mi_wspace: str, mtask: SpearsMigrationTask):
+    def _retrieve_excuses(self, session, mi_wspace: str, mtask: SpearsMigrationTask) -> tuple[dict, dict[str, float]]:
         excuses_yaml = os.path.join(mi_wspace, 'output', 'target', 'excuses.yaml')
         log_file = os.path.join(mi_wspace, 'output', 'target', 'output.txt')
 
@@ -457,13 +607,87 @@ class SpearsEngine:
             raise Exception('Unable to find and process the excuses information. Spears data will be outdated.')
 
         efile = ExcusesFile(session, excuses_yaml, log_file, mtask)
-        excuses = []
-        for _, excuse in efile.get_excuses().items():
-            if excuse in session:
-                session.expunge(excuse)  # don't add this to the database yet
-            excuses.append(excuse)
+        excuses = efile.get_excuse_rows()
+
+        return excuses, dict(efile.timings)
+
+    def _store_excuses(
+        self, session, mtask: SpearsMigrationTask, excuses: dict, emitter: EventEmitter, timings: dict[str, float]
+    ):
+        """
+        Insert, update and remove the excuses of a migration task in bulk.
+
+        :param excuses: Excuse rows as returned by :func:`ExcusesFile.get_excuse_rows`
+        :param timings: Durations of the previous processing phases, extended and logged by this function.
+        """
+
+        suites_source = [s.name for s in mtask.source_suites]
+        suite_target = mtask.target_suite.name
+
+        # list existing excuses
+        start_time = time.monotonic()
+        existing_q = (
+            session.query(SpearsExcuse.uuid, SourcePackage.name, SpearsExcuse.version_new, SpearsExcuse.version_old)
+            .join(SpearsExcuse.source_package)
+            .filter(SpearsExcuse.migration_id == mtask.id)
+        )
+        existing_excuses = {(name, vnew, vold): uuid for uuid, name, vnew, vold in existing_q}
+
+        new_rows = []
+        update_rows = []
+        for key, row in excuses.items():
+            excuse_uuid = existing_excuses.pop(key, None)
+            if excuse_uuid:
+                # the excuse already exists, so we just update it
+                update_rows.append({'uuid': excuse_uuid, **{f: row[f] for f in EXCUSE_UPDATE_FIELDS}})
+                continue
 
-        return excuses
+            row['uuid'] = uuid4()  # we need an UUID immediately to submit it in the event payload
+            new_rows.append(row)
+            data = {
+                'uuid': str(row['uuid']),
+                'suites_source': suites_source,
+                'suite_target': suite_target,
+                'source_package': key[0],
+                'version_new': row['version_new'],
+                'version_old': row['version_old'],
+            }
+            emitter.submit_event('new-excuse', data)
+
+        for i in range(0, len(new_rows), EXCUSE_BATCH_SIZE):
+            session.execute(insert(SpearsExcuse), new_rows[i : i + EXCUSE_BATCH_SIZE])
+        for i in range(0, len(update_rows), EXCUSE_BATCH_SIZE):
+            session.execute(update(SpearsExcuse), update_rows[i : i + EXCUSE_BATCH_SIZE])
+        timings['upsert'] = time.monotonic() - start_time
+
+        # drop all excuses that Britney did not emit again
+        start_time = time.monotonic()
+        for (name, vnew, vold), excuse_uuid in existing_excuses.items():
+            data = {
+                'uuid': str(excuse_uuid),
+                'suites_source': suites_source,
+                'suite_target': suite_target,
+                'source_package': name,
+                'version_new': vnew,
+                'version_old': vold,
+            }
+            emitter.submit_event('excuse-removed', data)
+        stale_uuids = list(existing_excuses.values())
+        for i in range(0, len(stale_uuids), EXCUSE_BATCH_SIZE):
+            session.execute(
+                delete(SpearsExcuse)
+                .where(SpearsExcuse.uuid.in_(stale_uuids[i : i + EXCUSE_BATCH_SIZE]))
+                .execution_options(synchronize_session=False)
+            )
+        timings['prune'] = time.monotonic() - start_time
+
+        log.info(
+            'Stored excuses: %s new, %s updated, %s removed (%s)',
+            len(new_rows),
+            len(update_rows),
+            len(stale_uuids),
+            ', '.join('{}: {:.2f}s'.format(phase, duration) for phase, duration in timings.items()),
+        )
 
     def _run_migration_internal(self, session, mtask: SpearsMigrationTask):
         mi_wspace = self._get_migrate_workspace(mtask)
@@ -512,8 +736,7 @@ class SpearsEngine:
             return None
 
         log.info('Retrieving excuses (%s)', migration_displayname)
-        res = self._retrieve_excuses(session, mi_wspace, mtask)
-        return res
+        return self._retrieve_excuses(session, mi_wspace, mtask)
 
     def _run_migration_for_entries(self, session, migration_tasks: T.List[SpearsMigrationTask]):
         # event emitted for message publishing
@@ -527,76 +750,75 @@ class SpearsEngine:
             )
             assert len(mtask.source_suites) >= 1
 
-            n_excuses = self._run_migration_internal(session, mtask)
-            if n_excuses is None:
+            result = self._run_migration_internal(session, mtask)
+            if result is None:
                 continue
+            n_excuses, timings = result
 
-            # list existing excuses
-            existing_excuses = {}
-            all_excuses = session.query(SpearsExcuse).filter(SpearsExcuse.migration_id == mtask.id).all()
-            for excuse in all_excuses:
-                existing_excuses[excuse.make_idname()] = excuse
-
-            for new_excuse in n_excuses:
-                excuse = existing_excuses.pop(new_excuse.make_idname(), None)
-                if excuse:
-                    # the excuse already exists, so we just update it
-                    excuse_is_new = False
-                else:
-                    excuse_is_new = True
-                    excuse = new_excuse
-
-                if excuse_is_new:
-                    excuse.uuid = uuid4()  # we need an UUID immediately to submit it in the event payload
-                    session.add(excuse)
-
-                    data = {
-                        'uuid': str(excuse.uuid),
-                        'suites_source': [s.name for s in excuse.migration_task.source_suites],
-                        'suite_target': excuse.migration_task.target_suite.name,
-                        'source_package': excuse.source_package.name,
-                        'version_new': excuse.version_new,
-                        'version_old': excuse.version_old,
-                    }
-                    emitter.submit_event('new-excuse', data)
-                else:
-                    excuse.is_candidate = new_excuse.is_candidate
-                    excuse.maintainer = new_excuse.maintainer
-
-                    excuse.age_current = new_excuse.age_current
-                    excuse.age_required = new_excuse.age_required
-
-                    excuse.missing_archs_primary = new_excuse.missing_archs_primary
-                    excuse.missing_archs_secondary = new_excuse.missing_archs_secondary
-
-                    excuse.set_old_binaries(new_excuse.get_old_binaries())
-
-                    excuse.blocked_by = new_excuse.blocked_by
-                    excuse.migrate_after = new_excuse.migrate_after
-                    excuse.manual_block = new_excuse.manual_block
-                    excuse.other = new_excuse.other
-                    excuse.log_excerpt = new_excuse.log_excerpt
-
-            for excuse in existing_excuses.values():
-                data = {
-                    'uuid': str(excuse.uuid),
-                    'suites_source': [s.name for s in excuse.migration_task.source_suites],
-                    'suite_target': excuse.migration_task.target_suite.name,
-                    'source_package': excuse.source_package.name,
-                    'version_new': excuse.version_new,
-                    'version_old': excuse.version_old,
-                }
-                emitter.submit_event('excuse-removed', data)
-                session.delete(excuse)
+            self._store_excuses(session, mtask, n_excuses, emitter, timings)
 
             # add changes to the database early
             session.commit()
 
         return True
 
-    def run_migration(self, repo_name: str, source_suite_name: str, target_suite_name: str):
+    def _run_migration_group(self, mtask_ids: list[int]):
+        """
+        Run a group of dependent migration tasks one after another, in a separate database session.
+        """
+
         with session_scope() as session:
-            migration_tasks = session.query(SpearsMigrationTask).all()
+            migration_tasks = [session.get(SpearsMigrationTask, mtask_id) for mtask_id in mtask_ids]
+            return self._run_migration_for_entries(session, migration_tasks)
+
+    def _run_migrations_concurrently(self, migration_tasks: T.List[SpearsMigrationTask], max_jobs: int = 1) -> bool:
+        """
+        Run independent migration tasks in parallel.
+
+        Each task already has its own workspace, but tasks that share a suite depend on each other's
+        results (or would run concurrent imports into the same target suite), so they are grouped
+        and the tasks of every group are run sequentially in their original order.
+
+        :param max_jobs: Maximum number of migration groups to process at the same time.
+        """
+
+        groups = group_dependent_migration_tasks(migration_tasks)
+        if max_jobs <= 1 or len(groups) <= 1:
+            with session_scope() as session:
+                return self._run_migration_for_entries(
+                    session, [session.get(SpearsMigrationTask, mtask.id) for mtask in migration_tasks]
+                )
+
+        log.info('Running %s independent migration groups with up to %s in parallel.', len(groups), max_jobs)
+        success = True
+        with ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='spears-migrate') as executor:
+            futures = {
+                executor.submit(self._run_migration_group, [mtask.id for mtask in group]): group for group in groups
+            }
+            for future in as_completed(futures):
+                try:
+                    if not future.result():
+                        success = False
+                except Exception as e:
+                    group = futures[future]
+                    log.error(
+                        'Migration failed for %s: %s',
+                        ', '.join(mtask.make_migration_shortname() for mtask in group),
+                        str(e),
+                    )
+                    success = False
+
+        return success
+
+    def run_migration(self, repo_name: str, source_suite_name: str, target_suite_name: str, max_jobs: int = 1):
+        """
+        Run package migrations.
+
+        :param max_jobs: Maximum number of independent migrations to run in parallel.
+        """
+
+        with session_scope() as session:
+            migration_tasks = session.query(SpearsMigrationTask).order_by(SpearsMigrationTask.id).all()
             if source_suite_name:
                 # we have parameters, so limit which migration entries we act on
                 if not target_suite_name:
@@ -621,4 +843,11 @@ class SpearsEngine:
                     log.error('Could not find migration recipe with the given parameters.')
                     return False
 
-            return self._run_migration_for_entries(session, migration_tasks)
+                return self._run_migration_for_entries(session, migration_tasks)
+
+            # make sure everything we need for grouping is loaded before the tasks leave this session
+            for mtask in migration_tasks:
+                mtask.make_migration_shortname()
+            session.expunge_all()
+
+        return self._run_migrations_concurrently(migration_tasks, max_jobs)
@@ -9,7 +9,7 @@ from enum import Enum, auto
 
 from pebble import ThreadPool
 from apt_pkg import version_compare
-from sqlalchemy import and_, func, exists
+from sqlalchemy import exists
 from sqlalchemy.orm import joinedload
 
 import laniakea.typing as T
@@ -27,6 +27,8 @@ from laniakea.db import (
     SynchrotronSource,
     SyncBlacklistEntry,
     ArchiveArchitecture,
+    LatestBinaryPackage,
+    LatestSourcePackage,
     SynchrotronIssueKind,
     ArchiveRepoSuiteSettings,
     session_scope,
@@ -35,6 +37,7 @@ from laniakea.db import (
 from laniakea.utils import process_file_lock
 from laniakea.archive import (
     PackageImporter,
+    BinaryImportRequest,
     ArchivePackageExistsError,
     copy_source_package,
 )
@@ -215,31 +218,16 @@ class SyncEngine:
 
         log.debug('Retrieving source package map for destination suite: %s', suite_name)
         target_suite = session.query(ArchiveSuite).filter(ArchiveSuite.name == suite_name).one()
-        spkg_filters = [
-            SourcePackage.repo.has(name=self._repo_name),
-            SourcePackage.suites.any(id=target_suite.id),
-            SourcePackage.component.has(name=component_name),
-            SourcePackage.time_deleted.is_(None),
-        ]
-
-        spkg_filter_sq = session.query(SourcePackage).filter(*spkg_filters).subquery()
-        smv_sq = (
-            session.query(spkg_filter_sq.c.name, func.max(spkg_filter_sq.c.version).label('max_version'))
-            .group_by(spkg_filter_sq.c.name)
-            .subquery('smv_sq')
-        )
 
         # get the latest source packages for this configuration
         spkgs = (
             session.query(SourcePackage)
             .options(joinedload(SourcePackage.binaries))
-            .filter(*spkg_filters)
-            .join(
-                smv_sq,
-                and_(
-                    SourcePackage.name == smv_sq.c.name,
-                    SourcePackage.version == smv_sq.c.max_version,
-                ),
+            .join(LatestSourcePackage, LatestSourcePackage.pkg_uuid == SourcePackage.uuid)
+            .filter(
+                SourcePackage.repo.has(name=self._repo_name),
+                SourcePackage.component.has(name=component_name),
+                LatestSourcePackage.suite_id == target_suite.id,
             )
             .order_by(SourcePackage.name)
             .all()
@@ -276,32 +264,16 @@ class SyncEngine:
             arch_name,
             'udeb' if deb_type == DebType.UDEB else 'deb',
         )
-        bpkg_filter = [
-            BinaryPackage.deb_type == deb_type,
-            BinaryPackage.repo.has(id=rss.repo_id),
-            BinaryPackage.suites.any(id=rss.suite_id),
-            BinaryPackage.component.has(name=component_name),
-            BinaryPackage.architecture.has(name=arch_name),
-            BinaryPackage.time_deleted.is_(None),
-        ]
-
-        bpkg_filter_sq = session.query(BinaryPackage).filter(*bpkg_filter).subquery()
-        bmv_sq = (
-            session.query(bpkg_filter_sq.c.name, func.max(bpkg_filter_sq.c.version).label('max_version'))
-            .group_by(bpkg_filter_sq.c.name)
-            .subquery('bmv_sq')
-        )
-
         # get the latest binary packages for this configuration
         bpkgs = (
             session.query(BinaryPackage)
-            .filter(*bpkg_filter)
-            .join(
-                bmv_sq,
-                and_(
-                    BinaryPackage.name == bmv_sq.c.name,
-                    BinaryPackage.version == bmv_sq.c.max_version,
-                ),
+            .join(LatestBinaryPackage, LatestBinaryPackage.pkg_uuid == BinaryPackage.uuid)
+            .filter(
+                LatestBinaryPackage.repo_id == rss.repo_id,
+                LatestBinaryPackage.suite_id == rss.suite_id,
+                BinaryPackage.component.has(name=component_name),
+                BinaryPackage.architecture.has(name=arch_name),
+                LatestBinaryPackage.deb_type == deb_type,
             )
             .order_by(BinaryPackage.name)
             .all()
@@ -366,13 +338,12 @@ class SyncEngine:
         target repo.
         """
         dscfile = None
-        for f in origin_pkg.files:
-            # the source repository might be on a remote location, so we need to
-            # request each file to be there.
-            # (dak will fetch the files referenced in the .dsc file from the same directory)
+        # the source repository might be on a remote location, so we need to
+        # request each file to be there.
+        # (dak will fetch the files referenced in the .dsc file from the same directory)
+        for f, fname in zip(origin_pkg.files, self._source_reader.get_files(origin_pkg.files)):
             if f.fname.endswith('.dsc'):
-                dscfile = self._source_reader.get_file(f)
-            self._source_reader.get_file(f)
+                dscfile = fname
 
         if not dscfile:
             log.error(
@@ -560,8 +531,18 @@ class SyncEngine:
                 if bin_files:
                     bin_files_synced = True
                     pkgip_rss = pkgip.get_rss(session)
-                    for orig_bpkg in bin_files:
-                        fname = self._source_reader.get_file(orig_bpkg.bin_file)
+                    bin_fnames = self._source_reader.get_files([b.bin_file for b in bin_files])
+                    try:
+                        # the common case: import all binaries of this architecture in one transaction
+                        pkgip.import_binaries(
+                            [BinaryImportRequest(fname, component) for fname in bin_fnames],
+                            ignore_missing_override=True,
+                        )
+                        bin_fnames = []
+                    except ArchivePackageExistsError:
+                        # the batch was rolled back, import the packages one by one so we can recover
+                        log.debug('Some binaries of %s/%s already exist, importing individually.', spkg.name, arch_name)
+                    for orig_bpkg, fname in zip(bin_files, bin_fnames):
                         try:
                             pkgip.import_binary(fname, component, ignore_missing_override=True)
                         except ArchivePackageExistsError as e:
@@ -628,6 +609,7 @@ class SyncEngine:
         rss = repo_suite_settings_for(session, self._repo_name, self._target_suite_name)
         pkgip = PackageImporter(rss)
         pkgip.keep_source_packages = True
+        pkgip.inspect_in_process = True
 
         # list of valid architectures supported by the target
         target_archs = [a.name for a in sync_conf.destination_suite.architectures]
@@ -810,6 +792,7 @@ class SyncEngine:
         suitable_architectures = set([a.name for a in rss.suite.architectures])
         pkgip = PackageImporter(rss)
         pkgip.keep_source_packages = True
+        pkgip.inspect_in_process = True
 
         # list of valid architectures supported by the target
         target_archs = [a.name for a in sync_conf.destination_suite.architectures]
@@ -1127,7 +1110,7 @@ class SyncEngine:
             with session_scope() as session:
                 ret = self._autosync_internal(session, remove_cruft)
 
-            # cleanup cruft, as we may have downloaded a lot of packages
+            # drop the packages we downloaded, the repository indices are kept for the next run
             self._source_reader.cleanup()
 
             return ret
@@ -83,6 +83,7 @@ class RepoSuiteSettingsSchema(Schema):
     but_automatic_upgrades = fields.Boolean()
     valid_time = fields.Integer()
     phased_update_delay = fields.Integer()
+    byhash_retention = fields.Integer()
     signingkeys = fields.List(fields.String())
     announce_emails = fields.List(fields.String())
     changes_pending = fields.Boolean()
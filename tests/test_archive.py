@@ -19,6 +19,8 @@ from laniakea.db import (
     ArchiveUploader,
     ArchiveRepository,
     SoftwareComponent,
+    LatestBinaryPackage,
+    LatestSourcePackage,
     ArchiveQueueNewEntry,
     ArchiveRepoSuiteSettings,
     session_scope,
@@ -52,6 +54,189 @@ def test_utils():
     assert pool_dir_from_name_component('libthing', 'main') == 'pool/main/libt/libthing'
 
 
+def test_debcheck_relation_names():
+    """Test extracting package names from dependency relations for Debcheck"""
+    from debcheck.dose import _relation_names
+
+    assert _relation_names(None) == set()
+    assert _relation_names([]) == set()
+    assert _relation_names(['libc6 (>= 2.34)', 'python3:any', 'foo | bar (<< 2.0) | baz [amd64]']) == {
+        'libc6',
+        'python3',
+        'foo',
+        'bar',
+        'baz',
+    }
+    assert _relation_names(['debhelper-compat (= 13)', 'pkg-a <!nocheck>', '  spaced-pkg']) == {
+        'debhelper-compat',
+        'pkg-a',
+        'spaced-pkg',
+    }
+
+
+def test_byhash_index(tmp_path):
+    """Test expiring by-hash files through the by-hash index"""
+    from archivecli.publish import ByHashIndex, RepoFileInfo
+
+    dists_dir = tmp_path / 'dists' / 'unstable'
+    index_fname = tmp_path / 'state' / 'by-hash-index.json'
+    sha256_dir = dists_dir / 'main' / 'by-hash' / 'SHA256'
+    sha256_dir.mkdir(parents=True)
+    for checksum in ('aaaa', 'bbbb', 'cccc'):
+        (sha256_dir / checksum).write_text(checksum)
+    os.utime(sha256_dir / 'aaaa', (1000, 1000))
+    os.utime(sha256_dir / 'bbbb', (1000, 1000))
+
+    # without an index, it is created from the modification times of the files
+    index = ByHashIndex(dists_dir, index_fname)
+    index.load(['main', 'contrib'])
+    index.mark_referenced([RepoFileInfo('main/binary-amd64/Packages.xz', 4, 'SHA256', 'bbbb')], 5000)
+    index.expire(2000)
+    index.save()
+    assert not (sha256_dir / 'aaaa').exists()
+    assert (sha256_dir / 'bbbb').exists()
+    assert (sha256_dir / 'cccc').exists()
+    assert index_fname.is_file()
+    assert not (dists_dir / '.by-hash-index.json').exists()
+
+    # once the index exists, files are only expired based on it, and the tree is not scanned again
+    os.utime(sha256_dir / 'bbbb', (1000, 1000))
+    (sha256_dir / 'dddd').write_text('dddd')
+    index = ByHashIndex(dists_dir, index_fname)
+    index.load(['main'])
+    index.mark_referenced([RepoFileInfo('main/source/Sources.xz', 4, 'SHA256', 'cccc')], 9000)
+    index.expire(6000)
+    index.save()
+    assert not (sha256_dir / 'bbbb').exists()
+    assert (sha256_dir / 'cccc').exists()
+    assert (sha256_dir / 'dddd').exists()
+
+    index = ByHashIndex(dists_dir, index_fname)
+    index.load(['main'])
+    index.expire(10000)
+    assert not (sha256_dir / 'cccc').exists()
+
+
+def test_metadata_file_writer(tmp_path):
+    """Test streaming index data into compressed, by-hash registered files"""
+    import gzip
+    import lzma
+    import hashlib
+
+    from debian.deb822 import Deb822
+
+    from archivecli.publish import MetadataFileWriter, format_deb822_stanza
+
+    stanzas = []
+    for i in range(2000):
+        entry = Deb822()
+        entry['Package'] = 'pkg{}'.format(i)
+        entry['Version'] = '1.0-{}'.format(i)
+        entry['Description'] = 'summary {}\n long description\n .\n more text'.format(i)
+        entry['Files'] = '\n 0123 42 pkg{}.dsc'.format(i)
+        # our fast formatter must produce the same data as python-debian
+        assert format_deb822_stanza(entry) == entry.dump()
+        stanzas.append(format_deb822_stanza(entry))
+    expected_data = '\n'.join(stanzas).encode('utf-8')
+
+    # data is written from an iterator, so it never needs to be held in memory as a whole
+    root_dir = tmp_path / 'dists' / 'unstable'
+    (root_dir / 'main' / 'binary-amd64').mkdir(parents=True)
+    with MetadataFileWriter() as writer:
+        writer.write(
+            root_dir, 'binary-amd64', 'Packages', component='main', data=iter(stanzas), compressions=('xz', 'gz')
+        )
+        finfos = writer.finish()
+
+    finfo_map = {(str(fi.fname), fi.checksum_name): fi for fi in finfos}
+    assert len(finfo_map) == 6
+    fi = finfo_map[('main/binary-amd64/Packages', 'SHA256')]
+    assert fi.size == len(expected_data)
+    assert fi.checksum == hashlib.sha256(expected_data).hexdigest()
+    assert finfo_map[('main/binary-amd64/Packages', 'MD5Sum')].checksum == hashlib.md5(expected_data).hexdigest()
+    for z_ext, z_open in (('xz', lzma.open), ('gz', gzip.open)):
+        fname = root_dir / 'main' / 'binary-amd64' / ('Packages.' + z_ext)
+        with z_open(fname, 'rb') as f:
+            assert f.read() == expected_data
+
+        # the compressed file was checksummed while writing, and moved to its by-hash location
+        data_z = fname.read_bytes()
+        sha256_z = hashlib.sha256(data_z).hexdigest()
+        md5_z = hashlib.md5(data_z).hexdigest()
+        assert fname.is_symlink()
+        assert os.path.samefile(fname, root_dir / 'main' / 'by-hash' / 'SHA256' / sha256_z)
+        assert (root_dir / 'main' / 'by-hash' / 'MD5Sum' / md5_z).is_file()
+        assert finfo_map[('main/binary-amd64/Packages.' + z_ext, 'SHA256')].checksum == sha256_z
+        assert finfo_map[('main/binary-amd64/Packages.' + z_ext, 'SHA256')].size == len(data_z)
+
+    # errors while generating the data are passed on, and do not leave the compressors hanging
+    def broken_stanzas():
+        yield stanzas[0]
+        raise ValueError('database went away')
+
+    (root_dir / 'main' / 'source').mkdir()
+    with pytest.raises(ValueError):
+        with MetadataFileWriter() as writer:
+            writer.write(root_dir, 'source', 'Sources', component='main', data=broken_stanzas())
+
+    # the writer only works within a with-block
+    with pytest.raises(RuntimeError):
+        MetadataFileWriter().write(root_dir, 'source', 'Sources', component='main', data='')
+
+
+def test_stage_dists_tree(tmp_path):
+    """Test staging a published dists/ tree, hardlinking only immutable by-hash files"""
+    import shutil
+
+    from archivecli.publish import _stage_dists_file
+
+    src_dir = tmp_path / 'dists' / 'unstable'
+    byhash_dir = src_dir / 'main' / 'by-hash' / 'SHA256'
+    byhash_dir.mkdir(parents=True)
+    (byhash_dir / 'aaaa').write_text('Package: a')
+    (src_dir / 'main' / 'binary-amd64').mkdir()
+    (src_dir / 'main' / 'binary-amd64' / 'Packages.xz').symlink_to('../by-hash/SHA256/aaaa')
+    (src_dir / 'main' / 'binary-amd64' / 'Release').write_text('Component: main')
+    (src_dir / 'Release').write_text('Suite: unstable')
+    os.utime(src_dir / 'Release', (1000, 1000))
+
+    dst_dir = tmp_path / 'zzz-meta' / 'unstable'
+    shutil.copytree(src_dir, dst_dir, symlinks=True, ignore_dangling_symlinks=True, copy_function=_stage_dists_file)
+
+    # content-addressed files are shared with the published tree
+    assert os.path.samefile(dst_dir / 'main' / 'by-hash' / 'SHA256' / 'aaaa', byhash_dir / 'aaaa')
+    assert (dst_dir / 'main' / 'binary-amd64' / 'Packages.xz').is_symlink()
+    assert (dst_dir / 'main' / 'binary-amd64' / 'Packages.xz').read_text() == 'Package: a'
+
+    # files which are modified in place are copies, keeping their metadata
+    for fname in ('Release', 'main/binary-amd64/Release'):
+        assert not os.path.samefile(dst_dir / fname, src_dir / fname)
+        assert (dst_dir / fname).read_text() == (src_dir / fname).read_text()
+    assert os.stat(dst_dir / 'Release').st_mtime == 1000
+    (dst_dir / 'Release').write_text('Suite: unstable\nChanged: yes')
+    assert (src_dir / 'Release').read_text() == 'Suite: unstable'
+
+
+def test_inspect_packages(package_samples):
+    """Test reading package information without apt-ftparchive"""
+    from laniakea.archive.pkginspect import inspect_deb, inspect_dsc
+
+    stanza, contents = inspect_deb(os.path.join(package_samples, 'package_0.1-1_all.deb'))
+    assert stanza['Package'] == 'package'
+    assert stanza['Version'] == '0.1-1'
+    assert stanza['Filename'] == 'package_0.1-1_all.deb'
+    assert int(stanza['Size']) == os.path.getsize(os.path.join(package_samples, 'package_0.1-1_all.deb'))
+    assert len(stanza['SHA256']) == 64
+    assert contents
+    assert not any(fname.startswith('.') or fname.startswith('/') for fname in contents)
+
+    stanza = inspect_dsc(os.path.join(package_samples, 'package_0.1-1.dsc'))
+    assert stanza['Package'] == 'package'
+    assert 'Source' not in stanza
+    assert 'package_0.1-1.dsc' in [f['name'] for f in stanza['Files']]
+    assert 'package_0.1-1.dsc' in [f['name'] for f in stanza['Checksums-Sha256']]
+
+
 class TestParseChanges:
     @pytest.fixture(autouse=True)
     def setup(self, samples_dir, sources_dir):
@@ -679,6 +864,19 @@ class TestArchive:
             assert bpkg
             assert os.path.isfile(os.path.join(ctx._archive_root, 'master', spkg.directory, 'grave_0.1-1_all.deb'))
 
+            # the package should be registered as latest version
+            latest_spkg = (
+                session.query(LatestSourcePackage)
+                .filter(
+                    LatestSourcePackage.repo_id == rss.repo_id,
+                    LatestSourcePackage.suite_id == rss.suite_id,
+                    LatestSourcePackage.name == 'grave',
+                )
+                .one()
+            )
+            assert latest_spkg.pkg_uuid == spkg.uuid
+            assert latest_spkg.version == '0.1-1'
+
             # now delete the package again and check that it is gone
             spkg_directory = spkg.directory
             remove_source_package(session, rss, spkg)
@@ -706,6 +904,18 @@ class TestArchive:
             )
             assert not bpkg
             assert not os.path.isdir(os.path.join(ctx._archive_root, 'master', spkg_directory))
+            assert (
+                session.query(LatestSourcePackage)
+                .filter(LatestSourcePackage.suite_id == rss.suite_id, LatestSourcePackage.name == 'grave')
+                .count()
+                == 0
+            )
+            assert (
+                session.query(LatestBinaryPackage)
+                .filter(LatestBinaryPackage.suite_id == rss.suite_id, LatestBinaryPackage.name == 'grave')
+                .count()
+                == 0
+            )
 
     def test_package_dbgsym_upload(self, ctx, package_samples):
         with session_scope() as session:
@@ -905,6 +1115,164 @@ class TestArchive:
             )
             assert bpkg
 
+            # the index of most recent packages must reflect the migration
+            latest_spkg = (
+                session.query(LatestSourcePackage)
+                .filter(
+                    LatestSourcePackage.repo_id == rss.repo_id,
+                    LatestSourcePackage.suite_id == rss.suite_id,
+                    LatestSourcePackage.name == 'pkgnew',
+                )
+                .one()
+            )
+            assert latest_spkg.version == '0.1-3'
+            assert rss.changes_pending
+
+        # check the set-based migration code in more detail, without keeping any of the changes
+        from laniakea.db import ArchiveError, PackageOverride
+        from laniakea.archive.manage import bulk_migrate_packages
+
+        class RecordingEmitter:
+            def __init__(self):
+                self.events = {}
+
+            def submit_events_for_mod(self, mod, subject, event_list):
+                self.events.setdefault(subject, []).extend(event_list)
+
+        def find_spkg(session, name, version):
+            return (
+                session.query(SourcePackage)
+                .filter(SourcePackage.name == name, SourcePackage.version == version)
+                .populate_existing()
+                .one()
+            )
+
+        def find_bpkg(session, name, version):
+            return (
+                session.query(BinaryPackage)
+                .filter(BinaryPackage.name == name, BinaryPackage.version == version)
+                .populate_existing()
+                .one()
+            )
+
+        def suite_names(pkg):
+            return sorted(s.name for s in pkg.suites)
+
+        def overrides_for(session, rss, names):
+            return {
+                ov.pkg_name: (ov.essential, ov.priority, ov.component_id, ov.section_id)
+                for ov in session.query(PackageOverride).filter(
+                    PackageOverride.repo_id == rss.repo_id,
+                    PackageOverride.suite_id == rss.suite_id,
+                    PackageOverride.pkg_name.in_(names),
+                )
+            }
+
+        with session_scope() as session:
+            rss = repo_suite_settings_for(session, 'master', 'stable')
+            rss_unstable = repo_suite_settings_for(session, 'master', 'unstable')
+            rss_unstable_dbg = repo_suite_settings_for_debug(session, rss_unstable)
+
+            # overrides of migrated binaries are copied from the suite they came from
+            migrated_bin_names = [
+                'package',
+                'main-package',
+                'pkg-all1',
+                'pkg-all2',
+                'pkg-all3',
+                'pkg-any1',
+                'pkg-any2',
+                'pkg-any3',
+            ]
+            stable_overrides = overrides_for(session, rss, migrated_bin_names)
+            assert set(stable_overrides.keys()) == set(migrated_bin_names)
+            assert stable_overrides == overrides_for(session, rss_unstable, migrated_bin_names)
+
+            # names that do not resolve are an error
+            with pytest.raises(ArchiveError) as einfo:
+                bulk_migrate_packages(session, rss, add_sources=[('snowman', '0.1-1'), ('nonexistent', '1.0')])
+            assert 'nonexistent/1.0' in str(einfo.value)
+            with pytest.raises(ArchiveError) as einfo:
+                bulk_migrate_packages(session, rss, add_binaries=[('pkg-any1', '9.9-1', 'amd64')])
+            assert 'pkg-any1/9.9-1/amd64' in str(einfo.value)
+
+            # a zombie package can only be revived in a suite which still has an override for it
+            with pytest.raises(ArchiveError) as einfo:
+                with session.begin_nested():
+                    bulk_migrate_packages(session, rss, add_binaries=[('pkg-any4', '0.1-2', 'amd64')])
+            assert 'No override origin suite found' in str(einfo.value)
+            assert find_bpkg(session, 'pkg-any4', '0.1-2').time_deleted is not None
+            unstable_overrides = overrides_for(session, rss_unstable, ['pkg-any4'])
+            assert unstable_overrides
+            bulk_migrate_packages(
+                session, rss_unstable, add_binaries=[('pkg-any4', '0.1-2', 'amd64')], emitter=RecordingEmitter()
+            )
+            bpkg = find_bpkg(session, 'pkg-any4', '0.1-2')
+            assert suite_names(bpkg) == ['unstable']
+            assert bpkg.time_deleted is None
+            assert overrides_for(session, rss_unstable, ['pkg-any4']) == unstable_overrides
+
+            # packages removed from a suite they are not the only suite of are not marked for deletion
+            emitter = RecordingEmitter()
+            bulk_migrate_packages(
+                session,
+                rss,
+                remove_sources=[('snowman', '0.1-1')],
+                remove_binaries=[('pkg-any1', '0.1-3', 'amd64')],
+                emitter=emitter,
+            )
+            spkg = find_spkg(session, 'snowman', '0.1-1')
+            assert suite_names(spkg) == ['unstable']
+            assert spkg.time_deleted is None
+            bpkg = find_bpkg(session, 'pkg-any1', '0.1-3')
+            assert suite_names(bpkg) == ['unstable']
+            assert bpkg.time_deleted is None
+            assert [e['pkg_name'] for e in emitter.events['package-src-suite-deleted']] == ['snowman']
+            assert 'package-src-marked-removal' not in emitter.events
+            assert (
+                session.query(LatestSourcePackage)
+                .filter(
+                    LatestSourcePackage.repo_id == rss.repo_id,
+                    LatestSourcePackage.suite_id == rss.suite_id,
+                    LatestSourcePackage.name == 'snowman',
+                )
+                .count()
+                == 0
+            )
+
+            # removing a source removes its binaries from the suite and its debug suite,
+            # and everything that is in no suite anymore is marked for deletion
+            emitter = RecordingEmitter()
+            bulk_migrate_packages(
+                session, rss_unstable, remove_sources=[('main-contrib-with-debug', '0.1-1')], emitter=emitter
+            )
+            spkg = find_spkg(session, 'main-contrib-with-debug', '0.1-1')
+            assert suite_names(spkg) == ['stable']
+            assert spkg.time_deleted is None
+            bpkg = find_bpkg(session, 'main-package', '0.1-1')
+            assert suite_names(bpkg) == ['stable']
+            assert bpkg.time_deleted is None
+            for name in ('contrib-with-debug', 'contrib-with-debug-dbgsym'):
+                bpkg = find_bpkg(session, name, '0.1-1')
+                assert bpkg.suites == []
+                assert bpkg.time_deleted is not None
+            assert (
+                session.query(LatestBinaryPackage)
+                .filter(
+                    LatestBinaryPackage.repo_id == rss_unstable_dbg.repo_id,
+                    LatestBinaryPackage.suite_id == rss_unstable_dbg.suite_id,
+                    LatestBinaryPackage.name == 'contrib-with-debug-dbgsym',
+                )
+                .count()
+                == 0
+            )
+
+            bulk_migrate_packages(session, rss_unstable, remove_sources=[('snowman', '0.1-1')], emitter=emitter)
+            assert find_spkg(session, 'snowman', '0.1-1').time_deleted is not None
+            assert [e['pkg_name'] for e in emitter.events['package-src-marked-removal']] == ['snowman']
+
+            session.rollback()
+
     def test_publish(self, ctx, samples_dir):
         from archivecli.publish import publish_repo_dists
 
@@ -920,6 +1288,12 @@ class TestArchive:
             repo = session.query(ArchiveRepository).filter(ArchiveRepository.name == 'master').one()
             publish_repo_dists(session, repo)
 
+            # all pending changes should have been published
+            session.expire_all()
+            rss = repo_suite_settings_for(session, 'master', 'unstable')
+            assert not rss.changes_pending
+            assert rss.changed_slices == []
+
             # check if key files are there
             assert os.path.isfile(os.path.join(repo.get_root_dir(), 'dists/unstable/Release'))
             assert os.path.isfile(os.path.join(repo.get_root_dir(), 'dists/unstable/Release.gpg'))
@@ -936,3 +1310,472 @@ class TestArchive:
             sw = session.query(SoftwareComponent).filter(SoftwareComponent.cid == 'org.freedesktop.appstream.cli').one()
             assert len(sw.pkgs_binary) == 1
             assert sw.pkgs_binary[0].name == 'pkg-any3'
+
+    def test_publish_changed_slices(self, ctx):
+        from archivecli.publish import publish_repo_dists
+        from laniakea.archive.utils import (
+            repo_suite_mark_changed,
+            repo_suite_add_changed_slices,
+            repo_suite_remove_changed_slices,
+        )
+
+        with session_scope() as session:
+            repo = session.query(ArchiveRepository).filter(ArchiveRepository.name == 'master').one()
+            rss = repo_suite_settings_for(session, 'master', 'unstable')
+
+            # changing a source package only affects the Sources index of its component
+            spkg = (
+                session.query(SourcePackage)
+                .filter(
+                    SourcePackage.repo_id == rss.repo_id,
+                    SourcePackage.name == 'package',
+                    SourcePackage.version == '0.2-1',
+                )
+                .one()
+            )
+            cname = spkg.component.name
+            dists_dir = os.path.join(repo.get_root_dir(), 'dists', 'unstable')
+            sources_fname = os.path.join(dists_dir, cname, 'source', 'Sources.xz')
+            packages_fname = os.path.join(dists_dir, cname, 'binary-all', 'Packages.xz')
+            sources_mtime = os.stat(sources_fname).st_mtime_ns
+            packages_mtime = os.stat(packages_fname).st_mtime_ns
+
+            repo_suite_mark_changed(session, rss, spkg)
+            assert rss.changed_slices == [cname + '/source']
+            assert rss.changes_pending
+            session.commit()
+
+            publish_repo_dists(session, repo, suite_name='unstable')
+            session.expire_all()
+            assert rss.changed_slices == []
+            assert not rss.changes_pending
+
+            # only the changed slice was regenerated, everything else was reused
+            assert os.stat(sources_fname).st_mtime_ns != sources_mtime
+            assert os.stat(packages_fname).st_mtime_ns == packages_mtime
+            with open(os.path.join(dists_dir, 'Release'), 'r', encoding='utf-8') as f:
+                release_data = f.read()
+            assert cname + '/source/Sources.xz' in release_data
+            assert cname + '/binary-all/Packages.xz' in release_data
+
+            # slices recorded while a suite is published must not be lost when it finishes
+            repo_suite_add_changed_slices(session, rss, ['main/source', 'main/binary-all'])
+            repo_suite_add_changed_slices(session, rss, ['main/binary-all', 'main/i18n'])
+            assert rss.changed_slices == ['main/binary-all', 'main/i18n', 'main/source']
+            repo_suite_remove_changed_slices(session, rss, ['main/source', 'main/binary-all'])
+            assert rss.changed_slices == ['main/i18n']
+            assert rss.changes_pending
+            repo_suite_remove_changed_slices(session, rss, ['main/i18n'])
+            assert rss.changed_slices == []
+            assert not rss.changes_pending
+
+    def test_suite_change_log(self, ctx):
+        from datetime import UTC, datetime, timedelta
+
+        from laniakea.db import PackageType, ArchiveRepoSuiteChange
+        from laniakea.archive import copy_source_package
+        from archivecli.ariadne import changed_source_names_query
+        from laniakea.archive.manage import package_mark_delete
+
+        with session_scope() as session:
+            rss = repo_suite_settings_for(session, 'master', 'stable')
+            spkg = (
+                session.query(SourcePackage)
+                .filter(
+                    SourcePackage.repo_id == rss.repo_id,
+                    SourcePackage.name == 'package',
+                    SourcePackage.version == '0.2-1',
+                )
+                .one()
+            )
+            assert rss.suite not in spkg.suites
+            since = datetime.now(UTC)
+
+            def logged_changes():
+                return [
+                    (c.pkg_type, c.pkg_name, c.source_name)
+                    for c in session.query(ArchiveRepoSuiteChange)
+                    .filter(ArchiveRepoSuiteChange.repo_suite_id == rss.id, ArchiveRepoSuiteChange.time >= since)
+                    .order_by(ArchiveRepoSuiteChange.id)
+                ]
+
+            def changed_names(start: datetime):
+                return set(session.execute(changed_source_names_query(rss, start)).scalars())
+
+            # a copied package keeps its timestamps, but it is found through the suite's change log
+            copy_source_package(session, spkg, rss, include_binaries=False)
+            assert logged_changes() == [(PackageType.SOURCE, 'package', 'package')]
+            assert 'package' in changed_names(since)
+
+            # removals from the suite are recorded as well
+            package_mark_delete(session, rss, spkg)
+            assert logged_changes() == [(PackageType.SOURCE, 'package', 'package')] * 2
+            assert 'package' not in changed_names(datetime.now(UTC) + timedelta(minutes=1))
+
+            # don't keep any of these changes
+            session.rollback()
+
+    def test_debcheck_packages_to_check(self, ctx):
+        from datetime import UTC, datetime, timedelta
+
+        from laniakea.db import PackageType
+        from debcheck.dose import DoseDebcheck
+        from laniakea.archive.manage import package_mark_delete
+
+        with session_scope() as session:
+            rss = repo_suite_settings_for(session, 'master', 'unstable')
+            rss_stable = repo_suite_settings_for(session, 'master', 'stable')
+            debcheck = DoseDebcheck(session, rss.repo)
+
+            suite_binaries = {
+                name
+                for (name,) in session.query(BinaryPackage.name).filter(
+                    BinaryPackage.repo_id == rss.repo_id, BinaryPackage.suites.any(id=rss.suite_id)
+                )
+            }
+
+            # nothing changed in the future, and if everything changed, everything is checked
+            assert (
+                debcheck.find_packages_to_check(rss.suite, PackageType.BINARY, datetime.now(UTC) + timedelta(days=1))
+                == set()
+            )
+            assert (
+                debcheck.find_packages_to_check(rss.suite, PackageType.BINARY, datetime.fromtimestamp(0, UTC))
+                == suite_binaries
+            )
+
+            # make one package depend on another, then remove the dependency from the suite while it is
+            # still in another suite, so it is never marked as deleted
+            since = datetime.now(UTC)
+            bpkg_dep = (
+                session.query(BinaryPackage)
+                .filter(
+                    BinaryPackage.repo_id == rss.repo_id,
+                    BinaryPackage.name == 'package',
+                    BinaryPackage.version == '0.2-1',
+                )
+                .one()
+            )
+            bpkg_rdep = (
+                session.query(BinaryPackage)
+                .filter(
+                    BinaryPackage.repo_id == rss.repo_id,
+                    BinaryPackage.name == 'pkg-any1',
+                    BinaryPackage.version == '0.1-3',
+                    BinaryPackage.suites.any(id=rss.suite_id),
+                )
+                .first()
+            )
+            bpkg_rdep.depends = ['libc6 (>= 2.34)', 'package (>= 0.2) | other-package']
+            bpkg_dep.suites.append(rss_stable.suite)
+            package_mark_delete(session, rss, bpkg_dep)
+            session.flush()
+            assert bpkg_dep.time_deleted is None
+
+            to_check = debcheck.find_packages_to_check(rss.suite, PackageType.BINARY, since)
+            assert 'pkg-any1' in to_check
+            assert 'package' not in to_check
+            assert to_check < suite_binaries
+
+            # don't keep any of these changes
+            session.rollback()
+
+    def test_import_binaries_batch(self, ctx, package_samples, monkeypatch):
+        from laniakea.db import ArchiveVersionMemory
+        from laniakea.archive import pkgimport
+
+        deb_fname = os.path.join(package_samples, 'binnmupkg_0.1-1_%s.deb' % ctx._host_arch)
+        deb_binnmu_fname = os.path.join(package_samples, 'binnmupkg_0.1-1+b1_%s.deb' % ctx._host_arch)
+        pool_dir = os.path.join(ctx._archive_root, 'master', 'pool', 'main', 'b', 'binnmupkg')
+
+        def binnmupkg_versions(session, repo_id):
+            return sorted(
+                v
+                for (v,) in session.query(BinaryPackage.version).filter(
+                    BinaryPackage.repo_id == repo_id, BinaryPackage.name == 'binnmupkg'
+                )
+            )
+
+        with session_scope() as session:
+            rss = repo_suite_settings_for(session, 'master', 'unstable')
+
+            pi = PackageImporter(rss)
+            pi.keep_source_packages = True
+            spkg_uuid, _ = pi.import_source(
+                os.path.join(package_samples, 'binnmupkg_0.1-1.dsc'), 'main', new_policy=NewPolicy.NEVER_NEW
+            )
+            session.commit()
+
+            # an older version later in the same batch is a downgrade, too
+            with pytest.raises(ArchiveImportError) as einfo:
+                pi.import_binaries([deb_binnmu_fname, deb_fname])
+            assert 'already seen higher version "0.1-1+b1"' in str(einfo.value)
+            session.expire_all()
+            assert binnmupkg_versions(session, rss.repo_id) == []
+
+            # if the batch fails after files were copied, they are removed again
+            def fail_mark_published(*args, **kwargs):
+                raise RuntimeError('publishing failed')
+
+            monkeypatch.setattr(pkgimport, 'package_mark_published', fail_mark_published)
+            with pytest.raises(RuntimeError):
+                pi.import_binaries([deb_fname, deb_binnmu_fname])
+            monkeypatch.undo()
+            session.expire_all()
+            assert binnmupkg_versions(session, rss.repo_id) == []
+            assert not os.path.exists(os.path.join(pool_dir, os.path.basename(deb_fname)))
+            assert not os.path.exists(os.path.join(pool_dir, os.path.basename(deb_binnmu_fname)))
+            assert os.path.isfile(deb_fname)
+            assert os.path.isfile(deb_binnmu_fname)
+
+            # ascending versions are imported in one go
+            bpkg_uuids = pi.import_binaries([deb_fname, deb_binnmu_fname])
+            assert len(bpkg_uuids) == 2 and all(bpkg_uuids)
+            session.expire_all()
+            assert binnmupkg_versions(session, rss.repo_id) == ['0.1-1', '0.1-1+b1']
+            assert os.path.isfile(os.path.join(pool_dir, os.path.basename(deb_fname)))
+            assert os.path.isfile(os.path.join(pool_dir, os.path.basename(deb_binnmu_fname)))
+            vmem = (
+                session.query(ArchiveVersionMemory)
+                .filter(
+                    ArchiveVersionMemory.repo_suite_id == rss.id,
+                    ArchiveVersionMemory.pkg_name == 'binnmupkg',
+                    ArchiveVersionMemory.arch_name == ctx._host_arch,
+                )
+                .one()
+            )
+            assert vmem.highest_version == '0.1-1+b1'
+
+            # drop the package again
+            spkg = session.query(SourcePackage).filter(SourcePackage.uuid == spkg_uuid).one()
+            assert remove_source_package(session, rss, spkg)
+
+    def test_parallel_inspection(self, ctx, package_samples):
+        from laniakea.archive.pkgimport import read_binary_info, read_source_info
+
+        dsc_fname = os.path.join(package_samples, 'binnmupkg_0.1-1.dsc')
+        deb_fnames = [
+            os.path.join(package_samples, 'binnmupkg_0.1-1_%s.deb' % ctx._host_arch),
+            os.path.join(package_samples, 'binnmupkg_0.1-1+b1_%s.deb' % ctx._host_arch),
+        ]
+
+        with session_scope() as session:
+            rss = repo_suite_settings_for(session, 'master', 'unstable')
+            pi = PackageImporter(rss)
+            pi.keep_source_packages = True
+
+            # without worker processes, nothing is prepared in advance
+            with pi.parallel_inspection(1):
+                pi.prepare_files([dsc_fname] + deb_fnames)
+                assert pi._take_prepared(dsc_fname) is None
+
+            # workers yield the same data as reading the files directly
+            with pi.parallel_inspection(2):
+                pi.prepare_files([dsc_fname] + deb_fnames)
+                pi.prepare_files(deb_fnames)
+                assert len(pi._inspect_futures) == 3
+
+                stanza, filelist = pi._take_prepared(dsc_fname)
+                assert stanza == read_source_info(dsc_fname).dump()
+                assert filelist is None
+                assert pi._take_prepared(dsc_fname) is None
+                for deb_fname in deb_fnames:
+                    # relative paths refer to the same file
+                    stanza, filelist = pi._take_prepared(os.path.relpath(deb_fname))
+                    bin_tf, expected_filelist = read_binary_info(deb_fname)
+                    assert stanza == bin_tf.dump()
+                    assert filelist == expected_filelist
+
+                # errors are raised when the result is collected
+                pi.prepare_files([os.path.join(package_samples, 'nonexistent_0.1-1_all.deb')])
+                with pytest.raises(Exception):
+                    pi._take_prepared(os.path.join(package_samples, 'nonexistent_0.1-1_all.deb'))
+
+                # pending inspections are dropped when the context is left
+                pi.prepare_files(deb_fnames)
+            assert not pi._inspect_futures
+            assert not pi._inspect_pool
+
+            # packages are imported using the data prepared by the workers
+            with pi.parallel_inspection(2):
+                pi.prepare_files([dsc_fname])
+                spkg_uuid, _ = pi.import_source(dsc_fname, 'main', new_policy=NewPolicy.NEVER_NEW)
+                session.commit()
+                bpkg_uuids = pi.import_binaries(deb_fnames)
+                assert len(bpkg_uuids) == 2 and all(bpkg_uuids)
+                assert not pi._inspect_futures
+            session.expire_all()
+            assert sorted(
+                v
+                for (v,) in session.query(BinaryPackage.version).filter(
+                    BinaryPackage.repo_id == rss.repo_id, BinaryPackage.name == 'binnmupkg'
+                )
+            ) == ['0.1-1', '0.1-1+b1']
+
+            # drop the package again
+            spkg = session.query(SourcePackage).filter(SourcePackage.uuid == spkg_uuid).one()
+            assert remove_source_package(session, rss, spkg)
+
+    def test_ariadne_job_maintenance(self, ctx):
+        import uuid
+        from datetime import UTC, datetime, timedelta
+
+        from laniakea import LkModule, LocalConfig
+        from laniakea.db import Job, JobKind, JobStatus, PackageType, DebcheckIssue
+        from laniakea.utils import get_dir_shorthand_for_uuid
+        from laniakea.ariadne.maintenance import (
+            delete_orphaned_jobs,
+            remove_superfluous_pending_jobs,
+        )
+        from laniakea.ariadne.package_jobs import BuildScheduleIndex
+
+        arch_indep_affinity = ctx._host_arch
+
+        def new_job(trigger, version, arch_name, status=JobStatus.WAITING, time_created=None):
+            job = Job()
+            job.module = LkModule.ARIADNE
+            job.kind = JobKind.PACKAGE_BUILD
+            job.trigger = trigger
+            job.version = version
+            job.architecture = arch_name
+            job.suite = rss.suite
+            job.status = status
+            if time_created:
+                job.time_created = time_created
+            session.add(job)
+            return job
+
+        with session_scope() as session:
+            rss = repo_suite_settings_for(session, 'master', 'unstable')
+            spkg = (
+                session.query(SourcePackage)
+                .filter(
+                    SourcePackage.repo_id == rss.repo_id,
+                    SourcePackage.suites.any(id=rss.suite_id),
+                    SourcePackage.binaries.any(BinaryPackage.suites.any(id=rss.suite_id)),
+                )
+                .order_by(SourcePackage.name)
+                .first()
+            )
+            bin_arch = [b for b in spkg.binaries if rss.suite in b.suites][0].architecture
+            built_arch_names = {b.architecture.name for b in spkg.binaries}
+            built_arch_name = arch_indep_affinity if bin_arch.name == 'all' else bin_arch.name
+            built_arch_names.add(built_arch_name)
+            arch_other = [a for a in rss.suite.architectures if a.name not in built_arch_names and a.name != 'all'][0]
+
+            # dependency issues and jobs are looked up in bulk, the oldest job wins
+            issue = DebcheckIssue()
+            issue.package_type = PackageType.SOURCE
+            issue.repo = rss.repo
+            issue.suite = rss.suite
+            issue.package_name = spkg.name
+            issue.package_version = spkg.version
+            issue.architectures = [arch_other.name]
+            session.add(issue)
+            job_new = new_job(spkg.source_uuid, spkg.version, arch_other.name)
+            job_old = new_job(
+                spkg.source_uuid, spkg.version, arch_other.name, time_created=datetime.now(UTC) - timedelta(days=1)
+            )
+            session.flush()
+
+            index = BuildScheduleIndex(session, rss, [spkg])
+            assert index.binaries_exist(spkg, bin_arch)
+            assert not index.binaries_exist(spkg, arch_other)
+            assert index.has_debcheck_issues(spkg, arch_other)
+            assert not index.has_debcheck_issues(spkg, bin_arch)
+            assert index.find_job(spkg, arch_other) == job_old
+            assert index.find_job(spkg, bin_arch) is None
+            job_bin_arch = Job()
+            job_bin_arch.trigger = spkg.source_uuid
+            job_bin_arch.version = spkg.version
+            job_bin_arch.architecture = bin_arch.name
+            index.add_job(job_bin_arch)
+            assert index.find_job(spkg, bin_arch) == job_bin_arch
+
+            # pending jobs are dropped if their binaries exist or their source is gone
+            session.delete(job_old)
+            job_built = new_job(spkg.source_uuid, spkg.version, built_arch_name)
+            job_orphan = new_job(uuid.uuid4(), '1.0-1', arch_other.name)
+            job_orphan_running = new_job(uuid.uuid4(), '1.0-1', arch_other.name, status=JobStatus.RUNNING)
+            session.flush()
+            job_ids = [job.uuid for job in (job_new, job_built, job_orphan, job_orphan_running)]
+
+            def remaining_jobs():
+                session.flush()
+                return [jid for jid in job_ids if session.get(Job, jid)]
+
+            remove_superfluous_pending_jobs(session, simulate=True, arch_indep_affinity=arch_indep_affinity)
+            assert remaining_jobs() == job_ids
+            remove_superfluous_pending_jobs(session, arch_indep_affinity=arch_indep_affinity)
+            assert remaining_jobs() == [job_new.uuid, job_orphan_running.uuid]
+
+            # jobs whose source package is gone are deleted with their logs, no matter their state
+            log_dir = os.path.join(
+                LocalConfig().logs_metadata_dir, get_dir_shorthand_for_uuid(str(job_orphan_running.uuid))
+            )
+            log_fname = os.path.join(log_dir, str(job_orphan_running.uuid) + '.log')
+            os.makedirs(log_dir, exist_ok=True)
+            with open(log_fname, 'w') as f:
+                f.write('build log')
+
+            delete_orphaned_jobs(session, simulate=True)
+            assert remaining_jobs() == [job_new.uuid, job_orphan_running.uuid]
+            assert os.path.isfile(log_fname)
+            delete_orphaned_jobs(session)
+            assert remaining_jobs() == [job_new.uuid]
+            assert not os.path.isfile(log_fname)
+
+            # don't keep any of these changes
+            session.rollback()
+
+    def test_publish_suites_parallel(self, ctx):
+        from archivecli.publish import (
+            publish_repo_dists,
+            generate_packages_index,
+            generate_packages_indices,
+        )
+        from laniakea.archive.utils import repo_suite_mark_changed
+
+        with session_scope() as session:
+            repo = session.query(ArchiveRepository).filter(ArchiveRepository.name == 'master').one()
+            dists_dir = os.path.join(repo.get_root_dir(), 'dists')
+
+            # fetching the Packages data of all architectures at once yields the same data as one query per arch
+            rss = repo_suite_settings_for(session, 'master', 'unstable')
+            arches = list(rss.suite.architectures)
+            for component in rss.suite.components:
+                for udeb in (False, True):
+                    batched = {
+                        arch.name: list(stanzas)
+                        for arch, stanzas in generate_packages_indices(
+                            session, repo, rss.suite, component, arches, installer_udeb=udeb
+                        )
+                    }
+                    assert sorted(batched.keys()) == sorted(a.name for a in arches)
+                    for arch in arches:
+                        assert batched[arch.name] == list(
+                            generate_packages_index(session, repo, rss.suite, component, arch, installer_udeb=udeb)
+                        )
+            assert list(generate_packages_indices(session, repo, rss.suite, rss.suite.components[0], [])) == []
+
+            # publish all suites of the repository at once, in the process pool
+            suite_names = [s.suite.name for s in repo.suite_settings]
+            assert len(suite_names) > 1
+            release_mtimes = {}
+            for s in repo.suite_settings:
+                repo_suite_mark_changed(session, s)
+                release_fname = os.path.join(dists_dir, s.suite.name, 'Release')
+                if os.path.isfile(release_fname):
+                    release_mtimes[s.suite.name] = os.stat(release_fname).st_mtime_ns
+            session.commit()
+
+            publish_repo_dists(session, repo)
+            session.expire_all()
+            for s in repo.suite_settings:
+                assert not s.changes_pending
+                release_fname = os.path.join(dists_dir, s.suite.name, 'Release')
+                assert os.path.isfile(release_fname)
+                assert os.path.isfile(os.path.join(dists_dir, s.suite.name, 'InRelease'))
+                if s.suite.name in release_mtimes:
+                    assert os.stat(release_fname).st_mtime_ns != release_mtimes[s.suite.name]
+            assert not os.path.exists(os.path.join(repo.get_root_dir(), 'zzz-meta'))
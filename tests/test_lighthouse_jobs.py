@@ -133,3 +133,68 @@ class TestLighthouseJobRequests:
             'repo': 'master',
             'version': '0.1-3',
         }
+
+    def test_request_job_poll(self, new_zmq_curve_socket, localconfig):
+        sock = new_zmq_curve_socket(zmq.REQ, localconfig.lighthouse.servers_jobs[0], self._server_key, self._client_key)
+
+        req = self.req_base()
+        req['request'] = 'job'
+        req['accepts'] = ['package-build']
+        req['architectures'] = ['riscv64']
+        req['poll_timeout'] = 1
+
+        # wait for a job on an architecture we have none for, and get an empty reply once the poll expired
+        reply = self.send_request(sock, req)
+        assert reply is None
+
+    def test_status_update_buffer(self):
+        '''
+        Job status updates are merged per job, and written as soon as the job state changes.
+        '''
+        from laniakea.db import LkModule, JobStatus
+        from lighthouse.jobs_worker import JobWorker
+
+        with session_scope() as session:
+            job = Job()
+            job.module = LkModule.ARIADNE
+            job.kind = JobKind.PACKAGE_BUILD
+            job.version = '1.0'
+            job.architecture = 'amd64'
+            job.status = JobStatus.SCHEDULED
+            session.add(job)
+            session.flush()
+            job_id = str(job.uuid)
+
+        worker = JobWorker(None)
+
+        req = self.req_base()
+        req['request'] = 'job-status'
+        req['uuid'] = job_id
+        req['log_excerpt'] = 'first'
+        assert worker.process_client_message(req) is None
+        req['log_excerpt'] = 'second\x00'
+        assert worker.process_client_message(req) is None
+
+        metrics = worker.status_buffer_metrics()
+        assert metrics['pending_job_updates'] == 1
+        assert metrics['pending_worker_pings'] == 1
+        assert metrics['flush_count'] == 0
+        with session_scope() as session:
+            job = session.query(Job).filter(Job.uuid == job_id).one()
+            assert job.latest_log_excerpt is None
+
+        # accepting the job writes the buffered updates right away
+        req = self.req_base()
+        req['request'] = 'job-accepted'
+        req['uuid'] = job_id
+        assert worker.process_client_message(req) is True
+
+        metrics = worker.status_buffer_metrics()
+        assert metrics['pending_job_updates'] == 0
+        assert metrics['pending_worker_pings'] == 0
+        assert metrics['flush_count'] == 1
+        with session_scope() as session:
+            job = session.query(Job).filter(Job.uuid == job_id).one()
+            assert job.latest_log_excerpt == 'second'
+            assert job.status == JobStatus.RUNNING
+            session.delete(job)
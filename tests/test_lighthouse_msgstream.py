@@ -102,3 +102,95 @@ class TestLighthouseMsgStream:
         sigs = msg['signatures']
         assert sigs
         assert len(sigs[self._sender_id]['ed25519:0']) > 80
+
+    def test_event_pipeline_batches(self, tmp_path):
+        '''
+        Push events through the signing pipeline and check the batched, signed result.
+        '''
+        import time
+        import threading
+
+        from laniakea.msgstream import event_message_unpack, keyfile_read_verify_key
+        from lighthouse.events_publisher import (
+            EventsQueue,
+            EventsSigner,
+            EventsPublisher,
+        )
+
+        pub_endpoint = 'ipc://' + str(tmp_path / 'pub')
+        pipeline_endpoint = 'ipc://' + str(tmp_path / 'publish')
+        signer_endpoint = 'ipc://' + str(tmp_path / 'sign-0')
+
+        publisher = EventsPublisher([pub_endpoint], pipeline_endpoint)
+        signer = EventsSigner(signer_endpoint, pipeline_endpoint, batch_size=3)
+        threading.Thread(target=publisher.run, daemon=True).start()
+        threading.Thread(target=signer.run, daemon=True).start()
+
+        sub_socket = self._zctx.socket(zmq.SUB)
+        sub_socket.setsockopt(zmq.RCVTIMEO, 5000)
+        sub_socket.setsockopt_string(zmq.SUBSCRIBE, '_lk.testsuite.')
+        sub_socket.connect(pub_endpoint)
+        # give the subscription some time to reach the publisher
+        time.sleep(0.5)
+
+        queue = EventsQueue([signer_endpoint])
+        sent = [
+            create_event_message(self._sender_id, '_lk.testsuite.batch', {'n': i}, self._sender_signing_key)
+            for i in range(3)
+        ]
+        sent.append(create_event_message(self._sender_id, '_lk.testsuite.single', {'n': 3}, self._sender_signing_key))
+        for event in sent:
+            queue.put(event)
+
+        received = {}
+        for _ in range(2):
+            topic, msg_b = sub_socket.recv_multipart()
+            received[topic] = json.loads(msg_b)
+        sub_socket.close()
+
+        lh_id, lh_verify_key = keyfile_read_verify_key(self._server_key_fname)
+        assert lh_id
+
+        # events with the same tag are bundled, and the bundle is signed by Lighthouse
+        batch = received[b'_lk.testsuite.batch']
+        assert batch['format'] == '1.0-batch'
+        assert batch['tag'] == '_lk.testsuite.batch'
+        verify_event_message(lh_id, batch, lh_verify_key)
+        events = event_message_unpack(batch)
+        assert [e['data'] for e in events] == [{'n': 0}, {'n': 1}, {'n': 2}]
+        for event in events:
+            verify_event_message(self._sender_id, event, self._sender_verify_key)
+
+        # a lone event is passed through, countersigned by Lighthouse
+        single = received[b'_lk.testsuite.single']
+        assert single['format'] == '1.0'
+        assert event_message_unpack(single) == [single]
+        verify_event_message(lh_id, single, lh_verify_key)
+        verify_event_message(self._sender_id, single, self._sender_verify_key)
+
+
+def test_pipeline_stats(monkeypatch, caplog):
+    import logging
+
+    import lighthouse.events_publisher as events_publisher
+
+    stats = events_publisher._PipelineStats('Test pipeline')
+
+    # nothing is reported before the interval has passed
+    with caplog.at_level(logging.INFO):
+        stats.add(5)
+        stats.add(7, True)
+    assert not caplog.records
+
+    monkeypatch.setattr(events_publisher, 'STATS_INTERVAL', 0)
+    with caplog.at_level(logging.INFO):
+        stats.add(1)
+    assert len(caplog.records) == 1
+    assert caplog.records[0].getMessage().startswith('Test pipeline: 13 events')
+    assert caplog.records[0].getMessage().endswith('most drained at once: 7, drains left events pending: 1')
+
+    # counters are reset after each report
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        stats.add(0)
+    assert not caplog.records
@@ -158,3 +158,230 @@ def test_reporeader_local(samples_dir, localconfig):
 
     validate_src_packages(src_pkgs)
     validate_bin_packages(bin_pkgs)
+
+    # reading the same, unchanged indices again should yield identical results from the parse cache
+    assert os.listdir(os.path.join(localconfig.cache_dir, 'repo_index_cache'))
+    repo_reader = RepositoryReader(repo_location, 'Dummy', trusted_keyrings=keyrings)
+    src_pkgs = repo_reader.source_packages(suite, component)
+    bin_pkgs = repo_reader.binary_packages(suite, component, arch)
+    bin_pkgs.extend(repo_reader.binary_packages(suite, component, arch_all))
+    assert len(src_pkgs) == 8
+    assert len(bin_pkgs) == 7
+    validate_src_packages(src_pkgs)
+    validate_bin_packages(bin_pkgs)
+
+
+@pytest.fixture
+def http_repo(tmp_path):
+    '''Serve a directory over HTTP and record the requests made to it.'''
+    import threading
+    from functools import partial
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    repo_dir = tmp_path / 'repo'
+    repo_dir.mkdir()
+    requests_log = []
+
+    class RecordingHandler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requests_log.append((self.path, dict(self.headers)))
+            super().do_GET()
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(RecordingHandler, directory=str(repo_dir)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1]), repo_dir, requests_log
+    server.shutdown()
+    server.server_close()
+
+
+def test_repo_file_downloader(tmp_path, http_repo):
+    import hashlib
+
+    from laniakea.db import ArchiveFile
+    from laniakea.reporeader import RepoFileDownloader
+
+    base_url, repo_dir, requests_log = http_repo
+    cache_dir = tmp_path / 'cache'
+
+    files = {}
+    for i in range(6):
+        data = 'Package: pkg{}\n'.format(i).encode() * (i + 1)
+        location = 'pool/main/p/pkg{}_1.0.deb'.format(i)
+        (repo_dir / location).parent.mkdir(parents=True, exist_ok=True)
+        (repo_dir / location).write_bytes(data)
+        files[location] = data
+
+    def afile(location):
+        af = ArchiveFile(location)
+        af.size = len(files[location])
+        af.sha256sum = hashlib.sha256(files[location]).hexdigest()
+        return af
+
+    downloader = RepoFileDownloader(base_url, cache_dir, max_parallel=3)
+    try:
+        # files are fetched in parallel, and returned in the order they were requested
+        afiles = [afile(loc) for loc in sorted(files.keys(), reverse=True)]
+        fnames = downloader.fetch_many(afiles)
+        assert fnames == [os.path.join(cache_dir, af.fname) for af in afiles]
+        for af, fname in zip(afiles, fnames):
+            with open(fname, 'rb') as f:
+                assert f.read() == files[af.fname]
+            assert not os.path.exists(fname + '.partial')
+        assert len(requests_log) == len(files)
+
+        # cached copies that match their checksum are not downloaded again
+        requests_log.clear()
+        assert downloader.fetch_many(afiles) == fnames
+        assert not requests_log
+
+        # a stale cached copy is replaced
+        location = afiles[0].fname
+        with open(fnames[0], 'wb') as f:
+            f.write(b'stale')
+        assert downloader.fetch(location, sha256sum=afiles[0].sha256sum, size=afiles[0].size) == fnames[0]
+        with open(fnames[0], 'rb') as f:
+            assert f.read() == files[location]
+        assert len(requests_log) == 1
+
+        # a leftover partial download is not trusted blindly
+        requests_log.clear()
+        os.remove(fnames[1])
+        with open(fnames[1] + '.partial', 'wb') as f:
+            f.write(b'garbage')
+        assert downloader.fetch(afiles[1].fname, sha256sum=afiles[1].sha256sum, check=True) == fnames[1]
+        with open(fnames[1], 'rb') as f:
+            assert f.read() == files[afiles[1].fname]
+        assert requests_log[0][1].get('Range') == 'bytes=7-'
+        assert not os.path.exists(fnames[1] + '.partial')
+
+        # files without a known checksum are only re-fetched if the server has a newer copy
+        requests_log.clear()
+        (repo_dir / 'Release').write_bytes(b'Origin: Test\n')
+        release_fname = downloader.fetch('Release')
+        assert release_fname == os.path.join(cache_dir, 'Release')
+        assert 'If-Modified-Since' not in requests_log[0][1]
+        assert downloader.fetch('Release') == release_fname
+        assert 'If-Modified-Since' in requests_log[1][1]
+        with open(release_fname, 'rb') as f:
+            assert f.read() == b'Origin: Test\n'
+
+        # data that does not match its expected checksum is rejected
+        bad = afile(afiles[2].fname)
+        bad.sha256sum = hashlib.sha256(b'something else').hexdigest()
+        os.remove(fnames[2])
+        with pytest.raises(Exception, match='Checksum validation'):
+            downloader.fetch(bad.fname, sha256sum=bad.sha256sum)
+        assert not os.path.exists(fnames[2])
+        assert not os.path.exists(fnames[2] + '.partial')
+
+        # missing files are only an error if we ask for it
+        assert downloader.fetch('dists/nonexistent/Release') is None
+        with pytest.raises(Exception, match='Unable to download'):
+            downloader.fetch('dists/nonexistent/Release', check=True)
+    finally:
+        downloader.close()
+
+
+def test_external_package_lazy_fields():
+    from laniakea.reporeader import ExternalBinaryPackage, ExternalSourcePackage
+
+    spkg = ExternalSourcePackage('hello', '1.0-1')
+    assert spkg.uploaders == []
+    assert spkg.build_depends == []
+    assert spkg.files == []
+    with pytest.raises(AttributeError):
+        spkg.not_a_field = True
+
+    # raw values are only split on first access, and the result is kept
+    spkg.directory = 'pool/main/h/hello'
+    spkg._uploaders = 'Jane Doe <jane@example.org>, John Doe <john@example.org>,'
+    spkg._build_depends = 'debhelper-compat (= 13),  libfoo-dev (>= 1.0)'
+    spkg._files = (
+        '4d2f3c8e0c9c5b5ba6c1e6c66e7c0a4b1d51a4fc4ee8ad3f11a52b8d1b7a5c5a 1234 hello_1.0-1.dsc\n'
+        'bd1a9bd9b4fb6bd8a3ddc2f2a59c8d1f8fc1f3fbba3ec2b6e1b3d41e71a6da3a 98765 hello_1.0.orig.tar.gz\n'
+    )
+    assert isinstance(spkg._uploaders, str)
+    uploaders = spkg.uploaders
+    assert uploaders == ['Jane Doe <jane@example.org>', 'John Doe <john@example.org>']
+    assert spkg.uploaders is uploaders
+    assert spkg.build_depends == ['debhelper-compat (= 13)', 'libfoo-dev (>= 1.0)']
+    assert [(f.fname, f.size) for f in spkg.files] == [
+        ('pool/main/h/hello/hello_1.0-1.dsc', 1234),
+        ('pool/main/h/hello/hello_1.0.orig.tar.gz', 98765),
+    ]
+    assert spkg.files[0].sha256sum.startswith('4d2f3c8e')
+    assert spkg.files is spkg.files
+
+    # assigning a list replaces the raw value
+    spkg.uploaders = ['Someone Else <else@example.org>']
+    assert spkg.uploaders == ['Someone Else <else@example.org>']
+    spkg.files = []
+    assert spkg.files == []
+
+    bpkg = ExternalBinaryPackage('hello', '1.0-1')
+    assert bpkg.depends == []
+    assert bpkg.pre_depends == []
+    assert bpkg.bin_file is None
+    with pytest.raises(AttributeError):
+        bpkg.not_a_field = True
+
+    bpkg._depends = 'libc6 (>= 2.34), libfoo1 | libfoo-alt1'
+    bpkg._pre_depends = ''
+    bpkg._bin_file = ('pool/main/h/hello/hello_1.0-1_amd64.deb', 5678, 'a' * 64)
+    assert bpkg.depends == ['libc6 (>= 2.34)', 'libfoo1 | libfoo-alt1']
+    assert bpkg.pre_depends == []
+    bin_file = bpkg.bin_file
+    assert bin_file.fname == 'pool/main/h/hello/hello_1.0-1_amd64.deb'
+    assert bin_file.size == 5678
+    assert bin_file.sha256sum == 'a' * 64
+    assert bpkg.bin_file is bin_file
+
+
+def test_reporeader_remote_cache(samples_dir, localconfig, http_repo):
+    import shutil
+    import hashlib
+
+    from laniakea.db import ArchiveFile
+
+    base_url, repo_dir, requests_log = http_repo
+    shutil.copytree(os.path.join(samples_dir, 'samplerepo', 'dummy'), repo_dir, dirs_exist_ok=True)
+    pool_data = b'Format: 3.0 (native)\n'
+    (repo_dir / 'pool' / 'main' / 'f' / 'foo').mkdir(parents=True)
+    (repo_dir / 'pool' / 'main' / 'f' / 'foo' / 'foo_1.0.dsc').write_bytes(pool_data)
+
+    cache_dir = os.path.join(localconfig.cache_dir, 'repo_cache', 'DummyRemote')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    keyrings = localconfig.synchrotron_sourcekeyrings
+    suite = ArchiveSuite('testing')
+    component = ArchiveComponent('main')
+
+    repo_reader = RepositoryReader(base_url, 'DummyRemote', trusted_keyrings=keyrings)
+    assert repo_reader.base_dir == cache_dir
+    validate_src_packages(repo_reader.source_packages(suite, component))
+    afile = ArchiveFile('pool/main/f/foo/foo_1.0.dsc')
+    afile.size = len(pool_data)
+    afile.sha256sum = hashlib.sha256(pool_data).hexdigest()
+    pool_fname = repo_reader.get_file(afile)
+    assert os.path.isfile(pool_fname)
+    partial_fname = os.path.join(cache_dir, 'dists', 'testing', 'main', 'source', 'Sources.gz.partial')
+    with open(partial_fname, 'wb') as f:
+        f.write(b'interrupted')
+
+    # package files and interrupted downloads are removed, but the index files are kept
+    repo_reader.cleanup()
+    assert not os.path.exists(os.path.join(cache_dir, 'pool'))
+    assert not os.path.exists(partial_fname)
+    assert os.path.isfile(os.path.join(cache_dir, 'dists', 'testing', 'InRelease'))
+    assert os.path.isfile(os.path.join(cache_dir, 'dists', 'testing', 'main', 'source', 'Sources.xz'))
+
+    # ... so the next run only needs to check whether the release data has changed
+    requests_log.clear()
+    repo_reader = RepositoryReader(base_url, 'DummyRemote', trusted_keyrings=keyrings)
+    validate_src_packages(repo_reader.source_packages(suite, component))
+    assert [path for path, _ in requests_log] == ['/dists/testing/InRelease']
+    assert 'If-Modified-Since' in requests_log[0][1]
+    repo_reader.cleanup()
@@ -5,10 +5,12 @@
 #
 # SPDX-License-Identifier: LGPL-3.0+ AND Apache-2.0
 
+import json
+
 import pytest
 import nacl.signing
 
-from laniakea.utils import decode_base64, encode_base64
+from laniakea.utils import decode_base64, encode_base64, json_compact_dump
 from laniakea.msgstream.signing import (
     get_verify_key,
     read_signing_keys,
@@ -26,6 +28,7 @@ from laniakea.msgstream.signedjson import (
     sign_json,
     signature_ids,
     verify_signed_json,
+    verify_signed_json_bytes,
 )
 
 
@@ -196,3 +199,49 @@ class TestJsonSign:
         invalid = {'signatures': {'Alice': {'mock:test': 'not base64'}}}
         with pytest.raises(SignatureVerifyException):
             verify_signed_json(invalid, 'Alice', self.verkey)
+
+
+class TestJsonVerifyBytes:
+    def setup_method(self, test_method):
+        self.signing_key = nacl.signing.SigningKey(SIGNING_KEY_SEED)
+        self.signing_key.alg = KEY_ALG
+        self.signing_key.version = KEY_VER
+        self.verify_key = get_verify_key(self.signing_key)
+        self.verify_key.alg = KEY_ALG
+        self.verify_key.version = KEY_VER
+
+        self.signed = sign_json({'data': {'a': 'b'}, 'tag': 'test', 'uuid': '1'}, 'domain', self.signing_key)
+
+    def test_verify_canonical(self):
+        data = json_compact_dump(self.signed, as_bytes=True)
+        verify_signed_json_bytes(data, self.signed, 'domain', self.verify_key)
+
+    def test_verify_not_canonical(self):
+        data = bytes(json.dumps(self.signed, indent=2), 'utf-8')
+        verify_signed_json_bytes(data, self.signed, 'domain', self.verify_key)
+
+    def test_verify_fail_modified(self):
+        modified = json.loads(json_compact_dump(self.signed))
+        modified['data']['a'] = 'c'
+        data = json_compact_dump(modified, as_bytes=True)
+        with pytest.raises(SignatureVerifyException):
+            verify_signed_json_bytes(data, modified, 'domain', self.verify_key)
+
+    def test_event_verifier(self):
+        from laniakea.msgstream import EventMessageVerifier
+
+        event = sign_json(
+            {'tag': 'test', 'uuid': '1', 'format': '1.0', 'time': 'now', 'data': {}}, 'domain', self.signing_key
+        )
+        data = json_compact_dump(event, as_bytes=True)
+        verifier = EventMessageVerifier({'domain': self.verify_key})
+
+        assert verifier.decode(b'{"tag": "test"}') is None
+        assert verifier.decode(data) == event
+        assert verifier.verify(data, verifier.decode(data))
+        # verifying the same message twice hits the cache
+        assert verifier.verify(data, verifier.decode(data))
+
+        modified = data.replace(b'"data":{}', b'"data":{"a":1}')
+        assert not verifier.verify(modified, verifier.decode(modified))
+        assert not EventMessageVerifier({}).verify(data, event)
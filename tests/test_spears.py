@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2026 Matthias Klumpp <matthias@tenstral.net>
+#
+# SPDX-License-Identifier: LGPL-3.0+
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+
+def _mtask(name, source_ids, target_id):
+    return SimpleNamespace(
+        name=name, source_suites=[SimpleNamespace(id=sid) for sid in source_ids], target_suite_id=target_id
+    )
+
+
+def test_group_dependent_migration_tasks():
+    from spears.spearsengine import group_dependent_migration_tasks
+
+    assert group_dependent_migration_tasks([]) == []
+
+    # chained tasks and tasks sharing a target are grouped, independent ones are not
+    t_unstable_testing = _mtask('unstable-testing', [1], 2)
+    t_exp_other = _mtask('experimental-other', [4], 5)
+    t_testing_stable = _mtask('testing-stable', [2], 3)
+    t_staging_testing = _mtask('staging-testing', [6], 2)
+    groups = group_dependent_migration_tasks([t_unstable_testing, t_exp_other, t_testing_stable, t_staging_testing])
+    assert [[t.name for t in g] for g in groups] == [
+        ['unstable-testing', 'testing-stable', 'staging-testing'],
+        ['experimental-other'],
+    ]
+
+    # a later task may join two groups that were independent so far, the order is kept
+    t_a = _mtask('a', [1], 2)
+    t_b = _mtask('b', [3], 4)
+    t_c = _mtask('c', [5], 6)
+    t_join = _mtask('join', [2, 7], 4)
+    groups = group_dependent_migration_tasks([t_a, t_b, t_c, t_join])
+    assert [[t.name for t in g] for g in groups] == [['a', 'b', 'join'], ['c']]
+
+
+def _concat_index_files(groups: list[list[str]]) -> bytes:
+    '''Merge index files in memory, the way Spears used to do it.'''
+    from laniakea.utils import open_compressed
+
+    data = b''
+    for files in groups:
+        fname, fname_all = files[0], files[1] if len(files) > 1 else None
+        with open_compressed(fname) as f:
+            data += f.read()
+        if fname_all:
+            if data.rstrip():
+                data += b'\n'
+            with open_compressed(fname_all) as f:
+                data += f.read()
+        if data.rstrip():
+            data += b'\n'
+    return data
+
+
+def test_stream_merge_index_files(tmp_path):
+    import gzip
+    import lzma
+
+    from spears.spearsengine import _stream_merge_index_files
+
+    def write_index(name, data: bytes):
+        fname = str(tmp_path / name)
+        opener = lzma.open if name.endswith('.xz') else gzip.open
+        with opener(fname, 'wb') as f:
+            f.write(data)
+        return fname
+
+    main_amd64 = write_index('main-amd64.xz', b'Package: a\nVersion: 1\n\nPackage: b\nVersion: 2\n')
+    main_all = write_index('main-all.xz', b'Package: c\nArchitecture: all\n')
+    empty_amd64 = write_index('empty-amd64.gz', b'')
+    contrib_all = write_index('contrib-all.gz', b'Package: d\nArchitecture: all\n')
+    sources_main = write_index('sources-main.gz', b'Package: a\n\nPackage: b\n')
+    sources_empty = write_index('sources-empty.xz', b'')
+
+    target_fname = str(tmp_path / 'Packages.gz')
+    for groups in (
+        [[main_amd64, main_all], [empty_amd64, contrib_all]],
+        [[empty_amd64, contrib_all], [main_amd64, main_all]],
+        [[empty_amd64], [empty_amd64]],
+        [[sources_empty], [sources_main], [sources_empty]],
+    ):
+        assert _stream_merge_index_files(target_fname, groups)
+        with gzip.open(target_fname, 'rb') as f:
+            assert f.read() == _concat_index_files(groups)
+
+    # nothing is written if the inputs have not changed
+    groups = [[main_amd64, main_all]]
+    assert _stream_merge_index_files(target_fname, groups)
+    mtime = os.path.getmtime(target_fname)
+    assert not _stream_merge_index_files(target_fname, groups)
+    assert os.path.getmtime(target_fname) == mtime
+
+    # ... but it is if they have
+    write_index('main-all.xz', b'Package: c\nArchitecture: all\nVersion: 2\n')
+    assert _stream_merge_index_files(target_fname, groups)
+    with gzip.open(target_fname, 'rb') as f:
+        assert f.read() == _concat_index_files(groups)
+    assert not _stream_merge_index_files(target_fname, groups)
+
+    # a changed set of input files is noticed as well
+    assert _stream_merge_index_files(target_fname, [[main_all, main_amd64]])
+
+
+class TestSpears:
+    @pytest.fixture(autouse=True)
+    def setup(self, localconfig, database, import_sample_packages):
+        pass
+
+    def test_faux_packages(self, tmp_path):
+        from datetime import datetime
+
+        from laniakea.db import (
+            ArchiveSuite,
+            BinaryPackage,
+            ArchiveRepoSuiteSettings,
+            session_scope,
+        )
+        from spears.spearsengine import SpearsEngine
+        from laniakea.archive.utils import repo_suite_settings_for
+
+        def read_faux_packages():
+            res = set()
+            with open(fauxpkg_fname, 'r') as f:
+                for segment in f.read().split('\n\n'):
+                    if not segment.strip():
+                        continue
+                    fields = dict(line.split(': ', 1) for line in segment.splitlines())
+                    res.add((fields['Package'], fields['Version'], fields.get('Architecture', 'all')))
+            return res
+
+        engine = SpearsEngine()
+        mi_wspace = str(tmp_path)
+        os.makedirs(os.path.join(mi_wspace, 'input'))
+        fauxpkg_fname = os.path.join(mi_wspace, 'input', 'faux-packages')
+        cache_key_fname = fauxpkg_fname + '.cachekey'
+
+        with session_scope() as session:
+            rss_unstable = repo_suite_settings_for(session, 'master', 'unstable')
+            rss_stable = repo_suite_settings_for(session, 'master', 'stable')
+            repo = rss_unstable.repo
+            suite_unstable = rss_unstable.suite
+            suite_stable = rss_stable.suite
+
+            # a partial suite on top of unstable, so packages migrating into it need to know about its parent
+            suite_partial = ArchiveSuite('unstable-updates')
+            suite_partial.parents = [suite_unstable]
+            suite_partial.architectures = list(suite_unstable.architectures)
+            suite_partial.components = list(suite_unstable.components)
+            session.add(suite_partial)
+            rss_partial = ArchiveRepoSuiteSettings(repo, suite_partial)
+            session.add(rss_partial)
+
+            # a package which already is in the source suite does not need a faux package
+            bpkgs = (
+                session.query(BinaryPackage)
+                .filter(BinaryPackage.repo_id == repo.id, BinaryPackage.suites.any(id=suite_unstable.id))
+                .all()
+            )
+            kept_bpkg = [b for b in bpkgs if b.component.name == 'main'][0]
+            kept_bpkg.suites.append(suite_stable)
+
+            for rss in (rss_unstable, rss_stable):
+                rss.changes_pending = False
+                rss.time_published = datetime(2026, 1, 2, 3, 4, 5)
+            rss_partial.changes_pending = True
+            session.flush()
+
+            mtask = SimpleNamespace(repo_id=repo.id, source_suites=[suite_stable], target_suite=suite_partial)
+
+            # the cache key covers the source suites and the target's parents, but not the target itself
+            cache_key = engine._faux_packages_cache_key(session, mtask)
+            assert cache_key == ';'.join(
+                '{}:{}'.format(rss.suite_id, rss.time_published.isoformat())
+                for rss in sorted((rss_unstable, rss_stable), key=lambda r: r.suite_id)
+            )
+            assert (
+                engine._faux_packages_cache_key(
+                    session, SimpleNamespace(repo_id=repo.id, source_suites=[suite_partial], target_suite=suite_stable)
+                )
+                is None
+            )
+
+            engine._create_faux_packages(session, mi_wspace, mtask)
+            expected_faux = {
+                (b.name, b.version, b.architecture.name)
+                for b in bpkgs
+                if (b.architecture.name, b.name) != (kept_bpkg.architecture.name, kept_bpkg.name)
+            }
+            assert expected_faux
+            assert read_faux_packages() == expected_faux
+            with open(cache_key_fname, 'r') as f:
+                assert f.read().strip() == cache_key
+
+            # nothing is regenerated as long as the involved suites are unchanged
+            with open(fauxpkg_fname, 'w') as f:
+                f.write('Package: stale\nVersion: 1.0\n\n')
+            engine._create_faux_packages(session, mi_wspace, mtask)
+            assert read_faux_packages() == {('stale', '1.0', 'all')}
+
+            # ... but it is if one of them was published again
+            rss_unstable.time_published = datetime(2026, 1, 3, 3, 4, 5)
+            session.flush()
+            engine._create_faux_packages(session, mi_wspace, mtask)
+            assert read_faux_packages() == expected_faux
+            with open(cache_key_fname, 'r') as f:
+                assert f.read().strip() == engine._faux_packages_cache_key(session, mtask)
+
+            # suites with pending changes are never cached
+            rss_stable.changes_pending = True
+            session.flush()
+            assert engine._faux_packages_cache_key(session, mtask) is None
+            with open(fauxpkg_fname, 'w') as f:
+                f.write('Package: stale\nVersion: 1.0\n\n')
+            engine._create_faux_packages(session, mi_wspace, mtask)
+            assert read_faux_packages() == expected_faux
+            assert not os.path.exists(cache_key_fname)
+
+            # no faux packages are needed without any parent suites, and multiple sources are not supported
+            os.remove(fauxpkg_fname)
+            engine._create_faux_packages(
+                session,
+                mi_wspace,
+                SimpleNamespace(repo_id=repo.id, source_suites=[suite_stable], target_suite=suite_unstable),
+            )
+            engine._create_faux_packages(
+                session,
+                mi_wspace,
+                SimpleNamespace(
+                    repo_id=repo.id, source_suites=[suite_stable, suite_unstable], target_suite=suite_partial
+                ),
+            )
+            assert not os.path.exists(fauxpkg_fname)
+
+            session.rollback()
+
+    def test_store_excuses(self, tmp_path, monkeypatch):
+        from spears import excuses, spearsengine
+        from laniakea.db import (
+            SpearsExcuse,
+            SourcePackage,
+            SpearsMigrationTask,
+            session_scope,
+        )
+        from spears.excuses import ExcusesFile
+        from spears.spearsengine import SpearsEngine
+        from laniakea.archive.utils import repo_suite_settings_for
+
+        class RecordingEmitter:
+            def __init__(self):
+                self.events = []
+
+            def submit_event(self, tag, data):
+                self.events.append((tag, data))
+
+        excuses_grave = '\n'.join(
+            (
+                '- excuses:',
+                '  - \'Too young, only 0 of 5 days old (needed 5 days)\'',
+                '  - \'∙ ∙ Depends: grave snowman (not considered)\'',
+                '  - \'missing build on <a href="https://buildd.debian.org/status/logs.php?arch=arm64&pkg=grave&ver=0.1-1"',
+                '    target="_blank">arm64</a>: grave\'',
+                '  is-candidate: {candidate}',
+                '  maintainer: Test Maintainer',
+                '  missing-builds:',
+                '    on-architectures:',
+                '    - arm64',
+                '    on-unimportant-architectures: []',
+                '  new-version: 0.1-1',
+                '  old-version: \'-\'',
+                '  old-binaries:',
+                '    0.0-1:',
+                '    - grave-data',
+                '  dependencies:',
+                '    blocked-by:',
+                '    - snowman',
+                '    migrate-after:',
+                '    - linux',
+                '  policy_info:',
+                '    age:',
+                '      age-requirement: 5',
+                '      current-age: 0',
+                '  source: grave',
+            )
+        )
+        excuses_snowman = '\n'.join(
+            (
+                '- is-candidate: true',
+                '  new-version: 0.1-1',
+                '  old-version: \'-\'',
+                '  source: snowman',
+            )
+        )
+        # the removal of a package
+        excuses_linux = '\n'.join(
+            (
+                '- is-candidate: true',
+                '  new-version: \'-\'',
+                '  old-version: 42.0-1',
+                '  source: linux',
+            )
+        )
+        log_fname = tmp_path / 'output.txt'
+        log_fname.write_text(
+            'info: main run\ntrying: grave\nskipped: grave (0, 1, 1)\n\ntrying: -linux\naccepted: -linux\n'
+        )
+
+        def excuses_file(session, mtask, *entries) -> ExcusesFile:
+            excuses_fname = tmp_path / 'excuses.yaml'
+            excuses_fname.write_text('generated-date: 2026-01-02 03:04:05\nsources:\n' + '\n'.join(entries) + '\n')
+            return ExcusesFile(session, str(excuses_fname), str(log_fname), mtask)
+
+        def stored_excuses(session, mtask):
+            return {
+                (name, e.version_new, e.version_old): e
+                for e, name in session.query(SpearsExcuse, SourcePackage.name)
+                .join(SpearsExcuse.source_package)
+                .filter(SpearsExcuse.migration_id == mtask.id)
+            }
+
+        # resolve the source packages and write the excuses in multiple small batches
+        monkeypatch.setattr(excuses, 'RESOLVE_BATCH_SIZE', 2)
+        monkeypatch.setattr(spearsengine, 'EXCUSE_BATCH_SIZE', 2)
+        engine = SpearsEngine()
+
+        with session_scope() as session:
+            rss_unstable = repo_suite_settings_for(session, 'master', 'unstable')
+            rss_stable = repo_suite_settings_for(session, 'master', 'stable')
+            mtask = SpearsMigrationTask()
+            mtask.repo = rss_unstable.repo
+            mtask.source_suites = [rss_unstable.suite]
+            mtask.target_suite = rss_stable.suite
+            mtask.delays = {}
+            session.add(mtask)
+            session.flush()
+
+            spkg_uuids = {
+                name: spkg_uuid
+                for name, spkg_uuid in session.query(SourcePackage.name, SourcePackage.uuid).filter(
+                    SourcePackage.repo_id == mtask.repo_id, SourcePackage.name.in_(['grave', 'snowman', 'linux'])
+                )
+            }
+
+            efile = excuses_file(
+                session, mtask, excuses_grave.format(candidate='false'), excuses_snowman, excuses_linux
+            )
+            rows = efile.get_excuse_rows()
+            assert set(rows.keys()) == {('grave', '0.1-1', '-'), ('snowman', '0.1-1', '-'), ('linux', '-', '42.0-1')}
+            assert set(efile.timings.keys()) == {'parse', 'resolve', 'process'}
+
+            row = rows[('grave', '0.1-1', '-')]
+            assert row['migration_id'] == mtask.id
+            assert row['source_package_id'] == spkg_uuids['grave']
+            assert not row['is_candidate']
+            assert row['maintainer'] == 'Test Maintainer'
+            assert (row['age_current'], row['age_required']) == (0, 5)
+            assert row['missing_archs_primary'] == ['arm64']
+            assert row['missing_archs_secondary'] == []
+            assert row['old_binaries'] == [{'pkg_version': '0.0-1', 'binaries': ['grave-data']}]
+            assert row['blocked_by'] == ['snowman']
+            assert row['migrate_after'] == ['linux']
+            assert row['other'] == ['Depends: grave snowman (not considered)', 'missing build on arm64: grave']
+            assert row['log_excerpt'] == 'trying: grave\nskipped: grave (0, 1, 1)\n'
+
+            # removals refer to the old version of the source package
+            row = rows[('linux', '-', '42.0-1')]
+            assert row['source_package_id'] == spkg_uuids['linux']
+            assert row['maintainer'] is None
+            assert row['log_excerpt'] == 'trying: -linux\naccepted: -linux\n'
+            assert rows[('snowman', '0.1-1', '-')]['log_excerpt'] is None
+
+            # all excuses are new at first
+            emitter = RecordingEmitter()
+            timings = dict(efile.timings)
+            engine._store_excuses(session, mtask, rows, emitter, timings)
+            assert {'upsert', 'prune'} <= set(timings.keys())
+            stored = stored_excuses(session, mtask)
+            assert set(stored.keys()) == set(rows.keys())
+            assert sorted(data['source_package'] for tag, data in emitter.events if tag == 'new-excuse') == [
+                'grave',
+                'linux',
+                'snowman',
+            ]
+            assert len(emitter.events) == 3
+            grave_excuse = stored[('grave', '0.1-1', '-')]
+            assert str(grave_excuse.uuid) == [d['uuid'] for _, d in emitter.events if d['source_package'] == 'grave'][0]
+            assert not grave_excuse.is_candidate
+            assert grave_excuse.get_old_binaries()[0].binaries == ['grave-data']
+
+            # excuses that are emitted again are updated in place, the others are dropped
+            efile = excuses_file(session, mtask, excuses_grave.format(candidate='true'), excuses_linux)
+            emitter = RecordingEmitter()
+            engine._store_excuses(session, mtask, efile.get_excuse_rows(), emitter, {})
+            session.expire_all()
+            stored = stored_excuses(session, mtask)
+            assert set(stored.keys()) == {('grave', '0.1-1', '-'), ('linux', '-', '42.0-1')}
+            assert stored[('grave', '0.1-1', '-')].uuid == grave_excuse.uuid
+            assert stored[('grave', '0.1-1', '-')].is_candidate
+            assert [(tag, data['source_package']) for tag, data in emitter.events] == [('excuse-removed', 'snowman')]
+
+            # excuses for packages we do not know are an error
+            efile = excuses_file(session, mtask, excuses_snowman.replace('snowman', 'nonexistent'))
+            with pytest.raises(ValueError):
+                efile.get_excuse_rows()
+
+            session.rollback()
@@ -122,3 +122,12 @@ def test_traceback_decrypt():
         key = b"wrongkey"
         with pytest.raises(Exception):
             decrypt_traceback_string(encrypted, key=key)
+
+
+def test_chunked():
+    from laniakea.utils import chunked
+
+    assert list(chunked([])) == []
+    assert list(chunked([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+    assert list(chunked([1, 2, 3, 4], 2)) == [[1, 2], [3, 4]]
+    assert list(chunked(list(range(4500)))) == [list(range(2000)), list(range(2000, 4000)), list(range(4000, 4500))]